@@ -0,0 +1,87 @@
+"""
+benchmarks/bench_cold_start.py — First-request latency of a fresh worker, with and without warmup.
+
+Each run starts a new Python process (a "worker"), sets Django up, optionally
+runs the warmup (core/warmup.py), then times two POST /api/analyze requests
+through Django's test client. Without warmup the first request pays for all
+lazy imports and client creation; with warmup it should cost about the same
+as the second one.
+
+Usage (from backend/):
+    python benchmarks/bench_cold_start.py [--runs 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "darkguard.settings")
+
+
+def _child(warm: bool) -> None:
+    """Run inside a fresh interpreter; prints one JSON line of timings (ms)."""
+    t0 = time.perf_counter()
+    import django
+
+    django.setup()
+    from django.test import Client
+
+    from core.warmup import synthetic_request, warm_up
+
+    timings = {"setup": (time.perf_counter() - t0) * 1000}
+    if warm:
+        t0 = time.perf_counter()
+        warm_up()
+        timings["warmup"] = (time.perf_counter() - t0) * 1000
+
+    client = Client(HTTP_HOST="localhost")
+    body = json.dumps(synthetic_request())
+    for name in ("first_request", "second_request"):
+        t0 = time.perf_counter()
+        response = client.post("/api/analyze", body, content_type="application/json")
+        timings[name] = (time.perf_counter() - t0) * 1000
+        assert response.status_code == 200, response.content
+    print(json.dumps(timings))
+
+
+def _run(warm: bool) -> dict[str, float]:
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", "warm" if warm else "cold"],
+        check=True, capture_output=True, text=True,
+        env={**os.environ, "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "")},
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", choices=["cold", "warm"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child == "warm")
+        return
+
+    print(f"{'mode':<6} {'setup':>9} {'warmup':>9} {'1st req':>9} {'2nd req':>9}   (median ms, {args.runs} runs)")
+    for warm in (False, True):
+        runs = [_run(warm) for _ in range(args.runs)]
+
+        def median(key: str, runs: list[dict[str, float]] = runs) -> str:
+            values = [r[key] for r in runs if key in r]
+            return f"{statistics.median(values):9.1f}" if values else f"{'-':>9}"
+
+        print(f"{'warm' if warm else 'cold':<6} {median('setup')} {median('warmup')} "
+              f"{median('first_request')} {median('second_request')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+benchmarks/bench_footprint.py — Startup time and resident memory of a worker process.
+
+Starts a fresh interpreter per settings profile and measures how long it
+takes to become ready to serve (Django setup + warmup, see core/warmup.py).
+It then reports the resident set size (RSS) after one /api/analyze request.
+Exits with status 1 if a profile exceeds its budget, so CI can catch
+regressions (core/tests/test_footprint.py runs it for the rules-only profile).
+
+With --importtime, also writes a ``python -X importtime`` report for each
+profile, sorted by cumulative import time, to ``importtime-<profile>.txt``.
+
+Usage (from backend/):
+    python benchmarks/bench_footprint.py [--importtime] [--profile darkguard.settings_rules_only]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Settings module → (max startup ms, max RSS MiB). Generous enough for a
+# loaded CI box; tighten them when a change makes a profile leaner.
+BUDGETS: dict[str, tuple[float, float]] = {
+    "darkguard.settings_rules_only": (2500.0, 90.0),
+    "darkguard.settings": (5000.0, 200.0),
+}
+
+
+def _rss_mib() -> float:
+    """Current resident set size (Linux), else peak RSS from getrusage."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _child() -> None:
+    """Run inside a fresh interpreter; prints one JSON line of measurements."""
+    started = float(os.environ["FOOTPRINT_STARTED"])
+    import django
+
+    django.setup()
+    from core.warmup import synthetic_request, warm_up
+
+    warm_up()
+    startup_ms = (time.time() - started) * 1000
+
+    from django.test import Client
+
+    response = Client(HTTP_HOST="localhost").post(
+        "/api/analyze", json.dumps(synthetic_request()), content_type="application/json"
+    )
+    assert response.status_code == 200, response.content
+    print(json.dumps({
+        "startup_ms": startup_ms,
+        "rss_mib": _rss_mib(),
+        "modules": len(sys.modules),
+    }))
+
+
+def measure(settings_module: str, importtime: bool = False) -> dict[str, float]:
+    """Measure one settings profile in a fresh interpreter."""
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": settings_module,
+        "FOOTPRINT_STARTED": repr(time.time()),
+    }
+    cmd = [sys.executable, *(["-X", "importtime"] if importtime else []), __file__, "--child"]
+    proc = subprocess.run(cmd, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    if importtime:
+        _write_importtime_report(settings_module, proc.stderr)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _write_importtime_report(settings_module: str, stderr: str) -> None:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|", 2)
+        if self_us.strip().isdigit():  # skip the header line
+            rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    rows.sort(reverse=True)
+    path = BACKEND_DIR / f"importtime-{settings_module.rsplit('.', 1)[-1]}.txt"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"{'cumulative ms':>14} {'self ms':>9}  module\n")
+        for cumulative, own, name in rows:
+            f.write(f"{cumulative / 1000:14.1f} {own / 1000:9.1f}  {name}\n")
+    print(f"  import-time report: {path}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--profile", action="append", help="Settings module (repeatable; default: all budgets)")
+    parser.add_argument("--importtime", action="store_true", help="Write a -X importtime report per profile")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child()
+        return 0
+
+    failed = False
+    for profile in args.profile or list(BUDGETS):
+        result = measure(profile, args.importtime)
+        max_ms, max_mib = BUDGETS.get(profile, (float("inf"), float("inf")))
+        over = result["startup_ms"] > max_ms or result["rss_mib"] > max_mib
+        failed |= over
+        print(
+            f"{profile:<32} startup {result['startup_ms']:7.0f} ms (budget {max_ms:.0f})  "
+            f"RSS {result['rss_mib']:6.1f} MiB (budget {max_mib:.0f})  "
+            f"{result['modules']:.0f} modules{'  OVER BUDGET' if over else ''}"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+benchmarks/bench_process_pool.py — Throughput of CPU-bound analyzers vs pool size.
+
+Simulates a Django worker serving concurrent requests (one thread and one
+event loop per request, as in core/views.py) on a heavy page, and measures
+requests/second with ANALYZER_PROCESS_WORKERS = 0 (inline), 1, 2, 4, … up to
+the machine's core count.
+
+Usage (from backend/):
+    python benchmarks/bench_process_pool.py [--requests 64] [--concurrency 16]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "darkguard.settings")
+
+
+def _element(i: int) -> dict[str, object]:
+    return {
+        "selector": f"#btn-{i}",
+        "tag_name": "button" if i % 2 else "a",
+        "text_content": f"Option {i}",
+        "attributes": {},
+        # Mostly similar buttons (so every pair is compared but few are flagged)
+        # plus a tiny "decline" link every 100 elements.
+        "bounding_rect": (
+            {"x": i % 40 * 30, "y": i * 12, "width": 24, "height": 10}
+            if i % 100 == 0
+            else {"x": i % 40 * 30, "y": i * 12, "width": 100 + i % 5 * 10, "height": 40}
+        ),
+        "computed_styles": {
+            "color": f"rgb({i % 255}, 120, 120)",
+            "background_color": "rgb(250, 250, 250)",
+            "font_size": "14px",
+            "opacity": "1",
+            "display": "block",
+            "visibility": "visible",
+        },
+    }
+
+
+def heavy_payload(n_elements: int = 400) -> dict[str, object]:
+    """A large page: ~80k button pairs and a long urgency-laden body."""
+    return {
+        "dom_metadata": {
+            "hidden_elements": [],
+            "interactive_elements": [_element(i) for i in range(n_elements)],
+            "prechecked_inputs": [],
+            "url": "https://example.com",
+        },
+        "text_content": {
+            "button_labels": [
+                {"selector": f"#btn-{i}", "text": f"No thanks, I'd rather pay full price {i}"}
+                for i in range(n_elements)
+            ],
+            "headings": [],
+            "body_text": "Only 3 left! Hurry, sale ends today. " * 2000,
+        },
+        "screenshot_b64": "A" * 500_000,
+        "url": "https://example.com",
+    }
+
+
+def run_config(workers: int, requests: int, concurrency: int) -> float:
+    """Return requests/second for one pool size."""
+    from django.test import override_settings
+
+    from core.dispatcher import dispatch
+    from core.executor import get_process_pool, shutdown_process_pool
+    from dom_analyzer.service import DomAnalyzerService
+    from text_analyzer.service import TextAnalyzerService
+
+    analyzers = {"dom": DomAnalyzerService(), "text": TextAnalyzerService()}
+    payload = heavy_payload()
+
+    def one_request(_: int) -> None:
+        asyncio.run(dispatch(analyzers, payload))  # type: ignore[arg-type]
+
+    with override_settings(ANALYZER_PROCESS_WORKERS=workers, ANALYZER_TIMEOUT=600):
+        pool = get_process_pool()
+        if pool is not None:
+            # Spawn every worker before timing.
+            list(pool.map(abs, range(workers * 4)))
+        with ThreadPoolExecutor(max_workers=concurrency) as threads:
+            list(threads.map(one_request, range(min(concurrency, requests))))  # warm-up
+            start = time.perf_counter()
+            list(threads.map(one_request, range(requests)))
+            elapsed = time.perf_counter() - start
+        shutdown_process_pool()
+    return requests / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    import django
+
+    django.setup()
+
+    cores = os.cpu_count() or 1
+    sizes = [0] + [n for n in (1, 2, 4, 8, 16, 32, 64) if n <= cores]
+    if cores not in sizes:
+        sizes.append(cores)
+
+    print(f"cores={cores} requests={args.requests} concurrency={args.concurrency}")
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8}")
+    baseline = None
+    for workers in sizes:
+        rps = run_config(workers, args.requests, args.concurrency)
+        baseline = baseline or rps
+        label = "inline" if workers == 0 else str(workers)
+        print(f"{label:>8} {rps:>10.2f} {rps / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
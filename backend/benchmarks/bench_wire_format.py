@@ -0,0 +1,122 @@
+"""
+benchmarks/bench_wire_format.py — Bytes on the wire and parse time per encoding.
+
+Builds a realistic scan payload (≈150 elements, 5k chars of body text, a
+~400 KB screenshot) and compares JSON (base64 screenshot, as the extension
+sends today) with gzip/zstd Content-Encoding and MessagePack carrying the
+screenshot as raw bytes. Parse time runs the actual DRF parsers from
+core/parsers.py, including decompression.
+
+Usage (from backend/):
+    python benchmarks/bench_wire_format.py [--repeat 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import gzip
+import io
+import json
+import os
+import random
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "darkguard.settings")
+
+
+def _element(i: int) -> dict[str, object]:
+    return {
+        "selector": f"main > div:nth-of-type({i}) > button",
+        "tag_name": "button",
+        "text_content": f"Add item {i} to cart",
+        "attributes": {"class": "btn btn-primary", "type": "button"},
+        "bounding_rect": {"x": 10.5 * i, "y": 40.25 * i, "width": 120.0, "height": 36.0},
+        "computed_styles": {
+            "color": "rgb(255, 255, 255)",
+            "background_color": "rgb(0, 102, 204)",
+            "font_size": "14px",
+            "opacity": "1",
+            "display": "inline-block",
+            "visibility": "visible",
+        },
+    }
+
+
+def build_payload(screenshot: bytes) -> dict[str, object]:
+    return {
+        "url": "https://shop.example.com/product/123",
+        "dom_metadata": {
+            "hidden_elements": [_element(i) for i in range(50)],
+            "interactive_elements": [_element(i) for i in range(100)],
+            "prechecked_inputs": [],
+            "url": "https://shop.example.com/product/123",
+        },
+        "text_content": {
+            "button_labels": [{"selector": f"#b{i}", "text": f"Add item {i}"} for i in range(100)],
+            "headings": [{"selector": "h1", "text": "Flash sale"}],
+            "body_text": ("Only 3 left in stock! Free shipping on orders over $50. " * 100)[:5000],
+        },
+        "review_text": None,
+    }
+
+
+def fake_screenshot(size: int = 300_000) -> bytes:
+    """PNG-like bytes: incompressible, like real compressed image data."""
+    rng = random.Random(42)
+    return b"\x89PNG\r\n\x1a\n" + rng.randbytes(size)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    import django
+
+    django.setup()
+
+    import msgpack
+
+    from core.parsers import CompressedJSONParser, MessagePackParser
+
+    screenshot = fake_screenshot()
+    json_payload = {**build_payload(screenshot), "screenshot_b64": base64.b64encode(screenshot).decode()}
+    bin_payload = {**build_payload(screenshot), "screenshot": screenshot}
+
+    json_body = json.dumps(json_payload).encode()
+    packed = msgpack.packb(bin_payload, use_bin_type=True)
+
+    variants: list[tuple[str, bytes, str, Callable[..., object]]] = [
+        ("json (today)", json_body, "", CompressedJSONParser().parse),
+        ("json + gzip", gzip.compress(json_body, 6), "gzip", CompressedJSONParser().parse),
+        ("msgpack (raw bytes)", packed, "", MessagePackParser().parse),
+        ("msgpack + gzip", gzip.compress(packed, 6), "gzip", MessagePackParser().parse),
+    ]
+    try:
+        import zstandard
+
+        cctx = zstandard.ZstdCompressor(level=3)
+        variants.insert(2, ("json + zstd", cctx.compress(json_body), "zstd", CompressedJSONParser().parse))
+        variants.append(("msgpack + zstd", cctx.compress(packed), "zstd", MessagePackParser().parse))
+    except ImportError:
+        print("(zstandard not installed — skipping zstd variants)")
+
+    baseline_bytes = len(json_body)
+    print(f"{'encoding':<22} {'bytes':>10} {'vs json':>8} {'parse ms':>9}")
+    for name, body, encoding, parse in variants:
+        context = {"request": SimpleNamespace(META={"HTTP_CONTENT_ENCODING": encoding}), "encoding": "utf-8"}
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            parse(io.BytesIO(body), None, context)
+        ms = (time.perf_counter() - start) / args.repeat * 1000
+        print(f"{name:<22} {len(body):>10,} {len(body) / baseline_bytes:>7.0%} {ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+benchmarks/fake_gemini.py — A local fake of the Gemini REST API.
+
+Serves ``:generateContent`` (one JSON body) and ``:streamGenerateContent``
+(server-sent events, one ``data:`` event per chunk), so the real
+``google-genai`` client can be pointed at it via ``GEMINI_BASE_URL``. Like
+Gemini, it keeps connections alive: streams use chunked transfer encoding,
+so a client that reuses a pooled connection across event loops fails here
+as it would in production.
+
+Used by the LLM tests and by the load-test tool (benchmarks/loadtest.py),
+which also injects latency (``LatencyModel``) and errors (``error_rate``).
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import random
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A response both LLM analyzers can parse: one JSON array of detections
+# (the visual analyzer reads "selector"; the review analyzer ignores it).
+DEFAULT_RESPONSE = json.dumps([{
+    "category": "misdirection",
+    "selector": "#decline",
+    "confidence": 0.7,
+    "explanation": "Fake Gemini response.",
+    "severity": "medium",
+}])
+
+
+@dataclass(frozen=True, slots=True)
+class LatencyModel:
+    """Time to first byte: log-normal around ``median_ms`` (``sigma`` 0 = fixed)."""
+
+    median_ms: float = 0.0
+    sigma: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        """One latency, in seconds."""
+        if self.median_ms <= 0:
+            return 0.0
+        return self.median_ms / 1000 * math.exp(self.sigma * rng.gauss(0.0, 1.0))
+
+
+def _candidate(text: str, usage: tuple[int, int] | None = None) -> bytes:
+    body: dict[str, object] = {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}]
+    }
+    if usage is not None:
+        body["usageMetadata"] = {
+            "promptTokenCount": usage[0],
+            "candidatesTokenCount": usage[1],
+            "totalTokenCount": sum(usage),
+        }
+    return json.dumps(body).encode()
+
+
+def _error(status: int) -> bytes:
+    return json.dumps({"error": {"code": status, "message": "Injected fake error", "status": "UNAVAILABLE"}}).encode()
+
+
+def chunk_text(text: str, size: int) -> list[str]:
+    """Split a recorded response into stream chunks of ``size`` characters."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@contextmanager
+def fake_gemini(
+    chunks: list[str],
+    delay: float = 0.0,
+    *,
+    latency: LatencyModel | None = None,
+    error_rate: float = 0.0,
+    error_status: int = 503,
+    seed: int | None = None,
+) -> Iterator[str]:
+    """
+    Run a fake Gemini server answering every prompt with ``chunks``.
+
+    Yields the base URL. ``delay`` is slept before each streamed chunk;
+    ``latency`` before the response starts. A share ``error_rate`` of
+    requests is answered with ``error_status`` instead.
+    """
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    latency = latency or LatencyModel()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:  # noqa: N802
+            request = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            # Like Gemini, report usage with the response (counts are rough).
+            usage = (len(request) // 4, len("".join(chunks)) // 4)
+            with rng_lock:
+                wait = latency.sample(rng)
+                fail = rng.random() < error_rate
+            time.sleep(wait)
+
+            if fail:
+                self._send(error_status, "application/json", _error(error_status))
+            elif ":streamGenerateContent" in self.path:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for i, chunk in enumerate(chunks):
+                        time.sleep(delay)
+                        last = i == len(chunks) - 1
+                        self._write_chunk(b"data: " + _candidate(chunk, usage if last else None) + b"\r\n\r\n")
+                    self._write_chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # the client gave up (e.g. analyzer timeout)
+            else:
+                self._send(200, "application/json", _candidate("".join(chunks), usage))
+
+        def _write_chunk(self, data: bytes) -> None:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def _send(self, status: int, content_type: str, body: bytes) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True  # don't wait for abandoned streams on close
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
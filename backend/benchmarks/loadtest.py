@@ -0,0 +1,367 @@
+"""
+benchmarks/loadtest.py — Open-loop load test of /api/analyze against a fake Gemini.
+
+Starts a local fake Gemini server (benchmarks/fake_gemini.py) with the configured
+latency and error distribution. Then, for each worker configuration, it
+starts the real backend over HTTP (N ``runserver`` processes, or one
+``gunicorn -w N``) and waits for ``/api/ready``. It drives open-loop traffic
+through a series of target request rates. Requests are sent on schedule
+whether or not earlier ones have finished, and latency is measured from the
+scheduled send time, so queueing shows up instead of being hidden.
+
+Requests ask for the response diagnostics (``?diagnostics=1``). A 200 whose
+analyzers timed out, errored, or had an LLM call fail (and so may have
+fallen back to heuristics) counts as *degraded*, not as a success.
+
+For every stage it reports latency percentiles, error, timeout and
+degraded rates, LLM call errors and achieved (full-quality) throughput.
+The saturation point is the first rate whose p99 exceeds ``--slo-ms``,
+whose error + timeout + degraded rate exceeds ``--max-error-rate``, or
+whose throughput falls below 90% of the target.
+
+Payloads are synthetic variants of the warmup page (core/warmup.py), or
+recorded request bodies replayed from ``--payloads`` (a JSON array or one
+JSON body per line).
+
+Usage (from backend/):
+    python benchmarks/loadtest.py --workers 1,2 --rps 2,5,10,20 --duration 15 \\
+        --llm-latency-ms 800 --llm-latency-sigma 0.4 --llm-error-rate 0.02
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "darkguard.settings")
+
+READY_TIMEOUT_S = 60.0
+REVIEWS = [
+    "Amazing product! Highly recommend!",
+    "Best purchase ever, five stars!",
+    "Great item, works as described and arrived quickly.",
+    "Must buy! Love it so much!",
+    "Excellent quality, would buy again.",
+]
+
+
+# ── Payloads ─────────────────────────────────────────────
+
+
+def synthetic_payloads(n: int, seed: int) -> list[bytes]:
+    """Variants of the warmup page, each on its own site with its own text."""
+    from core.warmup import synthetic_request
+
+    rng = random.Random(seed)
+    bodies = []
+    for i in range(n):
+        request = synthetic_request()
+        url = f"https://shop{i}.loadtest.invalid/product/{rng.randrange(10**6)}"
+        request["url"] = url
+        request["dom_metadata"] = {**request["dom_metadata"], "url": url}  # type: ignore[dict-item]
+        text = dict(request["text_content"])  # type: ignore[call-overload]
+        text["body_text"] = f"{text['body_text']} Order #{rng.randrange(10**6)} ships today."
+        request["text_content"] = text
+        request["review_text"] = "---".join(rng.sample(REVIEWS, k=rng.randint(3, len(REVIEWS))))
+        bodies.append(json.dumps(request).encode())
+    return bodies
+
+
+def recorded_payloads(path: str) -> list[bytes]:
+    """Request bodies from a JSON array or a JSON-lines file."""
+    text = Path(path).read_text(encoding="utf-8").strip()
+    if text.startswith("["):
+        return [json.dumps(body).encode() for body in json.loads(text)]
+    return [line.encode() for line in text.splitlines() if line.strip()]
+
+
+# ── Backend processes ────────────────────────────────────
+
+
+@contextmanager
+def backend(
+    workers: int, server: str, port: int, env: dict[str, str]
+) -> Iterator[list[str]]:
+    """Start the backend with ``workers`` processes; yields the base URLs to hit."""
+    if server == "gunicorn":
+        if shutil.which("gunicorn") is None:
+            raise SystemExit("gunicorn is not installed (pip install gunicorn)")
+        commands = [["gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", "darkguard.wsgi"]]
+        urls = [f"http://127.0.0.1:{port}"]
+    else:
+        # One single-process dev server per worker; the client round-robins.
+        commands = [
+            [sys.executable, "manage.py", "runserver", f"127.0.0.1:{port + i}", "--noreload"]
+            for i in range(workers)
+        ]
+        urls = [f"http://127.0.0.1:{port + i}" for i in range(workers)]
+
+    logs = [tempfile.TemporaryFile() for _ in commands]
+    procs = [
+        subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+        for cmd, log in zip(commands, logs)
+    ]
+    try:
+        _wait_ready(urls, procs, logs)
+        yield urls
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        for log in logs:
+            log.close()
+
+
+def _wait_ready(urls: list[str], procs: list[subprocess.Popen[bytes]], logs: list[IO[bytes]]) -> None:
+    import httpx
+
+    deadline = time.monotonic() + READY_TIMEOUT_S
+    pending = set(urls)
+    while pending:
+        for proc, log in zip(procs, logs):
+            if proc.poll() is not None:
+                log.seek(0)
+                output = log.read().decode(errors="replace")[-2000:]
+                raise SystemExit(f"A backend process exited during startup:\n{output}")
+        if time.monotonic() > deadline:
+            raise SystemExit(f"Backend not ready after {READY_TIMEOUT_S:.0f}s: {sorted(pending)}")
+        for url in list(pending):
+            try:
+                if httpx.get(f"{url}/api/ready", timeout=1.0).status_code == 200:
+                    pending.discard(url)
+            except httpx.HTTPError:
+                pass
+        time.sleep(0.2)
+
+
+# ── Load generation ──────────────────────────────────────
+
+
+@dataclass
+class StageResult:
+    target_rps: float
+    duration_s: float
+    sent: int = 0
+    ok: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    degraded: int = 0
+    """HTTP 200, but an analyzer timed out, errored or had an LLM call fail."""
+    llm_errors: int = 0
+    latencies_ms: list[float] = field(default_factory=list, repr=False)
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies_ms:
+            return float("nan")
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    @property
+    def failure_rate(self) -> float:
+        return (self.errors + self.timeouts + self.degraded) / self.sent if self.sent else 0.0
+
+    @property
+    def achieved_rps(self) -> float:
+        return self.ok / self.duration_s if self.duration_s else 0.0
+
+    def saturated(self, slo_ms: float, max_error_rate: float) -> bool:
+        return (
+            self.percentile(99) > slo_ms
+            or self.failure_rate > max_error_rate
+            or self.achieved_rps < 0.9 * self.target_rps
+        )
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "target_rps": self.target_rps, "achieved_rps": round(self.achieved_rps, 2),
+            "sent": self.sent, "ok": self.ok, "errors": self.errors, "timeouts": self.timeouts,
+            "degraded": self.degraded, "llm_errors": self.llm_errors,
+            **{f"p{q}_ms": round(self.percentile(q), 1) for q in (50, 90, 99)},
+            "max_ms": round(max(self.latencies_ms, default=float("nan")), 1),
+        }
+
+
+async def run_stage(
+    urls: list[str],
+    payloads: list[bytes],
+    rps: float,
+    duration: float,
+    timeout: float,
+    arrival: str,
+    rng: random.Random,
+) -> StageResult:
+    """Send requests at ``rps`` for ``duration`` seconds, open loop."""
+    import httpx
+
+    result = StageResult(target_rps=rps, duration_s=duration)
+    headers = {"Content-Type": "application/json"}
+
+    async def send(client: httpx.AsyncClient, url: str, body: bytes, scheduled: float) -> None:
+        try:
+            response = await client.post(f"{url}/api/analyze?diagnostics=1", content=body, headers=headers)
+        except httpx.TimeoutException:
+            result.timeouts += 1
+            return
+        except httpx.HTTPError:
+            result.errors += 1
+            return
+        result.latencies_ms.append((time.perf_counter() - scheduled) * 1000)
+        if response.status_code != 200:
+            result.errors += 1
+            return
+        analyzers = response.json().get("diagnostics", {}).get("analyzers", {})
+        llm_errors = sum((a.get("llm") or {}).get("errors", 0) for a in analyzers.values())
+        result.llm_errors += llm_errors
+        if llm_errors or any(a.get("status") in ("timeout", "error") for a in analyzers.values()):
+            result.degraded += 1
+        else:
+            result.ok += 1
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=256)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        tasks = []
+        start = time.perf_counter()
+        next_at = 0.0
+        i = 0
+        while next_at < duration:
+            delay = start + next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(
+                send(client, urls[i % len(urls)], payloads[i % len(payloads)], start + next_at)
+            ))
+            i += 1
+            next_at += rng.expovariate(rps) if arrival == "poisson" else 1.0 / rps
+        result.sent = len(tasks)
+        await asyncio.gather(*tasks)
+    return result
+
+
+# ── CLI ──────────────────────────────────────────────────
+
+
+def _floats(value: str) -> list[float]:
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+def _ints(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    load = parser.add_argument_group("load")
+    load.add_argument("--rps", type=_floats, default=[1, 2, 5, 10], help="Target rates, one stage each")
+    load.add_argument("--duration", type=float, default=10.0, help="Seconds per stage")
+    load.add_argument("--arrival", choices=["uniform", "poisson"], default="poisson")
+    load.add_argument("--timeout", type=float, default=30.0, help="Client timeout per request (s)")
+    load.add_argument("--payloads", help="Replay request bodies from a JSON / JSON-lines file")
+    load.add_argument("--seed", type=int, default=1)
+
+    backend_args = parser.add_argument_group("backend")
+    backend_args.add_argument("--workers", type=_ints, default=[1], help="Worker process counts to compare")
+    backend_args.add_argument("--pool-workers", type=int, default=0, help="ANALYZER_PROCESS_WORKERS per worker")
+    backend_args.add_argument("--server", choices=["runserver", "gunicorn"], default="runserver")
+    backend_args.add_argument("--settings", default="darkguard.settings", help="DJANGO_SETTINGS_MODULE")
+    backend_args.add_argument("--analyzer-timeout", type=int, default=10)
+    backend_args.add_argument("--port", type=int, default=8700, help="First port to bind")
+
+    llm = parser.add_argument_group("fake LLM")
+    llm.add_argument("--llm-latency-ms", type=float, default=500.0, help="Median time to first byte")
+    llm.add_argument("--llm-latency-sigma", type=float, default=0.3, help="Log-normal spread (0 = fixed)")
+    llm.add_argument("--llm-error-rate", type=float, default=0.0)
+    llm.add_argument("--llm-error-status", type=int, default=503)
+    llm.add_argument("--llm-chunks", type=int, default=4, help="Stream chunks per response")
+    llm.add_argument("--llm-chunk-delay-ms", type=float, default=20.0)
+
+    slo = parser.add_argument_group("saturation")
+    slo.add_argument("--slo-ms", type=float, default=5000.0, help="p99 latency budget")
+    slo.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--json", help="Also write all results to this file")
+    args = parser.parse_args()
+
+    import django
+
+    django.setup()
+    from benchmarks.fake_gemini import DEFAULT_RESPONSE, LatencyModel, chunk_text, fake_gemini
+
+    payloads = recorded_payloads(args.payloads) if args.payloads else synthetic_payloads(1000, args.seed)
+    chunks = chunk_text(DEFAULT_RESPONSE, max(1, -(-len(DEFAULT_RESPONSE) // args.llm_chunks)))
+    report: dict[str, object] = {"args": {k: v for k, v in vars(args).items() if k != "json"}, "configs": []}
+
+    with fake_gemini(
+        chunks,
+        args.llm_chunk_delay_ms / 1000,
+        latency=LatencyModel(args.llm_latency_ms, args.llm_latency_sigma),
+        error_rate=args.llm_error_rate,
+        error_status=args.llm_error_status,
+        seed=args.seed,
+    ) as gemini_url:
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": args.settings,
+            "DJANGO_DEBUG": "False",
+            "GOOGLE_API_KEY": "loadtest",
+            "GEMINI_BASE_URL": gemini_url,
+            "FEEDBACK_DIR": "",
+            "ANALYZER_PROCESS_WORKERS": str(args.pool_workers),
+            "ANALYZER_TIMEOUT": str(args.analyzer_timeout),
+        }
+        for workers in args.workers:
+            print(f"\n== {workers} worker(s), {args.server}, pool={args.pool_workers}, settings={args.settings}")
+            print(f"{'target':>7} {'achieved':>9} {'sent':>6} {'err%':>6} {'tmo%':>6} {'degr%':>6} "
+                  f"{'llm err':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+            stages = []
+            saturation = None
+            with backend(workers, args.server, args.port, env) as urls:
+                rng = random.Random(args.seed)
+                for rps in args.rps:
+                    stage = asyncio.run(run_stage(
+                        urls, payloads, rps, args.duration, args.timeout, args.arrival, rng,
+                    ))
+                    s = stage.summary()
+                    stages.append(s)
+                    print(f"{rps:7.1f} {s['achieved_rps']:9.2f} {stage.sent:6d} "
+                          f"{100 * stage.errors / max(stage.sent, 1):6.1f} "
+                          f"{100 * stage.timeouts / max(stage.sent, 1):6.1f} "
+                          f"{100 * stage.degraded / max(stage.sent, 1):6.1f} {stage.llm_errors:7d} "
+                          f"{s['p50_ms']:8.0f} {s['p90_ms']:8.0f} {s['p99_ms']:8.0f} {s['max_ms']:8.0f}")
+                    if stage.saturated(args.slo_ms, args.max_error_rate):
+                        saturation = rps
+                        break
+            passing = [s["target_rps"] for s in stages if saturation is None or s["target_rps"] < saturation]
+            if saturation is None:
+                print(f"-> not saturated up to {args.rps[-1]:g} rps")
+            else:
+                print(f"-> saturates at {saturation:g} rps (sustained: {max(passing, default=0):g} rps)")
+            report["configs"].append({  # type: ignore[attr-defined]
+                "workers": workers, "stages": stages,
+                "saturation_rps": saturation, "sustained_rps": max(passing, default=0),
+            })
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""pytest configuration: load the DarkGuard Django settings once per session."""
+
+import os
+
+import django
+import pytest
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "darkguard.settings")
+django.setup()
+
+
+@pytest.fixture(autouse=True)
+def _fresh_site_profiles(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Give every test an empty, memory-only site profile store."""
+    monkeypatch.setattr("core.site_profiles._store", None)
+    monkeypatch.setattr("django.conf.settings.SITE_PROFILE_PATH", "")
+
+
+@pytest.fixture(autouse=True)
+def _no_feedback_storage(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Keep tests from writing feedback segments unless they opt in."""
+    monkeypatch.setattr("core.feedback._writer", None)
+    monkeypatch.setattr("django.conf.settings.FEEDBACK_DIR", "")
+
+
+@pytest.fixture(autouse=True)
+def _no_request_profiles(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Keep tests from writing request profiles unless they opt in."""
+    monkeypatch.setattr("django.conf.settings.PROFILE_DIR", "")
+
+
+@pytest.fixture(autouse=True)
+def _no_job_store(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Keep tests from creating the job queue unless they opt in."""
+    monkeypatch.setattr("core.jobs._store", None)
+    monkeypatch.setattr("django.conf.settings.JOB_DB_PATH", "")
+
+
+@pytest.fixture(autouse=True)
+def _no_shared_state(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Keep tests from sharing cached results through /dev/shm unless they opt in."""
+    monkeypatch.setattr("core.shared_state._state", None)
+    monkeypatch.setattr("django.conf.settings.SHARED_STATE_BACKEND", "")
@@ -0,0 +1,48 @@
+"""
+core/analyzers.py — The process-wide analyzer registry.
+
+Only the analyzers named in ``ENABLED_ANALYZERS`` are imported, on first
+use: a rules-only worker never loads the visual and review apps (or, through
+them, the Gemini client).
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from core.interfaces import BaseAnalyzer
+
+# Analyzer name → service class, imported lazily.
+ANALYZER_CLASSES: dict[str, str] = {
+    "dom": "dom_analyzer.service.DomAnalyzerService",
+    "text": "text_analyzer.service.TextAnalyzerService",
+    "visual": "visual_analyzer.service.VisualAnalyzerService",
+    "review": "review_analyzer.service.ReviewAnalyzerService",
+}
+
+_analyzers: dict[str, BaseAnalyzer] | None = None
+
+
+def _get_enabled_analyzers() -> list[str]:
+    """Analyzer names to run (default: all of them)."""
+    names = list(getattr(settings, "ENABLED_ANALYZERS", ANALYZER_CLASSES))
+    unknown = [name for name in names if name not in ANALYZER_CLASSES]
+    if unknown:
+        raise ImproperlyConfigured(
+            f"Unknown analyzers in ENABLED_ANALYZERS: {', '.join(unknown)} "
+            f"(choose from {', '.join(ANALYZER_CLASSES)})"
+        )
+    return names
+
+
+def get_analyzers() -> dict[str, BaseAnalyzer]:
+    """Analyzer name → shared service instance, for the enabled analyzers."""
+    global _analyzers  # noqa: PLW0603
+    if _analyzers is None:
+        _analyzers = {
+            name: import_string(ANALYZER_CLASSES[name])()
+            for name in _get_enabled_analyzers()
+        }
+    return _analyzers
@@ -0,0 +1,312 @@
+"""
+core/calibration.py — Confidence calibration learned from user feedback.
+
+Analyzer rules emit hand-picked confidences (0.85, 0.7, ...). A
+``Calibrator`` turns them into the probability that users would confirm the
+detection. It is a logistic model over agreement features. The dispatcher
+sets these on every merged detection (see ``Detection.sources``):
+
+- ``confidence``        the merged (max) confidence
+- ``agreement``         number of other analyzers that flagged it
+- ``corroborated``      1.0 if 2+ analyzers agree on overlapping elements
+- ``score:<analyzer>``  that analyzer's confidence, 0.0 if it was silent
+- ``category:<name>``   one-hot category
+
+The model is fitted offline from the feedback store (``python manage.py
+fit_calibration``), on the merged confidence before calibration that each
+feedback row records, and saved as a small versioned JSON file
+(``CALIBRATION_PATH``). The dispatcher reloads it when the file changes and
+applies it to all of a request's detections in one call. Evaluation is a
+plain Python loop over ``array('d')`` feature columns, element by element;
+a request has only a handful of detections, so it stays in the
+microseconds without importing numpy or pyarrow on the request path.
+Detections below the model's ``threshold`` are dropped.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+from array import array
+from collections import defaultdict
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+from django.conf import settings
+
+from core.models import Detection
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+# Scores are rounded to this many decimals when grouping training rows.
+FIT_PRECISION = 2
+
+
+def _get_calibration_path() -> str:
+    """Calibration model file ("" = calibration disabled)."""
+    return str(getattr(settings, "CALIBRATION_PATH", ""))
+
+
+def _sigmoid(z: float) -> float:
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+def feature_columns(
+    names: Sequence[str],
+    confidences: Sequence[float],
+    sources: Sequence[Mapping[str, float]],
+    categories: Sequence[str],
+    corroborated: Sequence[bool],
+) -> list[array]:  # type: ignore[type-arg]
+    """One ``array('d')`` column per feature name, over parallel row sequences."""
+    columns = []
+    for name in names:
+        kind, _, arg = name.partition(":")
+        if kind == "confidence":
+            col = array("d", confidences)
+        elif kind == "agreement":
+            col = array("d", (max(len(s) - 1, 0) for s in sources))
+        elif kind == "corroborated":
+            col = array("d", map(float, corroborated))
+        elif kind == "score":
+            col = array("d", (s.get(arg, 0.0) for s in sources))
+        elif kind == "category":
+            col = array("d", (1.0 if c == arg else 0.0 for c in categories))
+        else:
+            raise ValueError(f"Unknown calibration feature {name!r}")
+        columns.append(col)
+    return columns
+
+
+@dataclass(frozen=True, slots=True)
+class Calibrator:
+    """A fitted logistic calibration model (immutable, shared by requests)."""
+
+    model_version: str
+    weights: Mapping[str, float]
+    intercept: float
+    threshold: float = 0.0
+    """Calibrated detections below this are dropped."""
+    metadata: Mapping[str, object] = field(default_factory=dict)
+
+    def predict(self, detections: Sequence[Detection]) -> array:  # type: ignore[type-arg]
+        """Calibrated confidence for each detection."""
+        return self.predict_columns(
+            [d.confidence for d in detections],
+            [d.sources for d in detections],
+            [d.category for d in detections],
+            [d.corroborated for d in detections],
+        )
+
+    def predict_columns(
+        self,
+        confidences: Sequence[float],
+        sources: Sequence[Mapping[str, float]],
+        categories: Sequence[str],
+        corroborated: Sequence[bool],
+    ) -> array:  # type: ignore[type-arg]
+        """
+        Calibrated confidence for parallel feature sequences (see ``feature_columns``).
+
+        Not vectorized: each feature column is added to the logits one
+        element at a time in Python, which is fine for a request's few
+        detections and for offline fitting.
+        """
+        names = list(self.weights)
+        columns = feature_columns(names, confidences, sources, categories, corroborated)
+        logits = array("d", [self.intercept]) * len(confidences)
+        for name, col in zip(names, columns):
+            w = self.weights[name]
+            logits = array("d", map(lambda z, x: z + w * x, logits, col))
+        return array("d", map(_sigmoid, logits))
+
+    def apply(self, detections: list[Detection]) -> list[Detection]:
+        """Replace confidences with calibrated ones; drop those below threshold."""
+        if not detections:
+            return detections
+        kept = []
+        for det, p in zip(detections, self.predict(detections)):
+            if p >= self.threshold:
+                det.confidence = round(p, 4)
+                kept.append(det)
+        return kept
+
+    # ── Persistence ──────────────────────────────────────
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "version": SCHEMA_VERSION,
+            "model_version": self.model_version,
+            "intercept": self.intercept,
+            "weights": dict(self.weights),
+            "threshold": self.threshold,
+            "metadata": dict(self.metadata),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, object]) -> Calibrator:
+        if data.get("version") != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported calibration schema version {data.get('version')!r}")
+        weights = {str(k): float(v) for k, v in dict(data["weights"]).items()}  # type: ignore[call-overload]
+        feature_columns(list(weights), [], [], [], [])  # reject unknown features early
+        return cls(
+            model_version=str(data["model_version"]),
+            weights=MappingProxyType(weights),
+            intercept=float(data["intercept"]),  # type: ignore[arg-type]
+            threshold=float(data.get("threshold", 0.0)),  # type: ignore[arg-type]
+            metadata=MappingProxyType(dict(data.get("metadata", {}))),  # type: ignore[call-overload]
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Calibrator:
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path: str) -> None:
+        """Write the model atomically, so a reloading server never reads half a file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".calibration.")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+
+# ── Fitting ──────────────────────────────────────────────
+
+
+def _solve(a: list[list[float]], b: list[float]) -> list[float]:
+    """Solve ``a x = b`` by Gaussian elimination with partial pivoting."""
+    n = len(b)
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        m[col], m[pivot] = m[pivot], m[col]
+        if abs(m[col][col]) < 1e-12:
+            continue
+        for r in range(col + 1, n):
+            f = m[r][col] / m[col][col]
+            if f:
+                for c in range(col, n + 1):
+                    m[r][c] -= f * m[col][c]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        if abs(m[r][r]) >= 1e-12:
+            x[r] = (m[r][n] - sum(m[r][c] * x[c] for c in range(r + 1, n))) / m[r][r]
+    return x
+
+
+def fit(
+    confidences: Sequence[float],
+    sources: Sequence[Mapping[str, float]],
+    categories: Sequence[str],
+    corroborated: Sequence[bool],
+    labels: Sequence[bool],
+    *,
+    model_version: str,
+    l2: float = 1.0,
+    threshold: float = 0.0,
+    iterations: int = 50,
+) -> Calibrator:
+    """
+    Fit a calibrator by L2-regularised logistic regression (Newton's method).
+
+    ``labels`` are True where users confirmed the detection. Rows with equal
+    (rounded) features are grouped first, so fitting cost scales with the
+    number of distinct feature rows rather than with the feedback volume.
+    """
+    analyzers = sorted({name for s in sources for name in s})
+    names = ["confidence", "agreement", "corroborated"]
+    names += [f"score:{a}" for a in analyzers]
+    names += [f"category:{c}" for c in sorted(set(categories))]
+
+    columns = feature_columns(names, confidences, sources, categories, corroborated)
+    groups: dict[tuple[float, ...], list[int]] = defaultdict(lambda: [0, 0])
+    for i, label in enumerate(labels):
+        row = tuple(round(col[i], FIT_PRECISION) for col in columns)
+        group = groups[row]
+        group[0] += 1
+        group[1] += bool(label)
+
+    rows = [(1.0, *row) for row in groups]  # leading 1.0 → intercept
+    counts = [g[0] for g in groups.values()]
+    positives = [g[1] for g in groups.values()]
+    d = len(names) + 1
+    w = [0.0] * d
+    for _ in range(iterations):
+        grad = [0.0] * d
+        hess = [[0.0] * d for _ in range(d)]
+        for x, n, pos in zip(rows, counts, positives):
+            p = _sigmoid(sum(wi * xi for wi, xi in zip(w, x)))
+            r = n * p - pos
+            s = n * p * (1.0 - p)
+            for j in range(d):
+                grad[j] += r * x[j]
+                sx = s * x[j]
+                for k in range(j, d):
+                    hess[j][k] += sx * x[k]
+        for j in range(1, d):  # the intercept is not regularised
+            grad[j] += l2 * w[j]
+            hess[j][j] += l2
+        for j in range(d):
+            for k in range(j):
+                hess[j][k] = hess[k][j]
+        step = _solve(hess, grad)
+        w = [wi - si for wi, si in zip(w, step)]
+        if max(map(abs, step)) < 1e-8:
+            break
+
+    return Calibrator(
+        model_version=model_version,
+        weights=MappingProxyType(dict(zip(names, w[1:]))),
+        intercept=w[0],
+        threshold=threshold,
+        metadata=MappingProxyType({"rows": len(labels), "distinct_rows": len(rows), "l2": l2}),
+    )
+
+
+# ── Process-wide model ───────────────────────────────────
+
+_cached: tuple[str, int, Calibrator | None] | None = None
+_cache_lock = threading.Lock()
+
+
+def get_calibrator() -> Calibrator | None:
+    """The model at ``CALIBRATION_PATH``, reloaded when the file changes."""
+    global _cached  # noqa: PLW0603
+    path = _get_calibration_path()
+    if not path:
+        return None
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _cache_lock:
+        if _cached is not None and _cached[:2] == (path, mtime):
+            return _cached[2]
+        calibrator: Calibrator | None
+        try:
+            calibrator = Calibrator.load(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.exception("Ignoring unusable calibration model %s", path)
+            calibrator = None
+        else:
+            logger.info("Loaded calibration model %s from %s", calibrator.model_version, path)
+        _cached = (path, mtime, calibrator)
+        return calibrator
@@ -0,0 +1,105 @@
+"""
+core/coalescing.py — Single-flight coalescing of identical in-flight analyses.
+
+When a page trends, many users analyse the same content within the same
+second. Instead of running (and paying Gemini for) the same analysis N times,
+the first request for a given (analyzer, content hash) becomes the leader;
+concurrent requests with the same key wait for the leader's result and each
+receive their own copy of it.
+
+Every Django request runs ``dispatch`` in its own event loop on its own
+thread, so the shared state is a thread-safe ``concurrent.futures.Future``
+bridged into each waiter's loop with ``asyncio.wrap_future``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future
+from dataclasses import replace
+
+from core.models import Detection
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderCancelledError(RuntimeError):
+    """The leading request was cancelled (e.g. timed out) before finishing."""
+
+
+def content_key(name: str, payload: dict[str, object]) -> str:
+    """Stable key for an analyzer's view of the payload."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    return f"{name}:{digest}"
+
+
+class SingleFlight:
+    """Deduplicates concurrent analyses with the same key across threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._in_flight: dict[str, Future[tuple[Detection, ...]]] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(
+        self,
+        key: str,
+        analyze: Callable[[], Awaitable[list[Detection]]],
+    ) -> list[Detection]:
+        """
+        Run ``analyze`` unless an identical analysis is already in flight.
+
+        Followers get fresh copies of the leader's detections, so callers may
+        mutate their results (e.g. set ``corroborated``) independently.
+        """
+        with self._lock:
+            shared = self._in_flight.get(key)
+            is_leader = shared is None
+            if shared is None:
+                shared = Future()
+                self._in_flight[key] = shared
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            logger.debug("Coalesced analysis %s onto in-flight request", key)
+            # shield: a follower timing out must not cancel the shared future.
+            snapshot = await asyncio.shield(asyncio.wrap_future(shared))
+            return [replace(det) for det in snapshot]
+
+        try:
+            detections = await analyze()
+        except asyncio.CancelledError:
+            shared.set_exception(LeaderCancelledError(key))
+            raise
+        except BaseException as exc:
+            shared.set_exception(exc)
+            raise
+        else:
+            # Publish copies made before the leader's caller can mutate them.
+            shared.set_result(tuple(replace(det) for det in detections))
+            return detections
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stats(self) -> dict[str, int]:
+        """Counters for leaders (real analyses) and coalesced waiters."""
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight),
+            }
+
+
+in_flight_analyses = SingleFlight()
+"""Process-wide single-flight registry used by the dispatcher."""
@@ -0,0 +1,262 @@
+"""
+core/corroboration.py — Geometric corroboration of detections.
+
+Analyzers name elements in different ways: the text analyzer reports
+urgency on ``"body"``, the review analyzer on ``"[itemprop='reviewBody']"``,
+and the LLM writes selectors in its own style. Comparing selector strings
+misses most real agreement, so selectors are resolved to bounding boxes via
+the request's ``PageModel``. Two detections of the same category from
+different analyzers corroborate each other when one box contains, or mostly
+overlaps, the other. Document-level selectors (``body``, ``html``) have no
+box: a page-wide hit says nothing about where on the page the pattern is,
+so it only agrees with other hits on the document itself.
+
+Boxes are bucketed into a uniform grid, sized from the median box, so
+candidate pairs come only from shared cells. Very large boxes (page-wide
+containers) are few, and are compared against every box directly.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from functools import lru_cache
+
+from core.models import Detection
+from core.page import PageElement, PageModel
+
+# Lower bound on the grid cell edge, so pages of tiny boxes stay coarse.
+MIN_CELL_PX = 32.0
+
+# Boxes spanning more cells than this skip the grid (checked against all).
+MAX_GRID_CELLS = 64
+
+# Share of the smaller box that must lie inside the other one.
+OVERLAP_THRESHOLD = 0.5
+
+DOCUMENT_SELECTORS = frozenset({"body", "html", ":root"})
+
+_COMPOUND = re.compile(r"^(?P<tag>[a-zA-Z][\w-]*|\*)?(?P<rest>(?:#[\w-]+|\.[\w-]+|\[[^\]]+\])*)$")
+_PART = re.compile(r"#(?P<id>[\w-]+)|\.(?P<cls>[\w-]+)|\[(?P<attr>[\w:-]+)(?:[~|^$*]?=(?P<val>[^\]]*))?\]")
+
+
+@dataclass(frozen=True, slots=True)
+class Box:
+    """Axis-aligned bounding box in page pixels."""
+
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+    @property
+    def area(self) -> float:
+        return (self.x1 - self.x0) * (self.y1 - self.y0)
+
+    def overlap(self, other: Box) -> float:
+        """Intersection area as a share of the smaller box (0–1)."""
+        width = min(self.x1, other.x1) - max(self.x0, other.x0)
+        height = min(self.y1, other.y1) - max(self.y0, other.y0)
+        smaller = min(self.area, other.area)
+        if width <= 0 or height <= 0 or smaller <= 0:
+            return 0.0
+        return (width * height) / smaller
+
+
+def _union_box(elements: Sequence[PageElement]) -> Box | None:
+    placed = [el for el in elements if el.has_geometry and el.area > 0]
+    if not placed:
+        return None
+    return Box(
+        min(el.x for el in placed),
+        min(el.y for el in placed),
+        max(el.x + el.width for el in placed),
+        max(el.y + el.height for el in placed),
+    )
+
+
+@lru_cache(maxsize=4096)
+def _normalize(selector: str) -> str:
+    return " ".join(selector.replace('"', "'").split())
+
+
+def _unquote(value: str) -> str:
+    return value.strip().strip("'\"")
+
+
+class SelectorResolver:
+    """Resolves detection selectors to page elements and boxes."""
+
+    def __init__(self, page: PageModel) -> None:
+        self._page = page
+        self._normalized = {_normalize(el.selector): el for el in page.elements}
+        self._by_id: dict[str, list[PageElement]] = defaultdict(list)
+        self._by_attr: dict[tuple[str, str], list[PageElement]] = defaultdict(list)
+        for el in page.elements:
+            ids = {el.attribute("id")}
+            ids.update(m.group("id") for m in _PART.finditer(el.selector) if m.group("id"))
+            for element_id in ids - {""}:
+                self._by_id[element_id].append(el)
+            for name, value in el.attributes.items():
+                self._by_attr[(name, str(value))].append(el)
+        self._cache: dict[str, tuple[str, Box | None]] = {}
+
+    def resolve(self, selector: str) -> tuple[str, Box | None]:
+        """
+        Map a selector to ``(canonical key, box)``.
+
+        The key is the page element's own selector when the selector names
+        exactly one element, else the normalized selector. The box is None
+        when the selector matches nothing with geometry.
+        """
+        cached = self._cache.get(selector)
+        if cached is None:
+            cached = self._cache[selector] = self._resolve(selector)
+        return cached
+
+    def _resolve(self, selector: str) -> tuple[str, Box | None]:
+        normalized = _normalize(selector)
+        element = self._page.get(selector) or self._normalized.get(normalized)
+        if element is not None:
+            return element.selector, _union_box([element])
+        if normalized.lower() in DOCUMENT_SELECTORS:
+            return normalized.lower(), None
+
+        matches = self._match_compound(normalized)
+        if len(matches) == 1:
+            return matches[0].selector, _union_box(matches)
+        return normalized, _union_box(matches)
+
+    def _match_compound(self, selector: str) -> list[PageElement]:
+        """Match the selector's last compound (``tag#id.cls[attr=v]``)."""
+        last = re.split(r"\s*[\s>+~]\s*", selector)[-1] if selector else ""
+        compound = _COMPOUND.match(last)
+        if compound is None or not compound.group("rest"):
+            return []
+
+        candidates: list[PageElement] | None = None
+        for part in _PART.finditer(compound.group("rest")):
+            if part.group("id"):
+                found = self._by_id.get(part.group("id"), [])
+            elif part.group("cls"):
+                cls = part.group("cls")
+                found = [
+                    el for el in (candidates if candidates is not None else self._page.elements)
+                    if cls in el.attribute("class").split()
+                ]
+            elif part.group("val") is not None:
+                found = self._by_attr.get((part.group("attr"), _unquote(part.group("val"))), [])
+            else:
+                found = [
+                    el for el in (candidates if candidates is not None else self._page.elements)
+                    if part.group("attr") in el.attributes
+                ]
+            if candidates is None:
+                candidates = found
+            else:
+                found_indexes = {el.index for el in found}
+                candidates = [el for el in candidates if el.index in found_indexes]
+            if not candidates:
+                return []
+
+        tag = compound.group("tag")
+        if candidates and tag and tag != "*":
+            candidates = [el for el in candidates if el.tag_name.lower() == tag.lower()]
+        return candidates or []
+
+
+def _cell_size(boxes: Sequence[Box]) -> float:
+    """Grid cell edge: about twice the median box edge, so cells stay sparse."""
+    edges = sorted(max(b.x1 - b.x0, b.y1 - b.y0) for b in boxes)
+    return max(2 * edges[len(edges) // 2], MIN_CELL_PX)
+
+
+def _overlapping_pairs(boxes: list[Box]) -> set[tuple[int, int]]:
+    """Index pairs whose boxes overlap by at least ``OVERLAP_THRESHOLD``."""
+    if len(boxes) < 2:
+        return set()
+    cell = _cell_size(boxes)
+    grid: dict[tuple[int, int], list[int]] = defaultdict(list)
+    large: list[int] = []
+    for i, box in enumerate(boxes):
+        xs = range(int(box.x0 // cell), int(box.x1 // cell) + 1)
+        ys = range(int(box.y0 // cell), int(box.y1 // cell) + 1)
+        if len(xs) * len(ys) > MAX_GRID_CELLS:
+            large.append(i)
+            continue
+        for cx in xs:
+            for cy in ys:
+                grid[(cx, cy)].append(i)
+
+    pairs: set[tuple[int, int]] = set()
+
+    def check(i: int, j: int) -> None:
+        pair = (i, j) if i < j else (j, i)
+        if pair not in pairs and boxes[i].overlap(boxes[j]) >= OVERLAP_THRESHOLD:
+            pairs.add(pair)
+
+    for members in grid.values():
+        for a, i in enumerate(members):
+            for j in members[a + 1:]:
+                check(i, j)
+    for i in large:
+        for j in range(len(boxes)):
+            if i != j:
+                check(i, j)
+    return pairs
+
+
+def corroborate(
+    tagged: Sequence[tuple[str, Detection]], resolver: SelectorResolver
+) -> list[str]:
+    """
+    Mark detections confirmed by a different analyzer as corroborated.
+
+    Two detections of the same category agree when their selectors resolve
+    to the same element, or when their boxes overlap. Agreement within one
+    analyzer does not count.
+
+    Args:
+        tagged: ``(analyzer name, detection)`` pairs from every analyzer.
+        resolver: Selector resolver for the request's page.
+
+    Returns:
+        The canonical element key of each detection, aligned with ``tagged``
+        (used by the dispatcher to deduplicate).
+    """
+    keys: list[str] = []
+    # (element key, category) → indexes into ``tagged``
+    groups: dict[tuple[str, str], list[int]] = defaultdict(list)
+    boxes: dict[tuple[str, str], Box] = {}
+
+    for i, (_, det) in enumerate(tagged):
+        key, box = resolver.resolve(det.element_selector)
+        keys.append(key)
+        groups[(key, det.category)].append(i)
+        if box is not None:
+            boxes[(key, det.category)] = box
+
+    analyzers = {group: {tagged[i][0] for i in members} for group, members in groups.items()}
+
+    def confirm(members: list[int], others: set[str]) -> None:
+        for i in members:
+            if others - {tagged[i][0]}:
+                tagged[i][1].corroborated = True
+
+    # Same element: any second analyzer in the group corroborates.
+    for group, members in groups.items():
+        confirm(members, analyzers[group])
+
+    # Overlapping elements, compared once per distinct (element, category).
+    by_category: dict[str, list[tuple[str, str]]] = defaultdict(list)
+    for group in boxes:
+        by_category[group[1]].append(group)
+    for category_groups in by_category.values():
+        for i, j in _overlapping_pairs([boxes[g] for g in category_groups]):
+            a, b = category_groups[i], category_groups[j]
+            confirm(groups[a], analyzers[b])
+            confirm(groups[b], analyzers[a])
+
+    return keys
@@ -0,0 +1,266 @@
+"""
+core/diagnostics.py — Opt-in per-request diagnostics for analyze responses.
+
+``POST /api/analyze?diagnostics=1`` adds a ``diagnostics`` block to the
+response:
+
+- each analyzer's status (``ok``, ``skipped``, ``timeout``, ``error``),
+  wall time, detection count and cache status (``miss``, ``coalesced``
+  onto an identical in-flight request, ``hit`` in the shared cache or
+  ``shared`` with another worker's run, see core/shared_state.py)
+- the time spent in each of its rules: the ``span(name)`` stages it
+  already reports for request profiling (core/profiling.py)
+- its LLM calls, token counts and failed or cut-off calls
+- for each returned detection, the analyzers and rules it came from
+
+Like request profiling, the active report is a ``ContextVar``. Without
+one, the instrumentation costs a ContextVar lookup per span, per analyzer
+and per rule. Analyzers pass each rule's detections through ``attribute``
+while its span is open. Analyzers run in the process pool report their
+total time only, and detections served from a cache or another request
+have no rule.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Iterable, Iterator, Sequence
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from core.models import Detection
+
+Status = Literal["ok", "skipped", "timeout", "error"]
+CacheStatus = Literal["miss", "coalesced", "hit", "shared"]
+
+_active: ContextVar[Diagnostics | None] = ContextVar("diagnostics", default=None)
+# The analyzer whose task is running (set only while diagnostics are on).
+_analyzer: ContextVar[AnalyzerReport | None] = ContextVar("diagnostics_analyzer", default=None)
+
+# Outer analyzer spans are reported as ``duration_ms`` instead.
+_ANALYZER_SPAN = "analyzer:"
+
+
+def _ms(ns: int) -> float:
+    return round(ns / 1e6, 3)
+
+
+class LLMUsage:
+    """LLM calls made by one analyzer and their token counts."""
+
+    __slots__ = ("calls", "errors", "prompt_tokens", "output_tokens", "estimated")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        # Calls that failed or were cut off (the analyzer may have fallen back)
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        # True if any count is estimated from text length (replayed responses)
+        self.estimated = False
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "estimated": self.estimated,
+        }
+
+
+class AnalyzerReport:
+    """What one analyzer did during the request."""
+
+    __slots__ = ("status", "note", "duration_ms", "detections", "cache", "rules", "llm", "_open", "_rule_of")
+
+    def __init__(self) -> None:
+        self.status: Status = "ok"
+        self.note = ""
+        self.duration_ms = 0.0
+        self.detections = 0
+        self.cache: CacheStatus | None = None
+        self.rules: dict[str, float] = {}
+        self.llm: LLMUsage | None = None
+        self._open: list[str] = []
+        # id(detection) → (detection, the rule span it came from); holding
+        # the detection keeps its id from being reused by another object
+        self._rule_of: dict[int, tuple[Detection, str]] = {}
+
+    def rule_of(self, detection: Detection) -> str | None:
+        entry = self._rule_of.get(id(detection))
+        return entry[1] if entry is not None and entry[0] is detection else None
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "status": self.status,
+            "note": self.note,
+            "duration_ms": self.duration_ms,
+            "detections": self.detections,
+            "cache": self.cache,
+            "rules": dict(self.rules),
+            "llm": self.llm.to_dict() if self.llm is not None else None,
+        }
+
+
+class Diagnostics:
+    """Diagnostics of one request."""
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter_ns()
+        self.total_ms = 0.0
+        self.stages: dict[str, float] = {}
+        self.analyzers: dict[str, AnalyzerReport] = {}
+        # id(merged detection) → (merged detection, [(analyzer, rule, confidence)])
+        self._sources: dict[int, tuple[Detection, list[tuple[str, str | None, float]]]] = {}
+
+    def span_started(self, name: str) -> None:
+        current = _analyzer.get()
+        if current is not None:
+            current._open.append(name)
+
+    def span_ended(self, name: str, elapsed_ns: int) -> None:
+        current = _analyzer.get()
+        if current is not None and current._open:
+            current._open.pop()
+        if name.startswith(_ANALYZER_SPAN):
+            return
+        timings = self.stages if current is None else current.rules
+        timings[name] = round(timings.get(name, 0.0) + _ms(elapsed_ns), 3)
+
+    def record_merge(
+        self, contributions: Iterable[tuple[Detection, list[tuple[str, Detection]]]]
+    ) -> None:
+        """Remember which raw detections each merged detection came from."""
+        for merged, raw in contributions:
+            self._sources[id(merged)] = (merged, [
+                (name, report.rule_of(det) if (report := self.analyzers.get(name)) else None, det.confidence)
+                for name, det in raw
+            ])
+
+    def sources_of(self, detection: Detection) -> list[tuple[str, str | None, float]]:
+        entry = self._sources.get(id(detection))
+        return entry[1] if entry is not None and entry[0] is detection else []
+
+    def skip_disabled(self, names: Sequence[str]) -> None:
+        for name in names:
+            report = self.analyzers.setdefault(name, AnalyzerReport())
+            report.status, report.note = "skipped", "disabled (ENABLED_ANALYZERS)"
+
+    def to_dict(self, detections: Sequence[Detection]) -> dict[str, object]:
+        return {
+            "total_ms": self.total_ms,
+            "stages": dict(self.stages),
+            "analyzers": {name: report.to_dict() for name, report in sorted(self.analyzers.items())},
+            "detections": [
+                {
+                    "sources": [
+                        {"analyzer": name, "rule": rule, "confidence": confidence}
+                        for name, rule, confidence in self.sources_of(det)
+                    ]
+                }
+                for det in detections
+            ],
+        }
+
+
+def active() -> Diagnostics | None:
+    """The current request's diagnostics, or None when not requested."""
+    return _active.get()
+
+
+@contextmanager
+def collecting() -> Iterator[Diagnostics]:
+    """Collect diagnostics for everything run inside the block."""
+    report = Diagnostics()
+    token = _active.set(report)
+    try:
+        yield report
+    finally:
+        _active.reset(token)
+        report.total_ms = _ms(time.perf_counter_ns() - report.started)
+
+
+@contextmanager
+def _analyzing(report: Diagnostics, name: str) -> Iterator[AnalyzerReport]:
+    current = report.analyzers[name] = AnalyzerReport()
+    token = _analyzer.set(current)
+    started = time.perf_counter_ns()
+    try:
+        yield current
+    finally:
+        current.duration_ms = _ms(time.perf_counter_ns() - started)
+        _analyzer.reset(token)
+
+
+def analyzer(name: str) -> AbstractContextManager[AnalyzerReport | None]:
+    """Attribute what runs inside the block to analyzer ``name``."""
+    report = _active.get()
+    if report is None:
+        return nullcontext()
+    return _analyzing(report, name)
+
+
+def current() -> AnalyzerReport | None:
+    """The running analyzer's report (None when diagnostics are off)."""
+    return _analyzer.get()
+
+
+def attribute(detections: Iterable[Detection]) -> list[Detection]:
+    """Note that ``detections`` came from the open rule span; returns them as a list."""
+    detections = list(detections)
+    current = _analyzer.get()
+    if current is not None and current._open:
+        rule = current._open[-1]
+        for det in detections:
+            current._rule_of[id(det)] = (det, rule)
+    return detections
+
+
+def skipped(reason: str) -> None:
+    """Mark the running analyzer as having had nothing to analyse."""
+    current = _analyzer.get()
+    if current is not None:
+        current.status, current.note = "skipped", reason
+
+
+def note(text: str) -> None:
+    """Attach a short note to the running analyzer's report."""
+    current = _analyzer.get()
+    if current is not None:
+        current.note = text
+
+
+def set_cache(status: CacheStatus) -> None:
+    current = _analyzer.get()
+    if current is not None:
+        current.cache = status
+
+
+def _llm_usage() -> LLMUsage | None:
+    current = _analyzer.get()
+    if current is None:
+        return None
+    if current.llm is None:
+        current.llm = LLMUsage()
+    return current.llm
+
+
+def record_llm_error() -> None:
+    """Count one failed or cut-off LLM call of the running analyzer."""
+    usage = _llm_usage()
+    if usage is not None:
+        usage.errors += 1
+
+
+def record_llm_call(prompt_tokens: int, output_tokens: int, *, estimated: bool = False) -> None:
+    """Add one LLM call's token counts to the running analyzer's report."""
+    usage = _llm_usage()
+    if usage is None:
+        return
+    usage.calls += 1
+    usage.prompt_tokens += prompt_tokens
+    usage.output_tokens += output_tokens
+    usage.estimated = usage.estimated or estimated
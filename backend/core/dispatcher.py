@@ -3,7 +3,26 @@ core/dispatcher.py — Async fan-out dispatcher.
 
 Runs all 4 analyzers concurrently via asyncio.gather() with per-analyzer
 timeouts. Merges results and sets the `corroborated` flag on detections
-where 2+ analyzers agree on the same element + category.
+where 2+ analyzers agree on the same category for the same element, or
+for overlapping elements (core/corroboration.py).
+
+The payload is indexed once into an immutable `PageModel` (core/page.py)
+that every analyzer shares, so no analyzer re-parses the raw dicts.
+
+Analyzers that declare `cpu_bound = True` are offloaded to the shared
+process pool (core/executor.py) so they don't block the event loop, and
+concurrent requests for identical content share one in-flight analysis
+per analyzer (core/coalescing.py). LLM analyzers' results are also cached
+and deduplicated across all workers on the host (core/shared_state.py).
+Detections that streaming analyzers
+report early (core/partial.py) survive an analyzer timeout. Merged
+confidences are calibrated by the model fitted from user feedback
+(core/calibration.py), then filtered through the site's learned profile
+(core/site_profiles.py).
+
+``dispatch`` is ``run_analyzers`` followed by ``merge_detections``; the job
+API (core/jobs.py) calls them separately to merge rule results with LLM
+results that arrive later.
 """
 
 from __future__ import annotations
@@ -11,11 +30,28 @@ from __future__ import annotations
 import asyncio
 import logging
 from collections import defaultdict
+from collections.abc import Awaitable, Mapping
 
 from django.conf import settings
 
+from core import diagnostics, partial
+from core.calibration import get_calibrator
+from core.coalescing import content_key, in_flight_analyses
+from core.corroboration import SelectorResolver, corroborate
+from core.executor import (
+    analyze_in_worker,
+    compact_payload,
+    detections_from_rows,
+    get_process_pool,
+    run_cpu_bound,
+)
 from core.interfaces import BaseAnalyzer
+from core.llm import close_clients
 from core.models import Detection
+from core.page import PageModel
+from core.profiling import span
+from core.shared_state import cached_analysis, get_shared_state
+from core.site_profiles import get_store, origin_of, site_profiles_enabled
 
 logger = logging.getLogger(__name__)
 
@@ -25,43 +61,81 @@ def _get_analyzer_timeout() -> float:
     return float(getattr(settings, "ANALYZER_TIMEOUT", 10))
 
 
+def _coalescing_enabled() -> bool:
+    """Whether identical concurrent analyses share one run (default: on)."""
+    return bool(getattr(settings, "COALESCE_ANALYSES", True))
+
+
+async def _analyze(
+    analyzer: BaseAnalyzer, payload: dict[str, object], page: PageModel
+) -> list[Detection]:
+    """Run one analyzer, in the shared process pool if it is CPU-bound."""
+    if analyzer.cpu_bound and get_process_pool() is not None:
+        # Workers index their compact payload themselves: unpickling a
+        # PageModel costs about as much as building one.
+        rows = await run_cpu_bound(
+            analyze_in_worker, analyzer, compact_payload(analyzer, payload)
+        )
+        return detections_from_rows(rows)
+    return await analyzer.analyze(payload, page)
+
+
 async def _run_analyzer(
     name: str,
     analyzer: BaseAnalyzer,
     payload: dict[str, object],
+    page: PageModel,
     timeout: float,
 ) -> list[Detection]:
-    """Run a single analyzer with a timeout, returning [] on failure."""
-    try:
-        return await asyncio.wait_for(
-            analyzer.analyze(payload),
-            timeout=timeout,
-        )
-    except asyncio.TimeoutError:
-        logger.warning("Analyzer %s timed out after %.1fs", name, timeout)
-        return []
-    except Exception:
-        logger.exception("Analyzer %s raised an unexpected error", name)
-        return []
-
-
-def _set_corroborated(detections: list[Detection]) -> list[Detection]:
     """
-    Mark detections as corroborated when 2+ analyzers flagged the
-    same (element_selector, category) pair.
-    """
-    counts: dict[tuple[str, str], list[Detection]] = defaultdict(list)
-
-    for det in detections:
-        key = (det.element_selector, det.category)
-        counts[key].append(det)
-
-    for group in counts.values():
-        if len(group) >= 2:
-            for det in group:
-                det.corroborated = True
+    Run a single analyzer with a timeout.
 
-    return detections
+    On timeout or failure, returns the detections the analyzer streamed
+    early via ``core.partial.emit`` (usually [], for non-streaming ones).
+    """
+    with (
+        partial.collecting() as early,
+        span(f"analyzer:{name}"),
+        diagnostics.analyzer(name) as report,
+    ):
+        shared = analyzer.uses_llm and get_shared_state() is not None
+        key = ""
+        if _coalescing_enabled() or shared:
+            key = content_key(name, compact_payload(analyzer, payload))
+            diagnostics.set_cache("coalesced")  # until this request runs it
+
+        def analyze() -> Awaitable[list[Detection]]:
+            diagnostics.set_cache("miss")
+            if shared:
+                # One run per host rather than per worker; the lease outlives the timeout.
+                return cached_analysis(
+                    key, lambda: _analyze(analyzer, payload, page), lease_seconds=timeout + 1
+                )
+            return _analyze(analyzer, payload, page)
+
+        work = in_flight_analyses.run(key, analyze) if _coalescing_enabled() else analyze()
+
+        try:
+            detections = await asyncio.wait_for(work, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Analyzer %s timed out after %.1fs; keeping %d early detections",
+                name, timeout, len(early),
+            )
+            detections = list(early)
+            if report is not None:
+                report.status = "timeout"
+        except Exception:
+            logger.exception("Analyzer %s raised an unexpected error", name)
+            detections = list(early)
+            if report is not None:
+                report.status = "error"
+
+        if report is not None:
+            report.detections = len(detections)
+            if analyzer.cpu_bound and get_process_pool() is not None and not report.note:
+                report.note = "ran in the process pool (no rule timings)"
+        return detections
 
 
 async def dispatch(
@@ -78,39 +152,92 @@ async def dispatch(
     Returns:
         Merged, deduplicated list of Detections sorted by confidence desc.
     """
-    timeout = _get_analyzer_timeout()
+    with span("page_model"):
+        page = PageModel.from_payload(payload)
+    results = await run_analyzers(analyzers, payload, page)
+    return merge_detections(results, page)
 
+
+async def run_analyzers(
+    analyzers: dict[str, BaseAnalyzer],
+    payload: dict[str, object],
+    page: PageModel,
+) -> dict[str, list[Detection]]:
+    """Run all analyzers concurrently; returns analyzer name → raw detections."""
+    timeout = _get_analyzer_timeout()
     tasks = [
-        _run_analyzer(name, analyzer, payload, timeout)
+        _run_analyzer(name, analyzer, payload, page, timeout)
         for name, analyzer in analyzers.items()
     ]
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        # LLM clients are per event loop; this one ends with the request.
+        await close_clients()
+    return dict(zip(analyzers, results))
+
+
+def merge_detections(
+    results: Mapping[str, list[Detection]],
+    page: PageModel,
+    *,
+    learn: bool = True,
+) -> list[Detection]:
+    """
+    Corroborate, deduplicate, calibrate and site-filter raw analyzer results.
 
-    results = await asyncio.gather(*tasks)
-
-    # Flatten all detections
-    all_detections: list[Detection] = []
-    for result_list in results:
-        all_detections.extend(result_list)
+    With ``learn=False`` the site profile is applied but not updated (for a
+    partial result that will be merged again later).
+    """
+    # Attribute every detection to its analyzer, then corroborate across
+    # analyzers by resolved element geometry rather than selector strings.
+    tagged = [
+        (name, det)
+        for name, result_list in results.items()
+        for det in result_list
+    ]
+    with span("corroborate"):
+        keys = corroborate(tagged, SelectorResolver(page))
 
-    # Deduplicate: keep the highest-confidence detection per (selector, category)
+    # Deduplicate: keep the highest-confidence detection per (element, category),
+    # corroborated if any of its duplicates was
     seen: dict[tuple[str, str], Detection] = {}
-    for det in all_detections:
-        key = (det.element_selector, det.category)
+    corroborated: dict[tuple[str, str], bool] = defaultdict(bool)
+    sources: dict[tuple[str, str], dict[str, float]] = defaultdict(dict)
+    for (name, det), element_key in zip(tagged, keys):
+        key = (element_key, det.category)
+        corroborated[key] |= det.corroborated
+        sources[key][name] = max(det.confidence, sources[key].get(name, 0.0))
         if key not in seen or det.confidence > seen[key].confidence:
             seen[key] = det
 
-    # But we still need corroboration info from the full list
     deduped = list(seen.values())
-    _set_corroborated(all_detections)  # marks on original objects
-
-    # Transfer corroborated flag to deduped
-    for det in deduped:
-        key = (det.element_selector, det.category)
-        corroborated_any = any(
-            d.corroborated for d in all_detections
-            if (d.element_selector, d.category) == key
-        )
-        det.corroborated = corroborated_any
+    for key, det in seen.items():
+        det.corroborated = corroborated[key]
+        det.sources = sources[key]
+
+    report = diagnostics.active()
+    if report is not None:
+        contributions: dict[tuple[str, str], list[tuple[str, Detection]]] = defaultdict(list)
+        for (name, det), element_key in zip(tagged, keys):
+            contributions[(element_key, det.category)].append((name, det))
+        report.record_merge((seen[key], raw) for key, raw in contributions.items())
+
+    calibrator = get_calibrator()
+    if calibrator is not None:
+        with span("calibrate"):
+            deduped = calibrator.apply(deduped)
+
+    # Apply what is already known about this site, then learn from this run.
+    origin = origin_of(page.url) if site_profiles_enabled() else ""
+    if origin:
+        store = get_store()
+        with span("site_profile"):
+            profile = store.get(origin)
+            if profile is not None:
+                deduped = profile.apply(deduped)
+            if learn:
+                store.record_analysis(origin, deduped)
 
     # Sort by confidence descending
     deduped.sort(key=lambda d: d.confidence, reverse=True)
@@ -0,0 +1,140 @@
+"""
+core/executor.py — Shared process pool for CPU-bound analyzer work.
+
+Rule engines like the DOM size-disparity check or the review pairwise
+overlap are pure Python CPU work: on the event loop they hold the GIL and
+stall every other in-flight request on the worker. Analyzers that declare
+``cpu_bound = True`` are run here instead, in a process pool shared by all
+requests in the process.
+
+The pool is opt-in (``ANALYZER_PROCESS_WORKERS``, default 0 = run inline):
+shipping a payload to another process costs a pickle round-trip, which only
+pays off on heavy pages or under concurrency.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, TypeVar
+
+from django.conf import settings
+
+if TYPE_CHECKING:
+    from core.interfaces import BaseAnalyzer
+    from core.models import Detection
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _get_worker_count() -> int:
+    """Read the pool size from Django settings (0 disables the pool)."""
+    return max(0, int(getattr(settings, "ANALYZER_PROCESS_WORKERS", 0)))
+
+
+def _init_worker(settings_module: str) -> None:
+    """Configure Django in a freshly spawned worker process."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+
+    django.setup()
+
+
+def get_process_pool() -> ProcessPoolExecutor | None:
+    """Return the shared pool, creating it on first use; None when disabled."""
+    global _pool  # noqa: PLW0603
+    workers = _get_worker_count()
+    if workers == 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the parent has an event loop and server threads.
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "darkguard.settings"),),
+            )
+            logger.info("Started analyzer process pool with %d workers", workers)
+        return _pool
+
+
+def shutdown_process_pool() -> None:
+    """Stop the shared pool (it is recreated lazily on next use)."""
+    global _pool  # noqa: PLW0603
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+async def run_cpu_bound(fn: Callable[..., T], *args: object) -> T:
+    """
+    Run a picklable, module-level callable in the shared pool.
+
+    Falls back to calling it inline when the pool is disabled, and restarts
+    the pool once if a worker died.
+    """
+    pool = get_process_pool()
+    if pool is None:
+        return fn(*args)
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        logger.warning("Analyzer process pool broke; restarting it")
+        shutdown_process_pool()
+        pool = get_process_pool()
+        if pool is None:
+            return fn(*args)
+        return await loop.run_in_executor(pool, fn, *args)
+
+
+def compact_payload(
+    analyzer: BaseAnalyzer, payload: dict[str, object]
+) -> dict[str, object]:
+    """Keep only the payload keys the analyzer reads (never the screenshot)."""
+    keys = analyzer.payload_keys
+    if keys is None:
+        return payload
+    return {key: payload[key] for key in keys if key in payload}
+
+
+DetectionRow = tuple[str, str, float, str, str, bool, "str | None"]
+
+
+def analyze_in_worker(
+    analyzer: BaseAnalyzer, payload: dict[str, object]
+) -> list[DetectionRow]:
+    """
+    Process-pool entry point: run an analyzer to completion.
+
+    Detections come back as plain tuples: pickling thousands of dataclass
+    instances repeats every field name per object and dominates IPC cost.
+    """
+    return [
+        (
+            d.category, d.element_selector, d.confidence, d.explanation,
+            d.severity, d.corroborated, d.user_feedback,
+        )
+        for d in asyncio.run(analyzer.analyze(payload))
+    ]
+
+
+def detections_from_rows(rows: list[DetectionRow]) -> list[Detection]:
+    """Rebuild Detections from ``analyze_in_worker`` output."""
+    from core.models import Detection
+
+    return [Detection(*row) for row in rows]  # type: ignore[arg-type]
@@ -0,0 +1,274 @@
+"""
+core/feedback.py — Append-only columnar store for user feedback.
+
+``POST /api/feedback`` only appends events to an in-memory buffer, so
+feedback never adds I/O latency to a request. A background thread flushes
+the buffer in batches to immutable Arrow IPC segment files:
+
+    FEEDBACK_DIR/segment-<ms>-<pid>-<seq>.arrow
+
+Once ``FEEDBACK_COMPACT_SEGMENTS`` small segments have accumulated, they are
+merged into one larger ``compacted-*.arrow`` file and deleted. Every file is
+written to a temporary name and then renamed, so readers only ever see
+complete files. ``load_feedback`` memory-maps all of them into one
+``pyarrow.Table`` for retraining (see ``core/calibration.py``).
+
+pyarrow is imported lazily, in the flush thread and in ``load_feedback``.
+"""
+
+from __future__ import annotations
+
+import atexit
+import glob
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterable, Mapping
+from typing import TYPE_CHECKING, Any
+
+from django.conf import settings
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+# Column name → Arrow type name (see ``_schema``).
+FEEDBACK_COLUMNS = (
+    "received_at",       # timestamp[ms, UTC]
+    "origin",            # string
+    "url",               # string
+    "category",          # string
+    "element_selector",  # string
+    "user_feedback",     # string: false_positive | confirmed
+    "confidence",        # float64: confidence shown to the user
+    "raw_confidence",    # float64: merged confidence before calibration and site floors
+    "severity",          # string
+    "corroborated",      # bool
+    "sources",           # map<string, float64>: analyzer → its confidence
+)
+
+# A compaction lock older than this is assumed to be left by a dead process.
+STALE_LOCK_SECONDS = 600
+
+
+def _get_feedback_dir() -> str:
+    """Directory for feedback segments ("" disables feedback storage)."""
+    return str(getattr(settings, "FEEDBACK_DIR", ""))
+
+
+def _get_flush_seconds() -> float:
+    """Max seconds an event waits in memory before being flushed (default: 5)."""
+    return float(getattr(settings, "FEEDBACK_FLUSH_SECONDS", 5))
+
+
+def _get_batch_rows() -> int:
+    """Buffered events that trigger an early flush (default: 1000)."""
+    return max(1, int(getattr(settings, "FEEDBACK_BATCH_ROWS", 1000)))
+
+
+def _get_max_buffered() -> int:
+    """Events kept in memory before new ones are dropped (default: 100000)."""
+    return max(1, int(getattr(settings, "FEEDBACK_MAX_BUFFERED", 100_000)))
+
+
+def _get_compact_segments() -> int:
+    """Segment count that triggers compaction (default: 16)."""
+    return max(2, int(getattr(settings, "FEEDBACK_COMPACT_SEGMENTS", 16)))
+
+
+def _schema() -> pa.Schema:
+    import pyarrow as pa
+
+    return pa.schema([
+        ("received_at", pa.timestamp("ms", tz="UTC")),
+        ("origin", pa.string()),
+        ("url", pa.string()),
+        ("category", pa.string()),
+        ("element_selector", pa.string()),
+        ("user_feedback", pa.string()),
+        ("confidence", pa.float64()),
+        ("raw_confidence", pa.float64()),
+        ("severity", pa.string()),
+        ("corroborated", pa.bool_()),
+        ("sources", pa.map_(pa.string(), pa.float64())),
+    ])
+
+
+def _write_ipc(table: pa.Table, path: str) -> None:
+    """Write an Arrow IPC file atomically (temp name, then rename)."""
+    import pyarrow as pa
+
+    tmp = f"{path}.tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def _read_ipc(path: str) -> pa.Table:
+    import pyarrow as pa
+
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def load_feedback(directory: str | None = None) -> pa.Table:
+    """Read every feedback segment into one table (memory-mapped)."""
+    import pyarrow as pa
+
+    directory = directory or _get_feedback_dir()
+    paths = sorted(glob.glob(os.path.join(directory, "*.arrow"))) if directory else []
+    tables = [_read_ipc(path) for path in paths]
+    if not tables:
+        return _schema().empty_table()
+    # Segments written before a column was added read it as null.
+    return pa.concat_tables(tables, promote_options="default")
+
+
+class FeedbackWriter:
+    """Buffers feedback events and flushes them from a background thread."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._buffer: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._seq = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="feedback-flush", daemon=True)
+        self._thread.start()
+
+    def append(self, events: Iterable[Mapping[str, Any]]) -> int:
+        """Queue events for the next flush; returns how many were accepted."""
+        received_at = time.time_ns() // 1_000_000
+        limit = _get_max_buffered()
+        accepted = dropped = 0
+        with self._lock:
+            for event in events:
+                if len(self._buffer) >= limit:
+                    dropped += 1
+                    continue
+                self._buffer.append({**event, "received_at": received_at})
+                accepted += 1
+            self.dropped += dropped
+            if len(self._buffer) >= _get_batch_rows():
+                self._wake.set()
+        if dropped:
+            logger.warning("Feedback buffer full; dropped %d events", dropped)
+        return accepted
+
+    def flush(self) -> str | None:
+        """Write buffered events to a new segment; returns its path."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return None
+
+        import pyarrow as pa
+
+        columns: dict[str, list[Any]] = {name: [] for name in FEEDBACK_COLUMNS}
+        for row in rows:
+            for name in FEEDBACK_COLUMNS:
+                value = row.get(name)
+                columns[name].append(list(value.items()) if name == "sources" else value)
+        table = pa.table(columns, schema=_schema())
+
+        self._seq += 1
+        path = os.path.join(
+            self.directory, f"segment-{time.time_ns() // 1_000_000}-{os.getpid()}-{self._seq}.arrow"
+        )
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_ipc(table, path)
+        except OSError:
+            self._requeue(rows)
+            raise
+        logger.debug("Flushed %d feedback events to %s", len(rows), path)
+        return path
+
+    def _requeue(self, rows: list[dict[str, Any]]) -> None:
+        """Put rows from a failed flush back in front of the buffer, up to its limit."""
+        limit = _get_max_buffered()
+        with self._lock:
+            restored = rows + self._buffer
+            self._buffer = restored[:limit]
+            dropped = len(restored) - len(self._buffer)
+            self.dropped += dropped
+        if dropped:
+            logger.warning("Feedback buffer full after a failed flush; dropped %d events", dropped)
+
+    def compact(self) -> str | None:
+        """Merge small segments into one file, if enough have accumulated."""
+        segments = sorted(glob.glob(os.path.join(self.directory, "segment-*.arrow")))
+        if len(segments) < _get_compact_segments() or not self._acquire_compaction_lock():
+            return None
+
+        import pyarrow as pa
+
+        try:
+            table = pa.concat_tables([_read_ipc(path) for path in segments], promote_options="default")
+            path = os.path.join(
+                self.directory, f"compacted-{time.time_ns() // 1_000_000}-{os.getpid()}.arrow"
+            )
+            _write_ipc(table, path)
+            for segment in segments:
+                os.unlink(segment)
+            logger.info("Compacted %d feedback segments into %s", len(segments), path)
+            return path
+        except FileNotFoundError:
+            return None  # another process compacted these first
+        finally:
+            os.unlink(self._lock_path)
+
+    @property
+    def _lock_path(self) -> str:
+        return os.path.join(self.directory, ".compact.lock")
+
+    def _acquire_compaction_lock(self) -> bool:
+        """Cross-process lock: only one worker compacts at a time."""
+        try:
+            if time.time() - os.path.getmtime(self._lock_path) > STALE_LOCK_SECONDS:
+                os.unlink(self._lock_path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.close(os.open(self._lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        return True
+
+    def close(self) -> None:
+        """Stop the background thread after a final flush."""
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=10)
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(_get_flush_seconds())
+            self._wake.clear()
+            try:
+                self.flush()
+                self.compact()
+            except Exception:
+                logger.exception("Feedback flush failed")
+
+
+_writer: FeedbackWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> FeedbackWriter | None:
+    """The process-wide writer, started on first use; None when disabled."""
+    global _writer  # noqa: PLW0603
+    directory = _get_feedback_dir()
+    if not directory:
+        return None
+    with _writer_lock:
+        if _writer is None or _writer.directory != directory:
+            _writer = FeedbackWriter(directory)
+            atexit.register(_writer.close)
+        return _writer
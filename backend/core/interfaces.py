@@ -7,20 +7,36 @@ Every analyzer module inherits from this and implements `analyze()`.
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from typing import ClassVar
 
 from core.models import Detection
+from core.page import PageModel
 
 
 class BaseAnalyzer(ABC):
     """Abstract base class for all dark-pattern analyzers."""
 
+    cpu_bound: ClassVar[bool] = False
+    """Pure CPU work; the dispatcher runs it in the shared process pool."""
+
+    payload_keys: ClassVar[tuple[str, ...] | None] = None
+    """Top-level payload keys this analyzer reads (None = all of them)."""
+
+    uses_llm: ClassVar[bool] = False
+    """Calls Gemini (when GOOGLE_API_KEY is set); warmup preloads the client."""
+
     @abstractmethod
-    async def analyze(self, payload: dict[str, object]) -> list[Detection]:
+    async def analyze(
+        self, payload: dict[str, object], page: PageModel | None = None
+    ) -> list[Detection]:
         """
         Analyze a payload and return a list of detections.
 
         Args:
             payload: The full request payload (each analyzer picks its keys).
+            page: The request's shared ``PageModel``, built once by the
+                dispatcher. Analyzers build their own from ``payload`` when
+                called without one (e.g. directly from tests).
 
         Returns:
             A list of Detection instances found by this analyzer.
@@ -0,0 +1,346 @@
+"""
+core/jobs.py — Background analysis jobs for clients that can poll.
+
+``POST /api/jobs`` runs the fast rule analyzers (``uses_llm = False``)
+right away and returns their merged detections with a job id. The LLM
+analyzers run later on a worker pool fed from a persistent SQLite queue
+at ``JOB_DB_PATH``. No broker is needed, and queued jobs survive a
+restart. ``GET /api/jobs/<id>?wait=<s>`` returns the job; it long-polls
+until the job finishes or ``wait`` runs out. A finished job holds the
+rule and LLM results merged by ``core.dispatcher.merge_detections``.
+
+Each serving process starts ``JOB_WORKERS`` worker threads
+(``start_job_workers``, from ``darkguard/wsgi.py``). Dedicated worker
+processes can run ``python manage.py run_jobs`` instead. A worker leases a
+job for ``JOB_LEASE_SECONDS``. A job whose worker died is picked up again
+after the lease runs out, and it fails after ``JOB_MAX_ATTEMPTS`` tries.
+Finished jobs are deleted after ``JOB_RETENTION_SECONDS``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from django.conf import settings
+
+from core.models import Detection
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL,
+    rule_results TEXT NOT NULL,
+    detections TEXT NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+"""
+
+_store: JobStore | None = None
+_store_lock = threading.Lock()
+# Wakes idle workers on submit and long-polls on completion (same process).
+_changed = threading.Condition()
+_workers: list[JobWorker] = []
+
+
+def _get_db_path() -> str:
+    """SQLite queue file ("" disables the job API)."""
+    return str(getattr(settings, "JOB_DB_PATH", ""))
+
+
+def _get_worker_count() -> int:
+    """Worker threads started by each serving process (0 = none)."""
+    return int(getattr(settings, "JOB_WORKERS", 2))
+
+
+def _get_lease_seconds() -> float:
+    return float(getattr(settings, "JOB_LEASE_SECONDS", 120))
+
+
+def _get_max_attempts() -> int:
+    return int(getattr(settings, "JOB_MAX_ATTEMPTS", 3))
+
+
+def _get_retention_seconds() -> float:
+    return float(getattr(settings, "JOB_RETENTION_SECONDS", 3600))
+
+
+def _get_poll_seconds() -> float:
+    """How often idle workers check the queue for jobs from other processes."""
+    return float(getattr(settings, "JOB_POLL_SECONDS", 0.5))
+
+
+def _notify() -> None:
+    with _changed:
+        _changed.notify_all()
+
+
+def _rows(results: Mapping[str, list[Detection]]) -> str:
+    return json.dumps({name: [asdict(d) for d in dets] for name, dets in results.items()})
+
+
+def _detections(rows: str) -> dict[str, list[Detection]]:
+    return {name: [Detection(**d) for d in dets] for name, dets in json.loads(rows).items()}
+
+
+@dataclass(frozen=True, slots=True)
+class Job:
+    """One job as stored."""
+
+    id: str
+    status: str
+    created_at: float
+    updated_at: float
+    attempts: int
+    detections: list[dict[str, object]]
+    error: str | None
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "detections": self.detections,
+            "error": self.error,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class ClaimedJob:
+    """A job leased by a worker."""
+
+    id: str
+    payload: dict[str, object]
+    rule_results: dict[str, list[Detection]]
+
+
+class JobStore:
+    """The SQLite-backed queue. Safe to share across threads and processes."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One short-lived connection per operation: sqlite3 connections
+        # can't be shared between threads, and opening one is cheap.
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(
+        self,
+        payload: Mapping[str, object],
+        rule_results: Mapping[str, list[Detection]],
+        detections: list[Detection],
+        *,
+        pending: bool = True,
+    ) -> Job:
+        """Store a job; with ``pending=False`` it is finished already."""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        status = QUEUED if pending else DONE
+        rows = [asdict(d) for d in detections]
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, created_at, updated_at, payload, rule_results, detections)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, status, now, now, json.dumps(payload) if pending else "{}",
+                 _rows(rule_results) if pending else "{}", json.dumps(rows)),
+            )
+        if pending:
+            _notify()
+        return Job(job_id, status, now, now, 0, rows, None)
+
+    def get(self, job_id: str) -> Job | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, status, created_at, updated_at, attempts, detections, error FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return Job(row[0], row[1], row[2], row[3], row[4], json.loads(row[5]), row[6])
+
+    def claim(self) -> ClaimedJob | None:
+        """Lease the oldest queued job (or one whose lease ran out)."""
+        while True:
+            now = time.time()
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = conn.execute(
+                        "SELECT id, attempts, payload, rule_results FROM jobs"
+                        " WHERE status = ? OR (status = ? AND lease_until < ?)"
+                        " ORDER BY created_at LIMIT 1",
+                        (QUEUED, RUNNING, now),
+                    ).fetchone()
+                    if row is None:
+                        conn.execute("COMMIT")
+                        return None
+                    job_id, attempts, payload, rule_results = row
+                    if attempts >= _get_max_attempts():
+                        conn.execute(
+                            "UPDATE jobs SET status = ?, updated_at = ?, error = ?, payload = '{}' WHERE id = ?",
+                            (FAILED, now, f"Gave up after {attempts} attempts", job_id),
+                        )
+                        conn.execute("COMMIT")
+                        _notify()
+                        continue
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, updated_at = ?, lease_until = ?, attempts = attempts + 1"
+                        " WHERE id = ?",
+                        (RUNNING, now, now + _get_lease_seconds(), job_id),
+                    )
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            return ClaimedJob(job_id, json.loads(payload), _detections(rule_results))
+
+    def finish(self, job_id: str, detections: list[Detection]) -> None:
+        self._close(job_id, DONE, json.dumps([asdict(d) for d in detections]), None)
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._close(job_id, FAILED, None, error)
+
+    def _close(self, job_id: str, status: str, detections: str | None, error: str | None) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, lease_until = NULL, payload = '{}',"
+                " rule_results = '{}', detections = COALESCE(?, detections), error = ? WHERE id = ?",
+                (status, time.time(), detections, error, job_id),
+            )
+        _notify()
+
+    def prune(self) -> int:
+        """Delete finished jobs older than JOB_RETENTION_SECONDS."""
+        cutoff = time.time() - _get_retention_seconds()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (*FINISHED, cutoff)
+            )
+        return cursor.rowcount
+
+    def wait(self, job_id: str, timeout: float) -> Job | None:
+        """The job once it has finished, or as it is after ``timeout`` seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job.status in FINISHED or remaining <= 0:
+                return job
+            # Woken early by a worker in this process; others are polled.
+            with _changed:
+                _changed.wait(min(remaining, _get_poll_seconds()))
+
+
+def get_store() -> JobStore | None:
+    """This process's job store, or None when JOB_DB_PATH is empty."""
+    global _store  # noqa: PLW0603
+    path = _get_db_path()
+    if not path:
+        return None
+    with _store_lock:
+        if _store is None or _store.path != path:
+            _store = JobStore(path)
+        return _store
+
+
+# ── Workers ──────────────────────────────────────────────
+
+
+def run_job(job: ClaimedJob) -> list[Detection]:
+    """Run a job's LLM analyzers and merge them with its rule results."""
+    from core.analyzers import get_analyzers
+    from core.dispatcher import merge_detections, run_analyzers
+    from core.page import PageModel
+
+    analyzers = get_analyzers()
+    llm_analyzers = {name: a for name, a in analyzers.items() if a.uses_llm}
+    page = PageModel.from_payload(job.payload)
+    llm_results = asyncio.run(run_analyzers(llm_analyzers, job.payload, page))
+    results = {**job.rule_results, **llm_results}
+    # Merge in registry order, as dispatch would.
+    ordered = {name: results[name] for name in analyzers if name in results}
+    return merge_detections(ordered, page)
+
+
+def process_next(store: JobStore) -> bool:
+    """Run the next queued job, if any; returns whether there was one."""
+    job = store.claim()
+    if job is None:
+        return False
+    try:
+        detections = run_job(job)
+    except Exception as exc:
+        logger.exception("Job %s failed", job.id)
+        store.fail(job.id, f"{type(exc).__name__}: {exc}")
+    else:
+        store.finish(job.id, detections)
+    return True
+
+
+class JobWorker(threading.Thread):
+    """Runs queued jobs until stopped."""
+
+    def __init__(self, store: JobStore, name: str = "darkguard-jobs") -> None:
+        super().__init__(name=name, daemon=True)
+        self.store = store
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        last_prune = 0.0
+        while not self._stopped.is_set():
+            try:
+                if process_next(self.store):
+                    continue
+                if time.monotonic() - last_prune > 60:
+                    self.store.prune()
+                    last_prune = time.monotonic()
+            except sqlite3.Error:
+                logger.exception("Job queue error")
+            with _changed:
+                _changed.wait(_get_poll_seconds())
+
+    def stop(self) -> None:
+        self._stopped.set()
+        _notify()
+
+
+def start_job_workers(count: int | None = None) -> list[JobWorker]:
+    """Start this process's worker threads (once); none if jobs are disabled."""
+    store = get_store()
+    count = _get_worker_count() if count is None else count
+    if store is None or count <= 0 or _workers:
+        return list(_workers)
+    for i in range(count):
+        worker = JobWorker(store, name=f"darkguard-jobs-{i}")
+        worker.start()
+        _workers.append(worker)
+    return list(_workers)
@@ -0,0 +1,336 @@
+"""
+core/llm.py — Shared Gemini access for the LLM-backed analyzers.
+
+Wraps the async `google.genai` client so concurrent prompts (e.g. one per
+page region) don't block the event loop, and centralizes the response
+clean-up every analyzer needs (Markdown fences → JSON array).
+
+Analyzers read responses with ``stream_json_items``: the response is
+streamed and each array element is parsed as soon as it is complete, so
+early detections are available before the model finishes and a truncated
+response still yields every complete item.
+
+Responses can be recorded (``recording``) and served back instead of
+calling Gemini (``replaying``), so traces (core/traces.py) replay
+deterministically. Both are ``ContextVar``s, like core/partial.py's sink.
+Each call's token counts go to the response diagnostics (core/diagnostics.py)
+when they were requested. A failed or cut-off call is counted there too, and
+keeps the analysis' result out of the host-wide cache (core/shared_state.py).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import ssl
+import threading
+from collections.abc import AsyncIterator, Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
+
+from core import diagnostics
+from core.shared_state import skip_shared_cache, wait_for_token
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = "gemini-2.5-flash"
+
+# prompt → response text, for the current recording (core/traces.py)
+_recorded: ContextVar[dict[str, str] | None] = ContextVar("llm_recorded", default=None)
+# prompt_key → response text to serve instead of calling Gemini
+_replayed: ContextVar[Mapping[str, str] | None] = ContextVar("llm_replayed", default=None)
+# prompt keys asked for during a replay that had no recorded response
+_replay_misses: ContextVar[list[str] | None] = ContextVar("llm_replay_misses", default=None)
+# event loop → (api key, base URL) → client created on that loop
+_loop_clients: WeakKeyDictionary[asyncio.AbstractEventLoop, dict[tuple[str, str], Any]] = WeakKeyDictionary()
+_loop_clients_lock = threading.Lock()
+
+
+def _get_base_url() -> str:
+    """Gemini API base URL override, e.g. a local fake server ("" = default)."""
+    return str(getattr(settings, "GEMINI_BASE_URL", ""))
+
+
+@lru_cache(maxsize=1)
+def _ssl_context() -> ssl.SSLContext:
+    """CA bundle for Gemini, loaded once (the slow part of creating a client)."""
+    import certifi
+
+    return ssl.create_default_context(
+        cafile=os.environ.get("SSL_CERT_FILE", certifi.where()),
+        capath=os.environ.get("SSL_CERT_DIR"),
+    )
+
+
+def get_client(api_key: str, base_url: str = "") -> Any:
+    """
+    Return the `genai.Client` for this key on the running event loop.
+
+    A client's async connection pool belongs to the loop it was first used
+    on, and every request runs its own loop (``asyncio.run``), so each loop
+    gets its own client; ``close_clients`` closes them before the loop
+    ends. Outside a loop a new, uncached client is returned.
+    """
+    from google import genai
+    from google.genai import types
+
+    try:
+        loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    clients = _loop_clients.get(loop) if loop is not None else None
+    client = clients.get((api_key, base_url)) if clients is not None else None
+    if client is not None:
+        return client
+
+    ctx = _ssl_context()
+    options = types.HttpOptions(
+        base_url=base_url or None,
+        client_args={"verify": ctx},
+        async_client_args={"verify": ctx, "ssl": ctx},
+    )
+    client = genai.Client(api_key=api_key, http_options=options)
+    if loop is not None:
+        with _loop_clients_lock:
+            _loop_clients.setdefault(loop, {})[(api_key, base_url)] = client
+    return client
+
+
+async def close_clients() -> None:
+    """Close the clients created on the running loop (call before it ends)."""
+    with _loop_clients_lock:
+        clients = _loop_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        try:
+            await client.aio.aclose()
+            client.close()
+        except Exception:
+            logger.debug("Could not close Gemini client", exc_info=True)
+
+
+def prompt_key(prompt: str) -> str:
+    """Stable key of a prompt, for looking recorded responses up."""
+    return hashlib.sha256(prompt.encode()).hexdigest()[:32]
+
+
+@contextmanager
+def recording() -> Iterator[dict[str, str]]:
+    """Collect prompt → response text for every LLM call made in this block."""
+    responses: dict[str, str] = {}
+    token = _recorded.set(responses)
+    try:
+        yield responses
+    finally:
+        _recorded.reset(token)
+
+
+@contextmanager
+def replaying(responses: Mapping[str, str]) -> Iterator[list[str]]:
+    """
+    Serve LLM calls in this block from ``responses`` (keyed by ``prompt_key``).
+
+    Yields the keys of prompts that had no recorded response; those calls
+    raise ``LookupError``, so analyzers take their failure path.
+    """
+    misses: list[str] = []
+    tokens = (_replayed.set(responses), _replay_misses.set(misses))
+    try:
+        yield misses
+    finally:
+        _replay_misses.reset(tokens[1])
+        _replayed.reset(tokens[0])
+
+
+def _replayed_response(prompt: str) -> str | None:
+    """The recorded response when replaying (raises if there is none)."""
+    responses = _replayed.get()
+    if responses is None:
+        return None
+    key = prompt_key(prompt)
+    if key not in responses:
+        misses = _replay_misses.get()
+        if misses is not None:
+            misses.append(key)
+        raise LookupError(f"No recorded LLM response for prompt {key}")
+    return responses[key]
+
+
+def _record(prompt: str, text: str) -> None:
+    responses = _recorded.get()
+    if responses is not None:
+        responses[prompt] = text
+
+
+def _failed(reason: str) -> None:
+    """A call failed or was cut off: keep its result out of the shared cache and report it."""
+    skip_shared_cache(reason)
+    diagnostics.record_llm_error()
+
+
+def _record_usage(prompt: str, text: str, usage: object) -> None:
+    """Report a call's token counts (estimated when Gemini sent none)."""
+    if diagnostics.current() is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    output_tokens = getattr(usage, "candidates_token_count", None)
+    if prompt_tokens is None:
+        diagnostics.record_llm_call(
+            math.ceil(len(prompt) / 4), math.ceil(len(text) / 4), estimated=True
+        )
+    else:
+        diagnostics.record_llm_call(prompt_tokens, output_tokens or 0)
+
+
+async def _response_chunks(prompt: str, api_key: str, usage: list[object]) -> AsyncIterator[str]:
+    """The response text in chunks; Gemini's usage metadata is appended to ``usage``."""
+    replayed = _replayed_response(prompt)
+    if replayed is not None:
+        yield replayed
+        return
+    await wait_for_token()
+    client = get_client(api_key, _get_base_url())
+    stream = await client.aio.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=prompt,
+    )
+    async for chunk in stream:
+        if chunk.usage_metadata is not None:
+            usage.append(chunk.usage_metadata)
+        yield chunk.text or ""
+
+
+async def stream_json_items(prompt: str, api_key: str) -> AsyncIterator[dict[str, object]]:
+    """
+    Stream one prompt through Gemini, yielding JSON array items as they complete.
+
+    If the stream breaks off after some items were yielded, the error is
+    logged and iteration simply ends; with no items it propagates.
+    """
+    parser = JSONArrayStream()
+    received: list[str] = []
+    usage: list[object] = []
+    yielded = 0
+    try:
+        async for text in _response_chunks(prompt, api_key, usage):
+            received.append(text)
+            for item in parser.feed(text):
+                yielded += 1
+                yield item
+    except Exception:
+        _failed("LLM stream failed")
+        if not yielded:
+            raise
+        logger.warning("LLM stream failed after %d items; keeping them", yielded, exc_info=True)
+
+    # What arrived, even if cut off: replaying it reproduces the same items.
+    _record(prompt, "".join(received))
+    _record_usage(prompt, "".join(received), usage[-1] if usage else None)
+    for item in parser.close():
+        yield item
+    if parser.truncated:
+        _failed("LLM response cut off or malformed")
+        logger.warning("LLM response was cut off or malformed; kept the complete items")
+
+
+class JSONArrayStream:
+    """
+    Incremental parser for a JSON array of objects arriving in chunks.
+
+    ``feed`` returns every element that became complete; anything before
+    the opening ``[`` (Markdown fences, prose) is skipped. ``close`` then
+    salvages any well-formed objects after a malformed element.
+    """
+
+    def __init__(self) -> None:
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._started = False
+        self.done = False
+        """The closing ``]`` was seen."""
+
+    @property
+    def truncated(self) -> bool:
+        """True if the input ended without a complete array."""
+        return not self.done
+
+    def feed(self, chunk: str) -> list[dict[str, object]]:
+        """Add a chunk, returning the array items it completed."""
+        if self.done:
+            return []
+        self._buffer += chunk
+        items: list[dict[str, object]] = []
+
+        if not self._started:
+            start = self._buffer.find("[")
+            if start < 0:
+                return items
+            self._buffer = self._buffer[start + 1:]
+            self._started = True
+
+        pos = 0
+        buffer = self._buffer
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                self.done = True
+                pos += 1
+                break
+            try:
+                value, pos = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # element not complete yet
+            if isinstance(value, dict):
+                items.append(value)
+
+        self._buffer = buffer[pos:]
+        return items
+
+    def close(self) -> list[dict[str, object]]:
+        """
+        End of input: recover complete objects after a malformed element.
+
+        Only objects that start between elements are kept; an object nested
+        inside an unfinished element is part of that element, not an item.
+        """
+        items: list[dict[str, object]] = []
+        buffer, pos, depth, in_string = self._buffer, 0, 0, False
+        while not self.done and pos < len(buffer):
+            char = buffer[pos]
+            if in_string:
+                if char == "\\":
+                    pos += 1
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "{[":
+                if depth == 0 and char == "{":
+                    try:
+                        value, end = self._decoder.raw_decode(buffer, pos)
+                    except json.JSONDecodeError:
+                        pass
+                    else:
+                        if isinstance(value, dict):
+                            items.append(value)
+                        pos = end
+                        continue
+                depth += 1
+            elif char in "}]":
+                if depth == 0:
+                    break  # the array's own closing bracket
+                depth -= 1
+            pos += 1
+        self._buffer = ""
+        return items
@@ -0,0 +1,95 @@
+"""
+``python manage.py fit_calibration`` — fit the confidence calibration model
+from stored user feedback (core/feedback.py) and write it to
+``CALIBRATION_PATH`` (or ``--output``). Running servers pick up the new file
+on their next request.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from argparse import ArgumentParser
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.calibration import fit
+from core.feedback import load_feedback
+
+
+def _log_loss(probabilities: Sequence[float], labels: Sequence[bool]) -> float:
+    eps = 1e-6
+    return -sum(
+        math.log(min(max(p if y else 1.0 - p, eps), 1.0)) for p, y in zip(probabilities, labels)
+    ) / len(labels)
+
+
+def _precision(probabilities: Sequence[float], labels: Sequence[bool], threshold: float) -> float:
+    kept = [y for p, y in zip(probabilities, labels) if p >= threshold]
+    return sum(kept) / len(kept) if kept else 0.0
+
+
+class Command(BaseCommand):
+    help = "Fit the confidence calibration model from stored user feedback."
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument("--feedback-dir", default="", help="Feedback segments (default: FEEDBACK_DIR)")
+        parser.add_argument("--output", default="", help="Model file (default: CALIBRATION_PATH)")
+        parser.add_argument("--l2", type=float, default=1.0, help="L2 regularisation strength")
+        parser.add_argument(
+            "--threshold", type=float, default=0.0,
+            help="Drop detections whose calibrated confidence is below this",
+        )
+        parser.add_argument("--min-rows", type=int, default=50, help="Refuse to fit on fewer events")
+
+    def handle(self, *args: object, **options: object) -> None:
+        output = str(options["output"] or getattr(settings, "CALIBRATION_PATH", ""))
+        if not output:
+            raise CommandError("No output file: pass --output or set CALIBRATION_PATH.")
+
+        table = load_feedback(str(options["feedback_dir"]) or None)
+        data = table.select(
+            ["raw_confidence", "sources", "category", "corroborated", "user_feedback"]
+        ).to_pydict()
+        # The model is applied to merged confidences before calibration, so it
+        # is fitted on those, not on the calibrated ones users were shown.
+        # Rows without one (older clients sent no sources) are skipped.
+        raw = [
+            c if c is not None else max(dict(s).values()) if s else None
+            for c, s in zip(data["raw_confidence"], data["sources"])
+        ]
+        keep = [i for i, c in enumerate(raw) if c is not None]
+        if len(keep) < len(raw):
+            self.stdout.write(f"Skipping {len(raw) - len(keep)} events without a raw confidence")
+        data = {name: [column[i] for i in keep] for name, column in data.items()}
+        labels = [v == "confirmed" for v in data["user_feedback"]]
+        if len(labels) < int(options["min_rows"]):  # type: ignore[call-overload]
+            raise CommandError(f"Only {len(labels)} feedback events; need {options['min_rows']}.")
+        if all(labels) or not any(labels):
+            raise CommandError("Feedback must contain both confirmed and false_positive events.")
+
+        confidences = [float(raw[i]) for i in keep]  # type: ignore[arg-type]
+        sources = [dict(s or []) for s in data["sources"]]
+        corroborated = [bool(c) for c in data["corroborated"]]
+        threshold = float(options["threshold"])  # type: ignore[arg-type]
+
+        calibrator = fit(
+            confidences, sources, data["category"], corroborated, labels,
+            model_version=time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()),
+            l2=float(options["l2"]),  # type: ignore[arg-type]
+            threshold=threshold,
+        )
+        calibrator.save(output)
+
+        # In-sample fit report: raw rule confidences vs calibrated ones.
+        calibrated = calibrator.predict_columns(confidences, sources, data["category"], corroborated)
+        self.stdout.write(
+            f"Fitted calibration {calibrator.model_version} on {len(labels)} events "
+            f"({sum(labels)} confirmed) → {output}\n"
+            f"  log loss:  raw {_log_loss(confidences, labels):.4f}  "
+            f"calibrated {_log_loss(calibrated, labels):.4f}\n"
+            f"  precision @ {threshold:.2f}:  raw {_precision(confidences, labels, threshold):.3f}  "
+            f"calibrated {_precision(calibrated, labels, threshold):.3f}"
+        )
@@ -0,0 +1,89 @@
+"""
+``python manage.py replay_traces [paths...]`` — replay recorded analyze
+traces (core/traces.py) through the current analyzers. Recorded LLM
+responses are served from the archive. The command reports detections
+gained, lost or changed and the dispatch time against the recorded run.
+Use ``--save-baseline`` and ``--baseline`` to compare two local runs.
+"""
+
+from __future__ import annotations
+
+import json
+import statistics
+from argparse import ArgumentParser
+from dataclasses import asdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.analyzers import get_analyzers
+from core.traces import ReplayResult, load_traces, replay
+
+
+class Command(BaseCommand):
+    help = "Replay recorded analyze traces and report output and timing differences."
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument("paths", nargs="*", help="Trace files or directories (default: TRACE_DIR)")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs per trace (median is reported)")
+        parser.add_argument("--limit", type=int, default=0, help="Replay at most this many traces")
+        parser.add_argument("--baseline", default="", help="Compare against results saved with --save-baseline")
+        parser.add_argument("--save-baseline", default="", help="Save this run's results to a JSON file")
+        parser.add_argument("--fail-on-diff", action="store_true", help="Exit non-zero if any output changed")
+
+    def handle(self, *args: object, **options: object) -> None:
+        paths = list(options["paths"]) or [str(getattr(settings, "TRACE_DIR", ""))]  # type: ignore[call-overload]
+        if not any(paths):
+            raise CommandError("No traces: pass paths or set TRACE_DIR.")
+        baselines: dict[str, dict[str, object]] = {}
+        if options["baseline"]:
+            baselines = json.loads(Path(str(options["baseline"])).read_text(encoding="utf-8"))
+
+        analyzers = get_analyzers()
+        limit = int(options["limit"])  # type: ignore[call-overload]
+        results: list[ReplayResult] = []
+        for trace in load_traces(paths):
+            if limit and len(results) >= limit:
+                break
+            trace_id = str(trace["id"])
+            if baselines and trace_id not in baselines:
+                continue
+            result = replay(trace, analyzers, int(options["repeat"]), baselines.get(trace_id))  # type: ignore[call-overload]
+            results.append(result)
+            self.stdout.write(self._line(result))
+
+        if not results:
+            raise CommandError("No traces replayed.")
+        if options["save_baseline"]:
+            saved = {r.trace_id: asdict(r) for r in results}
+            Path(str(options["save_baseline"])).write_text(json.dumps(saved), encoding="utf-8")
+
+        differing = [r for r in results if not r.matches]
+        ratios = [r.replay_ms / r.baseline_ms for r in results if r.baseline_ms > 0]
+        self.stdout.write(
+            f"\n{len(results)} traces: {len(results) - len(differing)} identical, {len(differing)} differ "
+            f"(+{sum(len(r.gained) for r in results)} / -{sum(len(r.lost) for r in results)} detections, "
+            f"{sum(len(r.changed) for r in results)} confidence changes)\n"
+            f"dispatch: baseline {sum(r.baseline_ms for r in results):.1f} ms, "
+            f"replay {sum(r.replay_ms for r in results):.1f} ms"
+            + (f", median ratio {statistics.median(ratios):.2f}x" if ratios else "")
+        )
+        if options["fail_on_diff"] and differing:
+            raise CommandError(f"{len(differing)} traces produced different detections.")
+
+    @staticmethod
+    def _line(result: ReplayResult) -> str:
+        status = "same" if result.matches else "DIFF"
+        line = (
+            f"{status} {result.trace_id}  {result.baseline_ms:8.1f} → {result.replay_ms:8.1f} ms  {result.url}"
+        )
+        for category, selector in result.gained:
+            line += f"\n    + {category} {selector}"
+        for category, selector in result.lost:
+            line += f"\n    - {category} {selector}"
+        for category, selector, before, after in result.changed:
+            line += f"\n    ~ {category} {selector} {before:.4f} → {after:.4f}"
+        if result.llm_misses:
+            line += f"\n    ! {result.llm_misses} prompts had no recorded LLM response"
+        return line
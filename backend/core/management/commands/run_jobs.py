@@ -0,0 +1,44 @@
+"""
+``python manage.py run_jobs`` — run queued ``/api/jobs`` analyses
+(core/jobs.py) in a dedicated worker process. Serving processes can then
+set ``JOB_WORKERS=0``. Stop it with Ctrl-C; a job cut off mid-run is picked
+up again once its lease runs out.
+"""
+
+from __future__ import annotations
+
+import time
+from argparse import ArgumentParser
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.jobs import get_store, process_next, start_job_workers
+
+
+class Command(BaseCommand):
+    help = "Run queued /api/jobs analyses until interrupted."
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument("--workers", type=int, default=2, help="Worker threads")
+        parser.add_argument("--drain", action="store_true", help="Exit once the queue is empty")
+
+    def handle(self, *args: object, **options: object) -> None:
+        store = get_store()
+        if store is None:
+            raise CommandError("Job mode is disabled: set JOB_DB_PATH.")
+
+        if options["drain"]:
+            done = 0
+            while process_next(store):
+                done += 1
+            self.stdout.write(f"Ran {done} jobs; queue is empty.")
+            return
+
+        workers = start_job_workers(int(options["workers"]))  # type: ignore[call-overload]
+        self.stdout.write(f"Running jobs from {store.path} with {len(workers)} workers (Ctrl-C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.stop()
@@ -0,0 +1,18 @@
+"""
+``python manage.py warmup`` — run the worker warmup steps (core/warmup.py)
+in the foreground and print how long each one took.
+"""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from core.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = "Preload analyzers, clients and models, then run a synthetic analysis."
+
+    def handle(self, *args: object, **options: object) -> None:
+        for step, seconds in warm_up().items():
+            self.stdout.write(f"{step:<20} {seconds * 1000:8.1f} ms")
@@ -39,6 +39,9 @@ class Detection:
     user_feedback: UserFeedback = field(default=None)
     """User feedback for model fine-tuning: null, 'false_positive', or 'confirmed'."""
 
+    sources: dict[str, float] = field(default_factory=dict)
+    """Analyzer name → its confidence for this element+category (set by the dispatcher)."""
+
     def __post_init__(self) -> None:
         if not 0.0 <= self.confidence <= 1.0:
             raise ValueError(
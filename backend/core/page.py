@@ -0,0 +1,376 @@
+"""
+core/page.py — Per-request, pre-indexed page model shared by all analyzers.
+
+Every analyzer used to walk the raw ``payload`` dicts on its own, re-checking
+``isinstance`` at each level and re-reading selectors, rects and styles. The
+dispatcher now validates and indexes the payload once into a ``PageModel``:
+
+- one ``PageElement`` per selector (merged across the hidden / interactive /
+  pre-checked lists), with parsed styles and its joined button/heading label
+- selector → element lookup
+- element geometry in contiguous ``array('d')`` columns
+- structured reviews with parsed timestamps
+- ``body_text`` offset → source element, from the collector's ``body_index``
+- the scroll offset and document size, to turn the viewport-relative rects
+  into document coordinates
+
+The model is immutable and shared by reference between analyzers, so nobody
+needs a defensive copy. It is also picklable, for the process pool.
+"""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, NoReturn
+
+from core.styles import ParsedStyles, parse_styles
+
+ELEMENT_LISTS = ("interactive_elements", "hidden_elements", "prechecked_inputs")
+
+
+class FrozenDict(dict[str, Any]):
+    """A read-only dict that still pickles (unlike MappingProxyType)."""
+
+    def _readonly(self, *args: object, **kwargs: object) -> NoReturn:
+        raise TypeError("PageModel data is read-only")
+
+    __setitem__ = __delitem__ = _readonly  # type: ignore[assignment]
+    clear = pop = popitem = setdefault = update = _readonly  # type: ignore[assignment]
+    __ior__ = _readonly  # type: ignore[assignment]
+
+    def __reduce__(self) -> tuple[type[FrozenDict], tuple[dict[str, Any]]]:
+        return (FrozenDict, (dict(self),))
+
+
+@dataclass(frozen=True, slots=True)
+class Label:
+    """A text label tied to a DOM selector (button label or heading)."""
+
+    selector: str
+    text: str
+
+
+@dataclass(frozen=True, slots=True)
+class TextSpan:
+    """The element ``body_text[start:end]`` was collected from."""
+
+    selector: str
+    start: int
+    end: int
+
+
+@dataclass(frozen=True, slots=True)
+class Review:
+    """One structured review (``payload["reviews"]``)."""
+
+    text: str
+    timestamp: float | None
+    """Posting time as a UNIX timestamp; None when missing or unparseable."""
+
+    rating: float | None
+    author_hash: str
+
+
+@dataclass(frozen=True, slots=True)
+class DocumentMetrics:
+    """Scroll offset and scrollable size of the document (``dom_metadata.document``)."""
+
+    scroll_x: float
+    scroll_y: float
+    width: float
+    height: float
+
+
+@dataclass(frozen=True, slots=True)
+class PageElement:
+    """One DOM element, merged across every list it was collected in."""
+
+    index: int
+    """Position in ``PageModel.elements`` and the geometry columns."""
+
+    selector: str
+    tag_name: str
+    text_content: str
+    attributes: FrozenDict
+    x: float
+    y: float
+    """Viewport-relative, as from ``getBoundingClientRect``."""
+
+    width: float
+    height: float
+    has_geometry: bool
+    """False when the collector sent no ``bounding_rect`` (x/y/size are 0)."""
+
+    styles: FrozenDict
+    """Raw computed-style strings, as sent by the collector."""
+
+    parsed_styles: ParsedStyles
+    sources: frozenset[str]
+    """Which dom_metadata lists contained this element."""
+
+    label: str
+    """Joined button/heading label text for this selector, if any."""
+
+    @property
+    def area(self) -> float:
+        return self.width * self.height
+
+    @property
+    def text(self) -> str:
+        """The element's own text, or its label when it has none."""
+        return self.text_content or self.label
+
+    @property
+    def is_hidden(self) -> bool:
+        return "hidden_elements" in self.sources
+
+    def attribute(self, name: str, default: str = "") -> str:
+        return str(self.attributes.get(name, default))
+
+
+@dataclass(frozen=True, slots=True)
+class PageModel:
+    """Immutable, indexed view of one analysis request."""
+
+    url: str
+    elements: tuple[PageElement, ...]
+    interactive: tuple[PageElement, ...]
+    hidden: tuple[PageElement, ...]
+    prechecked: tuple[PageElement, ...]
+    button_labels: tuple[Label, ...]
+    headings: tuple[Label, ...]
+    body_text: str
+    body_index: tuple[TextSpan, ...]
+    """Non-overlapping spans of ``body_text``, sorted by ``start``."""
+
+    review_text: str | None
+    reviews: tuple[Review, ...]
+    document: DocumentMetrics | None
+    """None when the collector sent no scroll offset (older extensions)."""
+
+    has_dom: bool
+    """False when the payload had no usable ``dom_metadata``."""
+
+    has_text: bool
+    """False when the payload had no usable ``text_content``."""
+
+    _by_selector: FrozenDict
+    _labels: FrozenDict
+    _geometry: tuple[array[float], array[float], array[float], array[float]]
+    _span_starts: tuple[int, ...]
+
+    # ── Lookups ──────────────────────────────────────────
+
+    def get(self, selector: str) -> PageElement | None:
+        """Element by exact selector, or None."""
+        return self._by_selector.get(selector)
+
+    def __contains__(self, selector: object) -> bool:
+        return selector in self._by_selector
+
+    def __iter__(self) -> Iterator[PageElement]:
+        return iter(self.elements)
+
+    def span_at(self, offset: int) -> TextSpan | None:
+        """The ``body_index`` span containing ``body_text[offset]``, or None."""
+        i = bisect_right(self._span_starts, offset) - 1
+        if i >= 0 and offset < self.body_index[i].end:
+            return self.body_index[i]
+        return None
+
+    @property
+    def labels_by_selector(self) -> FrozenDict:
+        """Selector → label text for every label (even without an element)."""
+        return self._labels
+
+    # Geometry columns, aligned with ``elements`` (read-only views).
+
+    @property
+    def xs(self) -> memoryview:
+        return memoryview(self._geometry[0]).toreadonly()
+
+    @property
+    def ys(self) -> memoryview:
+        return memoryview(self._geometry[1]).toreadonly()
+
+    @property
+    def widths(self) -> memoryview:
+        return memoryview(self._geometry[2]).toreadonly()
+
+    @property
+    def heights(self) -> memoryview:
+        return memoryview(self._geometry[3]).toreadonly()
+
+    # ── Construction ─────────────────────────────────────
+
+    @classmethod
+    def from_payload(cls, payload: dict[str, object]) -> PageModel:
+        """Validate-and-index a raw request payload (done once per request)."""
+        text_content = payload.get("text_content")
+        has_text = isinstance(text_content, dict)
+        text = text_content if isinstance(text_content, dict) else {}
+
+        button_labels = _labels(text.get("button_labels"))
+        headings = _labels(text.get("headings"))
+        labels: dict[str, str] = {}
+        for lbl in (*button_labels, *headings):
+            labels.setdefault(lbl.selector, lbl.text)
+
+        dom = payload.get("dom_metadata")
+        has_dom = isinstance(dom, dict)
+        dom_metadata = dom if isinstance(dom, dict) else {}
+
+        records: dict[str, dict[str, Any]] = {}
+        # Insertion-ordered sets of each list's selectors.
+        members: dict[str, dict[str, None]] = {key: {} for key in ELEMENT_LISTS}
+        for key in ELEMENT_LISTS:
+            for raw in _dicts(dom_metadata.get(key)):
+                selector = str(raw.get("selector", ""))
+                record = records.get(selector)
+                if record is None:
+                    records[selector] = {"raw": raw, "sources": {key}}
+                else:
+                    record["sources"].add(key)
+                members[key].setdefault(selector)
+
+        elements: list[PageElement] = []
+        xs, ys, ws, hs = array("d"), array("d"), array("d"), array("d")
+        for index, (selector, record) in enumerate(records.items()):
+            raw = record["raw"]
+            rect = raw.get("bounding_rect")
+            has_geometry = isinstance(rect, dict)
+            rect = rect if isinstance(rect, dict) else {}
+            styles = raw.get("computed_styles")
+            styles = styles if isinstance(styles, dict) else {}
+            attributes = raw.get("attributes")
+            attributes = attributes if isinstance(attributes, dict) else {}
+
+            element = PageElement(
+                index=index,
+                selector=selector,
+                tag_name=str(raw.get("tag_name", "")),
+                text_content=str(raw.get("text_content", "") or ""),
+                attributes=FrozenDict(attributes),
+                x=_float(rect.get("x")),
+                y=_float(rect.get("y")),
+                width=_float(rect.get("width")),
+                height=_float(rect.get("height")),
+                has_geometry=has_geometry,
+                styles=FrozenDict(styles),
+                parsed_styles=parse_styles(styles),
+                sources=frozenset(record["sources"]),
+                label=labels.get(selector, ""),
+            )
+            elements.append(element)
+            xs.append(element.x)
+            ys.append(element.y)
+            ws.append(element.width)
+            hs.append(element.height)
+
+        by_selector = FrozenDict({el.selector: el for el in elements})
+        review_text = payload.get("review_text")
+        body_text = str(text.get("body_text", "") or "")
+        body_index = _spans(text.get("body_index"), len(body_text))
+
+        return cls(
+            url=str(dom_metadata.get("url", "") or payload.get("url", "") or ""),
+            elements=tuple(elements),
+            interactive=tuple(by_selector[s] for s in members["interactive_elements"]),
+            hidden=tuple(by_selector[s] for s in members["hidden_elements"]),
+            prechecked=tuple(by_selector[s] for s in members["prechecked_inputs"]),
+            button_labels=button_labels,
+            headings=headings,
+            body_text=body_text,
+            body_index=body_index,
+            review_text=review_text if isinstance(review_text, str) else None,
+            reviews=_reviews(payload.get("reviews")),
+            document=_document(dom_metadata.get("document")),
+            has_dom=has_dom,
+            has_text=has_text,
+            _by_selector=by_selector,
+            _labels=FrozenDict(labels),
+            _geometry=(xs, ys, ws, hs),
+            _span_starts=tuple(span.start for span in body_index),
+        )
+
+
+def _dicts(value: object) -> Iterable[dict[str, Any]]:
+    if not isinstance(value, list):
+        return ()
+    return (item for item in value if isinstance(item, dict))
+
+
+def _labels(value: object) -> tuple[Label, ...]:
+    return tuple(
+        Label(selector=str(item.get("selector", "")), text=str(item.get("text", "")))
+        for item in _dicts(value)
+    )
+
+
+def _spans(value: object, length: int) -> tuple[TextSpan, ...]:
+    """Valid spans within ``length``, sorted; ones overlapping an earlier span are dropped."""
+    spans = []
+    for item in _dicts(value):
+        try:
+            start, end = int(item["start"]), min(int(item["end"]), length)
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= start < end:
+            spans.append(TextSpan(str(item.get("selector", "")), start, end))
+    spans.sort(key=lambda span: span.start)
+    kept: list[TextSpan] = []
+    for span in spans:
+        if not kept or span.start >= kept[-1].end:
+            kept.append(span)
+    return tuple(kept)
+
+
+def _document(value: object) -> DocumentMetrics | None:
+    if not isinstance(value, dict):
+        return None
+    return DocumentMetrics(
+        scroll_x=_float(value.get("scroll_x")),
+        scroll_y=_float(value.get("scroll_y")),
+        width=_float(value.get("width")),
+        height=_float(value.get("height")),
+    )
+
+
+def _reviews(value: object) -> tuple[Review, ...]:
+    reviews = []
+    for item in _dicts(value):
+        rating = item.get("rating")
+        reviews.append(Review(
+            text=str(item.get("text", "") or ""),
+            timestamp=_timestamp(item.get("date")),
+            rating=_float(rating) if rating is not None else None,
+            author_hash=str(item.get("author_hash", "") or ""),
+        ))
+    return tuple(reviews)
+
+
+def _timestamp(value: object) -> float | None:
+    """ISO 8601 string, datetime or UNIX time → UNIX time (naive = UTC)."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return None
+
+
+def _float(value: object) -> float:
+    try:
+        return float(value)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,137 @@
+"""
+core/parsers.py — Request body parsers for /api/analyze.
+
+A scan payload is several MB: DOM metadata plus a base64 screenshot. These
+parsers let clients cut ingress bandwidth and parse time:
+
+- ``Content-Encoding: gzip | deflate | zstd`` on any body (zstd needs the
+  optional ``zstandard`` package).
+- ``Content-Type: application/msgpack`` as an alternative to JSON, where the
+  screenshot can be sent as raw bytes in the ``screenshot`` field instead
+  of base64 text in ``screenshot_b64``.
+
+Plain uncompressed JSON keeps working unchanged.
+"""
+
+from __future__ import annotations
+
+import zlib
+from typing import IO, Any
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError, UnsupportedMediaType
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.utils import json
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Request body too large."
+    default_code = "payload_too_large"
+
+
+def _get_max_body_size() -> int:
+    """Max request body size in bytes, after decompression (default: 20 MB)."""
+    return int(getattr(settings, "MAX_REQUEST_BODY_BYTES", 20 * 1024 * 1024))
+
+
+def _read_limited(stream: IO[bytes], limit: int) -> bytes:
+    data = stream.read(limit + 1)
+    if len(data) > limit:
+        raise PayloadTooLarge()
+    return data
+
+
+def _inflate(data: bytes, wbits: int, limit: int) -> bytes:
+    decompressor = zlib.decompressobj(wbits=wbits)
+    try:
+        out = decompressor.decompress(data, limit + 1)
+    except zlib.error as exc:
+        raise ParseError(f"Invalid compressed body - {exc}") from exc
+    if len(out) > limit or decompressor.unconsumed_tail:
+        raise PayloadTooLarge()
+    return out
+
+
+def _unzstd(data: bytes, limit: int) -> bytes:
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise UnsupportedMediaType("zstd", detail="zstd Content-Encoding is not enabled.") from exc
+
+    reader = zstandard.ZstdDecompressor().stream_reader(data)
+    try:
+        out = reader.read(limit + 1)
+    except zstandard.ZstdError as exc:
+        raise ParseError(f"Invalid compressed body - {exc}") from exc
+    if len(out) > limit:
+        raise PayloadTooLarge()
+    return out
+
+
+def decode_body(data: bytes, content_encoding: str) -> bytes:
+    """
+    Undo an HTTP ``Content-Encoding``, bounded by ``MAX_REQUEST_BODY_BYTES``.
+
+    Raises:
+        UnsupportedMediaType: For unknown encodings.
+        PayloadTooLarge: If the decoded body would exceed the limit.
+        ParseError: If the body is not validly encoded.
+    """
+    limit = _get_max_body_size()
+    encoding = content_encoding.strip().lower()
+    if encoding in ("", "identity"):
+        return data
+    if encoding in ("gzip", "x-gzip"):
+        return _inflate(data, 16 + zlib.MAX_WBITS, limit)
+    if encoding == "deflate":
+        return _inflate(data, zlib.MAX_WBITS, limit)
+    if encoding == "zstd":
+        return _unzstd(data, limit)
+    raise UnsupportedMediaType(encoding, detail=f"Unsupported Content-Encoding {encoding!r}.")
+
+
+def read_body(stream: IO[bytes], parser_context: dict[str, Any] | None) -> bytes:
+    """Read and decode the request body for a DRF parser."""
+    request = (parser_context or {}).get("request")
+    content_encoding = request.META.get("HTTP_CONTENT_ENCODING", "") if request else ""
+    return decode_body(_read_limited(stream, _get_max_body_size()), content_encoding)
+
+
+class CompressedJSONParser(JSONParser):
+    """JSON parser that also accepts gzip/deflate/zstd request bodies."""
+
+    def parse(
+        self,
+        stream: IO[bytes],
+        media_type: str | None = None,
+        parser_context: dict[str, Any] | None = None,
+    ) -> Any:
+        body = read_body(stream, parser_context)
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            parse_constant = json.strict_constant if self.strict else None
+            return json.loads(body.decode(encoding), parse_constant=parse_constant)
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}") from exc
+
+
+class MessagePackParser(BaseParser):
+    """MessagePack parser; binary fields (e.g. ``screenshot``) stay bytes."""
+
+    media_type = "application/msgpack"
+
+    def parse(
+        self,
+        stream: IO[bytes],
+        media_type: str | None = None,
+        parser_context: dict[str, Any] | None = None,
+    ) -> Any:
+        import msgpack
+
+        body = read_body(stream, parser_context)
+        try:
+            return msgpack.unpackb(body, raw=False, strict_map_key=True)
+        except (ValueError, TypeError, msgpack.UnpackException) as exc:
+            raise ParseError(f"MessagePack parse error - {exc}") from exc
@@ -0,0 +1,38 @@
+"""
+core/partial.py — Early (partial) detections reported while an analyzer runs.
+
+Streaming analyzers call ``emit`` for each detection as soon as it is
+parsed. The dispatcher collects them per analyzer run, so when an analyzer
+times out its already-streamed detections are kept instead of lost.
+
+The sink is a ``ContextVar``: tasks spawned inside an analyzer (e.g. one per
+page region) inherit it, and concurrent requests never see each other's.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from core.models import Detection
+
+_sink: ContextVar[list[Detection] | None] = ContextVar("partial_detections", default=None)
+
+
+def emit(*detections: Detection) -> None:
+    """Report detections early (a no-op outside the dispatcher)."""
+    sink = _sink.get()
+    if sink is not None:
+        sink.extend(detections)
+
+
+@contextmanager
+def collecting() -> Iterator[list[Detection]]:
+    """Collect everything ``emit``-ted by tasks created inside this block."""
+    sink: list[Detection] = []
+    token = _sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _sink.reset(token)
@@ -0,0 +1,372 @@
+"""
+core/profiling.py — Opt-in per-request profiling.
+
+``ProfilingMiddleware`` profiles a request when it carries the
+``X-DarkGuard-Profile`` header (if ``PROFILE_ALLOW_HEADER``) or is picked
+at random at ``PROFILE_SAMPLE_RATE``. A profiled request gets:
+
+- wall-clock spans for each pipeline stage, recorded with ``span(name)``
+  (parse, validate, dispatch, each analyzer and its rules, prompt
+  building, LLM calls, merge, ...)
+- a statistical profile: a sampler thread captures the request thread's
+  Python stack every ``PROFILE_SAMPLE_INTERVAL_MS``
+
+Both are written to ``PROFILE_DIR`` as ``<id>.speedscope.json`` (open it
+at https://www.speedscope.app) and the samples also as ``<id>.collapsed``
+(one ``frame;frame;frame count`` line per stack, for flamegraph.pl and
+similar tools). The response carries the id in ``X-DarkGuard-Profile``.
+
+The active profile is a ``ContextVar``, so analyzer tasks inherit it and
+concurrent requests never see each other's. Outside a profiled request
+``span`` returns a shared no-op object, so the instrumentation costs two
+ContextVar lookups (spans also feed response diagnostics, see
+core/diagnostics.py). Analyzers run in the process pool report only their
+outer ``analyzer:<name>`` span and are not sampled.
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from types import FrameType, TracebackType
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+
+from core import diagnostics
+
+if TYPE_CHECKING:
+    from django.http import HttpRequest, HttpResponse
+
+    from core.diagnostics import Diagnostics
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-DarkGuard-Profile"
+_PROFILE_META_KEY = "HTTP_X_DARKGUARD_PROFILE"
+
+_active: ContextVar[RequestProfile | None] = ContextVar("request_profile", default=None)
+_sequence = itertools.count()
+
+# (qualified name, file, first line) of one Python function
+Frame = tuple[str, str, int]
+
+
+def _get_profile_dir() -> str:
+    """Where profiles are written ("" disables profiling)."""
+    return str(getattr(settings, "PROFILE_DIR", ""))
+
+
+def _get_sample_rate() -> float:
+    """Share of requests profiled without being asked (default: none)."""
+    return float(getattr(settings, "PROFILE_SAMPLE_RATE", 0.0))
+
+
+def _header_allowed() -> bool:
+    """Whether clients may ask for a profile with the header (default: DEBUG)."""
+    return bool(getattr(settings, "PROFILE_ALLOW_HEADER", False))
+
+
+def _get_sample_interval() -> float:
+    """Seconds between stack samples."""
+    return float(getattr(settings, "PROFILE_SAMPLE_INTERVAL_MS", 1.0)) / 1000
+
+
+def _get_max_files() -> int:
+    """Profiles kept in PROFILE_DIR; older ones are deleted (0 = keep all)."""
+    return int(getattr(settings, "PROFILE_MAX_FILES", 200))
+
+
+# ── Spans ────────────────────────────────────────────────
+
+
+@dataclass(frozen=True, slots=True)
+class Span:
+    """One timed pipeline stage (nanoseconds, ``perf_counter_ns``)."""
+
+    name: str
+    start: int
+    end: int
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: object) -> None:
+        return None
+
+
+class _TimedSpan:
+    __slots__ = ("_profile", "_diagnostics", "_name", "_start")
+
+    def __init__(
+        self, profile: RequestProfile | None, diagnostics: Diagnostics | None, name: str
+    ) -> None:
+        self._profile = profile
+        self._diagnostics = diagnostics
+        self._name = name
+        self._start = 0
+
+    def __enter__(self) -> None:
+        if self._diagnostics is not None:
+            self._diagnostics.span_started(self._name)
+        self._start = time.perf_counter_ns()
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        end = time.perf_counter_ns()
+        if self._profile is not None:
+            self._profile.spans.append(Span(self._name, self._start, end))
+        if self._diagnostics is not None:
+            self._diagnostics.span_ended(self._name, end - self._start)
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str) -> _NullSpan | _TimedSpan:
+    """
+    Time a ``with`` block as a pipeline stage, for the request profile and
+    response diagnostics (core/diagnostics.py); a no-op when neither is on.
+    """
+    profile = _active.get()
+    report = diagnostics.active()
+    if profile is None and report is None:
+        return _NULL_SPAN
+    return _TimedSpan(profile, report, name)
+
+
+def pack_lanes(spans: list[Span]) -> list[list[Span]]:
+    """
+    Split spans into lanes in which they nest properly.
+
+    Spans of concurrent analyzers overlap without nesting, which a single
+    timeline can't show. Each span goes into the first lane where it fits
+    inside the innermost still-open span (or after all of them have ended).
+    """
+    lanes: list[list[Span]] = []
+    open_stacks: list[list[Span]] = []
+    for s in sorted(spans, key=lambda s: (s.start, -s.end)):
+        for lane, stack in zip(lanes, open_stacks):
+            while stack and stack[-1].end <= s.start:
+                stack.pop()
+            if not stack or s.end <= stack[-1].end:
+                lane.append(s)
+                stack.append(s)
+                break
+        else:
+            lanes.append([s])
+            open_stacks.append([s])
+    return lanes
+
+
+# ── Sampling ─────────────────────────────────────────────
+
+
+class _Sampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        super().__init__(name="darkguard-profiler", daemon=True)
+        self._thread_id = thread_id
+        self._interval = interval
+        self._stopped = threading.Event()
+        # (stack root-first, ns since the previous sample)
+        self.samples: list[tuple[tuple[Frame, ...], int]] = []
+
+    def run(self) -> None:
+        last = time.perf_counter_ns()
+        while not self._stopped.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            now = time.perf_counter_ns()
+            if frame is not None:
+                self.samples.append((_stack(frame), now - last))
+            last = now
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+def _stack(frame: FrameType | None) -> tuple[Frame, ...]:
+    stack: list[Frame] = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+# ── Profiles ─────────────────────────────────────────────
+
+
+class RequestProfile:
+    """Spans and stack samples of one request."""
+
+    def __init__(self, name: str, sample_interval: float) -> None:
+        self.name = name
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(_sequence)}"
+        self.spans: list[Span] = []
+        self.started = 0
+        self.ended = 0
+        self._sampler = _Sampler(threading.get_ident(), sample_interval) if sample_interval > 0 else None
+
+    @property
+    def samples(self) -> list[tuple[tuple[Frame, ...], int]]:
+        return self._sampler.samples if self._sampler is not None else []
+
+    def start(self) -> None:
+        self.started = time.perf_counter_ns()
+        if self._sampler is not None:
+            self._sampler.start()
+
+    def stop(self) -> None:
+        if self._sampler is not None:
+            self._sampler.stop()
+        self.ended = time.perf_counter_ns()
+
+    def collapsed(self) -> str:
+        """Samples in collapsed-stack format, weighted in microseconds."""
+        weights: Counter[str] = Counter()
+        for stack, weight in self.samples:
+            weights[";".join(_label(frame) for frame in stack)] += weight
+        return "".join(f"{stack} {max(1, weight // 1000)}\n" for stack, weight in weights.items())
+
+    def speedscope(self) -> dict[str, object]:
+        """Spans (one evented profile per lane) and samples as a speedscope file."""
+        frames: list[dict[str, object]] = []
+        index: dict[object, int] = {}
+
+        def frame_id(key: object, frame: dict[str, object]) -> int:
+            if key not in index:
+                index[key] = len(frames)
+                frames.append(frame)
+            return index[key]
+
+        def ms(ns: int) -> float:
+            return round((ns - self.started) / 1e6, 3)
+
+        end = ms(self.ended)
+        profiles: list[dict[str, object]] = []
+        for i, lane in enumerate(pack_lanes(self.spans)):
+            # Lanes are sorted outer-first, so at equal times closes go
+            # before opens, inner spans close first and outer ones open first.
+            events: list[tuple[tuple[int, int, int], str, int]] = []
+            for n, s in enumerate(lane):
+                fid = frame_id(("span", s.name), {"name": s.name})
+                events.append(((s.start, 1, n), "O", fid))
+                events.append(((s.end, 0, -n), "C", fid))
+            events.sort()
+            profiles.append({
+                "type": "evented", "name": f"spans {i + 1}", "unit": "milliseconds",
+                "startValue": 0, "endValue": end,
+                "events": [{"type": kind, "frame": fid, "at": ms(key[0])} for key, kind, fid in events],
+            })
+        if self.samples:
+            profiles.append({
+                "type": "sampled", "name": "samples", "unit": "milliseconds",
+                "startValue": 0, "endValue": end,
+                "samples": [
+                    [frame_id(f, {"name": f[0], "file": f[1], "line": f[2]}) for f in stack]
+                    for stack, _ in self.samples
+                ],
+                "weights": [round(weight / 1e6, 3) for _, weight in self.samples],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "darkguard",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def write(self, directory: str) -> Path:
+        """Write ``<id>.speedscope.json`` and ``<id>.collapsed``; returns the first."""
+        root = Path(directory)
+        root.mkdir(parents=True, exist_ok=True)
+        path = root / f"{self.id}.speedscope.json"
+        path.write_text(json.dumps(self.speedscope()), encoding="utf-8")
+        (root / f"{self.id}.collapsed").write_text(self.collapsed(), encoding="utf-8")
+        return path
+
+
+def _label(frame: Frame) -> str:
+    name, filename, line = frame
+    try:
+        filename = str(Path(filename).relative_to(settings.BASE_DIR))
+    except ValueError:
+        filename = Path(filename).name
+    return f"{name} ({filename}:{line})"
+
+
+def _prune(directory: str, keep: int) -> None:
+    """Delete the oldest profiles beyond ``keep``."""
+    profiles = sorted(Path(directory).glob("*.speedscope.json"), key=lambda p: p.stat().st_mtime)
+    for path in profiles[: max(0, len(profiles) - keep)]:
+        path.unlink(missing_ok=True)
+        path.with_name(path.name.removesuffix(".speedscope.json") + ".collapsed").unlink(missing_ok=True)
+
+
+# ── Middleware ───────────────────────────────────────────
+
+
+def should_profile(request: HttpRequest) -> bool:
+    """Whether this request is profiled (header or random sample)."""
+    if not _get_profile_dir():
+        return False
+    if _header_allowed() and request.META.get(_PROFILE_META_KEY):
+        return True
+    rate = _get_sample_rate()
+    return rate > 0 and random.random() < rate
+
+
+class ProfilingMiddleware:
+    """Profiles requests picked by ``should_profile``; passes the rest through."""
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not should_profile(request):
+            return self.get_response(request)
+
+        profile = RequestProfile(f"{request.method} {request.path}", _get_sample_interval())
+        token = _active.set(profile)
+        profile.start()
+        try:
+            with span("request"):
+                response = self.get_response(request)
+        finally:
+            profile.stop()
+            _active.reset(token)
+
+        directory = _get_profile_dir()
+        try:
+            profile.write(directory)
+            if _get_max_files() > 0:
+                _prune(directory, _get_max_files())
+        except OSError:
+            logger.exception("Could not write request profile to %s", directory)
+            return response
+        response[PROFILE_HEADER] = profile.id
+        return response
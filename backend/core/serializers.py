@@ -1,14 +1,34 @@
 """
-core/serializers.py — DRF serializers for the /api/analyze endpoint.
+core/serializers.py — DRF serializers for the /api/analyze and /api/feedback endpoints.
 """
 
 from __future__ import annotations
 
+from datetime import datetime, timezone
+
 from rest_framework import serializers
 
 
 # ── Request serializers ──────────────────────────────────
 
+MAX_REVIEWS = 10_000
+MAX_BODY_SPANS = 5_000
+
+
+class BytesField(serializers.Field):  # type: ignore[type-arg]
+    """Raw binary value, e.g. a MessagePack ``bin`` screenshot."""
+
+    default_error_messages = {"invalid": "Expected binary data."}
+
+    def to_internal_value(self, data: object) -> bytes:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return bytes(data)
+        self.fail("invalid")
+        raise AssertionError("unreachable")
+
+    def to_representation(self, value: bytes) -> bytes:
+        return value
+
 
 class BoundingRectSerializer(serializers.Serializer[dict[str, float]]):
     x = serializers.FloatField()
@@ -35,11 +55,20 @@ class ElementInfoSerializer(serializers.Serializer[dict[str, object]]):
     computed_styles = ComputedStyleSerializer()
 
 
+class DocumentMetricsSerializer(serializers.Serializer[dict[str, float]]):
+    scroll_x = serializers.FloatField()
+    scroll_y = serializers.FloatField()
+    width = serializers.FloatField(min_value=0.0)
+    height = serializers.FloatField(min_value=0.0)
+
+
 class DomMetadataSerializer(serializers.Serializer[dict[str, object]]):
     hidden_elements = ElementInfoSerializer(many=True)
     interactive_elements = ElementInfoSerializer(many=True)
     prechecked_inputs = ElementInfoSerializer(many=True)
     url = serializers.URLField()
+    # Scroll offset and document size; bounding rects are viewport-relative.
+    document = DocumentMetricsSerializer(required=False)
 
 
 class LabeledElementSerializer(serializers.Serializer[dict[str, str]]):
@@ -47,19 +76,70 @@ class LabeledElementSerializer(serializers.Serializer[dict[str, str]]):
     text = serializers.CharField()
 
 
+class TextSpanSerializer(serializers.Serializer[dict[str, object]]):
+    """The element a ``body_text[start:end]`` range came from."""
+
+    selector = serializers.CharField()
+    start = serializers.IntegerField(min_value=0)
+    end = serializers.IntegerField(min_value=0)
+
+    def validate(self, attrs: dict[str, object]) -> dict[str, object]:
+        if attrs["end"] < attrs["start"]:  # type: ignore[operator]
+            raise serializers.ValidationError({"end": ["Must not be before start."]})
+        return attrs
+
+
 class TextContentSerializer(serializers.Serializer[dict[str, object]]):
     button_labels = LabeledElementSerializer(many=True)
     headings = LabeledElementSerializer(many=True)
-    body_text = serializers.CharField(allow_blank=True)
+    body_text = serializers.CharField(allow_blank=True, trim_whitespace=False)
+    body_index = TextSpanSerializer(many=True, required=False, max_length=MAX_BODY_SPANS)
+
+
+class ReviewSerializer(serializers.Serializer[dict[str, object]]):
+    text = serializers.CharField(allow_blank=True, trim_whitespace=False)
+    date = serializers.DateTimeField(required=False, allow_null=True, default_timezone=timezone.utc)
+    rating = serializers.FloatField(min_value=0.0, max_value=5.0, required=False, allow_null=True)
+    author_hash = serializers.CharField(max_length=128, allow_blank=True, required=False)
+
+    def validate_date(self, value: datetime | None) -> str | None:
+        # Kept as a string so the payload stays JSON-serializable (jobs, traces).
+        return value.isoformat() if value is not None else None
 
 
 class AnalyzeRequestSerializer(serializers.Serializer[dict[str, object]]):
     dom_metadata = DomMetadataSerializer()
     text_content = TextContentSerializer()
-    screenshot_b64 = serializers.CharField()
+    screenshot_b64 = serializers.CharField(required=False)
+    screenshot = BytesField(required=False)  # raw PNG bytes (MessagePack clients)
     review_text = serializers.CharField(allow_null=True, required=False)
+    reviews = ReviewSerializer(many=True, required=False, max_length=MAX_REVIEWS)
     url = serializers.URLField()
 
+    def validate(self, attrs: dict[str, object]) -> dict[str, object]:
+        if not attrs.get("screenshot_b64") and not attrs.get("screenshot"):
+            raise serializers.ValidationError(
+                {"screenshot_b64": ["This field is required."]}
+            )
+        return attrs
+
+
+class FeedbackEventSerializer(serializers.Serializer[dict[str, object]]):
+    """A user's verdict on one detection, with the detection as it was shown."""
+
+    category = serializers.CharField()
+    element_selector = serializers.CharField()
+    confidence = serializers.FloatField(min_value=0.0, max_value=1.0)
+    severity = serializers.ChoiceField(choices=["low", "medium", "high"])
+    corroborated = serializers.BooleanField(default=False)
+    sources = serializers.DictField(child=serializers.FloatField(), required=False, default=dict)
+    user_feedback = serializers.ChoiceField(choices=["false_positive", "confirmed"])
+
+
+class FeedbackRequestSerializer(serializers.Serializer[dict[str, object]]):
+    url = serializers.URLField()
+    events = FeedbackEventSerializer(many=True, allow_empty=False, max_length=1000)
+
 
 # ── Response serializers ─────────────────────────────────
 
@@ -75,7 +155,53 @@ class DetectionSerializer(serializers.Serializer[dict[str, object]]):
         choices=["false_positive", "confirmed"],
         allow_null=True,
     )
+    sources = serializers.DictField(child=serializers.FloatField(), required=False)
+
+
+class LLMUsageSerializer(serializers.Serializer[dict[str, object]]):
+    calls = serializers.IntegerField(min_value=0)
+    errors = serializers.IntegerField(min_value=0)
+    prompt_tokens = serializers.IntegerField(min_value=0)
+    output_tokens = serializers.IntegerField(min_value=0)
+    estimated = serializers.BooleanField()
+
+
+class AnalyzerDiagnosticsSerializer(serializers.Serializer[dict[str, object]]):
+    status = serializers.ChoiceField(choices=["ok", "skipped", "timeout", "error"])
+    note = serializers.CharField(allow_blank=True)
+    duration_ms = serializers.FloatField(min_value=0.0)
+    detections = serializers.IntegerField(min_value=0)
+    cache = serializers.ChoiceField(choices=["miss", "coalesced", "hit", "shared"], allow_null=True)
+    rules = serializers.DictField(child=serializers.FloatField())
+    llm = LLMUsageSerializer(allow_null=True)
+
+
+class DetectionSourceSerializer(serializers.Serializer[dict[str, object]]):
+    analyzer = serializers.CharField()
+    rule = serializers.CharField(allow_null=True)
+    confidence = serializers.FloatField(min_value=0.0, max_value=1.0)
+
+
+class DetectionProvenanceSerializer(serializers.Serializer[dict[str, object]]):
+    sources = DetectionSourceSerializer(many=True)
+
+
+class DiagnosticsSerializer(serializers.Serializer[dict[str, object]]):
+    """Timing and provenance of one analysis (``?diagnostics=1``)."""
+
+    total_ms = serializers.FloatField(min_value=0.0)
+    stages = serializers.DictField(child=serializers.FloatField())
+    analyzers = serializers.DictField(child=AnalyzerDiagnosticsSerializer())
+    detections = DetectionProvenanceSerializer(many=True)  # same order as the detections
 
 
 class AnalyzeResponseSerializer(serializers.Serializer[dict[str, object]]):
     detections = DetectionSerializer(many=True)
+    diagnostics = DiagnosticsSerializer(required=False)
+
+
+class JobResponseSerializer(serializers.Serializer[dict[str, object]]):
+    job_id = serializers.CharField()
+    status = serializers.ChoiceField(choices=["queued", "running", "done", "failed"])
+    detections = DetectionSerializer(many=True)
+    error = serializers.CharField(allow_null=True)
@@ -0,0 +1,499 @@
+"""
+core/shared_state.py — Node-local state shared by every worker on a host.
+
+The single-flight registry (core/coalescing.py) and everything else in a
+worker's memory is per process. With N gunicorn workers, identical analyses
+would run N times and an LLM quota would be spent N times over. This
+module gives all workers on a host one view of:
+
+- a result cache for LLM analyzers (``cached_analysis``)
+- in-flight leases, so only one worker runs an analysis while the others
+  wait for its cached result
+- token buckets for LLM rate limiting (``wait_for_token``)
+
+``SHARED_STATE_BACKEND`` selects the store:
+
+``mmap``
+    A fixed-size hash table in a memory-mapped file under /dev/shm
+    (``SHARED_STATE_PATH``). Keys hash to a group of ``GROUP_SLOTS`` slots.
+    Reads are lock-free: each slot carries a sequence counter that writers
+    make odd while they write (a seqlock), and readers retry on a change.
+    Writers lock only their group (``fcntl.lockf`` on its byte range plus
+    a striped thread lock). A full group evicts the slot that expires first.
+``redis``
+    A Redis server at ``SHARED_STATE_REDIS_URL``, for hosts that already run
+    one (needs the ``redis`` package).
+``local``
+    Per-process dicts: the same API without sharing (tests, single worker).
+``""`` (default)
+    Off: no cache, no cross-worker dedup, no rate limiting.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from dataclasses import asdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from core import diagnostics
+from core.models import Detection
+
+logger = logging.getLogger(__name__)
+
+# Reasons the running leader's result must not be cached (skip_shared_cache)
+_uncacheable: ContextVar[list[str] | None] = ContextVar("shared_uncacheable", default=None)
+# Cached instead of a result that doesn't fit a slot (never valid zlib data)
+TOO_LARGE = b"\0"
+
+_state: SharedState | None = None
+_state_config: tuple[object, ...] | None = None
+_state_lock = threading.Lock()
+
+
+def _get_backend() -> str:
+    return str(getattr(settings, "SHARED_STATE_BACKEND", ""))
+
+
+def _get_path() -> str:
+    """Base path of the mmap table (geometry is appended to the name)."""
+    default = "/dev/shm/darkguard-state" if os.path.isdir("/dev/shm") else \
+        os.path.join(tempfile.gettempdir(), "darkguard-state")
+    return str(getattr(settings, "SHARED_STATE_PATH", "") or default)
+
+
+def _get_slots() -> int:
+    return int(getattr(settings, "SHARED_STATE_SLOTS", 1024))
+
+
+def _get_slot_bytes() -> int:
+    return int(getattr(settings, "SHARED_STATE_SLOT_BYTES", 16384))
+
+
+def _get_redis_url() -> str:
+    return str(getattr(settings, "SHARED_STATE_REDIS_URL", "redis://localhost:6379/0"))
+
+
+def _get_result_ttl() -> float:
+    """Seconds an LLM analyzer's result is served from the shared cache."""
+    return float(getattr(settings, "SHARED_CACHE_TTL_SECONDS", 300))
+
+
+def _get_llm_rate() -> float:
+    """LLM calls per second allowed across the host (0 = unlimited)."""
+    return float(getattr(settings, "LLM_RATE_PER_MINUTE", 0)) / 60
+
+
+def _get_llm_burst() -> float:
+    return float(getattr(settings, "LLM_RATE_BURST", 10))
+
+
+class SharedState(ABC):
+    """Byte values with expiry, plus token buckets."""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None: ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float) -> bool:
+        """Store ``value``; False if it doesn't fit."""
+
+    @abstractmethod
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Store ``value`` only if ``key`` is absent; returns whether it did."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None: ...
+
+    @abstractmethod
+    def take(self, bucket: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        """
+        Take ``cost`` tokens from a bucket refilled at ``rate`` per second.
+
+        Returns 0 when they were taken, else the seconds until they will be.
+        """
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+# ── Local ────────────────────────────────────────────────
+
+
+class LocalState(SharedState):
+    """Per-process state with the shared API."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._values: dict[str, tuple[float, bytes]] = {}
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def get(self, key: str) -> bytes | None:
+        item = self._values.get(key)
+        if item is None or item[0] <= time.time():
+            return None
+        return item[1]
+
+    def set(self, key: str, value: bytes, ttl: float) -> bool:
+        with self._lock:
+            self._values[key] = (time.time() + ttl, value)
+        return True
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        with self._lock:
+            if self.get(key) is not None:
+                return False
+            self._values[key] = (time.time() + ttl, value)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    def take(self, bucket: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(bucket, (burst, now))
+            tokens = _refill(tokens, updated, now, rate, burst)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            self._buckets[bucket] = (tokens - cost if not wait else tokens, now)
+        return wait
+
+
+# ── mmap ─────────────────────────────────────────────────
+
+MAGIC = b"DGS1"
+HEADER = struct.Struct("<4sIII")            # magic, slots, slot bytes, buckets
+SLOT = struct.Struct("<I4x16sdI4x")         # seq, key digest, expires at, length
+BUCKET = struct.Struct("<16sdd")            # name digest, tokens, updated at
+HEADER_BYTES = 64
+BUCKET_BYTES = 64
+BUCKETS = 64
+GROUP_SLOTS = 8
+THREAD_STRIPES = 64
+READ_RETRIES = 100
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+
+class MmapState(SharedState):
+    """The hash table described in the module docstring."""
+
+    def __init__(self, path: str, slots: int, slot_bytes: int) -> None:
+        self.slots = max(GROUP_SLOTS, slots - slots % GROUP_SLOTS)
+        self.slot_bytes = max(SLOT.size + 64, slot_bytes)
+        self.groups = self.slots // GROUP_SLOTS
+        self.path = f"{path}-{self.slots}x{self.slot_bytes}"
+        self._slots_offset = HEADER_BYTES + BUCKETS * BUCKET_BYTES
+        size = self._slots_offset + self.slots * self.slot_bytes
+        self._thread_locks = [threading.Lock() for _ in range(THREAD_STRIPES)]
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER_BYTES, 0)
+        try:
+            if os.fstat(self._fd).st_size != size:
+                os.ftruncate(self._fd, size)  # new file: all zero = empty
+            self._mm = mmap.mmap(self._fd, size)
+            if self._mm[:4] != MAGIC:
+                HEADER.pack_into(self._mm, 0, MAGIC, self.slots, self.slot_bytes, BUCKETS)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER_BYTES, 0)
+
+    def _locked(self, offset: int, length: int) -> _RangeLock:
+        return _RangeLock(self._fd, offset, length, self._thread_locks[offset // length % THREAD_STRIPES])
+
+    def _slot_offset(self, index: int) -> int:
+        return self._slots_offset + index * self.slot_bytes
+
+    def _group(self, digest: bytes) -> int:
+        return int.from_bytes(digest[:8], "little") % self.groups
+
+    def _read(self, offset: int) -> tuple[bytes, float, bytes] | None:
+        """(key digest, expires at, value) of a slot, read without locking."""
+        mm = self._mm
+        for _ in range(READ_RETRIES):
+            seq, digest, expires, length = SLOT.unpack_from(mm, offset)
+            if seq & 1:
+                continue  # a write is in progress
+            start = offset + SLOT.size
+            value = mm[start:start + min(length, self.slot_bytes - SLOT.size)]
+            if SLOT.unpack_from(mm, offset)[0] == seq:
+                return digest, expires, value
+        return None
+
+    def _write(self, offset: int, digest: bytes, expires: float, value: bytes) -> None:
+        """Write a slot; the caller holds its group's lock."""
+        mm = self._mm
+        seq = SLOT.unpack_from(mm, offset)[0]
+        struct.pack_into("<I", mm, offset, seq + 1)
+        start = offset + SLOT.size
+        mm[start:start + len(value)] = value
+        SLOT.pack_into(mm, offset, seq + 1, digest, expires, len(value))
+        struct.pack_into("<I", mm, offset, seq + 2)
+
+    def get(self, key: str) -> bytes | None:
+        digest = _digest(key)
+        now = time.time()
+        first = self._group(digest) * GROUP_SLOTS
+        for i in range(first, first + GROUP_SLOTS):
+            slot = self._read(self._slot_offset(i))
+            if slot is not None and slot[0] == digest and slot[1] > now:
+                return slot[2]
+        return None
+
+    def _store(self, key: str, value: bytes, ttl: float, only_if_absent: bool) -> bool:
+        if len(value) > self.slot_bytes - SLOT.size:
+            return False
+        digest = _digest(key)
+        group = self._group(digest)
+        first = group * GROUP_SLOTS
+        now = time.time()
+        with self._locked(self._slot_offset(first), GROUP_SLOTS * self.slot_bytes):
+            target, target_expires = first, float("inf")
+            for i in range(first, first + GROUP_SLOTS):
+                _, slot_digest, expires, _ = SLOT.unpack_from(self._mm, self._slot_offset(i))
+                if slot_digest == digest and expires > now:
+                    if only_if_absent:
+                        return False
+                    target = i
+                    break
+                # Otherwise prefer an empty or expired slot, then the one expiring first.
+                if expires < target_expires:
+                    target, target_expires = i, expires
+            self._write(self._slot_offset(target), digest, now + ttl, value)
+        return True
+
+    def set(self, key: str, value: bytes, ttl: float) -> bool:
+        return self._store(key, value, ttl, only_if_absent=False)
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return self._store(key, value, ttl, only_if_absent=True)
+
+    def delete(self, key: str) -> None:
+        digest = _digest(key)
+        first = self._group(digest) * GROUP_SLOTS
+        with self._locked(self._slot_offset(first), GROUP_SLOTS * self.slot_bytes):
+            for i in range(first, first + GROUP_SLOTS):
+                offset = self._slot_offset(i)
+                if SLOT.unpack_from(self._mm, offset)[1] == digest:
+                    self._write(offset, digest, 0.0, b"")
+
+    def take(self, bucket: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        digest = _digest(bucket)
+        offset = HEADER_BYTES + int.from_bytes(digest[:8], "little") % BUCKETS * BUCKET_BYTES
+        now = time.time()
+        with self._locked(offset, BUCKET_BYTES):
+            name, tokens, updated = BUCKET.unpack_from(self._mm, offset)
+            if name != digest:
+                tokens, updated = burst, now
+            tokens = _refill(tokens, updated, now, rate, burst)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            BUCKET.pack_into(self._mm, offset, digest, tokens - cost if not wait else tokens, now)
+        return wait
+
+
+class _RangeLock:
+    """Exclusive lock on a byte range, across processes and threads."""
+
+    __slots__ = ("fd", "offset", "length", "thread_lock")
+
+    def __init__(self, fd: int, offset: int, length: int, thread_lock: threading.Lock) -> None:
+        self.fd, self.offset, self.length, self.thread_lock = fd, offset, length, thread_lock
+
+    def __enter__(self) -> None:
+        # POSIX record locks are per process, so threads need their own.
+        self.thread_lock.acquire()
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, self.length, self.offset)
+
+    def __exit__(self, *exc: object) -> None:
+        fcntl.lockf(self.fd, fcntl.LOCK_UN, self.length, self.offset)
+        self.thread_lock.release()
+
+
+# ── Redis ────────────────────────────────────────────────
+
+# KEYS[1] = bucket; ARGV = rate, burst, cost. Returns the wait in ms.
+_TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return math.ceil(wait * 1000)
+"""
+
+
+class RedisState(SharedState):
+    """The shared API on a Redis server (keys are prefixed ``darkguard:``)."""
+
+    prefix = "darkguard:"
+
+    def __init__(self, url: str) -> None:
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImproperlyConfigured(
+                "SHARED_STATE_BACKEND=redis needs the redis package (pip install redis)."
+            ) from exc
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+
+    def get(self, key: str) -> bytes | None:
+        return self._redis.get(self.prefix + key)  # type: ignore[no-any-return]
+
+    def set(self, key: str, value: bytes, ttl: float) -> bool:
+        self._redis.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+        return True
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        return bool(self._redis.set(self.prefix + key, value, px=max(1, int(ttl * 1000)), nx=True))
+
+    def delete(self, key: str) -> None:
+        self._redis.delete(self.prefix + key)
+
+    def take(self, bucket: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        return int(self._take(keys=[self.prefix + "bucket:" + bucket], args=[rate, burst, cost])) / 1000
+
+
+def get_shared_state() -> SharedState | None:
+    """This process's handle on the configured store, or None when it is off."""
+    global _state, _state_config  # noqa: PLW0603
+    backend = _get_backend()
+    if not backend:
+        return None
+    config: tuple[object, ...]
+    if backend == "mmap":
+        config = (backend, _get_path(), _get_slots(), _get_slot_bytes())
+    elif backend == "redis":
+        config = (backend, _get_redis_url())
+    elif backend == "local":
+        config = (backend,)
+    else:
+        raise ImproperlyConfigured(f"Unknown SHARED_STATE_BACKEND {backend!r}")
+    with _state_lock:
+        if _state is None or _state_config != config:
+            if backend == "mmap":
+                _state = MmapState(_get_path(), _get_slots(), _get_slot_bytes())
+            elif backend == "redis":
+                _state = RedisState(_get_redis_url())
+            else:
+                _state = LocalState()
+            _state_config = config
+        return _state
+
+
+# ── Uses ─────────────────────────────────────────────────
+
+
+async def wait_for_token(bucket: str = "llm") -> None:
+    """Wait until the host-wide LLM rate limit allows one more call."""
+    rate = _get_llm_rate()
+    state = get_shared_state()
+    if rate <= 0 or state is None:
+        return
+    while (wait := state.take(bucket, rate, max(1.0, _get_llm_burst()))) > 0:
+        await asyncio.sleep(min(wait, 1.0))
+
+
+def skip_shared_cache(reason: str) -> None:
+    """
+    Keep the running analysis' result out of the shared cache.
+
+    Called when a result is degraded, e.g. an LLM call failed and the
+    analyzer fell back to heuristics: caching it would serve the fallback
+    to every worker for SHARED_CACHE_TTL_SECONDS.
+    """
+    reasons = _uncacheable.get()
+    if reasons is not None:
+        reasons.append(reason)
+
+
+def _encode(detections: list[Detection]) -> bytes:
+    return zlib.compress(json.dumps([asdict(d) for d in detections]).encode())
+
+
+def _detections(rows: bytes) -> list[Detection]:
+    return [Detection(**row) for row in json.loads(zlib.decompress(rows))]
+
+
+async def cached_analysis(
+    key: str,
+    analyze: Callable[[], Awaitable[list[Detection]]],
+    lease_seconds: float,
+    poll_seconds: float = 0.05,
+) -> list[Detection]:
+    """
+    Serve ``key`` from the shared cache, or run ``analyze`` once per host.
+
+    The first worker to lease ``key`` runs the analysis and caches its
+    result; other workers poll the cache until it appears. If the leader's
+    lease lapses without a result (it failed, died or its result was
+    degraded), they run it themselves. A result too large for a slot is
+    marked as such, and later requests for it skip the lease and rely on
+    per-process coalescing.
+    """
+    state = get_shared_state()
+    if state is None:
+        return await analyze()
+    result_key, lease_key = f"result:{key}", f"lease:{key}"
+
+    cached = state.get(result_key)
+    if cached == TOO_LARGE:
+        return await analyze()
+    if cached is not None:
+        diagnostics.set_cache("hit")
+        return _detections(cached)
+    if not state.add(lease_key, str(os.getpid()).encode(), lease_seconds):
+        # Another worker is running it: wait for its result.
+        while cached is None and state.get(lease_key) is not None:
+            await asyncio.sleep(poll_seconds)
+            cached = state.get(result_key)
+        if cached is None:
+            cached = state.get(result_key)
+        if cached is None or cached == TOO_LARGE:
+            return await analyze()
+        diagnostics.set_cache("shared")
+        return _detections(cached)
+
+    reasons: list[str] = []
+    token = _uncacheable.set(reasons)
+    try:
+        detections = await analyze()
+        if reasons:
+            logger.info("Not caching %s: %s", key, "; ".join(reasons))
+        elif not state.set(result_key, _encode(detections), _get_result_ttl()):
+            logger.warning(
+                "Result for %s does not fit SHARED_STATE_SLOT_BYTES; coalescing it per process only",
+                key,
+            )
+            state.set(result_key, TOO_LARGE, _get_result_ttl())
+        return detections
+    finally:
+        _uncacheable.reset(token)
+        state.delete(lease_key)
@@ -0,0 +1,416 @@
+"""
+core/site_profiles.py — Per-site profiles learned from past analyses.
+
+Large retailers and consent-management platforms render the same banners
+and buttons on every page. A ``SiteProfile``, keyed by the origin of
+``dom_metadata.url``, remembers what previous requests already established:
+
+- known-benign ``(selector, category)`` pairs, dismissed as false positives
+  by users; these detections are dropped. Feedback is unauthenticated, so
+  one verdict is only a vote: a pair is suppressed once
+  ``SITE_PROFILE_SUPPRESS_VOTES`` distinct clients (remote addresses) flagged
+  it and at least ``SITE_PROFILE_SUPPRESS_RATIO`` of the clients that judged
+  it did. Votes
+  expire after ``SITE_PROFILE_VOTE_DAYS``, which lifts the suppression again
+- known dark-pattern pairs, corroborated by 2+ analyzers or confirmed by
+  users; their confidence is floored at the best one seen
+- layout fingerprints, with the results of analyzers whose output depends
+  only on the layout. Once a layout has been seen ``LAYOUT_STABLE_HITS``
+  times, the visual analyzer reuses its recorded detections instead of
+  calling the LLM again
+
+The dispatcher consults the profile once per request and updates it from
+the merged results; user feedback updates it incrementally too.
+Memory is bounded (LRU over sites, and over selectors and layouts within a
+site), and the store can be persisted as a JSON snapshot
+(``SITE_PROFILE_PATH``) that is reloaded on startup and written on exit.
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from core.executor import DetectionRow
+from core.models import Detection
+from core.page import PageModel
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 2
+
+# Per-site bounds
+MAX_SELECTORS_PER_SITE = 512
+MAX_LAYOUTS_PER_SITE = 32
+# Latest verdicts kept per (selector, category)
+MAX_VOTES_PER_PATTERN = 64
+
+# A layout must be seen this many times before cached results are reused.
+LAYOUT_STABLE_HITS = 2
+
+# Geometry is rounded to this grid so sub-pixel reflows keep the fingerprint.
+FINGERPRINT_GRID_PX = 8
+
+BENIGN_FEEDBACK = frozenset({"false_positive"})
+CONFIRMED_FEEDBACK = frozenset({"confirmed"})
+
+PatternKey = tuple[str, str]
+"""``(element_selector, category)``"""
+
+
+def _get_max_sites() -> int:
+    """Max number of site profiles kept in memory (default: 1000)."""
+    return max(1, int(getattr(settings, "SITE_PROFILE_MAX_SITES", 1000)))
+
+
+def _get_snapshot_path() -> str:
+    """File the store is persisted to ("" = memory only)."""
+    return str(getattr(settings, "SITE_PROFILE_PATH", ""))
+
+
+def _get_snapshot_interval() -> float:
+    """Min seconds between snapshot writes (default: 60)."""
+    return float(getattr(settings, "SITE_PROFILE_SNAPSHOT_SECONDS", 60))
+
+
+def _get_suppress_votes() -> int:
+    """Distinct clients that must flag a pair before it is dropped (default: 3)."""
+    return max(1, int(getattr(settings, "SITE_PROFILE_SUPPRESS_VOTES", 3)))
+
+
+def _get_suppress_ratio() -> float:
+    """Min share of a pair's voters that flagged it (default: 0.8)."""
+    return float(getattr(settings, "SITE_PROFILE_SUPPRESS_RATIO", 0.8))
+
+
+def _get_vote_ttl() -> float:
+    """Seconds a verdict counts towards suppression (default: 30 days)."""
+    return float(getattr(settings, "SITE_PROFILE_VOTE_DAYS", 30)) * 86400
+
+
+def site_profiles_enabled() -> bool:
+    """Whether the dispatcher consults and updates site profiles."""
+    return bool(getattr(settings, "SITE_PROFILES_ENABLED", True))
+
+
+def origin_of(url: str) -> str:
+    """``scheme://host[:port]`` of a URL, or "" if it has none."""
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return ""
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+
+
+def layout_fingerprint(page: PageModel) -> str:
+    """Stable hash of the page's elements, their text, styles and coarse geometry."""
+    g = FINGERPRINT_GRID_PX
+    digest = hashlib.blake2b(digest_size=16)
+    for el in sorted(page.elements, key=lambda e: e.selector):
+        style = el.parsed_styles
+        digest.update(
+            repr((
+                el.selector, el.tag_name, el.text_content, sorted(el.sources),
+                round(el.x / g), round(el.y / g), round(el.width / g), round(el.height / g),
+                style.color, style.background_color, round(style.opacity, 2),
+            )).encode()
+        )
+    return digest.hexdigest()
+
+
+def voter_id(client: str) -> str:
+    """Short hash of a client identifier; raw identifiers are never stored."""
+    return hashlib.blake2b(client.encode(), digest_size=8).hexdigest()
+
+
+def _rows(detections: Iterable[Detection]) -> tuple[DetectionRow, ...]:
+    return tuple(
+        (d.category, d.element_selector, d.confidence, d.explanation,
+         d.severity, False, None)
+        for d in detections
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class SiteProfile:
+    """Read-only snapshot of what is known about one origin."""
+
+    origin: str
+    benign: frozenset[PatternKey]
+    dark: Mapping[PatternKey, float]
+    """Known dark pattern → best confidence seen."""
+
+    def apply(self, detections: list[Detection]) -> list[Detection]:
+        """Drop known-benign detections and floor known dark ones' confidence."""
+        kept: list[Detection] = []
+        for det in detections:
+            key = (det.element_selector, det.category)
+            if key in self.benign:
+                continue
+            floor = self.dark.get(key)
+            if floor is not None and floor > det.confidence:
+                det.confidence = floor
+            kept.append(det)
+        return kept
+
+
+@dataclass
+class _Layout:
+    hits: int = 0
+    results: dict[str, tuple[DetectionRow, ...]] = field(default_factory=dict)
+
+
+Votes = OrderedDict[str, tuple[bool, float]]
+"""Voter → (flagged as benign, wall-clock time of the verdict)"""
+
+
+def _suppressed(votes: Votes, since: float) -> bool:
+    recent = [benign for benign, at in votes.values() if at > since]
+    flagged = sum(recent)
+    return flagged >= _get_suppress_votes() and flagged >= _get_suppress_ratio() * len(recent)
+
+
+@dataclass
+class _Site:
+    """Mutable per-site record; only touched under the store lock."""
+
+    votes: OrderedDict[PatternKey, Votes] = field(default_factory=OrderedDict)
+    dark: OrderedDict[PatternKey, float] = field(default_factory=OrderedDict)
+    layouts: OrderedDict[str, _Layout] = field(default_factory=OrderedDict)
+    snapshot: SiteProfile | None = None
+    # Wall-clock time at which the oldest counted vote expires.
+    snapshot_expires: float = float("inf")
+
+    def freeze(self, origin: str) -> SiteProfile:
+        now = time.time()
+        if self.snapshot is None or now >= self.snapshot_expires:
+            ttl = _get_vote_ttl()
+            since = now - ttl
+            self.snapshot = SiteProfile(
+                origin=origin,
+                benign=frozenset(key for key, votes in self.votes.items() if _suppressed(votes, since)),
+                dark=MappingProxyType(dict(self.dark)),
+            )
+            self.snapshot_expires = min(
+                (at + ttl for votes in self.votes.values() for _, at in votes.values() if at > since),
+                default=float("inf"),
+            )
+        return self.snapshot
+
+
+def _touch(mapping: OrderedDict, key: object, value: object, limit: int) -> None:  # type: ignore[type-arg]
+    mapping[key] = value
+    mapping.move_to_end(key)
+    while len(mapping) > limit:
+        mapping.popitem(last=False)
+
+
+class SiteProfileStore:
+    """Thread-safe, bounded, optionally file-backed store of site profiles."""
+
+    def __init__(self, path: str = "", max_sites: int = 1000) -> None:
+        self._lock = threading.Lock()
+        self._sites: OrderedDict[str, _Site] = OrderedDict()
+        self._path = path
+        self._max_sites = max_sites
+        self._dirty = False
+        self._last_save = time.monotonic()
+        if path:
+            self._load(path)
+
+    # ── Lookups ──────────────────────────────────────────
+
+    def get(self, origin: str) -> SiteProfile | None:
+        """Snapshot of a site's profile, or None if nothing is known yet."""
+        with self._lock:
+            site = self._sites.get(origin)
+            if site is None:
+                return None
+            self._sites.move_to_end(origin)
+            return site.freeze(origin)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sites)
+
+    # ── Updates ──────────────────────────────────────────
+
+    def record_analysis(self, origin: str, detections: Iterable[Detection]) -> None:
+        """Learn known dark patterns from one request's merged detections."""
+        corroborated = [d for d in detections if d.corroborated]
+        if not corroborated:
+            return
+        with self._lock:
+            site = self._site(origin)
+            for det in corroborated:
+                key = (det.element_selector, det.category)
+                best = max(det.confidence, site.dark.get(key, 0.0))
+                _touch(site.dark, key, best, MAX_SELECTORS_PER_SITE)
+            site.snapshot = None
+            self._dirty = True
+        self._maybe_save()
+
+    def observe_layout(self, origin: str, fingerprint: str, analyzer: str) -> list[Detection] | None:
+        """
+        Count one sighting of a layout; return the analyzer's recorded
+        detections (fresh copies) once the layout is stable, else None.
+        """
+        with self._lock:
+            site = self._site(origin)
+            layout = site.layouts.get(fingerprint) or _Layout()
+            layout.hits += 1
+            _touch(site.layouts, fingerprint, layout, MAX_LAYOUTS_PER_SITE)
+            self._dirty = True
+            rows = layout.results.get(analyzer)
+            if layout.hits <= LAYOUT_STABLE_HITS or rows is None:
+                return None
+        return [Detection(*row) for row in rows]  # type: ignore[arg-type]
+
+    def record_layout(
+        self, origin: str, fingerprint: str, analyzer: str, detections: Iterable[Detection]
+    ) -> None:
+        """Remember an analyzer's (successful) result for a layout."""
+        with self._lock:
+            site = self._site(origin)
+            layout = site.layouts.get(fingerprint) or _Layout()
+            layout.results[analyzer] = _rows(detections)
+            _touch(site.layouts, fingerprint, layout, MAX_LAYOUTS_PER_SITE)
+            self._dirty = True
+        self._maybe_save()
+
+    def record_feedback(
+        self, origin: str, selector: str, category: str, feedback: str, client: str = ""
+    ) -> None:
+        """
+        Count one client's verdict on a detection (see ``BENIGN_FEEDBACK``).
+        A client's later verdict on the same pair replaces its earlier one.
+        """
+        key = (selector, category)
+        verdict = feedback.strip().lower()
+        if verdict in BENIGN_FEEDBACK:
+            benign = True
+        elif verdict in CONFIRMED_FEEDBACK:
+            benign = False
+        else:
+            return
+        with self._lock:
+            site = self._site(origin)
+            votes = site.votes.get(key) or OrderedDict()
+            _touch(votes, voter_id(client), (benign, time.time()), MAX_VOTES_PER_PATTERN)
+            _touch(site.votes, key, votes, MAX_SELECTORS_PER_SITE)
+            if not benign:
+                _touch(site.dark, key, max(0.9, site.dark.get(key, 0.0)), MAX_SELECTORS_PER_SITE)
+            site.snapshot = None
+            self._dirty = True
+        self._maybe_save()
+
+    def _site(self, origin: str) -> _Site:
+        site = self._sites.get(origin)
+        if site is None:
+            site = _Site()
+        _touch(self._sites, origin, site, self._max_sites)
+        return site
+
+    # ── Snapshot ─────────────────────────────────────────
+
+    def _maybe_save(self) -> None:
+        if self._path and time.monotonic() - self._last_save >= _get_snapshot_interval():
+            self.save()
+
+    def save(self) -> None:
+        """Write the store to its snapshot file atomically (if it has one)."""
+        if not self._path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "version": SNAPSHOT_VERSION,
+                "sites": {
+                    origin: {
+                        "votes": [
+                            [*key, [[voter, benign, at] for voter, (benign, at) in votes.items()]]
+                            for key, votes in site.votes.items()
+                        ],
+                        "dark": [[*key, conf] for key, conf in site.dark.items()],
+                        "layouts": {
+                            fp: {"hits": layout.hits,
+                                 "results": {k: [list(r) for r in v] for k, v in layout.results.items()}}
+                            for fp, layout in site.layouts.items()
+                        },
+                    }
+                    for origin, site in self._sites.items()
+                },
+            }
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+        directory = os.path.dirname(os.path.abspath(self._path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".site_profiles.")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self._path)
+        except OSError:
+            logger.exception("Could not write site profile snapshot to %s", self._path)
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def _load(self, path: str) -> None:
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.exception("Ignoring unreadable site profile snapshot %s", path)
+            return
+        if data.get("version") != SNAPSHOT_VERSION:
+            logger.warning("Ignoring site profile snapshot with version %r", data.get("version"))
+            return
+
+        for origin, raw in list(data.get("sites", {}).items())[-self._max_sites:]:
+            site = _Site()
+            for selector, category, votes in raw.get("votes", []):
+                site.votes[(selector, category)] = OrderedDict(
+                    (voter, (bool(benign), float(at))) for voter, benign, at in votes
+                )
+            for selector, category, conf in raw.get("dark", []):
+                site.dark[(selector, category)] = float(conf)
+            for fp, layout in raw.get("layouts", {}).items():
+                site.layouts[fp] = _Layout(
+                    hits=int(layout.get("hits", 0)),
+                    results={
+                        name: tuple(tuple(row) for row in rows)  # type: ignore[misc]
+                        for name, rows in layout.get("results", {}).items()
+                    },
+                )
+            self._sites[origin] = site
+        logger.info("Loaded %d site profiles from %s", len(self._sites), path)
+
+
+_store: SiteProfileStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SiteProfileStore:
+    """The process-wide store, created (and loaded) on first use."""
+    global _store  # noqa: PLW0603
+    with _store_lock:
+        if _store is None:
+            _store = SiteProfileStore(_get_snapshot_path(), _get_max_sites())
+            atexit.register(_store.save)
+        return _store
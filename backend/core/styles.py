@@ -0,0 +1,216 @@
+"""
+core/styles.py — Shared CSS computed-style value parsing.
+
+The collector sends computed styles as raw strings (``"rgb(153, 153, 153)"``,
+``"14px"``, ``"0.6"``). Pages reuse a handful of distinct values across
+thousands of elements, so every parser here is memoized with an LRU cache:
+each distinct string is parsed once per process, not once per element per rule.
+
+Colors are normalized to ``(r, g, b, a)`` with channels in 0–255 and alpha
+in 0–1. Lengths are normalized to CSS pixels.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+RGBA = tuple[float, float, float, float]
+
+# Browsers report computed colors as rgb()/rgba(); hex and names only show up
+# in hand-written payloads (tests, API clients), so the table stays small.
+NAMED_COLORS: dict[str, RGBA] = {
+    "transparent": (0.0, 0.0, 0.0, 0.0),
+    "black": (0.0, 0.0, 0.0, 1.0),
+    "white": (255.0, 255.0, 255.0, 1.0),
+    "red": (255.0, 0.0, 0.0, 1.0),
+    "green": (0.0, 128.0, 0.0, 1.0),
+    "blue": (0.0, 0.0, 255.0, 1.0),
+    "yellow": (255.0, 255.0, 0.0, 1.0),
+    "orange": (255.0, 165.0, 0.0, 1.0),
+    "purple": (128.0, 0.0, 128.0, 1.0),
+    "gray": (128.0, 128.0, 128.0, 1.0),
+    "grey": (128.0, 128.0, 128.0, 1.0),
+    "silver": (192.0, 192.0, 192.0, 1.0),
+    "lightgray": (211.0, 211.0, 211.0, 1.0),
+    "lightgrey": (211.0, 211.0, 211.0, 1.0),
+    "darkgray": (169.0, 169.0, 169.0, 1.0),
+    "darkgrey": (169.0, 169.0, 169.0, 1.0),
+    "gainsboro": (220.0, 220.0, 220.0, 1.0),
+    "whitesmoke": (245.0, 245.0, 245.0, 1.0),
+    "maroon": (128.0, 0.0, 0.0, 1.0),
+    "navy": (0.0, 0.0, 128.0, 1.0),
+    "olive": (128.0, 128.0, 0.0, 1.0),
+    "teal": (0.0, 128.0, 128.0, 1.0),
+    "lime": (0.0, 255.0, 0.0, 1.0),
+    "aqua": (0.0, 255.0, 255.0, 1.0),
+    "cyan": (0.0, 255.0, 255.0, 1.0),
+    "fuchsia": (255.0, 0.0, 255.0, 1.0),
+    "magenta": (255.0, 0.0, 255.0, 1.0),
+}
+
+_FUNC_COLOR_RE = re.compile(r"^rgba?\(\s*([^)]*)\)$", re.IGNORECASE)
+_LENGTH_RE = re.compile(r"^(-?\d*\.?\d+)\s*(px|pt|em|rem|%)?$", re.IGNORECASE)
+
+# Relative units resolve against the browser default font size.
+_BASE_FONT_SIZE_PX = 16.0
+_UNIT_TO_PX: dict[str, float] = {
+    "px": 1.0,
+    "": 1.0,
+    "pt": 96.0 / 72.0,
+    "em": _BASE_FONT_SIZE_PX,
+    "rem": _BASE_FONT_SIZE_PX,
+    "%": _BASE_FONT_SIZE_PX / 100.0,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class ParsedStyles:
+    """Numeric view of a ComputedStyleSerializer dict."""
+
+    color: RGBA | None
+    background_color: RGBA | None
+    font_size_px: float | None
+    opacity: float
+
+    @property
+    def contrast_ratio(self) -> float | None:
+        """WCAG contrast of text over its own background, if both are opaque."""
+        if self.color is None or self.background_color is None:
+            return None
+        # A transparent background inherits from an ancestor we never see.
+        if self.background_color[3] < 1.0:
+            return None
+        return contrast_ratio(self.color, self.background_color)
+
+
+def _parse_channel(token: str) -> float:
+    if token.endswith("%"):
+        return float(token[:-1]) * 2.55
+    return float(token)
+
+
+def _parse_alpha(token: str) -> float:
+    if token.endswith("%"):
+        return float(token[:-1]) / 100.0
+    return float(token)
+
+
+def _parse_hex(value: str) -> RGBA | None:
+    digits = value[1:]
+    if len(digits) in (3, 4):
+        digits = "".join(ch * 2 for ch in digits)
+    if len(digits) not in (6, 8):
+        return None
+    try:
+        channels = [int(digits[i:i + 2], 16) for i in range(0, len(digits), 2)]
+    except ValueError:
+        return None
+    alpha = channels[3] / 255.0 if len(channels) == 4 else 1.0
+    return (float(channels[0]), float(channels[1]), float(channels[2]), alpha)
+
+
+@lru_cache(maxsize=1024)
+def parse_color(value: str) -> RGBA | None:
+    """
+    Parse a CSS color into ``(r, g, b, a)``.
+
+    Supports ``rgb()``/``rgba()`` (comma or space separated, with optional
+    ``/ alpha``), 3/4/6/8-digit hex, and common named colors.
+
+    Returns:
+        The normalized tuple, or None if the value is not understood.
+    """
+    text = value.strip().lower()
+    if not text:
+        return None
+    if text.startswith("#"):
+        return _parse_hex(text)
+    if text in NAMED_COLORS:
+        return NAMED_COLORS[text]
+
+    match = _FUNC_COLOR_RE.match(text)
+    if not match:
+        return None
+
+    tokens = match.group(1).replace(",", " ").replace("/", " ").split()
+    if len(tokens) not in (3, 4):
+        return None
+    try:
+        r, g, b = (min(max(_parse_channel(t), 0.0), 255.0) for t in tokens[:3])
+        a = _parse_alpha(tokens[3]) if len(tokens) == 4 else 1.0
+    except ValueError:
+        return None
+    return (r, g, b, min(max(a, 0.0), 1.0))
+
+
+@lru_cache(maxsize=256)
+def parse_length(value: str) -> float | None:
+    """
+    Parse a CSS length (``px``, ``pt``, ``em``, ``rem``, ``%``) into pixels.
+
+    Relative units resolve against a 16px base. Returns None if unparseable.
+    """
+    match = _LENGTH_RE.match(value.strip())
+    if not match:
+        return None
+    unit = (match.group(2) or "").lower()
+    return float(match.group(1)) * _UNIT_TO_PX[unit]
+
+
+@lru_cache(maxsize=128)
+def parse_opacity(value: str) -> float:
+    """Parse a CSS opacity, clamped to 0–1. Unparseable values count as opaque."""
+    try:
+        return min(max(_parse_alpha(value.strip()), 0.0), 1.0)
+    except ValueError:
+        return 1.0
+
+
+def _linear_channel(channel: float) -> float:
+    c = channel / 255.0
+    return c / 12.92 if c <= 0.03928 else ((c + 0.055) / 1.055) ** 2.4
+
+
+def relative_luminance(color: RGBA) -> float:
+    """WCAG 2.x relative luminance of an sRGB color (alpha ignored)."""
+    r, g, b, _ = color
+    return (
+        0.2126 * _linear_channel(r)
+        + 0.7152 * _linear_channel(g)
+        + 0.0722 * _linear_channel(b)
+    )
+
+
+@lru_cache(maxsize=1024)
+def contrast_ratio(foreground: RGBA, background: RGBA) -> float:
+    """
+    WCAG contrast ratio (1–21) between two colors.
+
+    A translucent foreground is composited over the background first.
+    """
+    alpha = foreground[3]
+    if alpha < 1.0:
+        foreground = (
+            foreground[0] * alpha + background[0] * (1 - alpha),
+            foreground[1] * alpha + background[1] * (1 - alpha),
+            foreground[2] * alpha + background[2] * (1 - alpha),
+            1.0,
+        )
+    lighter, darker = sorted(
+        (relative_luminance(foreground), relative_luminance(background)),
+        reverse=True,
+    )
+    return (lighter + 0.05) / (darker + 0.05)
+
+
+def parse_styles(styles: dict[str, object]) -> ParsedStyles:
+    """Parse the numeric fields of a computed-styles dict."""
+    font_size = styles.get("font_size")
+    return ParsedStyles(
+        color=parse_color(str(styles.get("color", ""))),
+        background_color=parse_color(str(styles.get("background_color", ""))),
+        font_size_px=parse_length(font_size) if isinstance(font_size, str) else None,
+        opacity=parse_opacity(str(styles.get("opacity", "1"))),
+    )
@@ -0,0 +1,168 @@
+"""Tests for confidence calibration from user feedback."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+from pathlib import Path
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.test import override_settings
+
+from core.calibration import SCHEMA_VERSION, Calibrator, fit, get_calibrator
+from core.dispatcher import dispatch
+from core.feedback import FeedbackWriter
+from core.interfaces import BaseAnalyzer
+from core.models import Detection
+from core.page import PageModel
+
+
+def _det(category: str = "misdirection", confidence: float = 0.7, **sources: float) -> Detection:
+    return Detection(
+        category=category,
+        element_selector="#x",
+        confidence=confidence,
+        explanation="test",
+        severity="medium",
+        sources=sources or {"dom": confidence},
+    )
+
+
+def _synthetic_feedback(n: int = 400) -> dict[str, list]:  # type: ignore[type-arg]
+    """Visual-only detections are mostly wrong; DOM-backed ones mostly right."""
+    rng = random.Random(7)
+    rows: dict[str, list] = {  # type: ignore[type-arg]
+        "confidences": [], "sources": [], "categories": [], "corroborated": [], "labels": [],
+    }
+    for i in range(n):
+        conf = rng.choice([0.6, 0.7, 0.85])
+        if i % 2:
+            src, label = {"visual": conf}, rng.random() < 0.15
+        else:
+            src, label = {"dom": conf}, rng.random() < 0.9
+        rows["confidences"].append(conf)
+        rows["sources"].append(src)
+        rows["categories"].append("misdirection")
+        rows["corroborated"].append(False)
+        rows["labels"].append(label)
+    return rows
+
+
+def _fitted(threshold: float = 0.0) -> Calibrator:
+    rows = _synthetic_feedback()
+    return fit(
+        rows["confidences"], rows["sources"], rows["categories"], rows["corroborated"],
+        rows["labels"], model_version="test", threshold=threshold,
+    )
+
+
+class TestFit:
+    def test_learns_per_analyzer_reliability(self) -> None:
+        calibrator = _fitted()
+        dom, visual = calibrator.predict([_det(dom=0.7), _det(visual=0.7)])
+        assert dom > 0.75
+        assert visual < 0.3
+
+    def test_threshold_drops_unlikely_detections(self) -> None:
+        kept = _fitted(threshold=0.5).apply([_det(dom=0.7), _det(visual=0.7)])
+        assert [d.sources for d in kept] == [{"dom": 0.7}]
+        assert 0.0 <= kept[0].confidence <= 1.0
+
+    def test_unknown_analyzers_and_categories_are_tolerated(self) -> None:
+        [p] = _fitted().predict([_det("hidden_costs", 0.9, review=0.9)])
+        assert 0.0 < p < 1.0
+
+
+class TestPersistence:
+    def test_round_trip(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "calibration.json")
+        calibrator = _fitted()
+        calibrator.save(path)
+        loaded = Calibrator.load(path)
+        assert loaded.model_version == "test"
+        assert list(loaded.predict([_det()])) == list(calibrator.predict([_det()]))
+
+    def test_rejects_other_schema_versions(self) -> None:
+        with pytest.raises(ValueError, match="schema version"):
+            Calibrator.from_dict({"version": SCHEMA_VERSION + 1, "weights": {}})
+
+    def test_get_calibrator_reloads_and_ignores_bad_files(self, tmp_path: Path) -> None:
+        path = tmp_path / "calibration.json"
+        with override_settings(CALIBRATION_PATH=str(path)):
+            assert get_calibrator() is None  # no file yet
+            path.write_text(json.dumps({"version": 99}))
+            assert get_calibrator() is None
+            _fitted().save(str(path))
+            calibrator = get_calibrator()
+            assert calibrator is not None and calibrator.model_version == "test"
+            assert get_calibrator() is calibrator  # cached until the file changes
+
+
+class _FixedAnalyzer(BaseAnalyzer):
+    def __init__(self, detection: Detection) -> None:
+        self._detection = detection
+
+    async def analyze(self, payload: dict[str, object], page: PageModel | None = None) -> list[Detection]:
+        return [self._detection]
+
+
+class TestDispatcherCalibration:
+    def test_dispatch_applies_the_model(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "calibration.json")
+        _fitted(threshold=0.5).save(path)
+        analyzers = {
+            "dom": _FixedAnalyzer(Detection("misdirection", "#a", 0.7, "x", "medium")),
+            "visual": _FixedAnalyzer(Detection("misdirection", "#b", 0.7, "x", "medium")),
+        }
+        with override_settings(CALIBRATION_PATH=path):
+            detections = asyncio.run(dispatch(analyzers, {}))  # type: ignore[arg-type]
+        assert [d.element_selector for d in detections] == ["#a"]
+        assert detections[0].confidence > 0.75
+
+
+class TestFitCommand:
+    def test_fits_from_feedback_store(self, tmp_path: Path) -> None:
+        rows = _synthetic_feedback(200)
+        writer = FeedbackWriter(str(tmp_path / "feedback"))
+        writer.append(
+            {
+                "category": cat, "element_selector": "#x", "confidence": conf,
+                "severity": "medium", "corroborated": corr, "sources": src,
+                "user_feedback": "confirmed" if label else "false_positive",
+            }
+            for conf, src, cat, corr, label in zip(
+                rows["confidences"], rows["sources"], rows["categories"],
+                rows["corroborated"], rows["labels"],
+            )
+        )
+        writer.close()
+
+        output = tmp_path / "calibration.json"
+        call_command("fit_calibration", feedback_dir=str(tmp_path / "feedback"), output=str(output))
+        calibrator = Calibrator.load(str(output))
+        assert calibrator.weights["score:dom"] > calibrator.weights["score:visual"]
+
+    def test_fits_on_raw_not_shown_confidence(self, tmp_path: Path) -> None:
+        # Users were shown a calibrated 0.95 for everything; only the raw
+        # confidence tells confirmed detections from false positives.
+        rng = random.Random(3)
+        writer = FeedbackWriter(str(tmp_path / "feedback"))
+        for _ in range(200):
+            raw = rng.choice([0.3, 0.9])
+            writer.append([{
+                "category": "misdirection", "element_selector": "#x", "confidence": 0.95,
+                "raw_confidence": raw, "severity": "medium", "corroborated": False, "sources": {},
+                "user_feedback": "confirmed" if rng.random() < raw else "false_positive",
+            }])
+        writer.close()
+
+        output = tmp_path / "calibration.json"
+        call_command("fit_calibration", feedback_dir=str(tmp_path / "feedback"), output=str(output))
+        calibrator = Calibrator.load(str(output))
+        assert calibrator.predict([_det(confidence=0.9)])[0] > calibrator.predict([_det(confidence=0.3)])[0] + 0.2
+
+    def test_refuses_too_little_feedback(self, tmp_path: Path) -> None:
+        with pytest.raises(CommandError, match="feedback events"):
+            call_command("fit_calibration", feedback_dir=str(tmp_path), output=str(tmp_path / "c.json"))
@@ -0,0 +1,128 @@
+"""Tests for geometric cross-analyzer corroboration."""
+
+from __future__ import annotations
+
+import asyncio
+
+from core.corroboration import SelectorResolver, corroborate
+from core.dispatcher import dispatch
+from core.interfaces import BaseAnalyzer
+from core.models import Detection
+from core.page import PageModel
+
+
+def _element(selector: str, x: float, y: float, w: float, h: float, **attrs: str) -> dict[str, object]:
+    return {
+        "selector": selector,
+        "tag_name": "button",
+        "text_content": "",
+        "attributes": attrs,
+        "bounding_rect": {"x": x, "y": y, "width": w, "height": h},
+        "computed_styles": {},
+    }
+
+
+def _banner_payload() -> dict[str, object]:
+    """A consent banner above two reviews; unlike the warmup page, it needs nested selectors."""
+    return {
+        "dom_metadata": {
+            "interactive_elements": [
+                _element("div.banner > button:nth-of-type(2)", 100, 600, 80, 20, id="decline"),
+                _element("#accept", 300, 600, 300, 60),
+                _element("#review-1", 0, 2000, 600, 100, itemprop="reviewBody"),
+                _element("#review-2", 0, 2120, 600, 100, itemprop="reviewBody"),
+            ],
+            "hidden_elements": [],
+            "prechecked_inputs": [],
+        },
+    }
+
+
+def _det(selector: str, category: str = "misdirection", confidence: float = 0.6) -> Detection:
+    return Detection(
+        category=category,
+        element_selector=selector,
+        confidence=confidence,
+        explanation="test",
+        severity="low",
+    )
+
+
+class TestSelectorResolver:
+    """Selectors in different styles resolve to the same element."""
+
+    def test_id_and_attribute_selectors_resolve(self) -> None:
+        resolver = SelectorResolver(PageModel.from_payload(_banner_payload()))
+
+        key, box = resolver.resolve("button#decline")
+        assert key == "div.banner > button:nth-of-type(2)"
+        assert box is not None and box.area == 80 * 20
+
+        key, box = resolver.resolve('[itemprop="reviewBody"]')
+        assert key == "[itemprop='reviewBody']"
+        assert box is not None and (box.y0, box.y1) == (2000, 2220)
+
+    def test_unknown_selector_has_no_box(self) -> None:
+        resolver = SelectorResolver(PageModel.from_payload(_banner_payload()))
+
+        assert resolver.resolve(".nowhere") == (".nowhere", None)
+
+
+class TestCorroborate:
+    """Agreement is by overlap between different analyzers."""
+
+    def test_body_does_not_corroborate_every_element(self) -> None:
+        resolver = SelectorResolver(PageModel.from_payload(_banner_payload()))
+        text, visual = _det("body", "urgency_scarcity"), _det("#accept", "urgency_scarcity")
+
+        corroborate([("text", text), ("visual", visual)], resolver)
+
+        assert not (text.corroborated or visual.corroborated)
+
+    def test_body_hits_from_two_analyzers_agree(self) -> None:
+        resolver = SelectorResolver(PageModel.from_payload(_banner_payload()))
+        text, visual = _det("body", "urgency_scarcity"), _det("BODY", "urgency_scarcity")
+
+        corroborate([("text", text), ("visual", visual)], resolver)
+
+        assert text.corroborated and visual.corroborated
+
+    def test_same_analyzer_or_category_mismatch_does_not_count(self) -> None:
+        resolver = SelectorResolver(PageModel.from_payload(_banner_payload()))
+        a, b = _det("#accept"), _det("#accept")
+        c = _det("#accept", "visual_interference")
+
+        corroborate([("dom", a), ("dom", b), ("visual", c)], resolver)
+
+        assert not (a.corroborated or b.corroborated or c.corroborated)
+
+    def test_disjoint_elements_do_not_corroborate(self) -> None:
+        resolver = SelectorResolver(PageModel.from_payload(_banner_payload()))
+        a, b = _det("#accept"), _det("#decline")
+
+        corroborate([("dom", a), ("visual", b)], resolver)
+
+        assert not (a.corroborated or b.corroborated)
+
+
+class _Fixed(BaseAnalyzer):
+    def __init__(self, *detections: Detection) -> None:
+        self._detections = detections
+
+    async def analyze(
+        self, payload: dict[str, object], page: PageModel | None = None
+    ) -> list[Detection]:
+        return list(self._detections)
+
+
+def test_dispatch_merges_differently_written_selectors() -> None:
+    analyzers = {
+        "dom": _Fixed(_det("div.banner > button:nth-of-type(2)", confidence=0.7)),
+        "visual": _Fixed(_det("button#decline", confidence=0.9)),
+    }
+
+    results = asyncio.run(dispatch(analyzers, _banner_payload()))
+
+    assert len(results) == 1
+    assert results[0].confidence == 0.9
+    assert results[0].corroborated
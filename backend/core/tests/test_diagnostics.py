@@ -0,0 +1,157 @@
+"""Tests for the opt-in response diagnostics."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import Iterator
+from dataclasses import replace
+
+import pytest
+from django.test import Client, override_settings
+
+from benchmarks.fake_gemini import DEFAULT_RESPONSE, fake_gemini
+from core import diagnostics
+from core.dispatcher import dispatch
+from core.interfaces import BaseAnalyzer
+from core.models import Detection
+from core.page import PageModel
+from core.profiling import _NULL_SPAN, span
+from core.warmup import synthetic_request
+
+
+@pytest.fixture
+def client() -> Client:
+    return Client(HTTP_HOST="localhost")
+
+
+@pytest.fixture
+def gemini() -> Iterator[None]:
+    with fake_gemini([DEFAULT_RESPONSE]) as url:
+        with override_settings(GOOGLE_API_KEY="test-key", GEMINI_BASE_URL=url):
+            yield
+
+
+def _analyze(client: Client, query: str = "") -> dict[str, object]:
+    response = client.post(
+        f"/api/analyze{query}", json.dumps(synthetic_request()), content_type="application/json"
+    )
+    assert response.status_code == 200, response.content
+    return response.json()
+
+
+class _Analyzer(BaseAnalyzer):
+    payload_keys = ("url",)
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+
+    async def analyze(
+        self, payload: dict[str, object], page: PageModel | None = None
+    ) -> list[Detection]:
+        await asyncio.sleep(self.delay)
+        with span("stub:rule"):
+            return diagnostics.attribute([Detection("misdirection", "#cta", 0.6, "stub", "low")])
+
+
+class TestDiagnosticsResponse:
+    """``?diagnostics=1`` on POST /api/analyze."""
+
+    def test_absent_unless_requested(self, client: Client) -> None:
+        assert "diagnostics" not in _analyze(client)
+
+    def test_reports_analyzers_rules_and_sources(self, client: Client) -> None:
+        body = _analyze(client, "?diagnostics=1")
+        report = body["diagnostics"]
+
+        dom = report["analyzers"]["dom"]  # type: ignore[index]
+        assert dom["status"] == "ok"
+        assert dom["detections"] > 0
+        assert set(dom["rules"]) >= {"dom:prechecked_inputs", "dom:hidden_elements"}
+        assert report["analyzers"]["review"]["status"] == "skipped"  # type: ignore[index]
+        assert "page_model" in report["stages"]  # type: ignore[operator]
+
+        # One provenance entry per detection, in the same order.
+        assert len(report["detections"]) == len(body["detections"])  # type: ignore[arg-type]
+        for det, provenance in zip(body["detections"], report["detections"]):  # type: ignore[call-overload]
+            assert {s["analyzer"] for s in provenance["sources"]} == set(det["sources"])
+        by_category = {
+            det["category"]: provenance["sources"]
+            for det, provenance in zip(body["detections"], report["detections"])  # type: ignore[call-overload]
+        }
+        assert by_category["preselection"] == [
+            {"analyzer": "dom", "rule": "dom:prechecked_inputs", "confidence": 0.85}
+        ]
+
+    @override_settings(ENABLED_ANALYZERS=["dom", "text"])
+    def test_disabled_analyzers_are_listed_as_skipped(
+        self, client: Client, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr("core.analyzers._analyzers", None)
+        report = _analyze(client, "?diagnostics=1")["diagnostics"]
+
+        assert report["analyzers"]["visual"]["status"] == "skipped"  # type: ignore[index]
+        assert "ENABLED_ANALYZERS" in report["analyzers"]["visual"]["note"]  # type: ignore[index]
+
+    def test_llm_token_counts(self, client: Client, gemini: None) -> None:
+        report = _analyze(client, "?diagnostics=1")["diagnostics"]
+
+        usage = report["analyzers"]["visual"]["llm"]  # type: ignore[index]
+        assert usage["calls"] == 1
+        assert usage["prompt_tokens"] > 0 and usage["output_tokens"] > 0
+        assert usage["estimated"] is False
+
+    def test_llm_errors_are_counted(self, client: Client) -> None:
+        with fake_gemini([DEFAULT_RESPONSE], error_rate=1.0) as url:
+            with override_settings(GOOGLE_API_KEY="test-key", GEMINI_BASE_URL=url):
+                report = _analyze(client, "?diagnostics=1")["diagnostics"]
+
+        usage = report["analyzers"]["visual"]["llm"]  # type: ignore[index]
+        assert usage["errors"] >= 1
+        assert usage["calls"] == 0
+
+
+class TestDiagnosticsDispatch:
+    """Statuses and cache outcomes recorded by the dispatcher."""
+
+    @override_settings(ANALYZER_TIMEOUT=0.05)
+    def test_timeout_status(self) -> None:
+        with diagnostics.collecting() as report:
+            asyncio.run(dispatch({"slow": _Analyzer(delay=1)}, {"url": "https://example.com"}))
+
+        assert report.analyzers["slow"].status == "timeout"
+        assert report.analyzers["slow"].detections == 0
+
+    @override_settings(SHARED_STATE_BACKEND="local")
+    def test_shared_cache_hit(self) -> None:
+        analyzer = _Analyzer()
+        analyzer.uses_llm = True  # type: ignore[misc]
+        payload = {"url": "https://example.com/cached"}
+
+        with diagnostics.collecting() as first:
+            asyncio.run(dispatch({"llm": analyzer}, payload))
+        with diagnostics.collecting() as second:
+            asyncio.run(dispatch({"llm": analyzer}, payload))
+
+        assert first.analyzers["llm"].cache == "miss"
+        assert first.analyzers["llm"].rules.keys() == {"stub:rule"}
+        assert second.analyzers["llm"].cache == "hit"
+        assert second.analyzers["llm"].rules == {}
+
+    def test_off_by_default(self) -> None:
+        assert diagnostics.active() is None
+        assert span("anything") is _NULL_SPAN
+        asyncio.run(dispatch({"stub": _Analyzer()}, {"url": "https://example.com"}))
+        assert diagnostics.current() is None
+
+    def test_rules_are_attributed_to_the_detections_themselves(self) -> None:
+        with diagnostics.collecting() as report:
+            with diagnostics.analyzer("stub") as current:
+                with span("stub:rule"):
+                    det = diagnostics.attribute([Detection("misdirection", "#cta", 0.6, "stub", "low")])[0]
+                    copy = replace(det)  # copies made later are not attributed again
+
+        assert current is not None
+        assert current.rule_of(det) == "stub:rule"
+        assert current.rule_of(copy) is None
+        assert report.sources_of(det) == []
@@ -0,0 +1,141 @@
+"""Tests for the async dispatcher."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.test import override_settings
+
+from core.coalescing import SingleFlight
+from core.dispatcher import dispatch
+from core.executor import compact_payload, shutdown_process_pool
+from core.interfaces import BaseAnalyzer
+from core.models import Detection
+from core.page import PageModel
+from core.warmup import synthetic_request
+from dom_analyzer.service import DomAnalyzerService
+from text_analyzer.service import TextAnalyzerService
+
+
+def _run(coro: object) -> list[Detection]:
+    return asyncio.run(coro)  # type: ignore[arg-type]
+
+
+class TestProcessPoolOffload:
+    """Dispatcher behaviour for cpu_bound analyzers."""
+
+    @pytest.fixture(autouse=True)
+    def _stop_pool(self) -> Iterator[None]:
+        yield
+        shutdown_process_pool()
+
+    def test_compact_payload_only_ships_declared_keys(self) -> None:
+        compact = compact_payload(DomAnalyzerService(), synthetic_request())
+        assert sorted(compact) == ["dom_metadata", "text_content"]
+
+    def test_pool_results_match_inline(self) -> None:
+        analyzers = {"dom": DomAnalyzerService(), "text": TextAnalyzerService()}
+
+        inline = _run(dispatch(analyzers, synthetic_request()))
+        with override_settings(ANALYZER_PROCESS_WORKERS=1):
+            pooled = _run(dispatch(analyzers, synthetic_request()))
+
+        assert {("#newsletter", "preselection"), ("#decline", "confirmshaming")} <= {
+            (d.element_selector, d.category) for d in pooled
+        }
+        assert pooled == inline
+
+
+class _PageRecorder(BaseAnalyzer):
+    """Records the page model it was handed."""
+
+    def __init__(self) -> None:
+        self.pages: list[PageModel | None] = []
+
+    async def analyze(
+        self, payload: dict[str, object], page: PageModel | None = None
+    ) -> list[Detection]:
+        self.pages.append(page)
+        return []
+
+
+class TestSharedPageModel:
+    """The dispatcher indexes the payload once per request."""
+
+    def test_all_analyzers_share_one_page_model(self) -> None:
+        first, second = _PageRecorder(), _PageRecorder()
+        with override_settings(COALESCE_ANALYSES=False):
+            _run(dispatch({"a": first, "b": second}, synthetic_request()))
+
+        assert first.pages[0] is not None
+        assert first.pages[0] is second.pages[0]
+        assert "#newsletter" in first.pages[0]
+
+
+class _SlowAnalyzer(BaseAnalyzer):
+    """Counts real runs; sleeps so concurrent requests overlap."""
+
+    payload_keys = ("url",)
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    async def analyze(
+        self, payload: dict[str, object], page: PageModel | None = None
+    ) -> list[Detection]:
+        with self._lock:
+            self.calls += 1
+        await asyncio.sleep(0.2)
+        return [
+            Detection(
+                category="misdirection",
+                element_selector="#cta",
+                confidence=0.6,
+                explanation="slow",
+                severity="low",
+            )
+        ]
+
+
+class TestCoalescing:
+    """Single-flight behaviour across concurrent requests."""
+
+    def test_identical_concurrent_requests_share_one_run(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        flight = SingleFlight()
+        monkeypatch.setattr("core.dispatcher.in_flight_analyses", flight)
+        analyzer = _SlowAnalyzer()
+
+        def one_request(_: int) -> list[Detection]:
+            return _run(dispatch({"slow": analyzer}, {"url": "https://example.com"}))
+
+        with ThreadPoolExecutor(max_workers=4) as threads:
+            results = list(threads.map(one_request, range(4)))
+
+        assert analyzer.calls == 1
+        assert flight.stats() == {"leaders": 1, "coalesced": 3, "in_flight": 0}
+        assert all(r == results[0] for r in results)
+        # Each request owns its detections.
+        assert len({id(r[0]) for r in results}) == 4
+
+    def test_different_content_is_not_coalesced(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        flight = SingleFlight()
+        monkeypatch.setattr("core.dispatcher.in_flight_analyses", flight)
+        analyzer = _SlowAnalyzer()
+
+        def one_request(i: int) -> list[Detection]:
+            return _run(dispatch({"slow": analyzer}, {"url": f"https://example.com/{i}"}))
+
+        with ThreadPoolExecutor(max_workers=2) as threads:
+            list(threads.map(one_request, range(2)))
+
+        assert analyzer.calls == 2
+        assert flight.stats()["coalesced"] == 0
@@ -0,0 +1,170 @@
+"""Tests for the feedback endpoint and its append-only Arrow store."""
+
+from __future__ import annotations
+
+import json
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from django.test import Client, override_settings
+
+from core import feedback
+from core.feedback import FeedbackWriter, get_writer, load_feedback
+from core.site_profiles import get_store
+
+URL = "https://shop.example.com/checkout"
+
+
+def _event(**overrides: object) -> dict[str, object]:
+    event: dict[str, object] = {
+        "category": "confirmshaming",
+        "element_selector": "#decline",
+        "confidence": 0.85,
+        "severity": "medium",
+        "corroborated": True,
+        "sources": {"text": 0.85, "visual": 0.7},
+        "user_feedback": "false_positive",
+    }
+    event.update(overrides)
+    return event
+
+
+@pytest.fixture
+def client() -> Client:
+    return Client(HTTP_HOST="localhost")
+
+
+@pytest.fixture
+def writer(tmp_path: Path) -> Iterator[FeedbackWriter]:
+    w = FeedbackWriter(str(tmp_path))
+    yield w
+    w.close()
+
+
+def _disk_full(table: object, path: str) -> None:
+    raise OSError(28, "No space left on device")
+
+
+def _post(client: Client, body: dict[str, object], **extra: str) -> object:
+    return client.post("/api/feedback", json.dumps(body), content_type="application/json", **extra)
+
+
+class TestFeedbackEndpoint:
+    def test_accepts_and_stores_events(self, client: Client, tmp_path: Path) -> None:
+        with override_settings(FEEDBACK_DIR=str(tmp_path), FEEDBACK_FLUSH_SECONDS=60):
+            response = _post(client, {"url": URL, "events": [_event(), _event(category="misdirection")]})
+            assert response.status_code == 202  # type: ignore[attr-defined]
+            assert response.json() == {"accepted": 2}  # type: ignore[attr-defined]
+            assert os.listdir(tmp_path) == []  # nothing written during the request
+
+            get_writer().flush()  # type: ignore[union-attr]
+        table = load_feedback(str(tmp_path))
+        assert table.num_rows == 2
+        row = table.to_pylist()[0]
+        assert row["origin"] == "https://shop.example.com"
+        assert row["user_feedback"] == "false_positive"
+        assert dict(row["sources"]) == {"text": 0.85, "visual": 0.7}
+
+    def test_records_the_confidence_before_calibration(self, client: Client, tmp_path: Path) -> None:
+        # Shown at a site-floored 0.95; the analyzers themselves said 0.6 and 0.4.
+        event = _event(confidence=0.95, sources={"text": 0.6, "visual": 0.4})
+        with override_settings(FEEDBACK_DIR=str(tmp_path)):
+            _post(client, {"url": URL, "events": [event, _event(sources={})]})
+            get_writer().flush()  # type: ignore[union-attr]
+        assert load_feedback(str(tmp_path)).column("raw_confidence").to_pylist() == [0.6, None]
+
+    def test_updates_site_profile(self, client: Client) -> None:
+        for address in ("203.0.113.1", "203.0.113.2", "203.0.113.3"):
+            response = _post(client, {"url": URL, "events": [_event()]}, REMOTE_ADDR=address)
+            assert response.status_code == 202  # type: ignore[attr-defined]
+            assert response.json() == {"accepted": 0}  # type: ignore[attr-defined]  # storage disabled
+        profile = get_store().get("https://shop.example.com")
+        assert profile is not None
+        assert ("#decline", "confirmshaming") in profile.benign
+
+    def test_ids_in_the_body_do_not_add_voters(self, client: Client) -> None:
+        for client_id in ("made-up-1", "made-up-2", "made-up-3"):
+            _post(client, {"url": URL, "client_id": client_id, "events": [_event()]})
+        profile = get_store().get("https://shop.example.com")
+        assert profile is not None
+        assert ("#decline", "confirmshaming") not in profile.benign
+
+    def test_rejects_unknown_verdict(self, client: Client) -> None:
+        response = _post(client, {"url": URL, "events": [_event(user_feedback="maybe")]})
+        assert response.status_code == 400  # type: ignore[attr-defined]
+
+    def test_rejects_empty_events(self, client: Client) -> None:
+        response = _post(client, {"url": URL, "events": []})
+        assert response.status_code == 400  # type: ignore[attr-defined]
+
+
+class TestFeedbackWriter:
+    def test_flush_writes_one_segment_per_batch(self, writer: FeedbackWriter, tmp_path: Path) -> None:
+        assert writer.flush() is None  # empty buffer → no file
+        writer.append([_event(origin="o", url=URL)])
+        path = writer.flush()
+        assert path is not None and Path(path).name.startswith("segment-")
+        writer.append([_event(origin="o", url=URL)] * 3)
+        writer.flush()
+        assert load_feedback(str(tmp_path)).num_rows == 4
+
+    def test_compaction_merges_segments(self, writer: FeedbackWriter, tmp_path: Path) -> None:
+        with override_settings(FEEDBACK_COMPACT_SEGMENTS=3):
+            for i in range(3):
+                writer.append([_event(origin="o", url=URL, confidence=i / 10)])
+                writer.flush()
+            path = writer.compact()
+        assert path is not None
+        assert sorted(os.listdir(tmp_path)) == [Path(path).name]
+        assert load_feedback(str(tmp_path)).column("confidence").to_pylist() == [0.0, 0.1, 0.2]
+
+    def test_compaction_waits_for_enough_segments(self, writer: FeedbackWriter) -> None:
+        writer.append([_event(origin="o", url=URL)])
+        writer.flush()
+        assert writer.compact() is None
+
+    def test_buffer_is_bounded(self, writer: FeedbackWriter) -> None:
+        with override_settings(FEEDBACK_MAX_BUFFERED=2):
+            assert writer.append([_event(origin="o", url=URL)] * 5) == 2
+        assert writer.dropped == 3
+
+    def test_failed_flush_keeps_the_rows(
+        self, writer: FeedbackWriter, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        writer.append([_event(origin="o", url=URL)] * 2)
+        with monkeypatch.context() as patch:
+            patch.setattr(feedback, "_write_ipc", _disk_full)
+            with pytest.raises(OSError):
+                writer.flush()
+        writer.append([_event(origin="o", url=URL)])
+        writer.flush()
+        assert load_feedback(str(tmp_path)).num_rows == 3
+        assert writer.dropped == 0
+
+    def test_rows_kept_after_a_failed_flush_are_bounded(
+        self, writer: FeedbackWriter, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        writer.append([_event(origin="o", url=URL)] * 3)
+        with monkeypatch.context() as patch, override_settings(FEEDBACK_MAX_BUFFERED=2):
+            patch.setattr(feedback, "_write_ipc", _disk_full)
+            with pytest.raises(OSError):
+                writer.flush()
+        assert writer.dropped == 1
+
+    def test_load_without_segments_is_empty(self, tmp_path: Path) -> None:
+        table = load_feedback(str(tmp_path / "missing"))
+        assert table.num_rows == 0
+        assert "sources" in table.column_names
+
+    def test_segments_without_raw_confidence_still_load(self, writer: FeedbackWriter, tmp_path: Path) -> None:
+        import pyarrow as pa
+
+        old = pa.table({"category": ["misdirection"], "confidence": [0.7]})
+        with pa.OSFile(str(tmp_path / "segment-0-0-0.arrow"), "wb") as sink, pa.ipc.new_file(sink, old.schema) as w:
+            w.write_table(old)
+        writer.append([_event()])
+        writer.flush()
+
+        assert load_feedback(str(tmp_path)).column("raw_confidence").to_pylist() == [None, None]
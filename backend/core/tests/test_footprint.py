@@ -0,0 +1,41 @@
+"""Startup-time / memory budget check and the analyzer registry."""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+
+from core import analyzers
+
+BENCH = Path(__file__).resolve().parents[2] / "benchmarks" / "bench_footprint.py"
+
+
+@pytest.fixture(autouse=True)
+def _fresh_registry(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(analyzers, "_analyzers", None)
+
+
+class TestEnabledAnalyzers:
+    def test_only_enabled_analyzers_are_built(self) -> None:
+        with override_settings(ENABLED_ANALYZERS=["dom", "text"]):
+            assert list(analyzers.get_analyzers()) == ["dom", "text"]
+
+    def test_unknown_analyzer_is_a_configuration_error(self) -> None:
+        with override_settings(ENABLED_ANALYZERS=["dom", "ocr"]):
+            with pytest.raises(ImproperlyConfigured, match="ocr"):
+                analyzers.get_analyzers()
+
+
+@pytest.mark.benchmark
+def test_rules_only_profile_stays_within_budget() -> None:
+    """Fails when startup time or RSS of a rules-only worker grows past its budget."""
+    proc = subprocess.run(
+        [sys.executable, str(BENCH), "--profile", "darkguard.settings_rules_only"],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
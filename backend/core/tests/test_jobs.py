@@ -0,0 +1,145 @@
+"""Tests for the background job API and its SQLite queue."""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from django.test import Client, override_settings
+
+from benchmarks.fake_gemini import DEFAULT_RESPONSE, fake_gemini
+from core import jobs
+from core.jobs import JobStore, JobWorker, process_next
+from core.warmup import synthetic_request
+
+
+@pytest.fixture
+def client() -> Client:
+    return Client(HTTP_HOST="localhost")
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> Iterator[JobStore]:
+    path = str(tmp_path / "jobs.sqlite3")
+    with override_settings(JOB_DB_PATH=path):
+        store = jobs.get_store()
+        assert store is not None
+        yield store
+
+
+@pytest.fixture
+def gemini() -> Iterator[None]:
+    with fake_gemini([DEFAULT_RESPONSE]) as url:
+        with override_settings(GOOGLE_API_KEY="test-key", GEMINI_BASE_URL=url):
+            yield
+
+
+def _submit(client: Client) -> dict[str, object]:
+    response = client.post("/api/jobs", json.dumps(synthetic_request()), content_type="application/json")
+    assert response.status_code == 202, response.content
+    return response.json()
+
+
+def _keys(body: dict[str, object]) -> set[tuple[str, str]]:
+    return {(d["category"], d["element_selector"]) for d in body["detections"]}  # type: ignore[attr-defined]
+
+
+class TestJobAPI:
+    def test_submit_returns_rule_detections_and_queues_the_rest(
+        self, client: Client, store: JobStore, gemini: None
+    ) -> None:
+        body = _submit(client)
+
+        assert body["status"] == "queued"
+        assert ("confirmshaming", "#decline") in _keys(body)
+        assert ("misdirection", "#decline") not in _keys(body)
+
+    def test_worker_merges_llm_results(self, client: Client, store: JobStore, gemini: None) -> None:
+        job_id = _submit(client)["job_id"]
+
+        assert process_next(store)
+        body = client.get(f"/api/jobs/{job_id}").json()
+
+        assert body["status"] == "done"
+        keys = _keys(body)
+        assert ("confirmshaming", "#decline") in keys
+        assert ("misdirection", "#decline") in keys
+
+    def test_long_poll_returns_when_the_job_finishes(
+        self, client: Client, store: JobStore, gemini: None
+    ) -> None:
+        job_id = _submit(client)["job_id"]
+        worker = JobWorker(store)
+        worker.start()
+        try:
+            started = time.monotonic()
+            body = client.get(f"/api/jobs/{job_id}", {"wait": "10"}).json()
+        finally:
+            worker.stop()
+            worker.join()
+
+        assert body["status"] == "done"
+        assert time.monotonic() - started < 10
+
+    def test_rules_only_jobs_finish_at_submit(
+        self, client: Client, store: JobStore, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr("core.analyzers._analyzers", None)
+        with override_settings(ENABLED_ANALYZERS=["dom", "text"]):
+            response = client.post(
+                "/api/jobs", json.dumps(synthetic_request()), content_type="application/json"
+            )
+
+        monkeypatch.setattr("core.analyzers._analyzers", None)
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "done"
+        assert not process_next(store)
+
+    def test_unknown_job(self, client: Client, store: JobStore) -> None:
+        assert client.get("/api/jobs/nope").status_code == 404
+
+    def test_disabled(self, client: Client) -> None:
+        response = client.post("/api/jobs", json.dumps(synthetic_request()), content_type="application/json")
+        assert response.status_code == 503
+
+
+class TestQueue:
+    def test_expired_lease_is_claimed_again(self, client: Client, store: JobStore) -> None:
+        job_id = _submit(client)["job_id"]
+        with override_settings(JOB_LEASE_SECONDS=-1):
+            assert store.claim() is not None  # this worker "dies"
+
+        claimed = store.claim()
+
+        assert claimed is not None and claimed.id == job_id
+
+    def test_gives_up_after_max_attempts(self, client: Client, store: JobStore) -> None:
+        job_id = _submit(client)["job_id"]
+        with override_settings(JOB_LEASE_SECONDS=-1, JOB_MAX_ATTEMPTS=1):
+            assert store.claim() is not None
+            assert store.claim() is None
+
+        job = store.get(job_id)
+        assert job is not None and job.status == "failed"
+
+    def test_only_one_worker_claims_a_job(self, client: Client, store: JobStore) -> None:
+        for _ in range(5):
+            _submit(client)
+        claimed: list[str] = []
+
+        def claim_all() -> None:
+            while (job := store.claim()) is not None:
+                claimed.append(job.id)
+
+        threads = [threading.Thread(target=claim_all) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(claimed) == len(set(claimed)) == 5
@@ -0,0 +1,169 @@
+"""Tests for streamed LLM response parsing."""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+import pytest
+from django.test import override_settings
+
+from benchmarks.fake_gemini import DEFAULT_RESPONSE, chunk_text, fake_gemini
+from core.dispatcher import dispatch
+from core.llm import (
+    JSONArrayStream,
+    close_clients,
+    get_client,
+    stream_json_items,
+)
+from visual_analyzer.service import VisualAnalyzerService
+
+FIXTURES = Path(__file__).parent / "fixtures" / "llm_responses"
+
+EXPECTED = {
+    "complete_fenced.txt": (["#decline-link", "div.cookie-banner > button:nth-of-type(1)"], False),
+    "truncated.txt": (["#decline-link", "#upsell"], True),
+    "malformed_item.txt": (["#decline-link", "#upsell"], True),
+    "empty.txt": ([], False),
+}
+
+
+def _fixture(name: str) -> str:
+    return (FIXTURES / name).read_text()
+
+
+def _collect(prompt: str) -> list[dict[str, object]]:
+    async def run() -> list[dict[str, object]]:
+        return [item async for item in stream_json_items(prompt, "test-key")]
+
+    return asyncio.run(run())
+
+
+class TestJSONArrayStream:
+    """Incremental parsing of recorded responses."""
+
+    @pytest.mark.parametrize("name", sorted(EXPECTED))
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64, 100_000])
+    def test_recorded_responses(self, name: str, chunk_size: int) -> None:
+        selectors, truncated = EXPECTED[name]
+        parser = JSONArrayStream()
+
+        items = []
+        for chunk in chunk_text(_fixture(name), chunk_size):
+            items.extend(parser.feed(chunk))
+        items.extend(parser.close())
+
+        assert [item["selector"] for item in items] == selectors
+        assert parser.truncated is truncated
+
+    def test_items_are_returned_as_soon_as_complete(self) -> None:
+        parser = JSONArrayStream()
+
+        assert parser.feed('```json\n[{"selector": "#a"}, {"sel') == [{"selector": "#a"}]
+        assert parser.feed('ector": "#b"}]\n```') == [{"selector": "#b"}]
+        assert parser.done
+
+    def test_objects_inside_a_cut_off_item_are_not_salvaged(self) -> None:
+        parser = JSONArrayStream()
+
+        assert parser.feed('[{"selector": "#a", "meta": {"category": "misdirection"}, "confidence": ') == []
+        assert parser.close() == []
+        assert parser.truncated
+
+    def test_items_after_a_malformed_one_are_salvaged(self) -> None:
+        parser = JSONArrayStream()
+        parser.feed('[{"selector": "#a", oops}, {"selector": "#b", "note": "}{"}, {"selector": "#c", "m": {')
+
+        assert parser.close() == [{"selector": "#b", "note": "}{"}]
+
+
+class TestClientPerEventLoop:
+    """Each request's event loop gets (and closes) its own Gemini client."""
+
+    def test_consecutive_event_loops_all_succeed(self) -> None:
+        async def twice(prompt: str) -> list[list[dict[str, object]]]:
+            try:
+                return [
+                    [item async for item in stream_json_items(prompt, "test-key")] for _ in range(2)
+                ]
+            finally:
+                await close_clients()
+
+        with fake_gemini([DEFAULT_RESPONSE]) as url, override_settings(GEMINI_BASE_URL=url):
+            # The fake keeps connections alive, as Gemini does.
+            results = [asyncio.run(twice(f"prompt {i}")) for i in range(3)]
+
+        assert all(items for both in results for items in both)
+
+    def test_unclosed_loops_still_get_a_fresh_client(self) -> None:
+        with fake_gemini([DEFAULT_RESPONSE]) as url, override_settings(GEMINI_BASE_URL=url):
+            results = [_collect(f"prompt {i}") for i in range(2)]
+
+        assert results[0] == results[1] != []
+
+
+class TestFakeStreamingServer:
+    """The real genai client against a local SSE server."""
+
+    def test_streams_items_from_server(self) -> None:
+        with fake_gemini(chunk_text(_fixture("complete_fenced.txt"), 40)) as url:
+            with override_settings(GEMINI_BASE_URL=url):
+                items = _collect("prompt")
+
+        assert [item["category"] for item in items] == ["visual_interference", "misdirection"]
+
+    def test_cut_off_stream_keeps_valid_items(self) -> None:
+        with fake_gemini(chunk_text(_fixture("truncated.txt"), 40)) as url:
+            with override_settings(GEMINI_BASE_URL=url):
+                items = _collect("prompt")
+
+        assert [item["selector"] for item in items] == ["#decline-link", "#upsell"]
+
+    def test_dispatcher_keeps_early_detections_on_timeout(self) -> None:
+        text = _fixture("complete_fenced.txt")
+        first_end = text.index("},") + 2
+        # First item arrives quickly; the rest never does within the timeout.
+        chunks = [text[:first_end], *[""] * 20, text[first_end:]]
+        payload = {
+            "dom_metadata": {
+                "interactive_elements": [{
+                    "selector": "#decline-link",
+                    "tag_name": "a",
+                    "text_content": "No thanks",
+                    "attributes": {},
+                    "bounding_rect": {"x": 0, "y": 0, "width": 40, "height": 10},
+                    "computed_styles": {},
+                }],
+            },
+        }
+
+        with fake_gemini(chunks, delay=0.2) as url:
+            get_client("test-key", url)  # import genai outside the timed run
+            with override_settings(
+                GEMINI_BASE_URL=url, GOOGLE_API_KEY="test-key", ANALYZER_TIMEOUT=1.0
+            ):
+                results = asyncio.run(dispatch({"visual": VisualAnalyzerService()}, payload))
+
+        assert [(d.element_selector, d.category) for d in results] == [
+            ("#decline-link", "visual_interference"),
+        ]
+
+    def test_injected_errors_fall_back_to_no_llm_detections(self) -> None:
+        payload = {
+            "dom_metadata": {
+                "interactive_elements": [{
+                    "selector": "#decline",
+                    "tag_name": "a",
+                    "text_content": "No thanks",
+                    "attributes": {},
+                    "bounding_rect": {"x": 0, "y": 0, "width": 40, "height": 10},
+                    "computed_styles": {},
+                }],
+            },
+        }
+
+        with fake_gemini([DEFAULT_RESPONSE], error_rate=1.0) as url:
+            with override_settings(GEMINI_BASE_URL=url, GOOGLE_API_KEY="test-key"):
+                results = asyncio.run(dispatch({"visual": VisualAnalyzerService()}, payload))
+
+        assert results == []
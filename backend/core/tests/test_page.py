@@ -0,0 +1,140 @@
+"""Tests for the shared per-request page model."""
+
+from __future__ import annotations
+
+import pickle
+
+import pytest
+
+from core.page import PageModel
+
+
+def _element(selector: str, **overrides: object) -> dict[str, object]:
+    element: dict[str, object] = {
+        "selector": selector,
+        "tag_name": "button",
+        "text_content": "",
+        "attributes": {},
+        "bounding_rect": {"x": 10, "y": 20, "width": 100, "height": 40},
+        "computed_styles": {
+            "color": "#777",
+            "background_color": "#888",
+            "font_size": "14px",
+            "opacity": "1",
+        },
+    }
+    element.update(overrides)
+    return element
+
+
+def _page() -> PageModel:
+    consent = _element("#consent", tag_name="input", attributes={"type": "checkbox"})
+    return PageModel.from_payload(
+        {
+            "dom_metadata": {
+                "interactive_elements": [_element("#accept", text_content="Accept"), consent],
+                "hidden_elements": [consent],
+                "prechecked_inputs": [consent],
+                "url": "https://example.com/checkout",
+            },
+            "text_content": {
+                "button_labels": [{"selector": "#consent", "text": "Send me offers"}],
+                "headings": [],
+                "body_text": "Checkout",
+            },
+        }
+    )
+
+
+class TestPageModel:
+    """Indexing, label joins and immutability."""
+
+    def test_elements_are_merged_by_selector(self) -> None:
+        page = _page()
+
+        consent = page.get("#consent")
+        assert consent is not None
+        assert [el.selector for el in page.elements] == ["#accept", "#consent"]
+        assert consent.sources == {"interactive_elements", "hidden_elements", "prechecked_inputs"}
+        assert page.hidden == page.prechecked == (consent,)
+        assert consent.is_hidden
+
+    def test_repeated_selectors_are_listed_once_in_first_seen_order(self) -> None:
+        hidden = [_element(f"#h{i % 3}") for i in range(9000)]
+        page = PageModel.from_payload({"dom_metadata": {"hidden_elements": hidden}})
+
+        assert [el.selector for el in page.hidden] == ["#h0", "#h1", "#h2"]
+
+    def test_labels_styles_and_geometry_are_precomputed(self) -> None:
+        page = _page()
+        consent = page.get("#consent")
+        assert consent is not None
+
+        assert consent.text == "Send me offers"
+        assert consent.parsed_styles.contrast_ratio == pytest.approx(1.3, abs=0.05)
+        assert list(page.widths) == [100.0, 100.0]
+        assert page.xs[consent.index] == 10.0
+
+    def test_model_is_read_only(self) -> None:
+        page = _page()
+        consent = page.get("#consent")
+        assert consent is not None
+
+        with pytest.raises(AttributeError):
+            page.body_text = "changed"  # type: ignore[misc]
+        with pytest.raises(TypeError):
+            consent.attributes["checked"] = ""
+        with pytest.raises(TypeError):
+            page.widths[0] = 1.0
+
+    def test_malformed_payload_yields_empty_model(self) -> None:
+        page = PageModel.from_payload({"dom_metadata": "nope", "text_content": None})
+
+        assert not page.has_dom and not page.has_text
+        assert page.elements == () and page.body_text == ""
+
+    def test_model_pickles_for_the_process_pool(self) -> None:
+        page = _page()
+        clone = pickle.loads(pickle.dumps(page))
+
+        assert clone == page
+        assert clone.get("#accept") == page.get("#accept")
+
+    def test_structured_reviews_are_parsed(self) -> None:
+        page = PageModel.from_payload({
+            "reviews": [
+                {"text": "Fine", "date": "2024-05-01T12:00:00+02:00", "rating": 4, "author_hash": "a1"},
+                {"text": "Ok", "date": "2024-05-01"},
+                {"text": "Odd", "date": "last tuesday", "rating": None},
+                "not a review",
+            ]
+        })
+
+        assert [r.text for r in page.reviews] == ["Fine", "Ok", "Odd"]
+        assert page.reviews[0].timestamp == 1714557600.0
+        assert page.reviews[1].timestamp == 1714521600.0  # naive dates are UTC
+        assert page.reviews[2].timestamp is None
+        assert page.reviews[0].rating == 4.0 and page.reviews[1].rating is None
+        assert page.reviews[0].author_hash == "a1"
+
+    def test_body_offsets_map_to_elements(self) -> None:
+        page = PageModel.from_payload({
+            "text_content": {
+                "button_labels": [],
+                "headings": [],
+                "body_text": "Sale!\nOnly 2 left",
+                "body_index": [
+                    {"selector": "#stock", "start": 6, "end": 99},
+                    {"selector": "#sale", "start": 0, "end": 5},
+                    {"selector": "#overlap", "start": 3, "end": 8},
+                    {"selector": "#bad", "start": "x", "end": 2},
+                ],
+            }
+        })
+
+        assert [s.selector for s in page.body_index] == ["#sale", "#stock"]
+        assert page.body_index[1].end == 17  # clamped to the text
+        assert page.span_at(0).selector == "#sale"  # type: ignore[union-attr]
+        assert page.span_at(5) is None  # the newline between spans
+        assert page.span_at(16).selector == "#stock"  # type: ignore[union-attr]
+        assert page.span_at(17) is None
@@ -0,0 +1,77 @@
+"""Tests for compressed / MessagePack request parsing on /api/analyze."""
+
+from __future__ import annotations
+
+import gzip
+import json
+
+import msgpack
+import pytest
+from django.test import Client, override_settings
+
+from core.warmup import synthetic_request
+
+
+@pytest.fixture
+def client() -> Client:
+    return Client(HTTP_HOST="localhost")
+
+
+def _selectors(response: object) -> list[str]:
+    return [d["element_selector"] for d in response.json()["detections"]]  # type: ignore[attr-defined]
+
+
+class TestWireFormats:
+    """The analyze endpoint accepts JSON, gzip JSON and MessagePack."""
+
+    def test_plain_json_still_works(self, client: Client) -> None:
+        response = client.post(
+            "/api/analyze", json.dumps(synthetic_request()), content_type="application/json"
+        )
+        assert response.status_code == 200
+        assert "#newsletter" in _selectors(response)
+
+    def test_gzip_json(self, client: Client) -> None:
+        body = gzip.compress(json.dumps(synthetic_request()).encode())
+        response = client.post(
+            "/api/analyze", body, content_type="application/json",
+            HTTP_CONTENT_ENCODING="gzip",
+        )
+        assert response.status_code == 200
+        assert "#newsletter" in _selectors(response)
+
+    def test_msgpack_with_raw_screenshot_bytes(self, client: Client) -> None:
+        payload = synthetic_request()
+        del payload["screenshot_b64"]
+        payload["screenshot"] = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+        response = client.post(
+            "/api/analyze", msgpack.packb(payload, use_bin_type=True),
+            content_type="application/msgpack",
+        )
+        assert response.status_code == 200
+        assert "#newsletter" in _selectors(response)
+
+    def test_screenshot_is_still_required(self, client: Client) -> None:
+        payload = synthetic_request()
+        del payload["screenshot_b64"]
+        response = client.post(
+            "/api/analyze", json.dumps(payload), content_type="application/json"
+        )
+        assert response.status_code == 400
+        assert "screenshot_b64" in response.json()
+
+    def test_unknown_encoding_is_rejected(self, client: Client) -> None:
+        response = client.post(
+            "/api/analyze", b"...", content_type="application/json",
+            HTTP_CONTENT_ENCODING="br",
+        )
+        assert response.status_code == 415
+
+    @override_settings(MAX_REQUEST_BODY_BYTES=10_000)
+    def test_decompression_bomb_is_rejected(self, client: Client) -> None:
+        body = gzip.compress(b" " * 1_000_000)
+        response = client.post(
+            "/api/analyze", body, content_type="application/json",
+            HTTP_CONTENT_ENCODING="gzip",
+        )
+        assert response.status_code == 413
@@ -0,0 +1,95 @@
+"""Tests for opt-in per-request profiling."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from django.test import Client, override_settings
+
+from core import profiling
+from core.profiling import PROFILE_HEADER, Span, pack_lanes, span
+from core.warmup import synthetic_request
+
+
+@pytest.fixture
+def client() -> Client:
+    return Client(HTTP_HOST="localhost")
+
+
+def _analyze(client: Client, **headers: str) -> object:
+    return client.post(
+        "/api/analyze", json.dumps(synthetic_request()), content_type="application/json", headers=headers
+    )
+
+
+def _span_names(document: dict[str, object]) -> set[str]:
+    frames = document["shared"]["frames"]  # type: ignore[index]
+    return {
+        frames[event["frame"]]["name"]
+        for profile in document["profiles"]  # type: ignore[attr-defined]
+        if profile["type"] == "evented"
+        for event in profile["events"]
+    }
+
+
+class TestMiddleware:
+    def test_header_writes_speedscope_and_collapsed_files(self, client: Client, tmp_path: Path) -> None:
+        with override_settings(PROFILE_DIR=str(tmp_path), PROFILE_ALLOW_HEADER=True):
+            response = _analyze(client, **{PROFILE_HEADER: "1"})
+
+        assert response.status_code == 200
+        profile_id = response[PROFILE_HEADER]
+        document = json.loads((tmp_path / f"{profile_id}.speedscope.json").read_text())
+        assert (tmp_path / f"{profile_id}.collapsed").exists()
+        assert {
+            "request", "parse", "validate", "dispatch", "page_model", "analyzer:dom",
+            "dom:size_disparity", "text:urgency", "corroborate", "serialize_response",
+        } <= _span_names(document)
+
+    def test_header_ignored_unless_allowed(self, client: Client, tmp_path: Path) -> None:
+        with override_settings(PROFILE_DIR=str(tmp_path), PROFILE_ALLOW_HEADER=False):
+            response = _analyze(client, **{PROFILE_HEADER: "1"})
+
+        assert PROFILE_HEADER not in response
+        assert list(tmp_path.iterdir()) == []
+
+    def test_sampled_requests_are_profiled(self, client: Client, tmp_path: Path) -> None:
+        with override_settings(PROFILE_DIR=str(tmp_path), PROFILE_SAMPLE_RATE=1.0):
+            response = _analyze(client)
+
+        assert PROFILE_HEADER in response
+
+    def test_old_profiles_are_pruned(self, client: Client, tmp_path: Path) -> None:
+        with override_settings(PROFILE_DIR=str(tmp_path), PROFILE_SAMPLE_RATE=1.0, PROFILE_MAX_FILES=2):
+            for _ in range(4):
+                _analyze(client)
+
+        assert len(list(tmp_path.glob("*.speedscope.json"))) == 2
+        assert len(list(tmp_path.glob("*.collapsed"))) == 2
+
+
+class TestSpans:
+    def test_span_is_a_shared_no_op_outside_a_profile(self) -> None:
+        assert span("a") is span("b")
+
+    def test_overlapping_spans_get_separate_lanes(self) -> None:
+        outer, a, b, child = Span("outer", 0, 100), Span("a", 10, 50), Span("b", 20, 60), Span("c", 30, 40)
+
+        lanes = pack_lanes([b, child, a, outer])
+
+        assert lanes == [[outer, a, child], [b]]
+
+    def test_speedscope_events_nest(self) -> None:
+        profile = profiling.RequestProfile("test", sample_interval=0)
+        profile.spans.extend([Span("outer", 0, 100), Span("a", 10, 50), Span("b", 50, 100)])
+        profile.ended = 100
+
+        stack: list[int] = []
+        for event in profile.speedscope()["profiles"][0]["events"]:  # type: ignore[index]
+            if event["type"] == "O":
+                stack.append(event["frame"])
+            else:
+                assert stack.pop() == event["frame"]
+        assert stack == []
@@ -0,0 +1,260 @@
+"""Tests for the node-local shared state (cache, leases, token buckets)."""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from django.test import override_settings
+
+from benchmarks.fake_gemini import DEFAULT_RESPONSE, fake_gemini
+from core import shared_state
+from core.coalescing import content_key
+from core.dispatcher import dispatch
+from core.interfaces import BaseAnalyzer
+from core.llm import stream_json_items
+from core.models import Detection
+from core.page import PageModel
+from core.shared_state import LocalState, MmapState, skip_shared_cache, wait_for_token
+
+
+@pytest.fixture
+def base(tmp_path: Path) -> str:
+    return str(tmp_path / "state")
+
+
+@pytest.fixture
+def mmap_backend(base: str) -> Iterator[None]:
+    with override_settings(SHARED_STATE_BACKEND="mmap", SHARED_STATE_PATH=base):
+        yield
+
+
+def _write_from_child(base: str) -> None:
+    MmapState(base, 64, 256).set("from-child", b"hello", 60)
+
+
+class TestMmapState:
+    """The shared-memory hash table."""
+
+    def test_values_are_visible_to_another_mapping(self, base: str) -> None:
+        writer, reader = MmapState(base, 64, 256), MmapState(base, 64, 256)
+
+        assert writer.set("a", b"1", 60)
+        assert reader.get("a") == b"1"
+        writer.set("a", b"22", 60)
+        assert reader.get("a") == b"22"
+        reader.delete("a")
+        assert writer.get("a") is None
+
+    def test_values_are_visible_to_another_process(self, base: str) -> None:
+        child = multiprocessing.get_context("spawn").Process(target=_write_from_child, args=(base,))
+        child.start()
+        child.join(30)
+
+        assert child.exitcode == 0
+        assert MmapState(base, 64, 256).get("from-child") == b"hello"
+
+    def test_expired_values_are_gone(self, base: str) -> None:
+        state = MmapState(base, 64, 256)
+        state.set("a", b"1", 0.05)
+        time.sleep(0.1)
+
+        assert state.get("a") is None
+
+    def test_add_only_stores_absent_keys(self, base: str) -> None:
+        state = MmapState(base, 64, 256)
+
+        assert state.add("lease", b"1", 60)
+        assert not state.add("lease", b"2", 60)
+        assert state.get("lease") == b"1"
+
+    def test_oversized_values_are_not_stored(self, base: str) -> None:
+        state = MmapState(base, 64, 256)
+
+        assert not state.set("big", b"x" * 1000, 60)
+        assert state.get("big") is None
+
+    def test_full_table_evicts_instead_of_growing(self, base: str) -> None:
+        state = MmapState(base, 8, 256)
+        for i in range(50):
+            state.set(f"k{i}", str(i).encode(), 60 + i)
+
+        kept = [i for i in range(50) if state.get(f"k{i}") is not None]
+        assert len(kept) == 8
+        assert 49 in kept  # the newest entry, latest to expire
+
+    def test_concurrent_writers_never_expose_torn_values(self, base: str) -> None:
+        state = MmapState(base, 8, 512)
+        values = {bytes([65 + i]) * 400 for i in range(4)}
+        stop = threading.Event()
+
+        def write(value: bytes) -> None:
+            while not stop.is_set():
+                state.set("hot", value, 60)
+
+        with ThreadPoolExecutor(max_workers=4) as threads:
+            for value in values:
+                threads.submit(write, value)
+            seen = {state.get("hot") for _ in range(2000)}
+            stop.set()
+
+        assert seen - {None} <= values
+
+
+class TestTokenBucket:
+    """Rate limiting shared between workers."""
+
+    @pytest.mark.parametrize("backend", ["local", "mmap"])
+    def test_burst_then_wait(self, backend: str, base: str) -> None:
+        state = LocalState() if backend == "local" else MmapState(base, 8, 256)
+
+        assert state.take("llm", rate=1, burst=2) == 0
+        assert state.take("llm", rate=1, burst=2) == 0
+        assert 0.9 < state.take("llm", rate=1, burst=2) <= 1
+
+    def test_bucket_is_shared_across_mappings(self, base: str) -> None:
+        first, second = MmapState(base, 8, 256), MmapState(base, 8, 256)
+
+        assert first.take("llm", rate=1, burst=1) == 0
+        assert second.take("llm", rate=1, burst=1) > 0
+
+    def test_wait_for_token_waits_for_a_refill(self, mmap_backend: None) -> None:
+        with override_settings(LLM_RATE_PER_MINUTE=600, LLM_RATE_BURST=1):
+            started = time.perf_counter()
+            asyncio.run(wait_for_token())
+            asyncio.run(wait_for_token())
+
+        assert time.perf_counter() - started >= 0.08
+
+
+class _LLMAnalyzer(BaseAnalyzer):
+    """Counts real runs; sleeps like an LLM call."""
+
+    payload_keys = ("url",)
+    uses_llm = True
+
+    def __init__(self, explanation: str = "llm", degraded: bool = False) -> None:
+        self.calls = 0
+        self.explanation = explanation
+        self.degraded = degraded
+        self._lock = threading.Lock()
+
+    async def analyze(
+        self, payload: dict[str, object], page: PageModel | None = None
+    ) -> list[Detection]:
+        with self._lock:
+            self.calls += 1
+        await asyncio.sleep(0.2)
+        if self.degraded:
+            skip_shared_cache("fell back")
+        return [
+            Detection(
+                category="fake_urgency",
+                element_selector="#timer",
+                confidence=0.8,
+                explanation=self.explanation,
+                severity="high",
+            )
+        ]
+
+
+class _FailingLLMAnalyzer(BaseAnalyzer):
+    """Falls back to no detections when its LLM call fails, like the visual analyzer."""
+
+    payload_keys = ("url",)
+    uses_llm = True
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def analyze(
+        self, payload: dict[str, object], page: PageModel | None = None
+    ) -> list[Detection]:
+        self.calls += 1
+        try:
+            [item async for item in stream_json_items("prompt", "test-key")]
+        except Exception:
+            pass
+        return []
+
+
+class TestSharedAnalysis:
+    """LLM analyses cached and deduplicated across workers."""
+
+    def test_repeat_request_is_served_from_the_shared_cache(self, mmap_backend: None) -> None:
+        analyzer = _LLMAnalyzer()
+        payload = {"url": "https://example.com"}
+
+        first = asyncio.run(dispatch({"llm": analyzer}, payload))
+        shared_state._state = None  # as if another worker took the request
+        second = asyncio.run(dispatch({"llm": analyzer}, payload))
+
+        assert analyzer.calls == 1
+        assert [d.explanation for d in second] == [d.explanation for d in first] == ["llm"]
+
+    @override_settings(COALESCE_ANALYSES=False)
+    def test_concurrent_workers_share_one_run(self, mmap_backend: None) -> None:
+        analyzer = _LLMAnalyzer()
+
+        def one_request(_: int) -> list[Detection]:
+            return asyncio.run(dispatch({"llm": analyzer}, {"url": "https://example.com/x"}))
+
+        with ThreadPoolExecutor(max_workers=3) as threads:
+            results = list(threads.map(one_request, range(3)))
+
+        assert analyzer.calls == 1
+        assert all(len(r) == 1 for r in results)
+
+    def test_rule_analyzers_are_not_cached(self, mmap_backend: None) -> None:
+        analyzer = _LLMAnalyzer()
+        analyzer.uses_llm = False  # type: ignore[misc]
+        payload = {"url": "https://example.com/rules"}
+
+        asyncio.run(dispatch({"rules": analyzer}, payload))
+        asyncio.run(dispatch({"rules": analyzer}, payload))
+
+        assert analyzer.calls == 2
+
+    def test_degraded_results_are_not_cached(self, mmap_backend: None) -> None:
+        analyzer = _LLMAnalyzer(degraded=True)
+        payload = {"url": "https://example.com/degraded"}
+
+        asyncio.run(dispatch({"llm": analyzer}, payload))
+        asyncio.run(dispatch({"llm": analyzer}, payload))
+
+        assert analyzer.calls == 2
+
+    def test_failed_llm_calls_are_not_cached(self, mmap_backend: None) -> None:
+        analyzer = _FailingLLMAnalyzer()
+        payload = {"url": "https://example.com/failing"}
+
+        with fake_gemini([DEFAULT_RESPONSE], error_rate=1.0) as url:
+            with override_settings(GEMINI_BASE_URL=url):
+                asyncio.run(dispatch({"llm": analyzer}, payload))
+                asyncio.run(dispatch({"llm": analyzer}, payload))
+
+        assert analyzer.calls == 2
+
+    def test_results_too_large_for_a_slot_skip_the_lease(self, base: str) -> None:
+        analyzer = _LLMAnalyzer(explanation=os.urandom(1024).hex())
+        payload = {"url": "https://example.com/large"}
+
+        with override_settings(
+            SHARED_STATE_BACKEND="mmap", SHARED_STATE_PATH=base, SHARED_STATE_SLOT_BYTES=512
+        ):
+            first = asyncio.run(dispatch({"llm": analyzer}, payload))
+            second = asyncio.run(dispatch({"llm": analyzer}, payload))
+            state = shared_state.get_shared_state()
+            assert state is not None
+            marker = state.get(f"result:{content_key('llm', payload)}")
+
+        assert analyzer.calls == 2
+        assert marker == shared_state.TOO_LARGE
+        assert first[0].explanation == second[0].explanation
@@ -0,0 +1,174 @@
+"""Tests for learned per-site profiles."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+from django.test import override_settings
+
+from core.dispatcher import dispatch
+from core.interfaces import BaseAnalyzer
+from core.models import Detection
+from core.page import PageModel
+from core.site_profiles import SiteProfileStore, get_store, origin_of
+from core.warmup import synthetic_request
+from visual_analyzer.service import VisualAnalyzerService
+
+URL = "https://shop.example.com/checkout?step=2"
+ORIGIN = "https://shop.example.com"
+
+
+def _det(category: str = "misdirection", confidence: float = 0.6) -> Detection:
+    return Detection(
+        category=category,
+        element_selector="#decline",
+        confidence=confidence,
+        explanation="test",
+        severity="low",
+    )
+
+
+class _Fixed(BaseAnalyzer):
+    def __init__(self, *detections: Detection) -> None:
+        self._detections = detections
+
+    async def analyze(
+        self, payload: dict[str, object], page: PageModel | None = None
+    ) -> list[Detection]:
+        return [Detection(**vars(d)) for d in self._detections]
+
+
+def test_origin_of() -> None:
+    assert origin_of(URL) == ORIGIN
+    assert origin_of("HTTP://Example.com:8080/a") == "http://example.com:8080"
+    assert origin_of("not a url") == ""
+
+
+class TestProfileFiltering:
+    """The dispatcher applies and updates the site's profile."""
+
+    def test_dismissed_detection_is_dropped(self) -> None:
+        _vote(get_store(), "false_positive", "client-1", "client-2", "client-3")
+
+        results = asyncio.run(dispatch({"a": _Fixed(_det())}, synthetic_request(URL)))
+
+        assert results == []
+
+    def test_corroborated_pattern_floors_later_confidence(self) -> None:
+        asyncio.run(dispatch(
+            {"a": _Fixed(_det(confidence=0.9)), "b": _Fixed(_det(confidence=0.8))}, synthetic_request(URL)
+        ))
+
+        results = asyncio.run(dispatch({"a": _Fixed(_det(confidence=0.5))}, synthetic_request(URL)))
+
+        assert [d.confidence for d in results] == [0.9]
+
+    def test_other_sites_are_unaffected(self) -> None:
+        for client in ("client-1", "client-2", "client-3"):
+            get_store().record_feedback("https://other.example", "#decline", "misdirection", "false_positive", client)
+
+        results = asyncio.run(dispatch({"a": _Fixed(_det())}, synthetic_request(URL)))
+
+        assert len(results) == 1
+
+
+def _vote(store: SiteProfileStore, feedback: str, *clients: str) -> None:
+    for client in clients:
+        store.record_feedback(ORIGIN, "#decline", "misdirection", feedback, client)
+
+
+def _suppressed(store: SiteProfileStore) -> bool:
+    profile = store.get(ORIGIN)
+    return profile is not None and ("#decline", "misdirection") in profile.benign
+
+
+class TestFeedbackVotes:
+    """False-positive feedback only suppresses a detection once enough clients agree."""
+
+    def test_one_client_cannot_suppress_a_detection(self) -> None:
+        store = SiteProfileStore()
+        _vote(store, "false_positive", *["client-1"] * 5)
+
+        assert not _suppressed(store)
+
+    def test_distinct_clients_suppress_a_detection(self) -> None:
+        store = SiteProfileStore()
+        _vote(store, "false_positive", "client-1", "client-2")
+        assert not _suppressed(store)
+
+        _vote(store, "false_positive", "client-3")
+        assert _suppressed(store)
+
+    def test_confirmations_outweigh_a_minority_of_false_positives(self) -> None:
+        store = SiteProfileStore()
+        _vote(store, "confirmed", "client-4", "client-5")
+        _vote(store, "false_positive", "client-1", "client-2", "client-3")
+
+        assert not _suppressed(store)
+
+    def test_a_client_changing_its_verdict_replaces_its_vote(self) -> None:
+        store = SiteProfileStore()
+        _vote(store, "false_positive", "client-1", "client-2", "client-3")
+        _vote(store, "confirmed", "client-3")
+
+        assert not _suppressed(store)
+
+    @override_settings(SITE_PROFILE_VOTE_DAYS=1)
+    def test_suppression_lifts_when_votes_expire(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        store = SiteProfileStore()
+        _vote(store, "false_positive", "client-1", "client-2", "client-3")
+        assert _suppressed(store)
+
+        later = time.time() + 86400 + 1
+        monkeypatch.setattr("core.site_profiles.time.time", lambda: later)
+        assert not _suppressed(store)
+
+
+class TestStore:
+    """Bounds and persistence."""
+
+    def test_sites_are_lru_bounded(self) -> None:
+        store = SiteProfileStore(max_sites=2)
+        for origin in ("https://a", "https://b", "https://c"):
+            store.record_feedback(origin, "#x", "misdirection", "confirmed")
+
+        assert len(store) == 2
+        assert store.get("https://a") is None
+
+    def test_snapshot_round_trip(self, tmp_path: Path) -> None:
+        path = str(tmp_path / "profiles.json")
+        store = SiteProfileStore(path=path)
+        _vote(store, "false_positive", "client-1", "client-2", "client-3")
+        store.record_layout(ORIGIN, "fp", "visual", [_det()])
+        store.save()
+
+        reloaded = SiteProfileStore(path=path)
+        profile = reloaded.get(ORIGIN)
+
+        assert profile is not None
+        assert profile.benign == {("#decline", "misdirection")}
+        for _ in range(3):
+            cached = reloaded.observe_layout(ORIGIN, "fp", "visual")
+        assert cached == [_det()]
+
+
+@override_settings(GOOGLE_API_KEY="test-key")
+def test_visual_analyzer_reuses_stable_layouts(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = 0
+
+    async def fake_stream(prompt: str, api_key: str) -> AsyncIterator[dict[str, object]]:
+        nonlocal calls
+        calls += 1
+        yield {"selector": "#decline", "category": "visual_interference", "confidence": 0.7}
+
+    monkeypatch.setattr("visual_analyzer.service.stream_json_items", fake_stream)
+    service = VisualAnalyzerService()
+
+    results = [asyncio.run(service.analyze(synthetic_request(URL))) for _ in range(4)]
+
+    assert calls == 2
+    assert all(r == results[0] for r in results)
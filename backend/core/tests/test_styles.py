@@ -0,0 +1,82 @@
+"""Tests for the shared computed-style parsers."""
+
+from __future__ import annotations
+
+import pytest
+
+from core.styles import (
+    contrast_ratio,
+    parse_color,
+    parse_length,
+    parse_opacity,
+    parse_styles,
+)
+
+
+class TestParseColor:
+    """Unit tests for parse_color."""
+
+    @pytest.mark.parametrize(
+        ("value", "expected"),
+        [
+            ("rgb(153, 153, 153)", (153.0, 153.0, 153.0, 1.0)),
+            ("rgba(0, 0, 0, 0.5)", (0.0, 0.0, 0.0, 0.5)),
+            ("rgb(255 0 0 / 50%)", (255.0, 0.0, 0.0, 0.5)),
+            ("#999", (153.0, 153.0, 153.0, 1.0)),
+            ("#00ff0080", (0.0, 255.0, 0.0, 128 / 255)),
+            ("White", (255.0, 255.0, 255.0, 1.0)),
+            ("transparent", (0.0, 0.0, 0.0, 0.0)),
+        ],
+    )
+    def test_parses_supported_formats(
+        self, value: str, expected: tuple[float, float, float, float]
+    ) -> None:
+        assert parse_color(value) == pytest.approx(expected)
+
+    def test_unknown_values_return_none(self) -> None:
+        assert parse_color("") is None
+        assert parse_color("hsl(0, 0%, 50%)") is None
+        assert parse_color("#12") is None
+
+    def test_repeated_values_hit_the_cache(self) -> None:
+        parse_color.cache_clear()
+        for _ in range(100):
+            parse_color("rgb(1, 2, 3)")
+        info = parse_color.cache_info()
+        assert info.misses == 1
+        assert info.hits == 99
+
+
+class TestParseLengthAndOpacity:
+    """Unit tests for parse_length / parse_opacity."""
+
+    def test_lengths_normalize_to_px(self) -> None:
+        assert parse_length("14px") == 14.0
+        assert parse_length("12pt") == pytest.approx(16.0)
+        assert parse_length("1.5rem") == 24.0
+        assert parse_length("auto") is None
+
+    def test_opacity_is_clamped_and_defaults_opaque(self) -> None:
+        assert parse_opacity("0.25") == 0.25
+        assert parse_opacity("2") == 1.0
+        assert parse_opacity("garbage") == 1.0
+
+
+class TestContrast:
+    """Unit tests for contrast_ratio / ParsedStyles."""
+
+    def test_black_on_white_is_maximal(self) -> None:
+        black = parse_color("black")
+        white = parse_color("white")
+        assert black is not None and white is not None
+        assert contrast_ratio(black, white) == pytest.approx(21.0)
+
+    def test_transparent_background_has_no_ratio(self) -> None:
+        parsed = parse_styles({
+            "color": "#999",
+            "background_color": "transparent",
+            "font_size": "10px",
+            "opacity": "1",
+        })
+        assert parsed.contrast_ratio is None
+        assert parsed.font_size_px == 10.0
@@ -0,0 +1,108 @@
+"""Tests for trace recording and deterministic replay."""
+
+from __future__ import annotations
+
+import copy
+import io
+import json
+from pathlib import Path
+
+import pytest
+from django.core.management import call_command
+from django.test import Client, override_settings
+
+from benchmarks.fake_gemini import DEFAULT_RESPONSE, fake_gemini
+from core import traces
+from core.analyzers import get_analyzers
+from core.traces import diff_detections, load_traces, replay
+from core.warmup import synthetic_request
+
+URL = "https://shop.example.com/checkout?session=secret#step-2"
+
+
+@pytest.fixture(autouse=True)
+def _fresh_recorder(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(traces, "_recorder", None)
+
+
+def _payload() -> dict[str, object]:
+    payload = synthetic_request(URL)
+    text = dict(payload["text_content"])  # type: ignore[call-overload]
+    text["body_text"] += " Questions? Mail jane.doe@example.com."
+    payload["text_content"] = text
+    return payload
+
+
+def _record(tmp_path: Path, **settings: object) -> dict[str, object]:
+    with override_settings(TRACE_DIR=str(tmp_path), **settings):
+        response = Client(HTTP_HOST="localhost").post(
+            "/api/analyze", json.dumps(_payload()), content_type="application/json"
+        )
+    assert response.status_code == 200
+    [trace] = load_traces([str(tmp_path)])
+    return trace
+
+
+class TestRecording:
+    def test_trace_is_sanitized(self, tmp_path: Path) -> None:
+        trace = _record(tmp_path)
+
+        payload = trace["payload"]
+        assert "screenshot_b64" not in payload
+        assert payload["url"] == "https://shop.example.com/checkout"
+        assert "jane.doe" not in json.dumps(trace)
+        assert trace["detections"]
+        assert trace["dispatch_ms"] > 0
+
+    def test_nothing_recorded_when_disabled(self, tmp_path: Path) -> None:
+        with override_settings(TRACE_DIR=""):
+            Client(HTTP_HOST="localhost").post("/api/analyze", json.dumps(_payload()), content_type="application/json")
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestReplay:
+    def test_replay_serves_recorded_llm_responses(self, tmp_path: Path) -> None:
+        with fake_gemini([DEFAULT_RESPONSE]) as url:
+            trace = _record(tmp_path, GOOGLE_API_KEY="test-key", GEMINI_BASE_URL=url)
+        assert trace["llm"]
+
+        # The fake server is gone: every LLM answer must come from the trace.
+        with override_settings(GEMINI_BASE_URL="http://127.0.0.1:9"):
+            result = replay(trace, get_analyzers(), repeat=1)
+
+        assert result.llm_misses == 0
+        assert result.matches, (result.gained, result.lost, result.changed)
+        assert ("misdirection", "#decline") in {
+            (d["category"], d["element_selector"]) for d in result.detections
+        }
+
+    def test_replay_reports_lost_detections(self, tmp_path: Path) -> None:
+        trace = _record(tmp_path)
+        changed = copy.deepcopy(trace)
+        changed["detections"].append({**trace["detections"][0], "category": "sneaking"})  # type: ignore[attr-defined]
+
+        result = replay(changed, get_analyzers(), repeat=1)
+
+        assert result.lost == [("sneaking", trace["detections"][0]["element_selector"])]  # type: ignore[index]
+
+    def test_diff_detections(self) -> None:
+        before = [{"category": "a", "element_selector": "#x", "confidence": 0.5},
+                  {"category": "b", "element_selector": "#y", "confidence": 0.5}]
+        after = [{"category": "a", "element_selector": "#x", "confidence": 0.7},
+                 {"category": "c", "element_selector": "#z", "confidence": 0.5}]
+
+        assert diff_detections(before, after) == ([("c", "#z")], [("b", "#y")], [("a", "#x", 0.5, 0.7)])
+
+
+class TestCommand:
+    def test_replay_against_saved_baseline(self, tmp_path: Path) -> None:
+        _record(tmp_path / "traces")
+        baseline = tmp_path / "baseline.json"
+        call_command("replay_traces", str(tmp_path / "traces"), "--repeat=1",
+                     f"--save-baseline={baseline}", stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command("replay_traces", str(tmp_path / "traces"), "--repeat=1",
+                     f"--baseline={baseline}", "--fail-on-diff", stdout=out)
+
+        assert "1 identical, 0 differ" in out.getvalue()
@@ -0,0 +1,57 @@
+"""Tests for worker warmup and the readiness probe."""
+
+from __future__ import annotations
+
+import threading
+
+import pytest
+from django.test import Client, override_settings
+
+from core import warmup
+
+
+@pytest.fixture(autouse=True)
+def _cold_worker(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(warmup, "_ready", threading.Event())
+    monkeypatch.setattr(warmup, "_report", {})
+
+
+@pytest.fixture
+def client() -> Client:
+    return Client(HTTP_HOST="localhost")
+
+
+class TestReadiness:
+    def test_not_ready_before_warmup(self, client: Client) -> None:
+        response = client.get("/api/ready")
+        assert response.status_code == 503
+        assert response.json() == {"ready": False}
+
+    def test_ready_after_warmup(self, client: Client) -> None:
+        warmup.warm_up()
+        response = client.get("/api/ready")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["ready"] is True
+        assert set(body["warmup"]) == {name for name, _ in warmup.STEPS} | {"total"}
+
+    def test_ready_when_warmup_is_disabled(self, client: Client) -> None:
+        with override_settings(WARMUP_ON_START=False):
+            assert client.get("/api/ready").status_code == 200
+
+
+class TestWarmUp:
+    def test_failing_step_does_not_block_readiness(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        def boom() -> None:
+            raise RuntimeError("no network")
+
+        monkeypatch.setattr(warmup, "STEPS", (("llm_client", boom),))
+        report = warmup.warm_up()
+        assert warmup.is_ready()
+        assert "llm_client" in report
+
+    def test_synthetic_analysis_does_not_teach_site_profiles(self) -> None:
+        from core.site_profiles import get_store
+
+        warmup.warm_up()
+        assert len(get_store()) == 0
@@ -0,0 +1,290 @@
+"""
+core/traces.py — Record /api/analyze traces and replay them deterministically.
+
+With ``TRACE_DIR`` set, the analyze view records a share
+(``TRACE_SAMPLE_RATE``) of requests. Each trace holds the sanitized payload,
+the LLM responses the analyzers received (core/llm.py ``recording``), the
+detections returned and the dispatch time. Traces are appended as JSON
+lines to gzip files (one gzip member per trace, so appends never rewrite
+anything). Each worker writes its own file and starts a new one after
+``TRACE_FILE_MAX_BYTES``.
+
+Sanitizing drops the screenshot (no analyzer reads it), strips query
+strings and fragments from URLs and masks e-mail addresses. Prompts are
+hashed after the same rewriting, so a replayed payload builds prompts
+that find their recorded responses.
+
+``replay`` feeds a trace back through ``dispatch``, serving the recorded
+LLM responses (core/llm.py ``replaying``) with site profiles and
+coalescing off. It reports detections gained, lost or changed against the
+recorded ones (or a saved baseline) and the dispatch time.
+``python manage.py replay_traces`` runs it over an archive.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import os
+import random
+import re
+import statistics
+import threading
+import time
+from collections.abc import Iterable, Iterator, Mapping
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+from django.conf import settings
+
+from core.interfaces import BaseAnalyzer
+from core.llm import prompt_key
+from core.models import Detection
+
+TRACE_VERSION = 1
+SCREENSHOT_KEYS = ("screenshot_b64", "screenshot")
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+EMAIL_MASK = "user@example.invalid"
+
+_recorder: TraceRecorder | None = None
+_recorder_lock = threading.Lock()
+
+
+def _get_trace_dir() -> str:
+    """Where traces are recorded ("" disables recording)."""
+    return str(getattr(settings, "TRACE_DIR", ""))
+
+
+def _get_sample_rate() -> float:
+    """Share of analyze requests recorded when TRACE_DIR is set."""
+    return float(getattr(settings, "TRACE_SAMPLE_RATE", 1.0))
+
+
+def _get_file_max_bytes() -> int:
+    """Size after which a worker starts a new trace file."""
+    return int(getattr(settings, "TRACE_FILE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+# ── Sanitizing ───────────────────────────────────────────
+
+
+def _strip_url(url: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+
+
+class Sanitizer:
+    """Rewrites every string of a trace the same way (URLs, e-mail addresses)."""
+
+    def __init__(self, payload: Mapping[str, object]) -> None:
+        dom = payload.get("dom_metadata")
+        urls = {str(payload.get("url") or "")}
+        if isinstance(dom, Mapping):
+            urls.add(str(dom.get("url") or ""))
+        # Longest first, so a URL is never rewritten through its own prefix.
+        self._urls = sorted(
+            ((u, _strip_url(u)) for u in urls if u and _strip_url(u) != u),
+            key=lambda pair: -len(pair[0]),
+        )
+
+    def text(self, value: str) -> str:
+        for raw, clean in self._urls:
+            value = value.replace(raw, clean)
+        return EMAIL_PATTERN.sub(EMAIL_MASK, value)
+
+    def value(self, value: object) -> object:
+        if isinstance(value, str):
+            return self.text(value)
+        if isinstance(value, Mapping):
+            return {k: self.value(v) for k, v in value.items() if k not in SCREENSHOT_KEYS}
+        if isinstance(value, (list, tuple)):
+            return [self.value(v) for v in value]
+        return value
+
+
+def build_trace(
+    payload: Mapping[str, object],
+    llm_responses: Mapping[str, str],
+    detections: Iterable[Detection],
+    dispatch_ms: float,
+) -> dict[str, object]:
+    """One sanitized, JSON-ready trace record."""
+    sanitizer = Sanitizer(payload)
+    return {
+        "version": TRACE_VERSION,
+        "id": f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{random.getrandbits(32):08x}",
+        "recorded_at": time.time(),
+        "payload": sanitizer.value(payload),
+        "llm": {
+            prompt_key(sanitizer.text(prompt)): sanitizer.text(text)
+            for prompt, text in llm_responses.items()
+        },
+        "detections": [sanitizer.value(asdict(d)) for d in detections],
+        "dispatch_ms": round(dispatch_ms, 3),
+    }
+
+
+# ── Recording ────────────────────────────────────────────
+
+
+class TraceRecorder:
+    """Appends traces to this worker's gzip JSON-lines file."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._path: Path | None = None
+
+    def _current_path(self) -> Path:
+        if self._path is None or self._path.stat().st_size >= _get_file_max_bytes():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            stamp = time.strftime("%Y%m%dT%H%M%S")
+            self._path = self.directory / f"traces-{stamp}-{os.getpid()}-{random.getrandbits(16):04x}.jsonl.gz"
+            self._path.touch()
+        return self._path
+
+    def record(self, trace: Mapping[str, object]) -> None:
+        line = (json.dumps(trace, separators=(",", ":")) + "\n").encode()
+        member = gzip.compress(line, compresslevel=6)
+        with self._lock:
+            with open(self._current_path(), "ab") as f:
+                f.write(member)
+
+
+def get_recorder() -> TraceRecorder | None:
+    """This process's recorder, or None when TRACE_DIR is empty."""
+    global _recorder  # noqa: PLW0603
+    directory = _get_trace_dir()
+    if not directory:
+        return None
+    with _recorder_lock:
+        if _recorder is None or str(_recorder.directory) != directory:
+            _recorder = TraceRecorder(directory)
+        return _recorder
+
+
+def should_record() -> bool:
+    """Whether to record the current analyze request."""
+    if not _get_trace_dir():
+        return False
+    rate = _get_sample_rate()
+    return rate >= 1.0 or random.random() < rate
+
+
+def load_traces(paths: Iterable[str]) -> Iterator[dict[str, object]]:
+    """Traces from trace files and/or directories of them, oldest file first."""
+    files: list[Path] = []
+    for p in map(Path, paths):
+        files.extend(sorted(p.glob("traces-*.jsonl.gz")) if p.is_dir() else [p])
+    for path in files:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    trace = json.loads(line)
+                    if trace.get("version") != TRACE_VERSION:
+                        raise ValueError(f"{path}: unsupported trace version {trace.get('version')!r}")
+                    yield trace
+
+
+# ── Replay ───────────────────────────────────────────────
+
+
+def _key(detection: Mapping[str, object]) -> tuple[str, str]:
+    return (str(detection["category"]), str(detection["element_selector"]))
+
+
+@dataclass
+class ReplayResult:
+    """How one trace's replay differs from its baseline."""
+
+    trace_id: str
+    url: str
+    baseline_ms: float
+    replay_ms: float
+    gained: list[tuple[str, str]] = field(default_factory=list)
+    lost: list[tuple[str, str]] = field(default_factory=list)
+    # (category, selector, baseline confidence, replayed confidence)
+    changed: list[tuple[str, str, float, float]] = field(default_factory=list)
+    llm_misses: int = 0
+    detections: list[dict[str, object]] = field(default_factory=list, repr=False)
+
+    @property
+    def matches(self) -> bool:
+        return not (self.gained or self.lost or self.changed)
+
+
+def diff_detections(
+    baseline: Iterable[Mapping[str, object]],
+    replayed: Iterable[Mapping[str, object]],
+    tolerance: float = 1e-6,
+) -> tuple[list[tuple[str, str]], list[tuple[str, str]], list[tuple[str, str, float, float]]]:
+    """(gained, lost, changed confidence), keyed by (category, selector)."""
+    before = {_key(d): float(d["confidence"]) for d in baseline}  # type: ignore[arg-type]
+    after = {_key(d): float(d["confidence"]) for d in replayed}  # type: ignore[arg-type]
+    gained = sorted(after.keys() - before.keys())
+    lost = sorted(before.keys() - after.keys())
+    changed = sorted(
+        (cat, sel, before[(cat, sel)], after[(cat, sel)])
+        for cat, sel in before.keys() & after.keys()
+        if abs(before[(cat, sel)] - after[(cat, sel)]) > tolerance
+    )
+    return gained, lost, changed
+
+
+def replay(
+    trace: Mapping[str, object],
+    analyzers: dict[str, BaseAnalyzer],
+    repeat: int = 3,
+    baseline: Mapping[str, object] | None = None,
+) -> ReplayResult:
+    """
+    Run one trace through ``dispatch`` ``repeat`` times with recorded LLM responses.
+
+    ``baseline`` is an earlier ``ReplayResult`` as saved by ``replay_traces
+    --save-baseline`` (``detections`` and ``replay_ms``); without one the
+    recorded detections and dispatch time are the baseline.
+    """
+    from django.test import override_settings
+
+    from core.dispatcher import dispatch
+    from core.llm import replaying
+
+    llm: Mapping[str, str] = trace.get("llm") or {}  # type: ignore[assignment]
+    payload: dict[str, object] = trace["payload"]  # type: ignore[assignment]
+    overrides: dict[str, object] = {
+        "SITE_PROFILES_ENABLED": False,
+        "COALESCE_ANALYSES": False,
+        "SHARED_STATE_BACKEND": "",
+    }
+    # LLM analyzers only call the (replayed) LLM when a key is configured.
+    overrides["GOOGLE_API_KEY"] = "replay" if llm else ""
+
+    timings: list[float] = []
+    detections: list[Detection] = []
+    with override_settings(**overrides), replaying(llm) as misses:
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            detections = asyncio.run(dispatch(analyzers, payload))
+            timings.append((time.perf_counter() - started) * 1000)
+
+    replayed = [asdict(d) for d in detections]
+    if baseline is not None:
+        expected: list[Mapping[str, object]] = baseline["detections"]  # type: ignore[assignment]
+        baseline_ms = float(baseline["replay_ms"])  # type: ignore[arg-type]
+    else:
+        expected = trace["detections"]  # type: ignore[assignment]
+        baseline_ms = float(trace["dispatch_ms"])  # type: ignore[arg-type]
+    gained, lost, changed = diff_detections(expected, replayed)
+    return ReplayResult(
+        trace_id=str(trace["id"]),
+        url=str(payload.get("url", "")),
+        baseline_ms=baseline_ms,
+        replay_ms=statistics.median(timings),
+        gained=gained,
+        lost=lost,
+        changed=changed,
+        llm_misses=len(set(misses)),
+        detections=replayed,
+    )
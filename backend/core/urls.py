@@ -2,8 +2,12 @@
 
 from django.urls import path
 
-from core.views import analyze
+from core.views import analyze, feedback, job_detail, jobs, ready
 
 urlpatterns = [
     path("analyze", analyze, name="analyze"),
+    path("feedback", feedback, name="feedback"),
+    path("jobs", jobs, name="jobs"),
+    path("jobs/<str:job_id>", job_detail, name="job-detail"),
+    path("ready", ready, name="ready"),
 ]
@@ -1,61 +1,202 @@
 """
-core/views.py — POST /api/analyze endpoint.
-
-Accepts the full analysis payload, dispatches to all analyzers,
-and returns merged detections.
+core/views.py — POST /api/analyze, POST /api/feedback and GET /api/ready.
+
+``analyze`` accepts the full analysis payload, dispatches to all analyzers,
+and returns merged detections (recording a trace if enabled, see
+core/traces.py), plus timing and provenance with ``?diagnostics=1``
+(core/diagnostics.py). ``jobs`` / ``job_detail`` are the asynchronous variant:
+rule results now, LLM results by polling (core/jobs.py). ``feedback``
+records users' verdicts on those detections. ``ready`` is the readiness
+probe (core/warmup.py).
 """
 
 from __future__ import annotations
 
 import asyncio
-from dataclasses import asdict
+import logging
+import time
+from contextlib import nullcontext
+from dataclasses import asdict, replace
 
+from django.conf import settings
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from core.dispatcher import dispatch
-from core.serializers import AnalyzeRequestSerializer, AnalyzeResponseSerializer
+from core.analyzers import ANALYZER_CLASSES, get_analyzers
+from core.dispatcher import dispatch, merge_detections, run_analyzers
+from core.models import Detection
+from core.page import PageModel
+from core import diagnostics, llm, traces
+from core.feedback import get_writer
+from core.jobs import get_store as get_job_store
+from core.profiling import span
+from core.serializers import (
+    AnalyzeRequestSerializer,
+    AnalyzeResponseSerializer,
+    FeedbackRequestSerializer,
+    JobResponseSerializer,
+)
+from core.site_profiles import get_store, origin_of, site_profiles_enabled
+from core.warmup import is_ready, warmup_report
+
+logger = logging.getLogger(__name__)
+
+
+@api_view(["POST"])
+def analyze(request: Request) -> Response:
+    """POST /api/analyze — run all dark-pattern analyzers."""
+    with span("parse"):
+        data = request.data
+    with span("validate"):
+        serializer = AnalyzeRequestSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+
+    payload: dict[str, object] = serializer.validated_data  # type: ignore[assignment]
+    analyzers = get_analyzers()
+
+    with diagnostics.collecting() if _wants_diagnostics(request) else nullcontext() as report:
+        # Run async dispatcher from sync Django view
+        if not traces.should_record():
+            with span("dispatch"):
+                detections = asyncio.run(dispatch(analyzers, payload))
+        else:
+            started = time.perf_counter()
+            with span("dispatch"), llm.recording() as llm_responses:
+                detections = asyncio.run(dispatch(analyzers, payload))
+            dispatch_ms = (time.perf_counter() - started) * 1000
+            _record_trace(payload, llm_responses, detections, dispatch_ms)
+
+    response_data: dict[str, object] = {
+        "detections": [asdict(d) for d in detections],
+    }
+    if report is not None:
+        report.skip_disabled([name for name in ANALYZER_CLASSES if name not in analyzers])
+        response_data["diagnostics"] = report.to_dict(detections)
+
+    with span("serialize_response"):
+        out = AnalyzeResponseSerializer(data=response_data)
+        out.is_valid(raise_exception=True)
+
+    return Response(out.validated_data, status=status.HTTP_200_OK)
+
+
+def _wants_diagnostics(request: Request) -> bool:
+    """Whether the client asked for a diagnostics block (``?diagnostics=1``)."""
+    return request.query_params.get("diagnostics", "").lower() in ("1", "true", "yes")
 
-# Lazy-import analyzer services to avoid circular imports
-_analyzers: dict[str, object] | None = None
 
+def _record_trace(
+    payload: dict[str, object],
+    llm_responses: dict[str, str],
+    detections: list[Detection],
+    dispatch_ms: float,
+) -> None:
+    """Record one trace; a failing recorder never fails the request."""
+    recorder = traces.get_recorder()
+    if recorder is None:
+        return
+    try:
+        with span("record_trace"):
+            recorder.record(traces.build_trace(payload, llm_responses, detections, dispatch_ms))
+    except (OSError, TypeError, ValueError):
+        logger.exception("Could not record trace")
 
-def _get_analyzers() -> dict[str, object]:
-    global _analyzers  # noqa: PLW0603
-    if _analyzers is None:
-        from dom_analyzer.service import DomAnalyzerService
-        from text_analyzer.service import TextAnalyzerService
-        from visual_analyzer.service import VisualAnalyzerService
-        from review_analyzer.service import ReviewAnalyzerService
 
-        _analyzers = {
-            "dom": DomAnalyzerService(),
-            "text": TextAnalyzerService(),
-            "visual": VisualAnalyzerService(),
-            "review": ReviewAnalyzerService(),
-        }
-    return _analyzers  # type: ignore[return-value]
+def _job_response(job: dict[str, object], status_code: int) -> Response:
+    out = JobResponseSerializer(data=job)
+    out.is_valid(raise_exception=True)
+    return Response(out.validated_data, status=status_code)
+
+
+def _get_max_wait() -> float:
+    """Longest long-poll a client may ask for (seconds)."""
+    return float(getattr(settings, "JOB_MAX_WAIT_SECONDS", 30))
 
 
 @api_view(["POST"])
-def analyze(request: Request) -> Response:
-    """POST /api/analyze — run all dark-pattern analyzers."""
+def jobs(request: Request) -> Response:
+    """POST /api/jobs — rule detections now, LLM analyzers in the background."""
+    store = get_job_store()
+    if store is None:
+        return Response({"detail": "Job mode is disabled."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
     serializer = AnalyzeRequestSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
+    # No analyzer reads the screenshot; don't queue it.
+    payload = {
+        key: value for key, value in serializer.validated_data.items()
+        if key not in ("screenshot_b64", "screenshot")
+    }
 
-    payload: dict[str, object] = serializer.validated_data  # type: ignore[assignment]
-    analyzers = _get_analyzers()
-
-    # Run async dispatcher from sync Django view
-    detections = asyncio.run(dispatch(analyzers, payload))  # type: ignore[arg-type]
+    analyzers = get_analyzers()
+    rules = {name: a for name, a in analyzers.items() if not a.uses_llm}
+    pending = len(rules) < len(analyzers)
+    page = PageModel.from_payload(payload)
+    rule_results = asyncio.run(run_analyzers(rules, payload, page))
+    # Merging mutates detections; the queued job keeps the raw ones.
+    fast = merge_detections(
+        {name: [replace(d) for d in dets] for name, dets in rule_results.items()},
+        page,
+        learn=not pending,
+    )
+    job = store.submit(payload, rule_results, fast, pending=pending)
+
+    return _job_response(job.to_dict(), status.HTTP_202_ACCEPTED if pending else status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+def job_detail(request: Request, job_id: str) -> Response:
+    """GET /api/jobs/<id>?wait=<seconds> — a job's status and detections."""
+    store = get_job_store()
+    if store is None:
+        return Response({"detail": "Job mode is disabled."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    try:
+        wait = min(max(float(request.query_params.get("wait", 0)), 0.0), _get_max_wait())
+    except ValueError:
+        return Response({"wait": ["A number of seconds is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+    job = store.wait(job_id, wait) if wait else store.get(job_id)
+    if job is None:
+        return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+    return _job_response(job.to_dict(), status.HTTP_200_OK)
 
-    response_data = {
-        "detections": [asdict(d) for d in detections],
-    }
 
-    out = AnalyzeResponseSerializer(data=response_data)
-    out.is_valid(raise_exception=True)
+@api_view(["POST"])
+def feedback(request: Request) -> Response:
+    """POST /api/feedback — record users' verdicts on detections."""
+    serializer = FeedbackRequestSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
 
-    return Response(out.validated_data, status=status.HTTP_200_OK)
+    url: str = serializer.validated_data["url"]
+    origin = origin_of(url)
+    # The analyzers' own confidences survive calibration in ``sources``; the
+    # merged one before calibration is their max. Calibration is fitted on it.
+    events = [
+        {**event, "url": url, "origin": origin, "raw_confidence": max(event["sources"].values(), default=None)}
+        for event in serializer.validated_data["events"]
+    ]
+
+    # Both are in-memory updates; the feedback writer flushes in the background.
+    if origin and site_profiles_enabled():
+        store = get_store()
+        # Votes are counted per remote address: the body is not authenticated,
+        # so nothing in it may stand for a distinct voter.
+        client = request.META.get("REMOTE_ADDR", "")
+        for event in events:
+            store.record_feedback(
+                origin, event["element_selector"], event["category"], event["user_feedback"], client
+            )
+    writer = get_writer()
+    accepted = writer.append(events) if writer is not None else 0
+
+    return Response({"accepted": accepted}, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(["GET"])
+def ready(request: Request) -> Response:
+    """GET /api/ready — 200 once this worker has warmed up, 503 before."""
+    if not is_ready():
+        return Response({"ready": False}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response({"ready": True, "warmup": warmup_report()}, status=status.HTTP_200_OK)
@@ -0,0 +1,230 @@
+"""
+core/warmup.py — Warm a worker process up before it takes traffic.
+
+A cold worker's first request pays for everything that is loaded lazily:
+the URLconf (and with it the views and DRF), the validators' regexes, the
+analyzer imports (and the regexes compiled at their import), the
+``google.genai`` import and client, pyarrow, the calibration model, the
+site profile snapshot and the analyzer process pool. With autoscaling,
+those first requests show up as p99 spikes.
+
+``start_warmup()`` (called from ``darkguard/wsgi.py`` when
+``WARMUP_ON_START`` is set) does all of that in a background thread and then
+runs one synthetic analysis through the dispatcher. ``GET /api/ready``
+answers 503 until it has finished, so a load balancer only routes requests
+to warm workers. ``python manage.py warmup`` runs the same steps in the
+foreground and prints their timings.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import Callable
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# A small page that makes the DOM and text rules fire. Its empty URL has no
+# origin, so site profiles don't learn from it.
+SYNTHETIC_PAYLOAD: dict[str, object] = {
+    "url": "",
+    "dom_metadata": {
+        "url": "",
+        "hidden_elements": [],
+        "interactive_elements": [
+            {
+                "selector": "#accept",
+                "tag_name": "button",
+                "text_content": "Accept all",
+                "attributes": {},
+                "bounding_rect": {"x": 100, "y": 400, "width": 300, "height": 60},
+                "computed_styles": {
+                    "color": "#ffffff", "background_color": "#008000", "font_size": "18px",
+                    "opacity": "1", "display": "block", "visibility": "visible",
+                },
+            },
+            {
+                "selector": "#decline",
+                "tag_name": "a",
+                "text_content": "No thanks, I don't want to save money",
+                "attributes": {"href": "#"},
+                "bounding_rect": {"x": 420, "y": 420, "width": 80, "height": 14},
+                "computed_styles": {
+                    "color": "#999999", "background_color": "#ffffff", "font_size": "10px",
+                    "opacity": "0.6", "display": "inline", "visibility": "visible",
+                },
+            },
+        ],
+        "prechecked_inputs": [
+            {
+                "selector": "#newsletter",
+                "tag_name": "input",
+                "text_content": "",
+                "attributes": {"type": "checkbox", "checked": "checked"},
+                "bounding_rect": {"x": 50, "y": 600, "width": 16, "height": 16},
+                "computed_styles": {
+                    "color": "#000000", "background_color": "#ffffff", "font_size": "14px",
+                    "opacity": "1", "display": "inline", "visibility": "visible",
+                },
+            },
+        ],
+    },
+    "text_content": {
+        "button_labels": [
+            {"selector": "#accept", "text": "Accept all"},
+            {"selector": "#decline", "text": "No thanks, I don't want to save money"},
+        ],
+        "headings": [{"selector": "h1", "text": "Flash sale ends today!"}],
+        "body_text": "Only 3 left in stock! 47 people are viewing this right now.",
+    },
+    "review_text": None,
+}
+
+# URL used when the synthetic page goes through the request serializers.
+SYNTHETIC_URL = "https://warmup.invalid/"
+
+
+def synthetic_request(url: str = SYNTHETIC_URL) -> dict[str, object]:
+    """``SYNTHETIC_PAYLOAD`` as a valid /api/analyze request body for ``url``."""
+    return {
+        **SYNTHETIC_PAYLOAD,
+        "url": url,
+        "dom_metadata": {**SYNTHETIC_PAYLOAD["dom_metadata"], "url": url},  # type: ignore[dict-item]
+        "screenshot_b64": "data:image/png;base64,AAAA",
+    }
+
+
+_ready = threading.Event()
+_started = False
+_start_lock = threading.Lock()
+_report: dict[str, float] = {}
+
+
+def warmup_enabled() -> bool:
+    """Whether serving processes warm up before reporting ready."""
+    return bool(getattr(settings, "WARMUP_ON_START", True))
+
+
+def is_ready() -> bool:
+    """True once warmup has finished (always True when warmup is disabled)."""
+    return _ready.is_set() or not warmup_enabled()
+
+
+def warmup_report() -> dict[str, float]:
+    """Seconds spent in each warmup step so far."""
+    return dict(_report)
+
+
+# ── Steps ────────────────────────────────────────────────
+
+
+def _load_urls() -> None:
+    """Import the URLconf, and with it the views, serializers and DRF."""
+    from django.urls import get_resolver
+
+    get_resolver().resolve("/api/analyze")
+
+
+def _validate_request() -> None:
+    """Compile the validators' lazy regexes (URLs, choices) by using them once."""
+    from core.serializers import AnalyzeRequestSerializer, AnalyzeResponseSerializer
+
+    AnalyzeRequestSerializer(data=synthetic_request()).is_valid(raise_exception=True)
+    AnalyzeResponseSerializer(data={"detections": [{
+        "category": "preselection", "element_selector": "#newsletter", "confidence": 0.5,
+        "explanation": "warmup", "severity": "low", "corroborated": False,
+        "user_feedback": None, "sources": {"dom": 0.5},
+    }]}).is_valid(raise_exception=True)
+
+
+def _load_analyzers() -> None:
+    from core.analyzers import get_analyzers
+
+    get_analyzers()
+
+
+def _load_llm_client() -> None:
+    """Import the Gemini SDK and load its CA bundle, if an enabled analyzer will call it."""
+    from core.analyzers import get_analyzers
+
+    api_key = getattr(settings, "GOOGLE_API_KEY", "")
+    if api_key and any(a.uses_llm for a in get_analyzers().values()):
+        from core.llm import get_client
+
+        get_client(api_key, str(getattr(settings, "GEMINI_BASE_URL", "")))
+
+
+def _load_feedback_store() -> None:
+    if getattr(settings, "FEEDBACK_DIR", ""):
+        import pyarrow.ipc  # noqa: F401
+
+
+def _load_calibration() -> None:
+    from core.calibration import get_calibrator
+
+    get_calibrator()
+
+
+def _load_site_profiles() -> None:
+    from core.site_profiles import get_store, site_profiles_enabled
+
+    if site_profiles_enabled():
+        get_store()
+
+
+def _synthetic_analysis() -> None:
+    """Run the rules-only analyzers end to end (in the process pool, if enabled)."""
+    from core.analyzers import get_analyzers
+    from core.dispatcher import dispatch
+
+    analyzers = {name: a for name, a in get_analyzers().items() if a.cpu_bound}
+    asyncio.run(dispatch(analyzers, SYNTHETIC_PAYLOAD))
+
+
+STEPS: tuple[tuple[str, Callable[[], None]], ...] = (
+    ("urls", _load_urls),
+    ("serializers", _validate_request),
+    ("analyzers", _load_analyzers),
+    ("llm_client", _load_llm_client),
+    ("feedback_store", _load_feedback_store),
+    ("calibration", _load_calibration),
+    ("site_profiles", _load_site_profiles),
+    ("synthetic_analysis", _synthetic_analysis),
+)
+
+
+def warm_up() -> dict[str, float]:
+    """
+    Run every warmup step in this thread and mark the process ready.
+
+    A failing step is logged and skipped: the worker can still serve, it
+    will just load that part lazily.
+    """
+    started = time.perf_counter()
+    for name, step in STEPS:
+        t0 = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Warmup step %s failed", name)
+        _report[name] = time.perf_counter() - t0
+    _report["total"] = time.perf_counter() - started
+    _ready.set()
+    logger.info("Warmup finished in %.2fs", _report["total"])
+    return warmup_report()
+
+
+def start_warmup() -> None:
+    """Warm up in a background thread (once per process) if enabled."""
+    global _started  # noqa: PLW0603
+    if not warmup_enabled():
+        return
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=warm_up, name="warmup", daemon=True).start()
@@ -5,6 +5,7 @@ Django settings for DarkGuard backend.
 import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env.example")
@@ -33,6 +34,7 @@ INSTALLED_APPS: list[str] = [
 ]
 
 MIDDLEWARE: list[str] = [
+    "core.profiling.ProfilingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -56,11 +58,24 @@ REST_FRAMEWORK: dict[str, object] = {
         "rest_framework.renderers.JSONRenderer",
     ],
     "DEFAULT_PARSER_CLASSES": [
-        "rest_framework.parsers.JSONParser",
+        "core.parsers.CompressedJSONParser",
+        "core.parsers.MessagePackParser",
     ],
+    # Stateless API: no users, so skip loading django.contrib.auth
+    "DEFAULT_AUTHENTICATION_CLASSES": [],
     "UNAUTHENTICATED_USER": None,
 }
 
+# Analyzers this worker runs (any of: dom, text, visual, review)
+ENABLED_ANALYZERS: list[str] = [
+    a.strip()
+    for a in os.getenv("ENABLED_ANALYZERS", "dom,text,visual,review").split(",")
+    if a.strip()
+]
+
+# Max request body after Content-Encoding is undone (bytes)
+MAX_REQUEST_BODY_BYTES: int = int(os.getenv("MAX_REQUEST_BODY_BYTES", str(20 * 1024 * 1024)))
+
 # CORS — locked to chrome-extension:// and localhost for dev
 CORS_ALLOWED_ORIGIN_REGEXES: list[str] = [
     r"^chrome-extension://.*$",
@@ -70,9 +85,95 @@ CORS_ALLOWED_ORIGINS: list[str] = [
     "http://127.0.0.1:8000",
     "http://localhost:3000",
 ]
+# The extension gzips request bodies (see core/parsers.py) and may ask for
+# a request profile (see core/profiling.py)
+CORS_ALLOW_HEADERS: list[str] = [*default_headers, "content-encoding", "x-darkguard-profile"]
+CORS_EXPOSE_HEADERS: list[str] = ["x-darkguard-profile"]
+
+# Warm serving processes up before /api/ready reports them ready
+WARMUP_ON_START: bool = os.getenv("WARMUP_ON_START", "True").lower() in ("true", "1", "yes")
 
 # Analyzer timeout (seconds)
 ANALYZER_TIMEOUT: int = int(os.getenv("ANALYZER_TIMEOUT", "10"))
 
+# Share one in-flight analysis between concurrent requests for identical content
+COALESCE_ANALYSES: bool = os.getenv("COALESCE_ANALYSES", "True").lower() in ("true", "1", "yes")
+
+# Node-local state shared by all workers on a host: LLM result cache,
+# cross-worker dedup and LLM rate limiting ("mmap", "redis", "local" or "" = off).
+# Everything that writes to disk or /dev/shm is opt-in.
+SHARED_STATE_BACKEND: str = os.getenv("SHARED_STATE_BACKEND", "")
+SHARED_STATE_PATH: str = os.getenv("SHARED_STATE_PATH", "")
+SHARED_STATE_SLOTS: int = int(os.getenv("SHARED_STATE_SLOTS", "1024"))
+SHARED_STATE_SLOT_BYTES: int = int(os.getenv("SHARED_STATE_SLOT_BYTES", "16384"))
+SHARED_STATE_REDIS_URL: str = os.getenv("SHARED_STATE_REDIS_URL", "redis://localhost:6379/0")
+SHARED_CACHE_TTL_SECONDS: float = float(os.getenv("SHARED_CACHE_TTL_SECONDS", "300"))
+# Host-wide LLM calls per minute (0 = unlimited) and burst size
+LLM_RATE_PER_MINUTE: float = float(os.getenv("LLM_RATE_PER_MINUTE", "0"))
+LLM_RATE_BURST: float = float(os.getenv("LLM_RATE_BURST", "10"))
+
+# Process pool for CPU-bound analyzers (0 = run them inline on the event loop)
+ANALYZER_PROCESS_WORKERS: int = int(os.getenv("ANALYZER_PROCESS_WORKERS", "0"))
+
+# Site profiles: learned per-origin benign / dark selectors and layouts
+SITE_PROFILES_ENABLED: bool = os.getenv("SITE_PROFILES_ENABLED", "True").lower() in ("true", "1", "yes")
+SITE_PROFILE_MAX_SITES: int = int(os.getenv("SITE_PROFILE_MAX_SITES", "1000"))
+SITE_PROFILE_PATH: str = os.getenv("SITE_PROFILE_PATH", "")
+SITE_PROFILE_SNAPSHOT_SECONDS: int = int(os.getenv("SITE_PROFILE_SNAPSHOT_SECONDS", "60"))
+# False-positive feedback suppresses a detection once enough distinct clients agree
+SITE_PROFILE_SUPPRESS_VOTES: int = int(os.getenv("SITE_PROFILE_SUPPRESS_VOTES", "3"))
+SITE_PROFILE_SUPPRESS_RATIO: float = float(os.getenv("SITE_PROFILE_SUPPRESS_RATIO", "0.8"))
+SITE_PROFILE_VOTE_DAYS: float = float(os.getenv("SITE_PROFILE_VOTE_DAYS", "30"))
+
+# Feedback store: append-only Arrow IPC segments ("" disables storage)
+FEEDBACK_DIR: str = os.getenv("FEEDBACK_DIR", "")
+FEEDBACK_FLUSH_SECONDS: float = float(os.getenv("FEEDBACK_FLUSH_SECONDS", "5"))
+FEEDBACK_BATCH_ROWS: int = int(os.getenv("FEEDBACK_BATCH_ROWS", "1000"))
+FEEDBACK_COMPACT_SEGMENTS: int = int(os.getenv("FEEDBACK_COMPACT_SEGMENTS", "16"))
+FEEDBACK_MAX_BUFFERED: int = int(os.getenv("FEEDBACK_MAX_BUFFERED", "100000"))
+
+# Confidence calibration model fitted from feedback ("" = use raw confidences)
+CALIBRATION_PATH: str = os.getenv("CALIBRATION_PATH", "")
+
+# Job API: rule results now, LLM analyzers on a worker pool fed from a
+# SQLite queue ("" disables /api/jobs; workers only start when it is set)
+JOB_DB_PATH: str = os.getenv("JOB_DB_PATH", "")
+JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_SECONDS: float = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+JOB_MAX_WAIT_SECONDS: float = float(os.getenv("JOB_MAX_WAIT_SECONDS", "30"))
+JOB_POLL_SECONDS: float = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+
+# Trace recording for replay benchmarks: sanitized payloads, LLM responses
+# and detections of analyze requests ("" disables recording)
+TRACE_DIR: str = os.getenv("TRACE_DIR", "")
+TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "1"))
+TRACE_FILE_MAX_BYTES: int = int(os.getenv("TRACE_FILE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Per-request profiling: stage spans + stack samples written to PROFILE_DIR
+# for requests sent with X-DarkGuard-Profile (if allowed) or sampled at random
+# ("" disables profiling)
+PROFILE_DIR: str = os.getenv("PROFILE_DIR", "")
+PROFILE_ALLOW_HEADER: bool = os.getenv("PROFILE_ALLOW_HEADER", str(DEBUG)).lower() in ("true", "1", "yes")
+PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_INTERVAL_MS: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1"))
+PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Visual analyzer: max estimated tokens for the ElementMap prompt (0 = unlimited)
+VISUAL_PROMPT_TOKEN_BUDGET: int = int(os.getenv("VISUAL_PROMPT_TOKEN_BUDGET", "4000"))
+
+# Visual analyzer: max concurrent LLM calls when a page is analysed in regions
+VISUAL_LLM_CONCURRENCY: int = int(os.getenv("VISUAL_LLM_CONCURRENCY", "4"))
+
+# Review analyzer: max estimated tokens of sampled reviews in the prompt (0 = unlimited)
+REVIEW_PROMPT_TOKEN_BUDGET: int = int(os.getenv("REVIEW_PROMPT_TOKEN_BUDGET", "3000"))
+
+# Review analyzer: width of the sliding window for posting bursts in dated reviews
+REVIEW_BURST_WINDOW_HOURS: float = float(os.getenv("REVIEW_BURST_WINDOW_HOURS", "24"))
+
 # Google GenAI
 GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
+
+# Gemini API base URL override, e.g. a local fake server for tests ("" = default)
+GEMINI_BASE_URL: str = os.getenv("GEMINI_BASE_URL", "")
@@ -0,0 +1,25 @@
+"""
+Minimal "rules-only" settings profile for small worker pods.
+
+Runs only the DOM and text rule engines, and loads nothing they don't
+need: no visual / review apps (so no Gemini client), no contenttypes or
+staticfiles apps, and no feedback store (so no pyarrow) unless
+FEEDBACK_DIR is set. Jobs finish at submit time (there are no
+LLM analyzers), so no job workers are started.
+
+    DJANGO_SETTINGS_MODULE=darkguard.settings_rules_only gunicorn darkguard.wsgi
+"""
+
+from darkguard.settings import *  # noqa: F403
+
+INSTALLED_APPS = [
+    "corsheaders",
+    "rest_framework",
+    "core",
+    "dom_analyzer",
+    "text_analyzer",
+]
+
+ENABLED_ANALYZERS = ["dom", "text"]
+
+JOB_WORKERS = 0
@@ -7,3 +7,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "darkguard.settings")
 
 application = get_wsgi_application()
+
+# Warm this worker up in the background; /api/ready reports when it is done.
+from core.warmup import start_warmup  # noqa: E402
+
+start_warmup()
+
+# Run queued LLM analyses for /api/jobs in background threads.
+from core.jobs import start_job_workers  # noqa: E402
+
+start_job_workers()
@@ -9,80 +9,203 @@ Rules engine that detects dark patterns from DOM metadata:
 
 from __future__ import annotations
 
+import re
+
+from core import diagnostics
 from core.interfaces import BaseAnalyzer
 from core.models import Detection
+from core.page import DocumentMetrics, PageElement, PageModel
+from core.profiling import span
+
+# WCAG AA minimum for large text; anything below is hard to read at any size.
+LOW_CONTRAST_RATIO = 3.0
+
+COST_PATTERN = re.compile(
+    r"\b(fees?|surcharge|service\s+charge|handling|processing\s+charge|"
+    r"auto[\s-]?renew\w*|recurring|per\s+month|/\s?mo\b)"
+    r"|[$€£¥]\s?\d|\d+(?:[.,]\d{2})?\s?(?:usd|eur|gbp)\b",
+    re.IGNORECASE,
+)
+
+OPT_OUT_PATTERN = re.compile(
+    r"\b(unsubscribe|opt[\s-]?out|decline|reject(\s+all)?|no\s+thanks|cancel|"
+    r"do\s+not\s+sell|don'?t\s+sell|withdraw\s+consent)\b",
+    re.IGNORECASE,
+)
+
+
+def _outside_document(el: PageElement, document: DocumentMetrics) -> bool:
+    """Whether the element lies entirely outside the document's scrollable area."""
+    x, y = el.x + document.scroll_x, el.y + document.scroll_y
+    if x + el.width <= 0 or y + el.height <= 0:
+        return True
+    return (0 < document.width <= x) or (0 < document.height <= y)
 
 
 class DomAnalyzerService(BaseAnalyzer):
     """Analyzes DOM metadata for dark-pattern signals."""
 
-    async def analyze(self, payload: dict[str, object]) -> list[Detection]:
+    cpu_bound = True
+    payload_keys = ("dom_metadata", "text_content")
+
+    async def analyze(
+        self, payload: dict[str, object], page: PageModel | None = None
+    ) -> list[Detection]:
+        if page is None:
+            page = PageModel.from_payload(payload)
+        if not page.has_dom:
+            diagnostics.skipped("no DOM metadata")
+            return []
+
         detections: list[Detection] = []
 
-        dom_metadata = payload.get("dom_metadata", {})
-        if not isinstance(dom_metadata, dict):
-            return detections
+        # Check pre-selected inputs (hidden ones are reported by the hidden rules)
+        with span("dom:prechecked_inputs"):
+            detections.extend(diagnostics.attribute(self._check_prechecked(page.prechecked)))
 
-        # Check pre-selected inputs
-        prechecked = dom_metadata.get("prechecked_inputs", [])
-        if isinstance(prechecked, list):
-            for el in prechecked:
-                if isinstance(el, dict):
-                    detections.append(
-                        Detection(
-                            category="preselection",
-                            element_selector=el.get("selector", ""),
-                            confidence=0.85,
-                            explanation=(
-                                "This checkbox/radio is pre-selected, which may "
-                                "trick users into opting in unintentionally."
-                            ),
-                            severity="medium",
-                        )
-                    )
+        with span("dom:hidden_elements"):
+            detections.extend(diagnostics.attribute(self._check_hidden_elements(page.hidden)))
 
         # Check interactive element size disparity
-        interactive = dom_metadata.get("interactive_elements", [])
-        if isinstance(interactive, list):
-            detections.extend(self._check_size_disparity(interactive))
-            detections.extend(self._check_low_contrast(interactive))
+        with span("dom:size_disparity"):
+            detections.extend(diagnostics.attribute(self._check_size_disparity(page)))
+        with span("dom:low_contrast"):
+            detections.extend(diagnostics.attribute(self._check_low_contrast(page.interactive)))
+        with span("dom:concealed_opt_outs"):
+            detections.extend(
+                diagnostics.attribute(self._check_concealed_opt_outs(page.interactive, page.document))
+            )
+
+        return detections
+
+    def _check_prechecked(self, prechecked: tuple[PageElement, ...]) -> list[Detection]:
+        """Visible pre-selected checkboxes/radios."""
+        return [
+            Detection(
+                category="preselection",
+                element_selector=el.selector,
+                confidence=0.85,
+                explanation=(
+                    "This checkbox/radio is pre-selected, which may "
+                    "trick users into opting in unintentionally."
+                ),
+                severity="medium",
+            )
+            for el in prechecked
+            if not el.is_hidden
+        ]
+
+    def _check_hidden_elements(self, hidden: tuple[PageElement, ...]) -> list[Detection]:
+        """Single pass over hidden elements: concealed consents, costs, opt-outs."""
+        detections: list[Detection] = []
+
+        for el in hidden:
+            is_checked = "prechecked_inputs" in el.sources or (
+                el.tag_name == "input"
+                and el.attribute("type").lower() in ("checkbox", "radio")
+                and "checked" in el.attributes
+            )
+            if is_checked:
+                detections.append(
+                    Detection(
+                        category="preselection",
+                        element_selector=el.selector,
+                        confidence=0.9,
+                        explanation=(
+                            "This option is pre-selected and hidden from view, so "
+                            "users cannot see or untick it."
+                        ),
+                        severity="high",
+                    )
+                )
+                continue
+
+            text = el.text
+            if not text:
+                continue
+
+            cost = COST_PATTERN.search(text)
+            if cost:
+                detections.append(
+                    Detection(
+                        category="hidden_costs",
+                        element_selector=el.selector,
+                        confidence=0.65,
+                        explanation=(
+                            f'Cost or fee information is hidden on the page: "{text[:80]}"'
+                        ),
+                        severity="medium",
+                    )
+                )
+            elif OPT_OUT_PATTERN.search(text):
+                detections.append(self._concealed_opt_out(el.selector, text, "hidden"))
 
         return detections
 
-    def _check_size_disparity(
-        self, elements: list[object]
+    def _check_concealed_opt_outs(
+        self, elements: tuple[PageElement, ...], document: DocumentMetrics | None
     ) -> list[Detection]:
-        """Flag button pairs where accept is much larger than decline."""
+        """
+        Flag visible-by-CSS opt-outs that are zero-size or lie entirely
+        outside the document. Rects are viewport-relative, so an element
+        above the viewport may just have been scrolled past; without the
+        scroll offset only zero-size elements are flagged.
+        """
         detections: list[Detection] = []
-        buttons: list[dict[str, object]] = [
-            e for e in elements if isinstance(e, dict)
-            and isinstance(e.get("tag_name"), str)
-            and e.get("tag_name") in ("button", "a")
-        ]
 
-        for i, btn_a in enumerate(buttons):
-            rect_a = btn_a.get("bounding_rect", {})
-            if not isinstance(rect_a, dict):
+        for el in elements:
+            if not el.has_geometry:
+                continue
+            width, height = el.width, el.height
+            if width * height == 0:
+                reason = "zero-size"
+            elif document is not None and _outside_document(el, document):
+                reason = "positioned off-screen"
+            else:
                 continue
-            area_a = float(rect_a.get("width", 0)) * float(rect_a.get("height", 0))
 
-            for btn_b in buttons[i + 1:]:
-                rect_b = btn_b.get("bounding_rect", {})
-                if not isinstance(rect_b, dict):
-                    continue
-                area_b = float(rect_b.get("width", 0)) * float(rect_b.get("height", 0))
+            text = el.text
+            if text and OPT_OUT_PATTERN.search(text):
+                detections.append(self._concealed_opt_out(el.selector, text, reason))
+
+        return detections
+
+    @staticmethod
+    def _concealed_opt_out(selector: str, text: str, reason: str) -> Detection:
+        return Detection(
+            category="misdirection",
+            element_selector=selector,
+            confidence=0.75,
+            explanation=(
+                f'The opt-out option "{text[:60]}" is {reason}, so users are '
+                f"unlikely to find it."
+            ),
+            severity="high",
+        )
+
+    def _check_size_disparity(self, page: PageModel) -> list[Detection]:
+        """Flag button pairs where accept is much larger than decline."""
+        detections: list[Detection] = []
+        widths, heights = page.widths, page.heights
+        buttons = [el for el in page.interactive if el.tag_name in ("button", "a")]
+        # Areas read straight from the geometry columns, computed once per button.
+        areas = [widths[el.index] * heights[el.index] for el in buttons]
 
-                if area_a == 0 or area_b == 0:
+        for i, area_a in enumerate(areas):
+            if area_a == 0:
+                continue
+            for j in range(i + 1, len(areas)):
+                area_b = areas[j]
+                if area_b == 0:
                     continue
 
                 ratio = max(area_a, area_b) / min(area_a, area_b)
                 if ratio > 3.0:
-                    smaller = btn_a if area_a < area_b else btn_b
-                    selector = str(smaller.get("selector", ""))
+                    smaller = buttons[i] if area_a < area_b else buttons[j]
                     detections.append(
                         Detection(
                             category="visual_interference",
-                            element_selector=selector,
+                            element_selector=smaller.selector,
                             confidence=min(0.5 + (ratio - 3) * 0.1, 0.95),
                             explanation=(
                                 f"This button is {ratio:.1f}× smaller than a "
@@ -94,36 +217,42 @@ class DomAnalyzerService(BaseAnalyzer):
         return detections
 
     def _check_low_contrast(
-        self, elements: list[object]
+        self, elements: tuple[PageElement, ...]
     ) -> list[Detection]:
         """Flag elements with very low text contrast (grey-on-grey)."""
         detections: list[Detection] = []
 
         for el in elements:
-            if not isinstance(el, dict):
-                continue
-            styles = el.get("computed_styles", {})
-            if not isinstance(styles, dict):
-                continue
-
-            opacity = styles.get("opacity", "1")
-            try:
-                opacity_val = float(opacity)
-            except (ValueError, TypeError):
-                opacity_val = 1.0
+            parsed = el.parsed_styles
 
-            if opacity_val < 0.4:
+            if parsed.opacity < 0.4:
                 detections.append(
                     Detection(
                         category="visual_interference",
-                        element_selector=str(el.get("selector", "")),
+                        element_selector=el.selector,
                         confidence=0.8,
                         explanation=(
-                            f"This element has very low opacity ({opacity_val:.2f}), "
+                            f"This element has very low opacity ({parsed.opacity:.2f}), "
                             f"making it hard to see or read."
                         ),
                         severity="medium",
                     )
                 )
+                continue
+
+            ratio = parsed.contrast_ratio
+            if ratio is not None and ratio < LOW_CONTRAST_RATIO and el.text_content:
+                detections.append(
+                    Detection(
+                        category="visual_interference",
+                        element_selector=el.selector,
+                        confidence=0.7,
+                        explanation=(
+                            f"This element's text has a contrast ratio of only "
+                            f"{ratio:.1f}:1 against its background, making it hard to read."
+                        ),
+                        severity="medium",
+                    )
+                )
 
         return detections
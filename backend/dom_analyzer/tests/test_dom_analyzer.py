@@ -19,6 +19,34 @@ def _run(coro: object) -> list[Detection]:
     return asyncio.run(coro)  # type: ignore[arg-type]
 
 
+# 1280x8000 document, not scrolled
+_DOCUMENT = {"scroll_x": 0, "scroll_y": 0, "width": 1280, "height": 8000}
+
+
+def _element(
+    selector: str,
+    text: str = "",
+    tag_name: str = "div",
+    rect: dict[str, float] | None = None,
+    attributes: dict[str, str] | None = None,
+) -> dict[str, object]:
+    return {
+        "selector": selector,
+        "tag_name": tag_name,
+        "text_content": text,
+        "attributes": attributes or {},
+        "bounding_rect": rect or {"x": 0, "y": 0, "width": 0, "height": 0},
+        "computed_styles": {
+            "color": "black",
+            "background_color": "white",
+            "font_size": "14px",
+            "opacity": "1",
+            "display": "none",
+            "visibility": "visible",
+        },
+    }
+
+
 class TestDomAnalyzer:
     """Unit tests for DomAnalyzerService."""
 
@@ -91,3 +119,115 @@ class TestDomAnalyzer:
         results = _run(service.analyze(payload))
         for det in results:
             assert 0.0 <= det.confidence <= 1.0
+
+    def test_detects_low_contrast_text(self, service: DomAnalyzerService) -> None:
+        payload = {
+            "dom_metadata": {
+                "hidden_elements": [],
+                "interactive_elements": [
+                    {
+                        "selector": "#decline",
+                        "tag_name": "a",
+                        "text_content": "No thanks",
+                        "attributes": {},
+                        "bounding_rect": {"x": 0, "y": 0, "width": 80, "height": 14},
+                        "computed_styles": {
+                            "color": "rgb(200, 200, 200)",
+                            "background_color": "rgb(230, 230, 230)",
+                            "font_size": "10px",
+                            "opacity": "1",
+                            "display": "inline",
+                            "visibility": "visible",
+                        },
+                    }
+                ],
+                "prechecked_inputs": [],
+                "url": "https://example.com",
+            }
+        }
+        results = _run(service.analyze(payload))
+        assert [d.element_selector for d in results] == ["#decline"]
+        assert results[0].category == "visual_interference"
+
+
+class TestHiddenElementRules:
+    """Rules over the collector's hidden_elements list."""
+
+    def _payload(
+        self,
+        hidden: list[dict[str, object]],
+        interactive: list[dict[str, object]] | None = None,
+        prechecked: list[dict[str, object]] | None = None,
+        labels: list[dict[str, str]] | None = None,
+    ) -> dict[str, object]:
+        return {
+            "dom_metadata": {
+                "hidden_elements": hidden,
+                "interactive_elements": interactive or [],
+                "prechecked_inputs": prechecked or [],
+                "url": "https://example.com",
+            },
+            "text_content": {"button_labels": labels or [], "headings": [], "body_text": ""},
+        }
+
+    def test_hidden_prechecked_consent_joins_prechecked_list(
+        self, service: DomAnalyzerService
+    ) -> None:
+        consent = _element("#share-data", tag_name="input", attributes={"type": "checkbox"})
+        results = _run(service.analyze(self._payload([consent], prechecked=[consent])))
+        assert [(d.element_selector, d.category, d.severity) for d in results] == [
+            ("#share-data", "preselection", "high"),
+        ]
+
+    def test_hidden_fee_text(self, service: DomAnalyzerService) -> None:
+        fee = _element(".fine-print", "A $4.99 service fee applies at checkout")
+        results = _run(service.analyze(self._payload([fee])))
+        assert [(d.element_selector, d.category) for d in results] == [
+            (".fine-print", "hidden_costs"),
+        ]
+
+    def test_offscreen_and_zero_size_opt_outs(self, service: DomAnalyzerService) -> None:
+        offscreen = _element(
+            "#unsub", "Unsubscribe", "a", rect={"x": -9999, "y": 10, "width": 80, "height": 20}
+        )
+        zero_size = _element("#reject", "", "button")
+        payload = self._payload(
+            [],
+            interactive=[offscreen, zero_size],
+            labels=[{"selector": "#reject", "text": "Reject all"}],
+        )
+        payload["dom_metadata"]["document"] = _DOCUMENT  # type: ignore[index]
+        results = _run(service.analyze(payload))
+        assert sorted((d.element_selector, d.category) for d in results) == [
+            ("#reject", "misdirection"),
+            ("#unsub", "misdirection"),
+        ]
+
+    def test_opt_out_scrolled_above_the_viewport_is_not_flagged(
+        self, service: DomAnalyzerService
+    ) -> None:
+        # Scrolled 3000px down: a footer link at page y=1200 has a viewport y of -1800.
+        scrolled_past = _element(
+            "#decline", "No thanks", "a", rect={"x": 40, "y": -1800, "width": 80, "height": 20}
+        )
+        payload = self._payload([], interactive=[scrolled_past])
+        payload["dom_metadata"]["document"] = {**_DOCUMENT, "scroll_y": 3000}  # type: ignore[index]
+
+        assert _run(service.analyze(payload)) == []
+
+    def test_opt_out_above_the_document_is_flagged(self, service: DomAnalyzerService) -> None:
+        above = _element(
+            "#decline", "No thanks", "a", rect={"x": 40, "y": -4000, "width": 80, "height": 20}
+        )
+        payload = self._payload([], interactive=[above])
+        payload["dom_metadata"]["document"] = {**_DOCUMENT, "scroll_y": 3000}  # type: ignore[index]
+
+        assert [d.element_selector for d in _run(service.analyze(payload))] == ["#decline"]
+
+    def test_without_scroll_offset_only_zero_size_is_flagged(
+        self, service: DomAnalyzerService
+    ) -> None:
+        offscreen = _element(
+            "#unsub", "Unsubscribe", "a", rect={"x": -9999, "y": 10, "width": 80, "height": 20}
+        )
+        assert _run(service.analyze(self._payload([], interactive=[offscreen]))) == []
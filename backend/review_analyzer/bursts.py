@@ -0,0 +1,172 @@
+"""
+review_analyzer/bursts.py — Posting bursts and rating spikes in dated reviews.
+
+Reviews with a timestamp are sorted once (O(n log n)). A window of
+``window`` seconds then slides over them with two pointers, keeping a
+histogram of the ratings inside it. Each review enters and leaves the
+window once, so the scan itself is O(n).
+
+- **Posting burst**: the busiest window holds at least ``MIN_BURST_REVIEWS``
+  reviews, ``BURST_FACTOR`` times as many as the average rate over the
+  whole period would put in it, and more than steady random posting would
+  plausibly put in *any* window of the period. The last test is a scan
+  statistic: with many windows to choose from, the busiest one of a
+  uniformly random (Poisson) stream is well above the average, so its
+  count is checked against Alm's approximation of the scan distribution
+  at ``BURST_P_VALUE``.
+- **Rating spike**: a window of at least ``MIN_BURST_REVIEWS`` rated reviews
+  whose mean rating is ``SPIKE_DELTA`` stars above the mean of the other
+  rated reviews, with most of them at five stars, and more five-star
+  ratings than the page-wide five-star share plausibly puts in a window
+  that size. That last test is a binomial tail multiplied by the number
+  of windows scanned (Bonferroni), checked at ``SPIKE_P_VALUE``: a page
+  that is mostly five stars has plenty of all-five-star windows by chance.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from math import exp, lgamma, log
+
+from core.page import Review
+
+MIN_BURST_REVIEWS = 5
+# Busiest window vs. the count a steady rate would give.
+BURST_FACTOR = 4.0
+# Chance that steady random posting yields a window this busy.
+BURST_P_VALUE = 0.001
+# Mean rating inside the window vs. outside it (stars).
+SPIKE_DELTA = 1.0
+# Share of the window's ratings at five stars.
+SPIKE_TOP_SHARE = 0.8
+# Chance that the page's own five-star share yields a window like it.
+SPIKE_P_VALUE = 0.001
+# Ratings are bucketed to whole stars (0–5).
+STARS = 6
+
+
+@dataclass(frozen=True, slots=True)
+class Window:
+    """A stretch of time and the reviews posted in it."""
+
+    start: float
+    end: float
+    count: int
+    authors: int
+    mean_rating: float | None = None
+    baseline_rating: float | None = None
+
+    @property
+    def started(self) -> str:
+        return datetime.fromtimestamp(self.start, timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+
+@dataclass(frozen=True, slots=True)
+class BurstReport:
+    """What ``find_bursts`` found; either part may be None."""
+
+    dated: int
+    expected: float
+    """Reviews a steady posting rate would put in one window."""
+
+    burst: Window | None
+    spike: Window | None
+
+
+def _stars(rating: float) -> int:
+    return min(STARS - 1, max(0, round(rating)))
+
+
+def _poisson_pmf(k: int, mean: float) -> float:
+    return exp(k * log(mean) - mean - lgamma(k + 1))
+
+
+def scan_p_value(count: int, n: int, window: float, period: float) -> float:
+    """Chance that ``n`` reviews posted at random over ``period`` seconds put
+    ``count`` or more in some ``window``-second window (Alm, 1983)."""
+    mean = n * window / period
+    if count <= mean:
+        return 1.0
+    below = min(1.0, sum(_poisson_pmf(i, mean) for i in range(count)))
+    windows = (n / period) * (period - window)
+    rate = (count - mean) / count * windows * _poisson_pmf(count - 1, mean)
+    return 1.0 - below * exp(-rate)
+
+
+def binomial_tail(k: int, n: int, p: float) -> float:
+    """Chance of ``k`` or more successes in ``n`` trials with probability ``p``."""
+    if k <= 0 or p >= 1.0:
+        return 1.0
+    if p <= 0.0:
+        return 0.0
+    return min(1.0, sum(
+        exp(lgamma(n + 1) - lgamma(i + 1) - lgamma(n - i + 1) + i * log(p) + (n - i) * log(1 - p))
+        for i in range(k, n + 1)
+    ))
+
+
+def find_bursts(reviews: Iterable[Review], window: float) -> BurstReport:
+    """Slide a ``window``-second window over the dated ``reviews``."""
+    dated = sorted(
+        ((r.timestamp, r.rating, r.author_hash) for r in reviews if r.timestamp is not None),
+        key=lambda item: item[0],
+    )
+    n = len(dated)
+    if n < MIN_BURST_REVIEWS or window <= 0:
+        return BurstReport(n, 0.0, None, None)
+
+    period = max(dated[-1][0] - dated[0][0], window)
+    expected = n * window / period
+
+    ratings = [_stars(r) for _, r, _ in dated if r is not None]
+    rated_total, rating_sum = len(ratings), sum(ratings)
+    top_share = ratings.count(STARS - 1) / rated_total if rated_total else 0.0
+
+    best: tuple[int, int, int] | None = None  # (count, left, right)
+    spike: tuple[float, int, int, float, float] | None = None  # (delta, left, right, mean, baseline)
+    histogram = [0] * STARS
+    left = 0
+    for right, (t, rating, _) in enumerate(dated):
+        if rating is not None:
+            histogram[_stars(rating)] += 1
+        while dated[left][0] <= t - window:
+            old = dated[left][1]
+            if old is not None:
+                histogram[_stars(old)] -= 1
+            left += 1
+
+        count = right - left + 1
+        if best is None or count > best[0]:
+            best = (count, left, right)
+
+        rated = sum(histogram)
+        if rated >= MIN_BURST_REVIEWS and rated_total > rated:
+            inside = sum(stars * k for stars, k in enumerate(histogram))
+            mean = inside / rated
+            baseline = (rating_sum - inside) / (rated_total - rated)
+            delta = mean - baseline
+            if (
+                delta >= SPIKE_DELTA
+                and histogram[-1] / rated >= SPIKE_TOP_SHARE
+                and (spike is None or delta > spike[0])
+                and binomial_tail(histogram[-1], rated, top_share) * rated_total <= SPIKE_P_VALUE
+            ):
+                spike = (delta, left, right, mean, baseline)
+
+    def _window(left: int, right: int, **ratings: float) -> Window:
+        authors = {a for _, _, a in dated[left:right + 1] if a}
+        return Window(dated[left][0], dated[right][0], right - left + 1, len(authors), **ratings)
+
+    burst = None
+    if (
+        best is not None
+        and best[0] >= max(MIN_BURST_REVIEWS, BURST_FACTOR * expected)
+        and scan_p_value(best[0], n, window, period) <= BURST_P_VALUE
+    ):
+        burst = _window(best[1], best[2])
+    rating_spike = None
+    if spike is not None:
+        rating_spike = _window(spike[1], spike[2], mean_rating=spike[3], baseline_rating=spike[4])
+    return BurstReport(n, expected, burst, rating_spike)
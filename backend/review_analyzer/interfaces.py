@@ -4,7 +4,17 @@ review_analyzer/interfaces.py — Payload/result types for the review analyzer.
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+
+@dataclass
+class ReviewItem:
+    """One structured review."""
+
+    text: str
+    date: str | None = None
+    rating: float | None = None
+    author_hash: str = ""
 
 
 @dataclass
@@ -13,6 +23,7 @@ class ReviewPayload:
 
     review_text: str
     url: str
+    reviews: list[ReviewItem] = field(default_factory=list)
 
 
 @dataclass
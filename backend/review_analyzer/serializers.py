@@ -4,8 +4,11 @@ from __future__ import annotations
 
 from rest_framework import serializers
 
+from core.serializers import MAX_REVIEWS, ReviewSerializer
+
 
 class ReviewPayloadSerializer(serializers.Serializer[dict[str, object]]):
     """Validates the review portion of the analysis request."""
 
     review_text = serializers.CharField(allow_null=True, required=False)
+    reviews = ReviewSerializer(many=True, required=False, max_length=MAX_REVIEWS)
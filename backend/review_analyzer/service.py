@@ -3,31 +3,53 @@ review_analyzer/service.py — Review Analyzer Service.
 
 Detects fake social proof by analyzing review text:
 - Burst patterns (many similar reviews in a short span)
+- Posting bursts and rating spikes in dated reviews (review_analyzer/bursts.py)
 - Templated/repetitive praise
 - Suspiciously generic language via LLM
+
+Reviews are scanned in one streaming pass (review_analyzer/pipeline.py):
+statistics cover every review, while the similarity check and the LLM see
+bounded, stratified samples, so review blobs of any size fit in memory and
+in the prompt budget.
 """
 
 from __future__ import annotations
 
-import json
 import logging
-import re
-from collections import Counter
 
 from django.conf import settings
 
+from core import diagnostics, partial
+from core.executor import run_cpu_bound
 from core.interfaces import BaseAnalyzer
+from core.llm import stream_json_items
 from core.models import Detection
+from core.page import PageModel
+from core.profiling import span
+from review_analyzer.bursts import BurstReport, find_bursts
+from review_analyzer.pipeline import (
+    ReviewScan,
+    build_review_prompt,
+    scan_reviews,
+    similar_pairs,
+)
 
 logger = logging.getLogger(__name__)
 
-# Heuristic patterns for fake reviews
-GENERIC_PRAISE_PATTERNS: list[re.Pattern[str]] = [
-    re.compile(r"(great|amazing|excellent|fantastic|awesome)\s+(product|item|purchase)", re.IGNORECASE),
-    re.compile(r"(highly\s+recommend|must\s+buy|best\s+purchase)", re.IGNORECASE),
-    re.compile(r"(five\s+stars?|5\s+stars?|⭐{3,})", re.IGNORECASE),
-    re.compile(r"(exceeded\s+expectations?|love\s+it|perfect)", re.IGNORECASE),
-]
+# Below this much review text the pickle round-trip costs more than it saves.
+OFFLOAD_MIN_CHARS = 64 * 1024
+
+
+def _get_burst_window() -> float:
+    """Width of the posting-burst window, in seconds."""
+    return float(getattr(settings, "REVIEW_BURST_WINDOW_HOURS", 24)) * 3600
+
+
+def _get_prompt_token_budget() -> int | None:
+    """Read the review prompt budget from settings (0 disables it)."""
+    budget = int(getattr(settings, "REVIEW_PROMPT_TOKEN_BUDGET", 3000))
+    return budget if budget > 0 else None
+
 
 SYSTEM_PROMPT = """You are a fake-review detection expert. Analyze the following review texts
 and identify signs of fake social proof or manipulated reviews.
@@ -55,80 +77,127 @@ Respond ONLY with the JSON array, no other text."""
 class ReviewAnalyzerService(BaseAnalyzer):
     """Analyzes review text for fake social-proof patterns."""
 
-    async def analyze(self, payload: dict[str, object]) -> list[Detection]:
-        review_text = payload.get("review_text")
-        if not review_text or not isinstance(review_text, str):
-            return []
+    payload_keys = ("review_text", "reviews", "url")
+    uses_llm = True
 
-        review_text = review_text.strip()
-        if len(review_text) < 20:
+    async def analyze(
+        self, payload: dict[str, object], page: PageModel | None = None
+    ) -> list[Detection]:
+        if page is None:
+            page = PageModel.from_payload(payload)
+        # Text heuristics read review_text, or the structured reviews' texts.
+        review_text = (page.review_text or "").strip()
+        texts: str | list[str] = review_text or [r.text for r in page.reviews]
+        size = len(review_text) or sum(len(t) for t in texts)
+        if size < 20 and not page.reviews:
+            diagnostics.skipped("no reviews")
             return []
 
-        # Split into individual reviews
-        reviews = [r.strip() for r in review_text.split("---") if r.strip()]
-
-        # Heuristic analysis first
-        detections = self._heuristic_analysis(reviews)
+        # One pass over the text; large blobs go to the process pool
+        # (if enabled).
+        with span("review:heuristics"):
+            if size >= OFFLOAD_MIN_CHARS:
+                scan, detections = await run_cpu_bound(self._scan, texts)
+            else:
+                scan, detections = self._scan(texts)
+            diagnostics.attribute(detections)
+        if page.reviews:
+            with span("review:bursts"):
+                report = find_bursts(page.reviews, _get_burst_window())
+                detections.extend(diagnostics.attribute(self._burst_analysis(report)))
+        partial.emit(*detections)
 
         # LLM analysis if API key is available
         api_key = getattr(settings, "GOOGLE_API_KEY", "")
-        if api_key and len(reviews) >= 3:
-            llm_detections = await self._llm_analysis(review_text, api_key)
+        if api_key and scan.total >= 3:
+            with span("review:llm"):
+                llm_detections = diagnostics.attribute(await self._llm_analysis(scan, api_key))
             detections.extend(llm_detections)
+        elif not api_key:
+            diagnostics.note("no GOOGLE_API_KEY: heuristics only")
+
+        return detections
+
+    def _scan(self, texts: str | list[str]) -> tuple[ReviewScan, list[Detection]]:
+        scan = scan_reviews(texts)
+        return scan, self._heuristic_analysis(scan)
+
+    def _burst_analysis(self, report: BurstReport) -> list[Detection]:
+        """Posting bursts and rating spikes among dated reviews."""
+        detections: list[Detection] = []
+        hours = _get_burst_window() / 3600
+
+        if report.burst is not None:
+            burst = report.burst
+            authors = f" from {burst.authors} distinct authors" if burst.authors else ""
+            detections.append(
+                Detection(
+                    category="fake_social_proof",
+                    element_selector="[itemprop='reviewBody']",
+                    confidence=0.7,
+                    explanation=(
+                        f"{burst.count} of {report.dated} dated reviews{authors} were posted "
+                        f"within {hours:g}h of {burst.started} UTC, "
+                        f"{burst.count / max(report.expected, 1e-9):.0f}x the usual rate, "
+                        f"suggesting a review burst."
+                    ),
+                    severity="medium",
+                )
+            )
+
+        if report.spike is not None:
+            spike = report.spike
+            detections.append(
+                Detection(
+                    category="fake_social_proof",
+                    element_selector="[itemprop='reviewBody']",
+                    confidence=0.75,
+                    explanation=(
+                        f"{spike.count} reviews posted within {hours:g}h of {spike.started} UTC "
+                        f"average {spike.mean_rating:.1f} stars against {spike.baseline_rating:.1f} "
+                        f"for the rest, suggesting a coordinated rating push."
+                    ),
+                    severity="high",
+                )
+            )
 
         return detections
 
-    def _heuristic_analysis(self, reviews: list[str]) -> list[Detection]:
+    def _heuristic_analysis(self, scan: ReviewScan) -> list[Detection]:
         """Rule-based fake review detection."""
         detections: list[Detection] = []
 
-        if len(reviews) < 2:
+        if scan.total < 2:
             return detections
 
-        # Check for generic praise patterns
-        generic_count = 0
-        for review in reviews:
-            for pattern in GENERIC_PRAISE_PATTERNS:
-                if pattern.search(review):
-                    generic_count += 1
-                    break
-
-        if len(reviews) >= 3 and generic_count / len(reviews) > 0.6:
+        # Check for generic praise patterns (counted over every review)
+        if scan.total >= 3 and scan.generic / scan.total > 0.6:
             detections.append(
                 Detection(
                     category="fake_social_proof",
                     element_selector="[itemprop='reviewBody']",
                     confidence=0.7,
                     explanation=(
-                        f"{generic_count} of {len(reviews)} reviews use generic "
+                        f"{scan.generic} of {scan.total} reviews use generic "
                         f"praise patterns, suggesting templated or fake reviews."
                     ),
                     severity="medium",
                 )
             )
 
-        # Check for suspiciously similar reviews (burst pattern)
-        if len(reviews) >= 5:
-            # Simple similarity: count reviews that share 3+ consecutive words
-            similar_pairs = 0
-            total_pairs = 0
-            words_per_review = [set(r.lower().split()) for r in reviews]
-
-            for i in range(len(reviews)):
-                for j in range(i + 1, len(reviews)):
-                    total_pairs += 1
-                    overlap = words_per_review[i] & words_per_review[j]
-                    if len(overlap) > max(5, min(len(words_per_review[i]), len(words_per_review[j])) * 0.4):
-                        similar_pairs += 1
-
-            if total_pairs > 0 and similar_pairs / total_pairs > 0.3:
+        # Check for suspiciously similar reviews (burst pattern); the
+        # pairwise check is quadratic, so it runs on the uniform sample.
+        if scan.total >= 5:
+            similar, total_pairs = similar_pairs(scan.similarity_sample)
+            if total_pairs > 0 and similar / total_pairs > 0.3:
+                sampled = f" (in a sample of {len(scan.similarity_sample)} reviews)" if scan.sampled else ""
                 detections.append(
                     Detection(
                         category="fake_social_proof",
                         element_selector="[itemprop='reviewBody']",
                         confidence=0.75,
                         explanation=(
-                            f"{similar_pairs} review pairs share unusually high "
+                            f"{similar} review pairs{sampled} share unusually high "
                             f"word overlap, suggesting burst-generated reviews."
                         ),
                         severity="high",
@@ -138,40 +207,31 @@ class ReviewAnalyzerService(BaseAnalyzer):
         return detections
 
     async def _llm_analysis(
-        self, review_text: str, api_key: str
+        self, scan: ReviewScan, api_key: str
     ) -> list[Detection]:
         """LLM-based fake review detection."""
         detections: list[Detection] = []
+        reviews, shown = build_review_prompt(scan, _get_prompt_token_budget())
+        logger.info("Review prompt: %d of %d reviews, %d chars", shown, scan.total, len(reviews))
 
         try:
-            from google import genai
-
-            client = genai.Client(api_key=api_key)
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=f"{SYSTEM_PROMPT}\n\n---\n\n{review_text[:3000]}",
-            )
-
-            response_text = response.text or "[]"
-
-            if response_text.startswith("```"):
-                lines = response_text.strip().split("\n")
-                response_text = "\n".join(lines[1:-1])
-
-            raw_detections = json.loads(response_text)
-
-            if isinstance(raw_detections, list):
-                for item in raw_detections:
-                    if isinstance(item, dict):
-                        detections.append(
-                            Detection(
-                                category="fake_social_proof",
-                                element_selector="[itemprop='reviewBody']",
-                                confidence=float(item.get("confidence", 0.5)),
-                                explanation=str(item.get("explanation", "")),
-                                severity=str(item.get("severity", "medium")),  # type: ignore[arg-type]
-                            )
-                        )
+            async for item in stream_json_items(
+                f"{SYSTEM_PROMPT}\n\n---\n\n{reviews}", api_key
+            ):
+                # One bad item (e.g. confidence 1.5) must not cost the rest.
+                try:
+                    det = Detection(
+                        category="fake_social_proof",
+                        element_selector="[itemprop='reviewBody']",
+                        confidence=float(item.get("confidence", 0.5)),  # type: ignore[arg-type]
+                        explanation=str(item.get("explanation", "")),
+                        severity=str(item.get("severity", "medium")),  # type: ignore[arg-type]
+                    )
+                except (TypeError, ValueError) as exc:
+                    logger.warning("Skipping invalid review analyzer item %.200r: %s", item, exc)
+                    continue
+                partial.emit(det)
+                detections.append(det)
 
         except Exception:
             logger.exception("Review analyzer LLM call failed")
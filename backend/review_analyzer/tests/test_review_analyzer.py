@@ -3,10 +3,25 @@
 from __future__ import annotations
 
 import asyncio
+import random
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta, timezone
 
 import pytest
+from django.test import override_settings
 
 from core.models import Detection
+from core.page import Review
+from core.serializers import ReviewSerializer
+from review_analyzer.bursts import find_bursts
+from review_analyzer.pipeline import (
+    CHARS_PER_TOKEN,
+    GENERIC_PRAISE_PATTERNS,
+    build_review_prompt,
+    is_generic,
+    iter_reviews,
+    scan_reviews,
+)
 from review_analyzer.service import ReviewAnalyzerService
 
 
@@ -50,3 +65,191 @@ class TestReviewAnalyzer:
         results = _run(service.analyze(payload))
         for det in results:
             assert 0.0 <= det.confidence <= 1.0
+
+
+def _review_blob(n: int) -> str:
+    reviews = []
+    for i in range(n):
+        if i % 3 == 0:
+            reviews.append("Amazing product! Highly recommend!")
+        elif i % 3 == 1:
+            reviews.append(f"The zipper on bag {i} broke after {i % 17} days of light use, " * (1 + i % 9))
+        else:
+            reviews.append(f"Arrived on day {i}; fits as described.")
+    return "\n---\n".join(reviews)
+
+
+class TestReviewPipeline:
+    """Streaming scan, sampling and prompt budget."""
+
+    def test_segmentation_matches_split(self) -> None:
+        text = "---a---\n---  b c ---\n\n---d--- ---"
+        expected = [r.strip() for r in text.split("---") if r.strip()]
+        assert list(iter_reviews(text)) == expected
+
+    def test_combined_pattern_matches_like_the_individual_ones(self) -> None:
+        reviews = list(iter_reviews(_review_blob(60))) + [
+            "Love it", "⭐⭐⭐⭐", "meh", "BEST  Purchase", "5 Stars", "Superb item", "grEAT\tItem",
+        ]
+        for review in reviews:
+            expected = any(p.search(review) for p in GENERIC_PRAISE_PATTERNS)
+            assert is_generic(review) == expected
+
+    def test_statistics_cover_every_review_while_samples_stay_bounded(self) -> None:
+        scan = scan_reviews(_review_blob(30_000))
+        assert scan.total == 30_000
+        assert scan.generic == 10_000
+        assert scan.sampled
+        assert len(scan.similarity_sample) == 200
+        assert all(len(reviews) <= 40 for _, reviews in scan.strata.values())
+        assert sum(n for n, _ in scan.strata.values()) == 30_000
+        assert scan.repeated[0] == ("amazing product! highly recommend!", scan.repeated[0][1])
+
+    def test_scan_is_deterministic(self) -> None:
+        text = _review_blob(2_000)
+        assert scan_reviews(text) == scan_reviews(text)
+
+    def test_prompt_fits_budget_and_reports_the_full_set(self) -> None:
+        scan = scan_reviews(_review_blob(5_000))
+        prompt, shown = build_review_prompt(scan, 1000)
+        assert len(prompt) <= 1000 * CHARS_PER_TOKEN
+        assert "all 5000 reviews" in prompt
+        assert 0 < shown < 5_000
+        # Every stratum is represented.
+        assert "Arrived on day" in prompt and "zipper" in prompt and "Amazing product" in prompt
+
+    @override_settings(GOOGLE_API_KEY="test-key", REVIEW_PROMPT_TOKEN_BUDGET=500)
+    def test_llm_gets_the_budgeted_prompt(
+        self, service: ReviewAnalyzerService, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        prompts: list[str] = []
+
+        async def fake_stream(prompt: str, api_key: str) -> AsyncIterator[dict[str, object]]:
+            prompts.append(prompt)
+            return
+            yield
+
+        monkeypatch.setattr("review_analyzer.service.stream_json_items", fake_stream)
+        results = _run(service.analyze({"review_text": _review_blob(3_000), "url": "https://example.com"}))
+        assert results == []
+        review_part = prompts[0].split("\n\n---\n\n", 1)[1]
+        assert len(review_part) <= 500 * CHARS_PER_TOKEN
+        assert "all 3000 reviews" in review_part
+
+    @override_settings(GOOGLE_API_KEY="test-key")
+    def test_invalid_llm_items_are_skipped_not_fatal(
+        self, service: ReviewAnalyzerService, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        async def fake_stream(prompt: str, api_key: str) -> AsyncIterator[dict[str, object]]:
+            yield {"confidence": -0.2, "explanation": "bad", "severity": "low"}
+            yield {"confidence": 0.8, "explanation": "unknown severity", "severity": "severe"}
+            yield {"confidence": 0.8, "explanation": "templated praise", "severity": "high"}
+
+        monkeypatch.setattr("review_analyzer.service.stream_json_items", fake_stream)
+        results = _run(service.analyze({"review_text": _review_blob(20), "url": "https://example.com"}))
+        assert "templated praise" in [d.explanation for d in results]
+        assert not {"bad", "unknown severity"} & {d.explanation for d in results}
+
+
+DAY = 86_400.0
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+STEADY_TEXTS = [
+    "The strap is fine but the lid sticks a little.",
+    "Took a week to arrive; colour is darker than pictured.",
+    "Decent for the price, though the zipper feels cheap.",
+    "My kid uses it daily and it still looks new.",
+    "Returned it, too small for a 15 inch laptop.",
+]
+
+
+def _steady_reviews(n: int = 60) -> list[dict[str, object]]:
+    """One honest review every other day, ratings 2–4 stars."""
+    return [
+        {
+            "text": STEADY_TEXTS[i % len(STEADY_TEXTS)] + f" (order {i})",
+            "date": (START + timedelta(days=2 * i)).isoformat(),
+            "rating": 2 + i % 3,
+            "author_hash": f"author-{i}",
+        }
+        for i in range(n)
+    ]
+
+
+def _burst(n: int, day: int, rating: float = 5) -> list[dict[str, object]]:
+    return [
+        {
+            "text": f"Works as advertised, item {i}.",
+            "date": (START + timedelta(days=day, minutes=20 * i)).isoformat(),
+            "rating": rating,
+            "author_hash": f"burst-{i % 3}",
+        }
+        for i in range(n)
+    ]
+
+
+class TestReviewBursts:
+    """Posting bursts and rating spikes in dated reviews."""
+
+    def test_steady_posting_is_not_flagged(self, service: ReviewAnalyzerService) -> None:
+        results = _run(service.analyze({"reviews": _steady_reviews(), "url": "https://example.com"}))
+        assert results == []
+
+    def test_posting_burst_and_rating_spike(self, service: ReviewAnalyzerService) -> None:
+        reviews = _steady_reviews() + _burst(15, day=51)
+        results = _run(service.analyze({"reviews": reviews[::-1], "url": "https://example.com"}))
+
+        burst, spike = results
+        assert burst.severity == "medium"
+        assert burst.explanation.startswith("15 of 75 dated reviews from 3 distinct authors were posted within 24h")
+        assert spike.severity == "high"
+        assert "average 5.0 stars against 3.0" in spike.explanation
+
+    def test_burst_without_rating_shift_is_only_a_burst(self) -> None:
+        reviews = [
+            Review(r["text"], datetime.fromisoformat(r["date"]).timestamp(), 3.0, "")  # type: ignore[arg-type]
+            for r in _steady_reviews() + _burst(15, day=51, rating=3)
+        ]
+        report = find_bursts(reviews, DAY)
+        assert report.burst is not None and report.burst.count == 15
+        assert report.spike is None
+
+    @pytest.mark.parametrize(("n", "days"), [(1000, 730), (300, 365), (60, 120)])
+    def test_uniform_random_posting_is_not_a_burst(self, n: int, days: int) -> None:
+        rng = random.Random(n)
+        for _ in range(20):
+            reviews = [Review("x", rng.uniform(0, days * DAY), None, "") for _ in range(n)]
+            assert find_bursts(reviews, DAY).burst is None
+
+    def test_steady_mostly_five_star_ratings_are_not_a_spike(self) -> None:
+        for seed in range(20):
+            rng = random.Random(seed)
+            reviews = [
+                Review("x", rng.uniform(0, 200 * DAY), 5.0 if rng.random() < 0.6 else rng.randint(1, 4), "")
+                for _ in range(1000)
+            ]
+            assert find_bursts(reviews, DAY).spike is None
+
+    def test_small_burst_on_a_busy_product_is_found(self) -> None:
+        rng = random.Random(0)
+        reviews = [Review("x", rng.uniform(0, 365 * DAY), None, "") for _ in range(300)]
+        reviews += [Review("x", 200 * DAY + 600 * i, None, "") for i in range(12)]
+
+        report = find_bursts(reviews, DAY)
+        assert report.burst is not None and report.burst.count >= 12
+
+    def test_undated_reviews_are_ignored(self) -> None:
+        report = find_bursts([Review("x", None, 5.0, "")] * 50, DAY)
+        assert report.dated == 0 and report.burst is None
+
+    def test_serializer_keeps_dates_json_ready(self) -> None:
+        serializer = ReviewSerializer(data=[
+            {"text": "Good", "date": "2024-05-01T10:00:00", "rating": 5, "author_hash": "ab12"},
+            {"text": "Bad"},
+        ], many=True)
+        assert serializer.is_valid(), serializer.errors
+        first, second = serializer.validated_data
+        assert first["date"] == "2024-05-01T10:00:00+00:00"
+        assert "date" not in second
+        assert not ReviewSerializer(data={"text": "x", "rating": 7}).is_valid()
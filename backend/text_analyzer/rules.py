@@ -0,0 +1,136 @@
+"""
+text_analyzer/rules.py — Per-locale rule packs and language identification.
+
+Each locale's confirmshaming, urgency and misdirection patterns live in
+``rule_packs/<locale>.json``. A pack is compiled the first time a page in
+that language is seen, then cached for the life of the process.
+
+``detect_locale`` picks a page's language from a sample of its text.
+Script-specific locales (Japanese kana) are matched by character class;
+Latin-script ones by counting stopwords from ``rule_packs/languages.json``.
+A request runs its own locale's pack plus the English one (storefronts
+often keep English button copy), so per-request cost stays the same as
+locales are added.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+PACK_DIR = Path(__file__).resolve().parent / "rule_packs"
+DEFAULT_LOCALE = "en"
+# Characters of text sampled for language identification.
+SAMPLE_CHARS = 2000
+# Stopword hits a Latin-script language needs to beat the default.
+MIN_STOPWORDS = 3
+# Script characters a script-specific language needs.
+MIN_SCRIPT_CHARS = 5
+
+_WORD = re.compile(r"[^\W\d_]+")
+
+_packs: dict[str, RulePack] = {}
+_packs_lock = threading.Lock()
+# Locales → their urgency patterns combined into one alternation.
+_urgency_matchers: dict[tuple[str, ...], re.Pattern[str]] = {}
+# (stopword → locales using it, script-specific locale → character class)
+_profiles: tuple[dict[str, tuple[str, ...]], dict[str, re.Pattern[str]]] | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class RulePack:
+    """One locale's compiled patterns."""
+
+    locale: str
+    confirmshaming: tuple[re.Pattern[str], ...]
+    urgency: tuple[re.Pattern[str], ...]
+    misdirection: tuple[tuple[re.Pattern[str], str], ...]
+
+
+def available_locales() -> list[str]:
+    """Locales that have a rule pack."""
+    return sorted(p.stem for p in PACK_DIR.glob("*.json") if p.stem != "languages")
+
+
+def _compile(pattern: str) -> re.Pattern[str]:
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def _load_pack(locale: str) -> RulePack:
+    data = json.loads((PACK_DIR / f"{locale}.json").read_text(encoding="utf-8"))
+    return RulePack(
+        locale=locale,
+        confirmshaming=tuple(_compile(p) for p in data.get("confirmshaming", [])),
+        urgency=tuple(_compile(p) for p in data.get("urgency", [])),
+        misdirection=tuple(
+            (_compile(rule["pattern"]), rule["explanation"]) for rule in data.get("misdirection", [])
+        ),
+    )
+
+
+def get_pack(locale: str) -> RulePack | None:
+    """The compiled pack for ``locale`` (loaded on first use), or None."""
+    pack = _packs.get(locale)
+    if pack is not None:
+        return pack
+    if locale == "languages" or not (PACK_DIR / f"{locale}.json").is_file():
+        return None
+    with _packs_lock:
+        if locale not in _packs:
+            _packs[locale] = _load_pack(locale)
+        return _packs[locale]
+
+
+def packs_for(locale: str) -> list[RulePack]:
+    """The packs to run for a page in ``locale``: its own, then English."""
+    locales = dict.fromkeys((locale, DEFAULT_LOCALE))
+    return [pack for loc in locales if (pack := get_pack(loc)) is not None]
+
+
+def urgency_matcher(packs: list[RulePack]) -> re.Pattern[str]:
+    """All of ``packs``' urgency patterns as one pattern (cached)."""
+    key = tuple(pack.locale for pack in packs)
+    matcher = _urgency_matchers.get(key)
+    if matcher is None:
+        alternatives = [f"(?:{p.pattern})" for pack in packs for p in pack.urgency]
+        matcher = _urgency_matchers[key] = _compile("|".join(alternatives) or "(?!)")
+    return matcher
+
+
+def _get_profiles() -> tuple[dict[str, tuple[str, ...]], dict[str, re.Pattern[str]]]:
+    global _profiles  # noqa: PLW0603
+    if _profiles is None:
+        data = json.loads((PACK_DIR / "languages.json").read_text(encoding="utf-8"))
+        stopwords: dict[str, tuple[str, ...]] = {}
+        for locale, profile in data.items():
+            for word in profile.get("stopwords", ()):
+                stopwords[word] = (*stopwords.get(word, ()), locale)
+        scripts = {loc: re.compile(p["script"]) for loc, p in data.items() if "script" in p}
+        _profiles = (stopwords, scripts)
+    return _profiles
+
+
+def detect_locale(text: str) -> str:
+    """Best-guess locale of ``text`` (DEFAULT_LOCALE when unsure)."""
+    sample = text[:SAMPLE_CHARS]
+    if not sample:
+        return DEFAULT_LOCALE
+    stopwords, scripts = _get_profiles()
+
+    for locale, script in scripts.items():
+        hits = 0
+        for _ in script.finditer(sample):
+            hits += 1
+            if hits >= MIN_SCRIPT_CHARS:
+                return locale
+
+    # One dict lookup per word, however many languages there are.
+    scores: dict[str, int] = {DEFAULT_LOCALE: 0}
+    for word in _WORD.findall(sample.lower()):
+        for locale in stopwords.get(word, ()):
+            scores[locale] = scores.get(locale, 0) + 1
+    best = max(scores, key=lambda loc: scores[loc])
+    return best if scores[best] >= MIN_STOPWORDS else DEFAULT_LOCALE
@@ -0,0 +1,45 @@
+"""
+text_analyzer/scanner.py — Find every match of a pattern in long text.
+
+``iter_matches`` runs one (combined) pattern over the text in chunks of
+``CHUNK_CHARS``. Each chunk's search runs ``OVERLAP_CHARS`` past the
+chunk's end, so a match that starts near a boundary is still found
+whole. A match belongs to the chunk it starts in, and the next chunk
+resumes after the previous match's end, so nothing is reported twice.
+Chunks are searched in place (``pos``/``endpos``), without copying the
+text, and the scan stops after ``limit`` matches.
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Iterator
+
+CHUNK_CHARS = 64 * 1024
+# Longest match the chunking is guaranteed to find whole.
+OVERLAP_CHARS = 512
+
+
+def iter_matches(
+    pattern: re.Pattern[str],
+    text: str,
+    *,
+    chunk_chars: int = CHUNK_CHARS,
+    overlap: int = OVERLAP_CHARS,
+    limit: int | None = None,
+) -> Iterator[tuple[int, int]]:
+    """(start, end) of every non-overlapping match of ``pattern``, in order."""
+    found = 0
+    resume = 0
+    for chunk_start in range(0, len(text), chunk_chars):
+        owned_end = chunk_start + chunk_chars
+        for match in pattern.finditer(text, max(resume, chunk_start), owned_end + overlap):
+            if match.start() >= owned_end:
+                break  # the next chunk owns it
+            if match.end() == match.start():
+                continue
+            yield match.start(), match.end()
+            resume = match.end()
+            found += 1
+            if limit is not None and found >= limit:
+                return
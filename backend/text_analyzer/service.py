@@ -5,56 +5,32 @@ Pattern-matching / NLP rules for detecting dark patterns in text:
 - Confirmshaming (guilt-tripping decline copy)
 - Urgency / scarcity language
 - Misdirection (misleading button labels)
+
+Patterns come from per-locale rule packs (text_analyzer/rules.py); each
+request runs the pack for the page's detected language plus English.
 """
 
 from __future__ import annotations
 
-import re
-
+from core import diagnostics
 from core.interfaces import BaseAnalyzer
 from core.models import Detection
+from core.page import Label, PageModel
+from core.profiling import span
+from text_analyzer.rules import RulePack, detect_locale, packs_for, urgency_matcher
+from text_analyzer.scanner import iter_matches
 
-
-# ── Pattern libraries ─────────────────────────────────────
-
-CONFIRMSHAMING_PATTERNS: list[re.Pattern[str]] = [
-    re.compile(r"no\s*,?\s*i\s+don'?t\s+want", re.IGNORECASE),
-    re.compile(r"no\s+thanks?\s*,?\s+i('?d)?\s*(rather|prefer|like)", re.IGNORECASE),
-    re.compile(r"i\s+don'?t\s+(care|like|want)\s+(about\s+|to\s+)?(sav|deal|discount|money)", re.IGNORECASE),
-    re.compile(r"i('?ll)?\s*(pay|stay)\s+(full\s+price|more)", re.IGNORECASE),
-    re.compile(r"no\s*,?\s*i\s+hate\s+(saving|money)", re.IGNORECASE),
-    re.compile(r"i\s+prefer\s+not\s+to\s+save", re.IGNORECASE),
-]
-
-URGENCY_PATTERNS: list[re.Pattern[str]] = [
-    re.compile(r"only\s+\d+\s+(left|remaining|available)", re.IGNORECASE),
-    re.compile(r"(offer|sale|deal|discount)\s+(expires?|ends?)\s+(soon|today|in\s+\d)", re.IGNORECASE),
-    re.compile(r"(hurry|act\s+now|don'?t\s+miss|limited\s+time)", re.IGNORECASE),
-    re.compile(r"\d+\s+(people|others?)\s+(are\s+)?(viewing|watching|looking)", re.IGNORECASE),
-    re.compile(r"(selling|going)\s+fast", re.IGNORECASE),
-    re.compile(r"(last|final)\s+chance", re.IGNORECASE),
-]
-
-MISDIRECTION_PATTERNS: list[tuple[re.Pattern[str], str]] = [
-    (
-        re.compile(r"^continue$", re.IGNORECASE),
-        "A button labeled 'Continue' may actually mean 'Subscribe' or 'Accept'.",
-    ),
-    (
-        re.compile(r"^(get\s+started|start\s+now)$", re.IGNORECASE),
-        "Generic action label may hide subscription or commitment.",
-    ),
-    (
-        re.compile(r"^(claim|unlock|activate)\b", re.IGNORECASE),
-        "Action-oriented label may disguise paid commitment or data collection.",
-    ),
-]
+# Urgency matches examined per page, and elements reported.
+MAX_URGENCY_MATCHES = 200
+MAX_URGENCY_ELEMENTS = 20
+# Context shown around an urgency match.
+SNIPPET_CONTEXT = 20
 
 
 # TODO(roberta): Replace regex patterns with a fine-tuned RoBERTa classifier.
 # Integration point: load a HuggingFace `transformers` pipeline here for
-# confirmshaming / urgency / misdirection classification. The regex rules
-# above should remain as a fast-path fallback when the model is unavailable.
+# confirmshaming / urgency / misdirection classification. The regex rule
+# packs should remain as a fast-path fallback when the model is unavailable.
 # Expected model: fine-tuned roberta-base on dark-pattern text corpus.
 # See: https://huggingface.co/docs/transformers/model_doc/roberta
 
@@ -62,39 +38,46 @@ MISDIRECTION_PATTERNS: list[tuple[re.Pattern[str], str]] = [
 class TextAnalyzerService(BaseAnalyzer):
     """Analyzes visible text for dark-pattern signals."""
 
-    async def analyze(self, payload: dict[str, object]) -> list[Detection]:
-        detections: list[Detection] = []
-
-        text_content = payload.get("text_content", {})
-        if not isinstance(text_content, dict):
-            return detections
+    cpu_bound = True
+    payload_keys = ("text_content",)
 
-        button_labels = text_content.get("button_labels", [])
-        body_text = str(text_content.get("body_text", ""))
+    async def analyze(
+        self, payload: dict[str, object], page: PageModel | None = None
+    ) -> list[Detection]:
+        if page is None:
+            page = PageModel.from_payload(payload)
+        if not page.has_text:
+            diagnostics.skipped("no text content")
+            return []
 
-        if isinstance(button_labels, list):
-            detections.extend(self._check_confirmshaming(button_labels))
-            detections.extend(self._check_misdirection(button_labels))
+        with span("text:locale"):
+            sample = page.body_text or " ".join(lbl.text for lbl in (*page.headings, *page.button_labels))
+            packs = packs_for(detect_locale(sample))
 
-        detections.extend(self._check_urgency(body_text))
+        detections: list[Detection] = []
+        with span("text:confirmshaming"):
+            detections.extend(diagnostics.attribute(self._check_confirmshaming(page.button_labels, packs)))
+        with span("text:misdirection"):
+            detections.extend(diagnostics.attribute(self._check_misdirection(page.button_labels, packs)))
+        with span("text:urgency"):
+            detections.extend(diagnostics.attribute(self._check_urgency(page, packs)))
 
         return detections
 
     def _check_confirmshaming(
-        self, labels: list[object]
+        self, labels: tuple[Label, ...], packs: list[RulePack]
     ) -> list[Detection]:
         """Detect guilt-tripping decline copy on buttons/links."""
         detections: list[Detection] = []
+        patterns = [pattern for pack in packs for pattern in pack.confirmshaming]
         for lbl in labels:
-            if not isinstance(lbl, dict):
-                continue
-            text = str(lbl.get("text", ""))
-            for pattern in CONFIRMSHAMING_PATTERNS:
+            text = lbl.text
+            for pattern in patterns:
                 if pattern.search(text):
                     detections.append(
                         Detection(
                             category="confirmshaming",
-                            element_selector=str(lbl.get("selector", "")),
+                            element_selector=lbl.selector,
                             confidence=0.85,
                             explanation=(
                                 f'The decline option uses guilt-tripping language: "{text}"'
@@ -105,41 +88,58 @@ class TextAnalyzerService(BaseAnalyzer):
                     break  # one match per label
         return detections
 
-    def _check_urgency(self, body_text: str) -> list[Detection]:
-        """Detect artificial urgency/scarcity language."""
+    def _check_urgency(self, page: PageModel, packs: list[RulePack]) -> list[Detection]:
+        """
+        Detect artificial urgency/scarcity language.
+
+        Every match in ``body_text`` is mapped to the element it came from
+        (``body_index``), with one detection per element; matches outside
+        the index are reported on ``body``.
+        """
+        body_text = page.body_text
+        # selector → (first match start, end, its span's bounds, match count)
+        hits: dict[str, tuple[int, int, int, int, int]] = {}
+        for start, end in iter_matches(urgency_matcher(packs), body_text, limit=MAX_URGENCY_MATCHES):
+            span = page.span_at(start)
+            selector = span.selector if span is not None else "body"
+            if selector in hits:
+                first = hits[selector]
+                hits[selector] = (*first[:4], first[4] + 1)
+            elif len(hits) < MAX_URGENCY_ELEMENTS:
+                lo, hi = (span.start, span.end) if span is not None else (0, len(body_text))
+                hits[selector] = (start, end, lo, hi, 1)
+
         detections: list[Detection] = []
-        for pattern in URGENCY_PATTERNS:
-            match = pattern.search(body_text)
-            if match:
-                snippet = body_text[max(0, match.start() - 20):match.end() + 20]
-                detections.append(
-                    Detection(
-                        category="urgency_scarcity",
-                        element_selector="body",
-                        confidence=0.7,
-                        explanation=(
-                            f'Urgency/scarcity language detected: "…{snippet.strip()}…"'
-                        ),
-                        severity="low",
-                    )
+        for selector, (start, end, lo, hi, count) in hits.items():
+            snippet = body_text[max(lo, start - SNIPPET_CONTEXT):min(hi, end + SNIPPET_CONTEXT)]
+            more = f" ({count} matches)" if count > 1 else ""
+            detections.append(
+                Detection(
+                    category="urgency_scarcity",
+                    element_selector=selector,
+                    confidence=0.7,
+                    explanation=(
+                        f'Urgency/scarcity language detected: "…{snippet.strip()}…"{more}'
+                    ),
+                    severity="low",
                 )
+            )
         return detections
 
     def _check_misdirection(
-        self, labels: list[object]
+        self, labels: tuple[Label, ...], packs: list[RulePack]
     ) -> list[Detection]:
         """Detect misleading button labels."""
         detections: list[Detection] = []
+        rules = [rule for pack in packs for rule in pack.misdirection]
         for lbl in labels:
-            if not isinstance(lbl, dict):
-                continue
-            text = str(lbl.get("text", "")).strip()
-            for pattern, explanation in MISDIRECTION_PATTERNS:
+            text = lbl.text.strip()
+            for pattern, explanation in rules:
                 if pattern.match(text):
                     detections.append(
                         Detection(
                             category="misdirection",
-                            element_selector=str(lbl.get("selector", "")),
+                            element_selector=lbl.selector,
                             confidence=0.6,
                             explanation=explanation,
                             severity="low",
@@ -7,6 +7,9 @@ import asyncio
 import pytest
 
 from core.models import Detection
+from text_analyzer import rules
+from text_analyzer.rules import available_locales, detect_locale, get_pack, packs_for, urgency_matcher
+from text_analyzer.scanner import iter_matches
 from text_analyzer.service import TextAnalyzerService
 
 
@@ -69,3 +72,107 @@ class TestTextAnalyzer:
         results = _run(service.analyze(payload))
         for det in results:
             assert 0.0 <= det.confidence <= 1.0
+
+
+def _page(body_text: str, *labels: tuple[str, str]) -> dict[str, object]:
+    return {
+        "text_content": {
+            "button_labels": [{"selector": sel, "text": text} for sel, text in labels],
+            "headings": [],
+            "body_text": body_text,
+        }
+    }
+
+
+class TestRulePacks:
+    """Locale detection and per-locale rule packs."""
+
+    @pytest.mark.parametrize(
+        ("text", "locale"),
+        [
+            ("Only 3 left in stock! Order now and get yours with free shipping to your door.", "en"),
+            ("Nur noch 3 Stück auf Lager! Jetzt zugreifen, die Aktion endet heute und ist nicht verlängerbar.", "de"),
+            ("Plus que 2 en stock ! Dépêchez-vous, l'offre se termine aujourd'hui pour les membres.", "fr"),
+            ("¡Sólo quedan 2 unidades! Date prisa, la oferta termina hoy para los clientes del club.", "es"),
+            ("残り3点！期間限定のセールは本日終了します。お見逃しなく。", "ja"),
+            ("", "en"),
+            ("12345 !!!", "en"),
+        ],
+    )
+    def test_detects_locale(self, text: str, locale: str) -> None:
+        assert detect_locale(text) == locale
+
+    def test_every_pack_compiles(self) -> None:
+        assert available_locales() == ["de", "en", "es", "fr", "ja"]
+        for locale in available_locales():
+            pack = get_pack(locale)
+            assert pack is not None and pack.confirmshaming and pack.urgency and pack.misdirection
+        assert get_pack("xx") is None
+
+    def test_only_the_detected_pack_is_loaded(
+        self, service: TextAnalyzerService, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr(rules, "_packs", {})
+        _run(service.analyze(_page("Nur noch 2 verfügbar, die Aktion endet heute. Jetzt zugreifen und sparen!")))
+        assert sorted(rules._packs) == ["de", "en"]
+
+    @pytest.mark.parametrize(
+        ("body_text", "label"),
+        [
+            ("Nur noch 2 verfügbar! Die Aktion endet heute, also jetzt zugreifen und sparen.",
+             "Nein danke, ich will nicht sparen"),
+            ("Il n'en reste que 2 ! Ne manquez pas cette offre, elle se termine aujourd'hui pour vous.",
+             "Non merci, je ne veux pas économiser"),
+            ("¡Sólo quedan 2 unidades! No te lo pierdas, la oferta termina hoy para los socios.",
+             "No gracias, no quiero ahorrar"),
+            ("残り2点！期間限定セールは本日終了。今すぐチェック。", "いいえ、割引はいりません"),
+        ],
+    )
+    def test_localized_patterns_fire(self, service: TextAnalyzerService, body_text: str, label: str) -> None:
+        results = _run(service.analyze(_page(body_text, ("#decline", label))))
+        categories = {d.category for d in results}
+        assert {"confirmshaming", "urgency_scarcity"} <= categories
+
+    def test_english_buttons_still_match_on_localized_pages(self, service: TextAnalyzerService) -> None:
+        results = _run(service.analyze(_page(
+            "Willkommen in unserem Shop, hier finden Sie die besten Produkte für Ihr Zuhause.",
+            ("#decline", "No thanks, I don't want to save money"),
+        )))
+        assert [d.category for d in results] == ["confirmshaming"]
+
+
+class TestUrgencyScan:
+    """Chunked scanning and match → element mapping."""
+
+    def test_chunked_scan_finds_every_match_once(self) -> None:
+        matcher = urgency_matcher(packs_for("en"))
+        filler = "Plain copy about the product. "
+        text = "".join(
+            f"{filler * (i % 7)}Only {i} left! Hurry, limited time. " for i in range(400)
+        )
+        expected = [(m.start(), m.end()) for m in matcher.finditer(text)]
+        # Small chunks put plenty of matches across chunk boundaries.
+        assert list(iter_matches(matcher, text, chunk_chars=97, overlap=40)) == expected
+        assert len(list(iter_matches(matcher, text, chunk_chars=97, overlap=40, limit=5))) == 5
+
+    def test_matches_are_mapped_to_their_elements(self, service: TextAnalyzerService) -> None:
+        segments = [
+            ("#hero", "Summer collection is here."),
+            ("#stock", "Only 2 left in stock. Only 1 left in blue."),
+            ("#viewers", "14 people are viewing this item."),
+        ]
+        body, index = "", []
+        for selector, text in segments:
+            index.append({"selector": selector, "start": len(body), "end": len(body) + len(text)})
+            body += text + "\n"
+        body += "Hurry!"  # outside the index
+        payload = _page(body)
+        payload["text_content"]["body_index"] = index  # type: ignore[index]
+
+        results = _run(service.analyze(payload))
+        by_selector = {d.element_selector: d for d in results}
+        assert list(by_selector) == ["#stock", "#viewers", "body"]
+        assert by_selector["#stock"].explanation == (
+            'Urgency/scarcity language detected: "…Only 2 left in stock. Only 1 le…" (2 matches)'
+        )
+        assert "Summer" not in by_selector["#stock"].explanation
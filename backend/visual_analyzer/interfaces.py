@@ -4,7 +4,7 @@ visual_analyzer/interfaces.py — Payload/result types for the visual analyzer.
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -23,6 +23,11 @@ class ElementMapEntry:
     font_size: str
     opacity: str
     area_ratio: float  # element area / viewport area
+    font_size_px: float | None = field(default=None)
+    opacity_value: float = field(default=1.0)
+    contrast_ratio: float | None = field(default=None)  # WCAG, text vs own background
+    source: str = field(default="interactive_elements")  # dom_metadata list it came from
+    role: str = field(default="")  # ARIA role ("dialog" for <dialog>/aria-modal)
 
 
 @dataclass
@@ -33,6 +38,19 @@ class ElementMap:
     viewport_height: float
     elements: list[ElementMapEntry]
     url: str
+    region: str = field(default="")  # set when this map is one tile of a larger page
+
+
+@dataclass
+class ElementMapPrompt:
+    """A token-budgeted prompt rendered from an ElementMap."""
+
+    text: str
+    token_budget: int | None
+    estimated_tokens: int
+    total_elements: int
+    kept_elements: int  # elements represented in the prompt (incl. merged repeats)
+    dropped_elements: int
 
 
 @dataclass
@@ -0,0 +1,251 @@
+"""
+visual_analyzer/prompt_builder.py — Token-budgeted ElementMap prompt rendering.
+
+Large pages produce ElementMaps with hundreds of entries; rendering every one
+verbosely makes the Gemini prompt grow to tens of thousands of tokens. This
+module renders a compact pipe-separated table instead, merges visually
+identical repeats (nav links, product tiles) into one row with a count, and,
+given a token budget, keeps the most relevant rows:
+
+- interactive elements and pre-checked inputs
+- elements that are actually visible in the viewport
+- accept/decline buttons and anything positioned near them
+- elements with unusual size, low opacity or low contrast
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+from dataclasses import dataclass
+from statistics import median
+
+from core.styles import parse_color
+from visual_analyzer.interfaces import ElementMap, ElementMapEntry, ElementMapPrompt
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE_TAGS = frozenset({"button", "a", "input", "select", "textarea", "label"})
+
+ACCEPT_RE = re.compile(
+    r"\b(accept|agree|allow|ok|yes|continue|subscribe|buy|sign\s*up|got\s*it|confirm)\b",
+    re.IGNORECASE,
+)
+DECLINE_RE = re.compile(
+    r"\b(decline|reject|deny|no(\s+thanks)?|cancel|refuse|skip|later|opt[\s-]?out|unsubscribe|manage)\b",
+    re.IGNORECASE,
+)
+
+# Elements whose centre lies within this distance of an accept/decline
+# control are part of the choice "cluster" the LLM needs to compare.
+CLUSTER_RADIUS_PX = 250.0
+
+# Rough chars-per-token ratio for Gemini's tokenizer on mixed ASCII tables.
+CHARS_PER_TOKEN = 4
+
+TEXT_COLUMN_CHARS = 60
+
+COLUMNS = "selector|tag|text|x,y|w×h|area|fg|bg|font|opacity|contrast|n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; good enough for budgeting, not for billing."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class _Group:
+    """A run of visually identical elements rendered as one row."""
+
+    entry: ElementMapEntry
+    count: int
+    score: float
+
+
+def _is_visible(el: ElementMapEntry, element_map: ElementMap) -> bool:
+    if el.opacity_value <= 0.0 or el.width <= 0 or el.height <= 0:
+        return False
+    if el.source == "hidden_elements":
+        return False
+    return (
+        el.x < element_map.viewport_width
+        and el.y < element_map.viewport_height
+        and el.x + el.width > 0
+        and el.y + el.height > 0
+    )
+
+
+def _centre(el: ElementMapEntry) -> tuple[float, float]:
+    return (el.x + el.width / 2, el.y + el.height / 2)
+
+
+def _score_entries(element_map: ElementMap) -> list[float]:
+    """Relevance score per entry (same order as ``element_map.elements``)."""
+    elements = element_map.elements
+
+    anchors = [
+        _centre(el) for el in elements
+        if el.text_content and (ACCEPT_RE.search(el.text_content) or DECLINE_RE.search(el.text_content))
+    ]
+    areas = [
+        el.width * el.height for el in elements
+        if el.source == "interactive_elements" and el.width > 0 and el.height > 0
+    ]
+    typical_area = median(areas) if areas else 0.0
+
+    scores: list[float] = []
+    for el in elements:
+        score = 0.0
+        if el.tag_name in INTERACTIVE_TAGS:
+            score += 3.0
+        if el.source == "prechecked_inputs":
+            score += 2.0
+        if _is_visible(el, element_map):
+            score += 2.0
+
+        if el.text_content and (ACCEPT_RE.search(el.text_content) or DECLINE_RE.search(el.text_content)):
+            score += 3.0
+        elif anchors:
+            cx, cy = _centre(el)
+            if any(math.hypot(cx - ax, cy - ay) <= CLUSTER_RADIUS_PX for ax, ay in anchors):
+                score += 2.0
+
+        area = el.width * el.height
+        if typical_area > 0 and area > 0 and not typical_area / 3 <= area <= typical_area * 3:
+            score += 1.5
+        if el.opacity_value < 0.6 or (el.contrast_ratio is not None and el.contrast_ratio < 3.0):
+            score += 1.5
+        scores.append(score)
+    return scores
+
+
+def _group_key(el: ElementMapEntry) -> tuple[object, ...]:
+    return (
+        el.tag_name,
+        el.text_content[:TEXT_COLUMN_CHARS],
+        round(el.width),
+        round(el.height),
+        el.color,
+        el.background_color,
+        el.font_size,
+        el.opacity,
+        el.source,
+    )
+
+
+def _merge_repeats(element_map: ElementMap, scores: list[float]) -> list[_Group]:
+    """Collapse identical-looking elements, keeping the top-most as the row."""
+    groups: dict[tuple[object, ...], _Group] = {}
+    ordered = sorted(
+        zip(element_map.elements, scores), key=lambda pair: (pair[0].y, pair[0].x)
+    )
+    for el, score in ordered:
+        key = _group_key(el)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = _Group(entry=el, count=1, score=score)
+        else:
+            group.count += 1
+            group.score = max(group.score, score)
+    return list(groups.values())
+
+
+def _format_color(value: str) -> str:
+    rgba = parse_color(value)
+    if rgba is None:
+        return value.replace("|", "/")
+    r, g, b, a = rgba
+    hex_color = f"#{round(r):02x}{round(g):02x}{round(b):02x}"
+    return hex_color if a >= 1.0 else f"{hex_color}@{a:.2f}"
+
+
+def _format_row(group: _Group) -> str:
+    el = group.entry
+    text = " ".join(el.text_content.split())[:TEXT_COLUMN_CHARS].replace("|", "/")
+    font = f"{el.font_size_px:.0f}px" if el.font_size_px is not None else el.font_size
+    contrast = f"{el.contrast_ratio:.1f}" if el.contrast_ratio is not None else "-"
+    return "|".join((
+        el.selector.replace("|", "/"),
+        el.tag_name,
+        text,
+        f"{el.x:.0f},{el.y:.0f}",
+        f"{el.width:.0f}×{el.height:.0f}",
+        f"{el.area_ratio:.4f}",
+        _format_color(el.color),
+        _format_color(el.background_color),
+        font,
+        f"{el.opacity_value:g}",
+        contrast,
+        str(group.count),
+    ))
+
+
+def estimate_rows_tokens(element_map: ElementMap) -> int:
+    """Estimated tokens for all (merged) element rows, excluding the header."""
+    groups = _merge_repeats(element_map, [0.0] * len(element_map.elements))
+    return sum(estimate_tokens(_format_row(group)) + 1 for group in groups)
+
+
+def build_prompt(
+    element_map: ElementMap, token_budget: int | None = None
+) -> ElementMapPrompt:
+    """
+    Render an ElementMap as a compact table, optionally within a token budget.
+
+    Args:
+        element_map: The page's ElementMap.
+        token_budget: Maximum estimated prompt tokens, or None for no limit.
+
+    Returns:
+        The rendered prompt plus counts of kept and dropped elements.
+    """
+    total = len(element_map.elements)
+    groups = _merge_repeats(element_map, _score_entries(element_map))
+    rows = {id(group): _format_row(group) for group in groups}
+
+    header = [
+        f"Page URL: {element_map.url}",
+        *([f"Region: {element_map.region}"] if element_map.region else []),
+        f"Viewport: {element_map.viewport_width:.0f}×{element_map.viewport_height:.0f}",
+        f"Total elements: {total} (identical repeats merged; see column n)",
+        "Rows sorted top-to-bottom, left-to-right. area = element/viewport area.",
+        f"Columns: {COLUMNS}",
+    ]
+
+    if token_budget is None:
+        selected = groups
+    else:
+        # Reserve room for the header and the "omitted" footer line.
+        remaining = token_budget - estimate_tokens("\n".join(header)) - 12
+        selected = []
+        for group in sorted(groups, key=lambda g: (-g.score, g.entry.y, g.entry.x)):
+            cost = estimate_tokens(rows[id(group)]) + 1
+            if cost <= remaining:
+                selected.append(group)
+                remaining -= cost
+
+    selected.sort(key=lambda g: (g.entry.y, g.entry.x))
+    kept = sum(g.count for g in selected)
+    dropped = total - kept
+
+    lines = header + [rows[id(group)] for group in selected]
+    if dropped:
+        lines.append(f"(+{dropped} lower-relevance elements omitted)")
+    text = "\n".join(lines)
+
+    logger.info(
+        "ElementMap prompt: budget=%s tokens, ~%d used, %d/%d elements kept "
+        "in %d rows, %d dropped",
+        token_budget if token_budget is not None else "unlimited",
+        estimate_tokens(text), kept, total, len(selected), dropped,
+    )
+
+    return ElementMapPrompt(
+        text=text,
+        token_budget=token_budget,
+        estimated_tokens=estimate_tokens(text),
+        total_elements=total,
+        kept_elements=kept,
+        dropped_elements=dropped,
+    )
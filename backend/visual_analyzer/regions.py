@@ -0,0 +1,101 @@
+"""
+visual_analyzer/regions.py — Split large ElementMaps into spatial regions.
+
+When a page's ElementMap cannot fit in one prompt even after compaction, the
+visual analyzer analyses it region by region, in parallel. Dialogs (modal
+consent banners, upsell pop-ups) become their own region, since accept and
+decline choices inside them must be compared together; everything else is
+bucketed into viewport-sized tiles. Adjacent tiles are packed back together
+while they fit the token budget, so small pages still make a single call.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import replace
+
+from visual_analyzer.interfaces import ElementMap, ElementMapEntry
+from visual_analyzer.prompt_builder import estimate_rows_tokens
+
+# Header + footer lines of a rendered prompt, in estimated tokens.
+PROMPT_OVERHEAD_TOKENS = 80
+
+
+def _contains(box: ElementMapEntry, el: ElementMapEntry) -> bool:
+    cx, cy = el.x + el.width / 2, el.y + el.height / 2
+    return box.x <= cx <= box.x + box.width and box.y <= cy <= box.y + box.height
+
+
+def _sub_map(element_map: ElementMap, entries: list[ElementMapEntry], region: str) -> ElementMap:
+    return replace(element_map, elements=entries, region=region)
+
+
+def split_element_map(element_map: ElementMap, token_budget: int) -> list[ElementMap]:
+    """
+    Partition an ElementMap into dialog regions and packed viewport tiles.
+
+    Every element lands in exactly one region. Each returned map is meant to
+    be rendered with ``build_prompt(region, token_budget)``; a single tile
+    that is still too dense is compacted further by the prompt builder.
+
+    Args:
+        element_map: The full page ElementMap.
+        token_budget: Per-prompt token budget used to pack adjacent tiles.
+
+    Returns:
+        Regions ordered dialogs-first, then top-to-bottom.
+    """
+    dialogs = [
+        el for el in element_map.elements
+        if el.role in ("dialog", "alertdialog") and el.width > 0 and el.height > 0
+    ]
+    dialog_members: list[list[ElementMapEntry]] = [[] for _ in dialogs]
+    tiles: dict[tuple[int, int], list[ElementMapEntry]] = {}
+
+    vw = element_map.viewport_width or 1.0
+    vh = element_map.viewport_height or 1.0
+
+    for el in element_map.elements:
+        for i, dialog in enumerate(dialogs):
+            if el is dialog or _contains(dialog, el):
+                dialog_members[i].append(el)
+                break
+        else:
+            tile = (math.floor(el.y / vh), math.floor(el.x / vw))
+            tiles.setdefault(tile, []).append(el)
+
+    regions: list[ElementMap] = [
+        _sub_map(element_map, members, f"dialog {dialog.selector}")
+        for dialog, members in zip(dialogs, dialog_members)
+    ]
+
+    # Greedily pack consecutive tiles while their combined rows still fit.
+    row_budget = token_budget - PROMPT_OVERHEAD_TOKENS
+    pending: list[ElementMapEntry] = []
+    pending_tokens = 0
+    first_tile: tuple[int, int] | None = None
+    last_tile: tuple[int, int] | None = None
+    for tile in sorted(tiles):
+        tile_tokens = estimate_rows_tokens(_sub_map(element_map, tiles[tile], ""))
+        if pending and pending_tokens + tile_tokens > row_budget:
+            regions.append(_sub_map(element_map, pending, _tile_label(first_tile, last_tile, vw, vh)))
+            pending, pending_tokens, first_tile = [], 0, None
+        pending.extend(tiles[tile])
+        pending_tokens += tile_tokens
+        first_tile = first_tile or tile
+        last_tile = tile
+    if pending:
+        regions.append(_sub_map(element_map, pending, _tile_label(first_tile, last_tile, vw, vh)))
+
+    return regions
+
+
+def _tile_label(
+    first: tuple[int, int] | None, last: tuple[int, int] | None, vw: float, vh: float
+) -> str:
+    if first is None or last is None:
+        return ""
+    return (
+        f"y {first[0] * vh:.0f}–{(last[0] + 1) * vh:.0f}px, "
+        f"x {min(first[1], last[1]) * vw:.0f}–{(max(first[1], last[1]) + 1) * vw:.0f}px"
+    )
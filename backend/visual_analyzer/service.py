@@ -3,20 +3,27 @@ visual_analyzer/service.py — Visual Analyzer Service.
 
 Converts screenshot + DOM metadata into an ElementMap, then sends it
 to an LLM for reasoning about visual dark patterns (layout anomalies,
-visual interference, misdirection through design).
+visual interference, misdirection through design). Pages too large for
+one prompt are split into regions analysed concurrently.
 """
 
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
-from dataclasses import asdict
 
 from django.conf import settings
 
+from core import diagnostics, partial
 from core.interfaces import BaseAnalyzer
+from core.llm import stream_json_items
 from core.models import Detection
-from visual_analyzer.element_map_builder import build_element_map, element_map_to_prompt
+from core.page import PageModel
+from core.profiling import span
+from core.site_profiles import get_store, layout_fingerprint, origin_of, site_profiles_enabled
+from visual_analyzer.element_map_builder import build_element_map
+from visual_analyzer.prompt_builder import build_prompt
+from visual_analyzer.regions import split_element_map
 
 logger = logging.getLogger(__name__)
 
@@ -44,24 +51,53 @@ If no issues are found, respond with an empty array: []
 Respond ONLY with the JSON array, no other text."""
 
 
+# Site-profile key for this analyzer's per-layout results.
+LAYOUT_CACHE_KEY = "visual"
+
+
+def _get_llm_concurrency() -> int:
+    """Max concurrent region prompts per request (default: 4)."""
+    return max(1, int(getattr(settings, "VISUAL_LLM_CONCURRENCY", 4)))
+
+
+def _dedupe_by_selector(detections: list[Detection]) -> list[Detection]:
+    """Merge per-region results, keeping the best detection per element+category."""
+    best: dict[tuple[str, str], Detection] = {}
+    for det in detections:
+        key = (det.element_selector, det.category)
+        if key not in best or det.confidence > best[key].confidence:
+            best[key] = det
+    return list(best.values())
+
+
+def _get_prompt_token_budget() -> int | None:
+    """Read the ElementMap prompt budget from settings (0 disables it)."""
+    budget = int(getattr(settings, "VISUAL_PROMPT_TOKEN_BUDGET", 4000))
+    return budget if budget > 0 else None
+
+
 class VisualAnalyzerService(BaseAnalyzer):
     """Analyzes page layout via ElementMap → LLM reasoning."""
 
-    async def analyze(self, payload: dict[str, object]) -> list[Detection]:
-        detections: list[Detection] = []
+    payload_keys = ("dom_metadata",)
+    uses_llm = True
 
-        dom_metadata = payload.get("dom_metadata")
-        if not isinstance(dom_metadata, dict):
-            return detections
+    async def analyze(
+        self, payload: dict[str, object], page: PageModel | None = None
+    ) -> list[Detection]:
+        if page is None:
+            page = PageModel.from_payload(payload)
+        if not page.has_dom:
+            diagnostics.skipped("no DOM metadata")
+            return []
 
-        # Build the ElementMap from DOM metadata
-        element_map = build_element_map(dom_metadata)
+        # Build the ElementMap from the shared page model
+        with span("visual:element_map"):
+            element_map = build_element_map(page)
 
         if not element_map.elements:
-            return detections
-
-        # Convert to prompt text
-        prompt = element_map_to_prompt(element_map)
+            diagnostics.skipped("no elements in the ElementMap")
+            return []
 
         # Check if Google API key is configured
         api_key = getattr(settings, "GOOGLE_API_KEY", "")
@@ -71,43 +107,85 @@ class VisualAnalyzerService(BaseAnalyzer):
                 "ElementMap-only heuristic results."
             )
             # Fall back to heuristic analysis from ElementMap
-            return self._heuristic_analysis(element_map)
+            diagnostics.note("no GOOGLE_API_KEY: heuristics only")
+            with span("visual:heuristics"):
+                return diagnostics.attribute(self._heuristic_analysis(element_map))
+
+        # A layout this site has shown repeatedly reuses the recorded result.
+        origin = origin_of(page.url) if site_profiles_enabled() else ""
+        fingerprint = layout_fingerprint(page) if origin else ""
+        if fingerprint:
+            cached = get_store().observe_layout(origin, fingerprint, LAYOUT_CACHE_KEY)
+            if cached is not None:
+                logger.info("Reusing visual analysis of a stable %s layout", origin)
+                diagnostics.note("reused the result for this site's stable layout")
+                return cached
+
+        # Convert to prompt text, trimmed to the configured token budget.
+        # If compaction had to drop elements, analyse the page region by
+        # region instead so nothing is lost.
+        budget = _get_prompt_token_budget()
+        with span("visual:build_prompt"):
+            prompt = build_prompt(element_map, token_budget=budget)
+            if budget is None or not prompt.dropped_elements:
+                prompts = [prompt.text]
+            else:
+                regions = split_element_map(element_map, budget)
+                prompts = [build_prompt(region, token_budget=budget).text for region in regions]
+                logger.info(
+                    "ElementMap too large for one prompt; analysing %d regions in parallel",
+                    len(prompts),
+                )
+
+        semaphore = asyncio.Semaphore(_get_llm_concurrency())
+        results = await asyncio.gather(
+            *(self._analyze_prompt(text, api_key, semaphore) for text in prompts),
+            return_exceptions=True,
+        )
 
-        try:
-            from google import genai
+        detections: list[Detection] = []
+        failures = 0
+        for result in results:
+            if isinstance(result, BaseException):
+                failures += 1
+                logger.error("Visual analyzer LLM call failed", exc_info=result)
+            else:
+                detections.extend(result)
+
+        if failures == len(results):
+            logger.warning("All visual analyzer LLM calls failed, falling back to heuristics")
+            return self._heuristic_analysis(element_map)
 
-            client = genai.Client(api_key=api_key)
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=f"{SYSTEM_PROMPT}\n\n---\n\n{prompt}",
-            )
+        merged = _dedupe_by_selector(detections)
+        if fingerprint and not failures:
+            get_store().record_layout(origin, fingerprint, LAYOUT_CACHE_KEY, merged)
+        return merged
 
-            response_text = response.text or "[]"
-
-            # Strip markdown fences if present
-            if response_text.startswith("```"):
-                lines = response_text.strip().split("\n")
-                response_text = "\n".join(lines[1:-1])
-
-            raw_detections = json.loads(response_text)
-
-            if isinstance(raw_detections, list):
-                for item in raw_detections:
-                    if isinstance(item, dict):
-                        detections.append(
-                            Detection(
-                                category=str(item.get("category", "visual_interference")),
-                                element_selector=str(item.get("selector", "")),
-                                confidence=float(item.get("confidence", 0.5)),
-                                explanation=str(item.get("explanation", "")),
-                                severity=str(item.get("severity", "medium")),  # type: ignore[arg-type]
-                            )
+    async def _analyze_prompt(
+        self, prompt: str, api_key: str, semaphore: asyncio.Semaphore
+    ) -> list[Detection]:
+        """Stream one ElementMap prompt through the LLM, emitting detections early."""
+        detections: list[Detection] = []
+        async with semaphore:
+            with span("visual:llm"):
+                async for item in stream_json_items(
+                    f"{SYSTEM_PROMPT}\n\n---\n\n{prompt}", api_key
+                ):
+                    # One bad item (e.g. confidence 1.5) must not cost the rest.
+                    try:
+                        det = Detection(
+                            category=str(item.get("category", "visual_interference")),
+                            element_selector=str(item.get("selector", "")),
+                            confidence=float(item.get("confidence", 0.5)),  # type: ignore[arg-type]
+                            explanation=str(item.get("explanation", "")),
+                            severity=str(item.get("severity", "medium")),  # type: ignore[arg-type]
                         )
-
-        except Exception:
-            logger.exception("Visual analyzer LLM call failed, falling back to heuristics")
-            return self._heuristic_analysis(element_map)
-
+                    except (TypeError, ValueError) as exc:
+                        logger.warning("Skipping invalid visual analyzer item %.200r: %s", item, exc)
+                        continue
+                    partial.emit(det)
+                    detections.append(det)
+                diagnostics.attribute(detections)
         return detections
 
     def _heuristic_analysis(self, element_map: object) -> list[Detection]:
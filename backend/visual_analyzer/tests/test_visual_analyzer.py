@@ -3,11 +3,15 @@
 from __future__ import annotations
 
 import asyncio
+from collections.abc import AsyncIterator
 
 import pytest
+from django.test import override_settings
 
 from core.models import Detection
 from visual_analyzer.element_map_builder import build_element_map
+from visual_analyzer.prompt_builder import _score_entries, build_prompt
+from visual_analyzer.regions import split_element_map
 from visual_analyzer.service import VisualAnalyzerService
 
 
@@ -62,6 +66,130 @@ class TestElementMapBuilder:
         assert len(emap.elements) == 0
 
 
+def _element(
+    selector: str,
+    text: str,
+    x: float,
+    y: float,
+    width: float = 120,
+    height: float = 40,
+    tag_name: str = "a",
+) -> dict[str, object]:
+    return {
+        "selector": selector,
+        "tag_name": tag_name,
+        "text_content": text,
+        "attributes": {},
+        "bounding_rect": {"x": x, "y": y, "width": width, "height": height},
+        "computed_styles": {
+            "color": "rgb(0, 0, 0)",
+            "background_color": "rgb(255, 255, 255)",
+            "font_size": "14px",
+            "opacity": "1",
+            "display": "block",
+            "visibility": "visible",
+        },
+    }
+
+
+class TestPromptBuilder:
+    """Unit tests for the token-budgeted prompt builder."""
+
+    def _large_map_dom(self) -> dict[str, object]:
+        footer_links = [
+            _element(f"footer a:nth-of-type({i})", f"Link {i}", 40 * i, 3000 + i)
+            for i in range(200)
+        ]
+        return {
+            "interactive_elements": [
+                _element("#accept", "Accept all", 400, 300, 300, 60, "button"),
+                _element("#decline", "No thanks", 720, 320, 60, 12),
+                *footer_links,
+            ],
+            "hidden_elements": [],
+            "prechecked_inputs": [],
+            "url": "https://example.com",
+        }
+
+    def test_merges_identical_repeats(self) -> None:
+        dom = {
+            "interactive_elements": [
+                _element(f".tile:nth-of-type({i})", "Add to cart", 0, 100 * i)
+                for i in range(50)
+            ],
+            "hidden_elements": [],
+            "prechecked_inputs": [],
+            "url": "https://example.com",
+        }
+        prompt = build_prompt(build_element_map(dom))
+        rows = [line for line in prompt.text.splitlines() if "Add to cart" in line]
+        assert len(rows) == 1
+        assert rows[0].endswith("|50")
+        assert prompt.dropped_elements == 0
+
+    def test_budget_keeps_accept_decline_cluster(self) -> None:
+        prompt = build_prompt(build_element_map(self._large_map_dom()), token_budget=300)
+        assert prompt.estimated_tokens <= 300
+        assert prompt.dropped_elements > 0
+        assert "#accept" in prompt.text
+        assert "#decline" in prompt.text
+
+    def test_visible_non_interactive_element_ranks_below_a_button(self) -> None:
+        dom = {
+            "interactive_elements": [
+                _element("#promo", "Summer sale", 0, 0, tag_name="div"),
+                _element("#more", "Details", 0, 600, tag_name="button"),
+            ],
+            "hidden_elements": [],
+            "prechecked_inputs": [],
+            "url": "https://example.com",
+        }
+        promo, button = _score_entries(build_element_map(dom))
+        assert promo < button
+
+    def test_unlimited_budget_keeps_everything(self) -> None:
+        prompt = build_prompt(build_element_map(self._large_map_dom()), token_budget=None)
+        assert prompt.kept_elements == prompt.total_elements == 202
+
+
+class TestRegions:
+    """Unit tests for splitting large ElementMaps into regions."""
+
+    def test_dialog_becomes_its_own_region(self) -> None:
+        dialog = _element("#consent", "", 300, 200, 600, 300, "div")
+        dialog["attributes"] = {"role": "dialog"}
+        dom = {
+            "interactive_elements": [
+                dialog,
+                _element("#accept", "Accept", 350, 400, 200, 40, "button"),
+                _element("#footer", "Imprint", 0, 2000),
+            ],
+            "hidden_elements": [],
+            "prechecked_inputs": [],
+            "url": "https://example.com",
+        }
+        regions = split_element_map(build_element_map(dom), token_budget=4000)
+        assert regions[0].region == "dialog #consent"
+        assert {e.selector for e in regions[0].elements} == {"#consent", "#accept"}
+        assert [e.selector for e in regions[1].elements] == ["#footer"]
+
+    def test_every_element_lands_in_one_region(self) -> None:
+        dom = {
+            "interactive_elements": [
+                _element(f"#el-{i}", f"Item {i}", (i % 7) * 200, i * 90)
+                for i in range(300)
+            ],
+            "hidden_elements": [],
+            "prechecked_inputs": [],
+            "url": "https://example.com",
+        }
+        regions = split_element_map(build_element_map(dom), token_budget=600)
+        assert len(regions) > 1
+        selectors = [e.selector for r in regions for e in r.elements]
+        assert sorted(selectors) == sorted(f"#el-{i}" for i in range(300))
+        assert all(build_prompt(r, 600).dropped_elements == 0 for r in regions)
+
+
 class TestVisualAnalyzer:
     """Unit tests for VisualAnalyzerService."""
 
@@ -113,3 +241,72 @@ class TestVisualAnalyzer:
         results = _run(service.analyze(payload))
         for det in results:
             assert 0.0 <= det.confidence <= 1.0
+
+    @override_settings(GOOGLE_API_KEY="test-key")
+    def test_invalid_llm_items_are_skipped_not_fatal(
+        self, service: VisualAnalyzerService, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        async def fake_stream(prompt: str, api_key: str) -> AsyncIterator[dict[str, object]]:
+            yield {"selector": "#el-0", "category": "misdirection", "confidence": 1.5,
+                   "explanation": "x", "severity": "low"}
+            yield {"selector": "#el-1", "category": "misdirection", "confidence": 0.6,
+                   "explanation": "x", "severity": "critical"}
+            yield {"selector": "#el-2", "category": "misdirection", "confidence": None,
+                   "explanation": "x", "severity": "low"}
+            yield {"selector": "#el-3", "category": "misdirection", "confidence": 0.7,
+                   "explanation": "x", "severity": "high"}
+
+        monkeypatch.setattr("visual_analyzer.service.stream_json_items", fake_stream)
+        payload = {
+            "dom_metadata": {
+                "interactive_elements": [_element(f"#el-{i}", f"Item {i}", 0, i * 90) for i in range(4)],
+                "hidden_elements": [],
+                "prechecked_inputs": [],
+                "url": "https://example.com",
+            },
+            "screenshot_b64": "",
+        }
+        results = _run(service.analyze(payload))
+        assert [(d.element_selector, d.confidence) for d in results] == [("#el-3", 0.7)]
+
+    @override_settings(
+        GOOGLE_API_KEY="test-key",
+        VISUAL_PROMPT_TOKEN_BUDGET=600,
+        VISUAL_LLM_CONCURRENCY=2,
+    )
+    def test_large_page_is_analysed_in_bounded_parallel_regions(
+        self, service: VisualAnalyzerService, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        in_flight = 0
+        peak = 0
+        calls = 0
+
+        async def fake_stream(prompt: str, api_key: str) -> AsyncIterator[dict[str, object]]:
+            nonlocal in_flight, peak, calls
+            calls += 1
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            # Every region reports the same element; the merge must dedupe it.
+            yield {"selector": "#el-0", "category": "misdirection",
+                   "confidence": 0.5 + calls / 100, "explanation": "x", "severity": "low"}
+
+        monkeypatch.setattr("visual_analyzer.service.stream_json_items", fake_stream)
+        payload = {
+            "dom_metadata": {
+                "interactive_elements": [
+                    _element(f"#el-{i}", f"Item {i}", (i % 7) * 200, i * 90)
+                    for i in range(300)
+                ],
+                "hidden_elements": [],
+                "prechecked_inputs": [],
+                "url": "https://example.com",
+            },
+            "screenshot_b64": "",
+        }
+        results = _run(service.analyze(payload))
+        assert calls > 1
+        assert peak == 2
+        assert len(results) == 1
+        assert results[0].confidence == pytest.approx(0.5 + calls / 100)
@@ -11,6 +11,7 @@ import type {
     BoundingRect,
     ComputedStyleInfo,
     LabeledElement,
+    TextSpan,
 } from "../types/index";
 import {
     sanitizeDomMetadata,
@@ -21,6 +22,24 @@ import {
 /** Maximum body text length to send to the backend. */
 const MAX_BODY_TEXT_LENGTH = 5000;
 
+/** Elements whose text is never shown to the user. */
+const NON_VISIBLE_TAGS = new Set(["SCRIPT", "STYLE", "NOSCRIPT", "TEMPLATE"]);
+
+/** Inline tags whose text belongs to the enclosing element's line. */
+const INLINE_TAGS = new Set([
+    "A", "ABBR", "B", "BDI", "CODE", "EM", "FONT", "I", "LABEL", "MARK",
+    "S", "SMALL", "SPAN", "STRONG", "SUB", "SUP", "TIME", "U",
+]);
+
+/** The nearest ancestor (or self) that is not an inline tag. */
+function lineElement(el: Element): Element {
+    let current = el;
+    while (INLINE_TAGS.has(current.tagName) && current.parentElement && current !== document.body) {
+        current = current.parentElement;
+    }
+    return current;
+}
+
 /** Build a unique CSS selector for an element. */
 function buildSelector(el: Element): string {
     if (el.id) return `#${CSS.escape(el.id)}`;
@@ -145,6 +164,46 @@ function collectHeadings(): LabeledElement[] {
         }));
 }
 
+/**
+ * Collect visible body text, one line per element, with an index mapping
+ * each line's offsets back to its element's selector.
+ */
+function collectBodyText(): { text: string; index: TextSpan[] } {
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+    const index: TextSpan[] = [];
+    let text = "";
+    let current: Element | null = null;
+    let pending = "";
+
+    const flush = () => {
+        const line = pending.replace(/\s+/g, " ").trim();
+        pending = "";
+        if (!current || !line) return;
+        const sep = text ? "\n" : "";
+        const room = MAX_BODY_TEXT_LENGTH - text.length - sep.length;
+        if (room <= 0) return;
+        const start = text.length + sep.length;
+        text += sep + line.slice(0, room);
+        index.push({ selector: buildSelector(current), start, end: text.length });
+    };
+
+    for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+        const parent = node.parentElement;
+        if (!parent || NON_VISIBLE_TAGS.has(parent.tagName)) continue;
+        // Hidden text is left out, as innerText would.
+        if (parent.checkVisibility?.() === false) continue;
+        const line = lineElement(parent);
+        if (line !== current) {
+            flush();
+            if (text.length >= MAX_BODY_TEXT_LENGTH) break;
+            current = line;
+        }
+        pending += node.nodeValue ?? "";
+    }
+    flush();
+    return { text, index };
+}
+
 /** Attempt to collect review text from common review containers. */
 function collectReviewText(): string | null {
     const reviewSelectors = [
@@ -179,12 +238,20 @@ export function collectPageSignals(): CollectorPayload {
         interactive_elements: collectInteractiveElements(),
         prechecked_inputs: collectPrecheckedInputs(),
         url: window.location.href,
+        document: {
+            scroll_x: window.scrollX,
+            scroll_y: window.scrollY,
+            width: document.documentElement.scrollWidth,
+            height: document.documentElement.scrollHeight,
+        },
     };
 
+    const body = collectBodyText();
     const textContent: TextContent = {
         button_labels: collectButtonLabels(),
         headings: collectHeadings(),
-        body_text: (document.body.innerText ?? "").slice(0, MAX_BODY_TEXT_LENGTH),
+        body_text: body.text,
+        body_index: body.index,
     };
 
     const reviewText = collectReviewText();
@@ -3,7 +3,7 @@
 // Strips sensitive data before payloads leave the browser.
 // ──────────────────────────────────────────────
 
-import type { DomMetadata, TextContent, ElementInfo } from "../types/index";
+import type { DomMetadata, TextContent, ElementInfo, TextSpan } from "../types/index";
 
 const EMAIL_REGEX = /[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}/g;
 const PHONE_REGEX = /(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}/g;
@@ -59,8 +59,30 @@ export function sanitizeDomMetadata(meta: DomMetadata): DomMetadata {
     };
 }
 
+/**
+ * Redact body text span by span and rebuild the offset index, since a
+ * redaction changes the length of the text after it.
+ */
+function sanitizeBodyText(
+    text: string,
+    index: TextSpan[]
+): { body_text: string; body_index: TextSpan[] } {
+    let out = "";
+    const spans: TextSpan[] = [];
+    for (const span of index) {
+        const clean = redactPiiFromText(text.slice(span.start, span.end));
+        if (out) out += "\n";
+        spans.push({ selector: span.selector, start: out.length, end: out.length + clean.length });
+        out += clean;
+    }
+    return { body_text: out, body_index: spans };
+}
+
 /** Sanitize text content: redact PII from body text and labels. */
 export function sanitizeTextContent(content: TextContent): TextContent {
+    const body = content.body_index
+        ? sanitizeBodyText(content.body_text, content.body_index)
+        : { body_text: redactPiiFromText(content.body_text) };
     return {
         button_labels: content.button_labels.map((lbl) => ({
             ...lbl,
@@ -70,7 +92,7 @@ export function sanitizeTextContent(content: TextContent): TextContent {
             ...h,
             text: redactPiiFromText(h.text),
         })),
-        body_text: redactPiiFromText(content.body_text),
+        ...body,
     };
 }
 
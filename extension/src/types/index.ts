@@ -27,6 +27,8 @@ export interface Detection {
     severity: Severity;
     corroborated: boolean;
     user_feedback: UserFeedback;
+    /** Analyzer name → that analyzer's confidence for this detection. */
+    sources?: Record<string, number>;
 }
 
 /** Payload sent from the content script to the service worker. */
@@ -46,6 +48,16 @@ export interface DomMetadata {
     prechecked_inputs: ElementInfo[];
     /** Page URL for context. */
     url: string;
+    /** Scroll offset and size of the document (bounding rects are viewport-relative). */
+    document: DocumentMetrics;
+}
+
+/** Scroll offset and scrollable size of the document, in CSS pixels. */
+export interface DocumentMetrics {
+    scroll_x: number;
+    scroll_y: number;
+    width: number;
+    height: number;
 }
 
 /** Information about a single DOM element. */
@@ -84,6 +96,15 @@ export interface TextContent {
     headings: LabeledElement[];
     /** Body text paragraphs (first 5000 chars). */
     body_text: string;
+    /** Which element each stretch of body_text came from. */
+    body_index?: TextSpan[];
+}
+
+/** body_text.slice(start, end) is the text of the element at selector. */
+export interface TextSpan {
+    selector: string;
+    start: number;
+    end: number;
 }
 
 /** A text label tied to a DOM selector. */
@@ -106,6 +127,28 @@ export interface AnalyzeResponse {
     detections: Detection[];
 }
 
+/** A user's verdict on one detection, sent to POST /api/feedback. */
+export interface FeedbackEvent {
+    category: DarkPatternCategory;
+    element_selector: string;
+    confidence: number;
+    severity: Severity;
+    corroborated: boolean;
+    sources?: Record<string, number>;
+    user_feedback: Exclude<UserFeedback, null>;
+}
+
+/** Request body for POST /api/feedback. */
+export interface FeedbackRequest {
+    url: string;
+    events: FeedbackEvent[];
+}
+
+/** Response from POST /api/feedback. */
+export interface FeedbackResponse {
+    accepted: number;
+}
+
 /** Message types for chrome.runtime messaging. */
 export type MessageType =
     | { type: "ANALYZE_PAGE"; payload: CollectorPayload }
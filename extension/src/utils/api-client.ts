@@ -3,7 +3,12 @@
 // Sends collected signals to the Django backend.
 // ──────────────────────────────────────────────
 
-import type { AnalyzeRequest, AnalyzeResponse } from "../types/index";
+import type {
+    AnalyzeRequest,
+    AnalyzeResponse,
+    FeedbackRequest,
+    FeedbackResponse,
+} from "../types/index";
 
 /** Default backend URL — can be overridden via chrome.storage. */
 const DEFAULT_API_URL = "http://localhost:8000/api/analyze";
@@ -14,6 +19,17 @@ async function getApiUrl(): Promise<string> {
     return (result["apiUrl"] as string | undefined) ?? DEFAULT_API_URL;
 }
 
+/**
+ * Gzip a request body with the browser's built-in CompressionStream.
+ * The backend decodes `Content-Encoding: gzip` (see core/parsers.py).
+ */
+async function gzipBody(body: string): Promise<ArrayBuffer> {
+    const stream = new Blob([body])
+        .stream()
+        .pipeThrough(new CompressionStream("gzip"));
+    return new Response(stream).arrayBuffer();
+}
+
 /**
  * Send analysis payload to the DarkGuard backend.
  * Throws on network errors or non-2xx responses.
@@ -23,6 +39,34 @@ export async function analyzePageSignals(
 ): Promise<AnalyzeResponse> {
     const apiUrl = await getApiUrl();
 
+    const response = await fetch(apiUrl, {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+        },
+        body: await gzipBody(JSON.stringify(request)),
+    });
+
+    if (!response.ok) {
+        const text = await response.text();
+        throw new Error(
+            `DarkGuard API error (${response.status}): ${text.slice(0, 200)}`
+        );
+    }
+
+    return (await response.json()) as AnalyzeResponse;
+}
+
+/**
+ * Send users' verdicts on detections to the backend's feedback endpoint,
+ * which lives next to the configured analyze URL.
+ */
+export async function sendFeedback(
+    request: FeedbackRequest
+): Promise<FeedbackResponse> {
+    const apiUrl = (await getApiUrl()).replace(/\/analyze\/?$/, "/feedback");
+
     const response = await fetch(apiUrl, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
@@ -36,5 +80,5 @@ export async function analyzePageSignals(
         );
     }
 
-    return (await response.json()) as AnalyzeResponse;
+    return (await response.json()) as FeedbackResponse;
 }